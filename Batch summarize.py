@@ -51,9 +51,12 @@ with app.app_context():
     fail = 0
 
     for i, tr in enumerate(pending, 1):
+        if not is_ollama_available():
+            print(f"\n⚠ Ollama 中途不可用，剩余 {len(pending) - i + 1} 条保留待下次运行")
+            break
         print(f"[{i}/{len(pending)}] {tr.tr_no} ... ", end="", flush=True)
         t0 = time.time()
-        summary = summarize_issue(tr.issue_description)
+        summary = summarize_issue(tr.issue_description, priority="batch")
         elapsed = time.time() - t0
 
         if summary:
@@ -4,6 +4,10 @@ from flask_migrate import Migrate  # ✅ 添加这一行
 from .config import Config
 from .extensions import db
 from . import models  # ✅ 确保所有模型（含TR）被加载
+from . import supplier_helper  # 注册写入时的 supplier_id 解析（mapper 事件）
+from . import scorecard_helper  # 注册供应商计分卡的增量刷新（mapper / session 事件）
+from . import edc_helper  # 注册零件增删改时 EDC part_id 的增量补挂（mapper 事件）
+from . import part_quality_helper  # 注册零件质量汇总的增量刷新（mapper / session 事件）
 
 
 def create_app(test_config=None):
@@ -7,63 +7,345 @@ import json
 import os
 import subprocess
 import hashlib
+import heapq
+import itertools
+import threading
+import time
 import zipfile
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from xml.etree import ElementTree as ET
 
 OLLAMA_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "qwen3:8b"   # 英文输出可改 llama3.2:3b
+# 相似问题检索用的 embedding 模型（ollama pull bge-m3，中英文混排效果较好）
+OLLAMA_EMBED_URL = "http://localhost:11434/api/embed"
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "bge-m3")
 
 # 输出语言：'zh' 中文 / 'en' 英文
 OUTPUT_LANG = "en"
 
 
+# ──────────────────────────────────────────────────────────
+# Ollama 调度：全局并发上限 + 优先级通道
+# ──────────────────────────────────────────────────────────
+
+# 本地只有一个模型实例，并发请求只会互相拖慢；默认同一时间只跑一个生成。
+OLLAMA_MAX_CONCURRENCY = max(1, int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1")))
+
+# interactive：用户在页面上等待结果（CP 重新识别、English Lab 生成）
+# background：TR 保存后的摘要 / 8D 提取等后台线程
+# batch：批量脚本（重新生成全部摘要、回填控制计划）
+AI_PRIORITIES = {"interactive": 0, "background": 1, "batch": 2}
+
+# 熔断器：健康结果缓存秒数；断开后按指数退避重新探测（秒）
+OLLAMA_HEALTH_TTL = 15
+OLLAMA_PROBE_BACKOFF = (5, 300)
+
+
+class _OllamaGovernor:
+    """Grant Ollama slots by lane priority, FIFO within a lane."""
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._stats = {
+            lane: {"calls": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for lane in AI_PRIORITIES
+        }
+
+    def acquire(self, lane, timeout=None):
+        """Block until a slot is free; return queue seconds, or None on timeout."""
+        ticket = (AI_PRIORITIES[lane], next(self._sequence))
+        started = time.monotonic()
+        deadline = started + timeout if timeout else None
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while self._active >= self.max_concurrency or self._waiting[0] != ticket:
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._stats[lane]["timeouts"] += 1
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait(remaining)
+            heapq.heappop(self._waiting)
+            self._active += 1
+            waited = time.monotonic() - started
+            stats = self._stats[lane]
+            stats["calls"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+            self._cond.notify_all()
+            return waited
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            waiting = {lane: 0 for lane in AI_PRIORITIES}
+            lane_by_rank = {rank: lane for lane, rank in AI_PRIORITIES.items()}
+            for rank, _ in self._waiting:
+                waiting[lane_by_rank[rank]] += 1
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "lanes": {
+                    lane: {
+                        "waiting": waiting[lane],
+                        "calls": stats["calls"],
+                        "timeouts": stats["timeouts"],
+                        "avg_wait_ms": round(stats["wait_total"] * 1000 / stats["calls"]) if stats["calls"] else 0,
+                        "max_wait_ms": round(stats["wait_max"] * 1000),
+                    }
+                    for lane, stats in self._stats.items()
+                },
+            }
+
+
+class _OllamaCircuit:
+    """Closed / open / half-open breaker around the local Ollama server.
+
+    closed：正常调用，健康结果缓存 OLLAMA_HEALTH_TTL 秒
+    open：连接失败后立即拒绝，直到下一次探测时间（指数退避）
+    half_open：只放行一个探测或试探调用，成功则恢复，失败则退避加倍
+    """
+
+    def __init__(self, backoff=OLLAMA_PROBE_BACKOFF, ttl=OLLAMA_HEALTH_TTL):
+        self.min_backoff, self.max_backoff = backoff
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.checked_at = None
+        self.next_probe_at = 0.0
+
+    def allow(self):
+        """Whether a call may go out now; may claim the half-open trial."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() >= self.next_probe_at:
+                self.state = "half_open"
+                return True
+            return False
+
+    def fresh_health(self):
+        """Cached health when still valid, else None (caller should probe)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                return False if now < self.next_probe_at else None
+            if self.state == "half_open":
+                return False
+            if self.checked_at is not None and now - self.checked_at < self.ttl:
+                return True
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.checked_at = time.monotonic()
+            self.next_probe_at = 0.0
+        _run_deferred_async()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            delay = min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+            self.state = "open"
+            self.checked_at = time.monotonic()
+            self.next_probe_at = self.checked_at + delay
+
+    def abandon_trial(self):
+        """A half-open trial ended without an answer; let the next caller probe."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.next_probe_at = time.monotonic()
+
+    def seconds_until_probe(self):
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.next_probe_at - time.monotonic())
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in_s": round(self.seconds_until_probe(), 1),
+        }
+
+
+_governor = _OllamaGovernor(OLLAMA_MAX_CONCURRENCY)
+_circuit = _OllamaCircuit()
+
+# Ollama 不可用时推迟的后台任务：key -> callback，恢复后各自重新执行
+_deferred = {}
+_deferred_lock = threading.Lock()
+_deferred_watcher = {"running": False}
+
+
+def ai_queue_stats():
+    """当前排队情况、熔断状态和各通道的排队耗时统计（用于状态接口 / 日志）"""
+    stats = _governor.snapshot()
+    stats["circuit"] = _circuit.snapshot()
+    with _deferred_lock:
+        stats["deferred"] = len(_deferred)
+    return stats
+
+
+def defer_until_available(key, callback, logger=None):
+    """Ollama 不可用时登记任务，探测恢复后自动重新执行（同一 key 只保留一份）"""
+    with _deferred_lock:
+        _deferred[key] = callback
+        start_watcher = not _deferred_watcher["running"]
+        _deferred_watcher["running"] = True
+    if logger:
+        logger.info(f"[AI] Ollama unavailable, requeued {key}")
+    if start_watcher:
+        threading.Thread(target=_watch_deferred, daemon=True, name="ollama-recovery").start()
+
+
+def _watch_deferred():
+    while True:
+        with _deferred_lock:
+            if not _deferred:
+                _deferred_watcher["running"] = False
+                return
+        if is_ollama_available():
+            _run_deferred_async()
+            continue
+        time.sleep(max(1.0, _circuit.seconds_until_probe()))
+
+
+def _run_deferred_async():
+    with _deferred_lock:
+        callbacks = list(_deferred.values())
+        _deferred.clear()
+    for callback in callbacks:
+        threading.Thread(target=callback, daemon=True).start()
+
+
 # ──────────────────────────────────────────────────────────
 # Ollama 基础
 # ──────────────────────────────────────────────────────────
 
 def is_ollama_available(timeout=3):
+    """熔断器视角的可用性：缓存期内 / 退避期内直接返回，不发请求"""
+    cached = _circuit.fresh_health()
+    if cached is not None:
+        return cached
+    if not _circuit.allow():
+        return False
     try:
         r = requests.get("http://localhost:11434/api/tags", timeout=timeout)
-        return r.status_code == 200
+        ok = r.status_code == 200
     except Exception:
-        return False
+        ok = False
+    if ok:
+        _circuit.record_success()
+    else:
+        _circuit.record_failure()
+    return ok
 
 
-def _call_ollama(prompt, timeout=120, num_predict=300, logger=None):
-    """调用 Ollama，返回文本或 None"""
+def _ollama_post(url, payload, timeout=120, logger=None, priority="background", queue_timeout=None):
+    """经调度器和熔断器向 Ollama 发 POST，返回解析后的 JSON 或 None
+
+    priority 决定排队通道（interactive > background > batch）；
+    排队最多等待 queue_timeout 秒（默认同 timeout）；熔断器断开时直接返回 None，不排队也不等超时。
+    """
+    if queue_timeout is None:
+        queue_timeout = timeout
+    if priority not in AI_PRIORITIES:
+        priority = "background"
+    if not _circuit.allow():
+        if logger:
+            logger.info(f"[AI] Ollama circuit open, skip {priority} call")
+        return None
+
+    waited = _governor.acquire(priority, timeout=queue_timeout)
+    if waited is None:
+        _circuit.abandon_trial()
+        if logger:
+            logger.warning(f"[AI] {priority} call gave up after queueing {queue_timeout}s")
+        return None
+    if logger and waited >= 1:
+        logger.info(f"[AI] {priority} call queued {waited:.1f}s")
     try:
-        resp = requests.post(
-            OLLAMA_URL,
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "think": False,
-                "options": {"temperature": 0.0, "num_predict": 1500},
-            },
-            timeout=timeout,
-        )
+        resp = requests.post(url, json=payload, timeout=timeout)
+        _circuit.record_success()
         if resp.status_code != 200:
             if logger:
                 logger.warning(f"[AI] Ollama returned {resp.status_code}")
             return None
-        raw = (resp.json().get("response") or "").strip()
-        raw = re.sub(r"<think>.*?</think>", "", raw, flags=re.DOTALL).strip()
-        return raw if raw else None
-    except requests.exceptions.Timeout:
+        return resp.json()
+    except (requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError):
+        _circuit.record_failure()
         if logger:
-            logger.warning("[AI] Ollama timeout")
+            logger.warning("[AI] Ollama not running")
         return None
-    except requests.exceptions.ConnectionError:
+    except requests.exceptions.Timeout:
+        # 连接成功但生成超时：服务在线，只是忙，不计入熔断
+        _circuit.record_success()
         if logger:
-            logger.warning("[AI] Ollama not running")
+            logger.warning("[AI] Ollama timeout")
         return None
     except Exception as e:
+        _circuit.abandon_trial()
         if logger:
             logger.warning(f"[AI] error: {e}")
         return None
+    finally:
+        _governor.release()
+
+
+def _call_ollama(prompt, timeout=120, num_predict=300, logger=None, priority="background",
+                 queue_timeout=None):
+    """调用 Ollama 生成，返回文本或 None"""
+    data = _ollama_post(
+        OLLAMA_URL,
+        {
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "think": False,
+            "options": {"temperature": 0.0, "num_predict": num_predict},
+        },
+        timeout=timeout, logger=logger, priority=priority, queue_timeout=queue_timeout,
+    )
+    if not data:
+        return None
+    raw = (data.get("response") or "").strip()
+    raw = re.sub(r"<think>.*?</think>", "", raw, flags=re.DOTALL).strip()
+    return raw if raw else None
+
+
+def embed_texts(texts, timeout=60, logger=None, priority="background"):
+    """用本地 embedding 模型批量向量化，返回 list[list[float]] 或 None"""
+    texts = [t for t in texts if t]
+    if not texts:
+        return []
+    data = _ollama_post(
+        OLLAMA_EMBED_URL,
+        {"model": OLLAMA_EMBED_MODEL, "input": texts},
+        timeout=timeout, logger=logger, priority=priority,
+    )
+    vectors = (data or {}).get("embeddings") or []
+    if len(vectors) != len(texts):
+        return None
+    return vectors
 
 
 def _parse_json(text):
@@ -108,14 +390,14 @@ Raw text:
 }
 
 
-def summarize_issue(raw_text, timeout=180, logger=None):
+def summarize_issue(raw_text, timeout=180, logger=None, priority="background"):
     if not raw_text or not raw_text.strip():
         return None
     if len(raw_text.strip()) < 30:
         return raw_text.strip()
 
     prompt = _SUMMARY_PROMPT[OUTPUT_LANG].format(raw=raw_text.strip()[:2000])
-    summary = _call_ollama(prompt, timeout=timeout, num_predict=800, logger=logger)
+    summary = _call_ollama(prompt, timeout=timeout, num_predict=800, logger=logger, priority=priority)
     if not summary:
         return None
 
@@ -377,6 +659,82 @@ RULES:
 8D report text:
 {raw}"""
 
+_8D_JSON_SCHEMA = (
+    '{"occurrence_cause":"<中文>","occurrence_cause_en":"<English translation>",'
+    '"occurrence_action":"<中文>","occurrence_action_en":"<English>",'
+    '"escape_cause":"<中文>","escape_cause_en":"<English>",'
+    '"escape_action":"<中文>","escape_action_en":"<English>"}'
+)
+
+# 长文档 map 阶段：每段只回答本段里出现的内容
+_8D_MAP_PROMPT = """You are reading PART {part} of {total} of a long 8D report from an automotive supplier.
+The text was extracted from Excel/PDF and contains Chinese + English bilingual labels.
+
+From THIS PART ONLY, extract:
+- occurrence_cause: why the defect HAPPENED (D4 root cause, "根本原因", "发生原因", 5-Why chain links)
+- escape_cause: why it was NOT DETECTED ("未检出原因", "流出原因", "Non-detection", "Escape")
+- occurrence_action: D5/D6 corrective action fixing the occurrence root cause
+- escape_action: D5/D6 action fixing the detection / inspection gap
+
+Use "" for anything this part does not state. Do NOT guess and do NOT use general knowledge.
+Keep each field to 1-3 short sentences; keep the Why chain order if several links are present.
+
+Output STRICT JSON, no preamble, no markdown:
+{schema}
+
+Report part text:
+{chunk}"""
+
+# 长文档 reduce 阶段：合并各段结果为最终答案
+_8D_REDUCE_PROMPT = """Below are partial extractions from different parts of ONE 8D report, in document order.
+Merge them into the final answer for the whole report.
+
+RULES:
+- occurrence_cause: combine the cause-chain links into one compact paragraph
+  (immediate cause -> process/system cause -> final root cause), 2-4 links, no repetition.
+- escape_cause is about non-detection and MUST differ from occurrence_cause. If none was found, use "".
+- Actions: keep the D5/D6 measures that match each cause; 1-2 concise sentences per field.
+- Chinese and English fields must describe the same content; translate naturally if one side is missing.
+- Use only information present below. If a field is empty in every part, output "".
+- Keep occurrence_cause / escape_cause 40-120 Chinese characters or 25-65 English words.
+
+Potential D5/D6 corrective action text pre-extracted from the report:
+{action_hint}
+
+Partial extractions (one JSON per line):
+{partials}
+
+Output STRICT JSON, no preamble, no markdown, no comments:
+{schema}"""
+
+# 超过此长度的 8D 文本走分段 map-reduce；否则单次提示
+EIGHT_D_SINGLE_PASS_CHARS = 10000
+EIGHT_D_CHUNK_CHARS = 4000
+# map 段按调度器并发数（OLLAMA_MAX_CONCURRENCY）并行，默认 1 即逐段执行；
+# 各段排在同一文档的前几段后面，排队上限不用单次调用的 timeout
+EIGHT_D_MAP_QUEUE_SECONDS = 1800
+
+_8D_FIELDS = (
+    "occurrence_cause", "occurrence_cause_en", "occurrence_action", "occurrence_action_en",
+    "escape_cause", "escape_cause_en", "escape_action", "escape_action_en",
+)
+
+# D1-D8 标题、Sheet / Slide 分隔、常见根因 / 措施小节标题作为分段边界
+_8D_SECTION_START = re.compile(
+    r"^(?:=== (?:Sheet|Slide)\b"
+    r"|\s*D\s?[1-8](?![0-9])"
+    r"|\s*(?:\d+(?:\.\d+)?\s*[|.、]?\s*)?"
+    r"(?:根本原因|发生原因|未检出原因|流出原因|纠正措施|永久措施|预防措施"
+    r"|Root Cause|Reason for Non-detection|Corrective Action|Preventive)"
+    r")",
+    re.I,
+)
+
+CAUSE_SECTION_KEYWORDS = (
+    "D4", "根本原因", "发生原因", "未检出原因", "流出原因", "为什么", "Root Cause",
+    "Non-detection", "Escape", "Why",
+)
+
 
 def _compact_8d_field(value, max_chars=420):
     """Keep AI 8D extraction readable if the model copies a long report section."""
@@ -547,7 +905,147 @@ def _extract_corrective_actions_from_table(action_hint):
     }
 
 
-def extract_8d(file_path, timeout=180, logger=None):
+def _pack_8d_pieces(pieces, max_chars):
+    """按顺序把文本块拼成不超过 max_chars 的段；超长块先按行、再按字符切开"""
+    chunks, buf, size = [], [], 0
+    queue = list(pieces)
+    while queue:
+        piece = queue.pop(0)
+        if len(piece) > max_chars:
+            lines = piece.split("\n")
+            if len(lines) > 1:
+                queue[:0] = lines
+            else:
+                queue[:0] = [piece[i:i + max_chars] for i in range(0, len(piece), max_chars)]
+            continue
+        if buf and size + len(piece) + 1 > max_chars:
+            chunks.append("\n".join(buf))
+            buf, size = [], 0
+        buf.append(piece)
+        size += len(piece) + 1
+    if buf:
+        chunks.append("\n".join(buf))
+    return chunks
+
+
+def _split_8d_sections(raw, max_chars=None):
+    """按 D1-D8 / Sheet / 根因措施小节切分长 8D 文本，连续的表格行尽量放在同一段"""
+    max_chars = max_chars or EIGHT_D_CHUNK_CHARS
+    sections, current = [], []
+    for line in (raw or "").splitlines():
+        if not line.strip():
+            continue
+        if current and _8D_SECTION_START.match(line):
+            sections.append(current)
+            current = []
+        current.append(line)
+    if current:
+        sections.append(current)
+
+    pieces = []
+    for lines in sections:
+        text = "\n".join(lines)
+        if len(text) <= max_chars:
+            pieces.append(text)
+            continue
+        # 小节本身超长：表格行块 / 正文块分开，表格块不从中间断开（除非表格块自身超长）
+        run, run_is_table = [], None
+        for line in lines:
+            is_table = " | " in line
+            if run and is_table != run_is_table:
+                pieces.append("\n".join(run))
+                run = []
+            run.append(line)
+            run_is_table = is_table
+        if run:
+            pieces.append("\n".join(run))
+    return _pack_8d_pieces(pieces, max_chars)
+
+
+def _relevant_8d_chunks(chunks):
+    """只把含根因 / 流出 / 措施线索的段送去 map；都没有时退回全部"""
+    keywords = [k.lower() for k in CAUSE_SECTION_KEYWORDS + ACTION_SECTION_KEYWORDS]
+    picked = [c for c in chunks if any(k in c.lower() for k in keywords)]
+    return picked or chunks
+
+
+def _map_8d_chunk(part, total, chunk, timeout, logger, priority):
+    prompt = _8D_MAP_PROMPT.format(part=part, total=total, schema=_8D_JSON_SCHEMA, chunk=chunk)
+    data = _parse_json(_call_ollama(
+        prompt, timeout=timeout, num_predict=600, logger=logger, priority=priority,
+        queue_timeout=EIGHT_D_MAP_QUEUE_SECONDS,
+    ))
+    if not isinstance(data, dict):
+        return None
+    return {k: re.sub(r"\s+", " ", str(data.get(k) or "")).strip() for k in _8D_FIELDS}
+
+
+def _merge_8d_partials(partials):
+    """reduce 调用失败时的确定性合并：各字段按文档顺序去重拼接"""
+    merged = {}
+    for key in _8D_FIELDS:
+        values, seen = [], set()
+        for partial in partials:
+            value = partial.get(key, "")
+            if value and value.lower() not in seen:
+                seen.add(value.lower())
+                values.append(value)
+        merged[key] = (" " if key.endswith("_en") else "").join(values)
+    return merged
+
+
+def _reduce_8d_partials(partials, action_hint, timeout, logger, priority):
+    useful = [p for p in partials if p and any(p.values())]
+    if not useful:
+        return None
+    if len(useful) == 1:
+        return useful[0]
+    prompt = _8D_REDUCE_PROMPT.format(
+        action_hint=(action_hint or "(none found)")[:3000],
+        partials="\n".join(
+            json.dumps({k: v for k, v in p.items() if v}, ensure_ascii=False) for p in useful
+        ),
+        schema=_8D_JSON_SCHEMA,
+    )
+    data = _parse_json(_call_ollama(prompt, timeout=timeout, num_predict=1000, logger=logger, priority=priority))
+    if isinstance(data, dict) and any(data.get(k) for k in _8D_FIELDS):
+        return data
+    if logger:
+        logger.info("[AI] 8D reduce returned nothing usable; merging partial results")
+    return _merge_8d_partials(useful)
+
+
+def _extract_8d_data(raw, action_hint, timeout=180, logger=None, priority="background"):
+    """短文档单次提示；长文档按段 map + reduce。返回模型 JSON dict 或 None"""
+    text = raw.strip()
+    if len(text) <= EIGHT_D_SINGLE_PASS_CHARS:
+        prompt = _8D_PROMPT.format(action_hint=action_hint or "(none found)", raw=text)
+        out = _call_ollama(prompt, timeout=timeout, num_predict=1500, logger=logger, priority=priority)
+        data = _parse_json(out)
+        if out and not data and logger:
+            logger.warning(f"[AI] 8D JSON parse failed: {out[:200]}")
+        return data
+
+    chunks = _relevant_8d_chunks(_split_8d_sections(text))
+    if logger:
+        logger.info(f"[AI] 8D long document: {len(text)} chars -> {len(chunks)} part(s)")
+    args = [(i + 1, len(chunks), chunk, timeout, logger, priority) for i, chunk in enumerate(chunks)]
+    workers = min(_governor.max_concurrency, len(chunks))
+    if workers == 1:
+        partials = [_map_8d_chunk(*a) for a in args]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(lambda a: _map_8d_chunk(*a), args))
+    missing = [i + 1 for i, partial in enumerate(partials) if partial is None]
+    if missing and logger:
+        logger.warning(
+            f"[AI] 8D map incomplete: part(s) {missing} of {len(chunks)} returned nothing; "
+            "causes / actions in those parts may be missing"
+        )
+    return _reduce_8d_partials(partials, action_hint, timeout, logger, priority)
+
+
+def extract_8d(file_path, timeout=180, logger=None, priority="background"):
     """
     从 8D 报告文件提取：发生根因、流出原因、纠正措施（中英双语）。
     返回 dict:
@@ -559,6 +1057,7 @@ def extract_8d(file_path, timeout=180, logger=None):
         "action": str,           # 纠正措施（中文）
         "action_en": str,        # 纠正措施（英文）
       }
+    长文档（超过 EIGHT_D_SINGLE_PASS_CHARS）按 D 段分块提取后再合并，不再截断。
     提取失败返回 None。
     """
     raw = extract_text_from_file(file_path, logger=logger)
@@ -569,39 +1068,12 @@ def extract_8d(file_path, timeout=180, logger=None):
 
     action_hint = _extract_action_hint(raw)
     fallback_actions = _fallback_actions_from_hint(action_hint)
-    prompt = _8D_PROMPT.format(action_hint=action_hint or "(none found)", raw=raw.strip()[:10000])
-    out = _call_ollama(prompt, timeout=timeout, num_predict=1500, logger=logger)
-    if not out:
-        if any(fallback_actions.values()):
-            if logger:
-                logger.info("[AI] 8D model returned no output; using deterministic D5/D6 action fallback")
-            return {
-                "root_cause": fallback_actions.get("root_cause", ""),
-                "root_cause_en": fallback_actions.get("root_cause_en", ""),
-                "escape_cause": fallback_actions.get("escape_cause", ""),
-                "escape_cause_en": fallback_actions.get("escape_cause_en", ""),
-                "action": fallback_actions.get("action", ""),
-                "action_en": fallback_actions.get("action_en", ""),
-                "escape_action": fallback_actions.get("escape_action", ""),
-                "escape_action_en": fallback_actions.get("escape_action_en", ""),
-            }
-        return None
-
-    data = _parse_json(out)
+    data = _extract_8d_data(raw, action_hint, timeout=timeout, logger=logger, priority=priority)
     if not data:
-        if logger:
-            logger.warning(f"[AI] 8D JSON parse failed: {out[:200]}")
         if any(fallback_actions.values()):
-            return {
-                "root_cause": fallback_actions.get("root_cause", ""),
-                "root_cause_en": fallback_actions.get("root_cause_en", ""),
-                "escape_cause": fallback_actions.get("escape_cause", ""),
-                "escape_cause_en": fallback_actions.get("escape_cause_en", ""),
-                "action": fallback_actions.get("action", ""),
-                "action_en": fallback_actions.get("action_en", ""),
-                "escape_action": fallback_actions.get("escape_action", ""),
-                "escape_action_en": fallback_actions.get("escape_action_en", ""),
-            }
+            if logger:
+                logger.info("[AI] 8D model returned no usable output; using deterministic D5/D6 action fallback")
+            return dict(fallback_actions)
         return None
 
     result = {
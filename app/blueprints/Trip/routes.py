@@ -63,9 +63,12 @@ def _apply_supplier_from_form(form, current_trip=None):
     """
     支持两种方式：
     1) 选择下拉 supplier_id -> 自动回填 supplier_code/supplier_name（以 Supplier 表为准）
-    2) 不选 supplier_id -> 使用手动输入 supplier_name（必填）和 supplier_code（可选）
+    2) 不选 supplier_id -> 使用手动输入 supplier_name（必填）和 supplier_code（可选），
+       保存时按别名表解析 supplier_id（supplier_helper）
+    返回 (supplier_code, supplier_name, 选中的 Supplier.id 或 None)
     """
     supplier_id = (form.get("supplier_id") or "").strip()
+    selected_id = None
 
     supplier_code = (form.get("supplier_code") or "").strip() or None
     supplier_name = (form.get("supplier_name") or "").strip()
@@ -80,8 +83,9 @@ def _apply_supplier_from_form(form, current_trip=None):
         if s:
             supplier_code = s.code
             supplier_name = s.name
+            selected_id = s.id
 
-    return supplier_code, supplier_name
+    return supplier_code, supplier_name, selected_id
 
 
 @trip_bp.route("/", methods=["GET"])
@@ -170,7 +174,7 @@ def new_trip():
 
         # 获取表单数据
         engineer = request.form.get("engineer", "").strip()
-        supplier_code, supplier_name = _apply_supplier_from_form(request.form)
+        supplier_code, supplier_name, supplier_id = _apply_supplier_from_form(request.form)
         supplier_location = request.form.get("supplier_location", "").strip() or None
         purpose = request.form.get("purpose", "").strip()
         audit_type = request.form.get("audit_type", "").strip() or None
@@ -270,6 +274,7 @@ def new_trip():
             engineer=engineer,
             supplier_code=supplier_code,
             supplier_name=supplier_name,
+            supplier_id=supplier_id,
             supplier_location=supplier_location,
             purpose=purpose,
             audit_type=audit_type,
@@ -308,7 +313,7 @@ def edit_trip(trip_id):
 
     if request.method == "POST":
         engineer = request.form.get("engineer", "").strip()
-        supplier_code, supplier_name = _apply_supplier_from_form(request.form)
+        supplier_code, supplier_name, supplier_id = _apply_supplier_from_form(request.form)
         supplier_location = request.form.get("supplier_location", "").strip() or None
         purpose = request.form.get("purpose", "").strip()
         audit_type = request.form.get("audit_type", "").strip() or None
@@ -338,6 +343,8 @@ def edit_trip(trip_id):
         trip.engineer = engineer
         trip.supplier_code = supplier_code
         trip.supplier_name = supplier_name
+        if supplier_id:
+            trip.supplier_id = supplier_id
         trip.supplier_location = supplier_location
         trip.purpose = purpose
         trip.audit_type = audit_type
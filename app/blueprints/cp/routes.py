@@ -1,23 +1,25 @@
 from datetime import date, datetime
-import csv
-import io
 import json
 import os
 import uuid
 
 from flask import (
-    abort, current_app, flash, jsonify, make_response, redirect,
-    render_template, request, send_file, url_for,
+    Response, abort, current_app, flash, jsonify, make_response, redirect,
+    render_template, request, send_file, stream_with_context, url_for,
 )
-from sqlalchemy import func
+from sqlalchemy import func, insert, select
 from werkzeug.utils import secure_filename
 
+from app.ai_helper import is_ollama_available
 from app.control_plan_helper import (
-    PARSER_VERSION, assess_quality, extract_control_plan, sha256_file,
+    CHANGE_COLUMNS, EXPORT_COLUMNS, PLAN_EXPORT_COLUMNS, characteristic_search,
+    diff_base_version, draft_counts, draft_quality, draft_step, extraction_progress, extraction_stalled,
+    iter_csv, iter_draft_export_rows, iter_published_export_rows, iter_xlsx, load_draft,
+    queue_extraction, search_characteristics, sha256_file, version_diff,
 )
 from app.extensions import db
 from app.models import (
-    ControlCharacteristic, ControlPlan, ControlPlanVersion,
+    ControlCharacteristic, ControlPlan, ControlPlanDraftStep, ControlPlanVersion,
     Part, ProcessStep, Supplier,
 )
 from . import cp_bp
@@ -41,20 +43,13 @@ PROCESS_TYPES = [
 PROCESS_LABELS = dict(PROCESS_TYPES)
 ALLOWED_EXTENSIONS = {"pdf", "doc", "docx", "xls", "xlsx", "xlsm", "ppt", "pptx"}
 OFFICE_EXTS = {"doc", "docx", "xls", "xlsx", "xlsm", "ppt", "pptx"}
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 
 def _allowed(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def _loads(value, default):
-    try:
-        parsed = json.loads(value) if value else default
-        return parsed if parsed is not None else default
-    except (TypeError, ValueError):
-        return default
-
-
 def _safe_path(rel_path):
     upload_root = os.path.abspath(current_app.config["UPLOAD_DIR"])
     file_path = os.path.abspath(os.path.join(upload_root, (rel_path or "").replace("/", os.sep)))
@@ -80,15 +75,64 @@ def _selected_version(cp, version_id=None):
     return _latest_version(cp)
 
 
-def _version_data(version):
-    if not version:
-        return {"metadata": {}, "steps": [], "quality_score": 0, "quality_issues": []}
-    data = _loads(version.structured_json, {})
-    data.setdefault("metadata", _loads(version.metadata_json, {}))
-    data.setdefault("steps", [])
-    data.setdefault("quality_score", version.quality_score or 0)
-    data.setdefault("quality_issues", _loads(version.quality_issues, []))
-    return data
+def _replace_structure(cp_id, steps):
+    """用版本草稿整体替换正式工序 / 特性表
+
+    集合操作：两条 DELETE，工序一次批量 INSERT ... RETURNING id（按参数顺序），
+    特性再一次批量 INSERT；不经过 ORM 单行 flush，在调用方的事务里完成。
+    """
+    old_steps = select(ProcessStep.id).where(ProcessStep.cp_id == cp_id)
+    ControlCharacteristic.query.filter(
+        ControlCharacteristic.step_id.in_(old_steps)
+    ).delete(synchronize_session=False)
+    ProcessStep.query.filter(ProcessStep.cp_id == cp_id).delete(synchronize_session=False)
+    if not steps:
+        return 0
+
+    step_ids = db.session.scalars(
+        insert(ProcessStep).returning(ProcessStep.id, sort_by_parameter_order=True),
+        [
+            {
+                "cp_id": cp_id,
+                "seq": step_data.get("seq") or 10,
+                "process_name": step_data.get("process_name") or "Unspecified process",
+                "process_code": step_data.get("process_code"),
+                "machine": step_data.get("machine"),
+                "is_key_process": bool(step_data.get("is_key_process")),
+                "notes": step_data.get("notes"),
+                "source_sheet": step_data.get("source_sheet"),
+                "source_row": step_data.get("source_row"),
+            }
+            for step_data in steps
+        ],
+    ).all()
+    characteristics = [
+        {
+            "step_id": step_id,
+            "char_name": item.get("char_name") or "Control characteristic",
+            "char_type": item.get("char_type") or "product",
+            "char_code": item.get("char_code"),
+            "special_class": item.get("special_class"),
+            "spec_value": item.get("spec_value"),
+            "spec_unit": item.get("spec_unit"),
+            "tolerance": item.get("tolerance"),
+            "measurement_method": item.get("measurement_method"),
+            "control_method": item.get("control_method"),
+            "sample_size": item.get("sample_size"),
+            "frequency": item.get("frequency"),
+            "inspector": item.get("inspector"),
+            "reaction_plan": item.get("reaction_plan"),
+            "is_key_char": bool(item.get("is_key_char")),
+            "source_sheet": item.get("source_sheet"),
+            "source_row": item.get("source_row"),
+            "confidence": item.get("confidence"),
+        }
+        for step_id, step_data in zip(step_ids, steps)
+        for item in step_data.get("characteristics", [])
+    ]
+    if characteristics:
+        db.session.execute(insert(ControlCharacteristic), characteristics)
+    return len(characteristics)
 
 
 def _store_upload(file, cp, version_no):
@@ -111,38 +155,14 @@ def _store_upload(file, cp, version_no):
     )
 
 
-def _apply_extraction(cp, version, file_path, force_ai=False):
-    version.extract_status = "processing"
+def _queue_version(cp, version, force_ai=False):
+    """标记为排队并在提交后交给后台提取；请求立即返回"""
+    version.extract_status = "queued"
+    version.extract_stage = "queued"
     version.extraction_error = None
-    db.session.flush()
-    try:
-        data = extract_control_plan(
-            file_path, force_ai=force_ai, logger=current_app.logger
-        )
-        version.structured_json = json.dumps(data, ensure_ascii=False)
-        version.metadata_json = json.dumps(data.get("metadata", {}), ensure_ascii=False)
-        version.quality_issues = json.dumps(
-            data.get("quality_issues", []), ensure_ascii=False
-        )
-        version.source_sheet = data.get("source_sheet")
-        version.source_template = data.get("source_template")
-        version.parser_version = data.get("parser_version") or PARSER_VERSION
-        version.ai_model = data.get("ai_model")
-        version.confidence = data.get("confidence")
-        version.quality_score = data.get("quality_score")
-        version.extract_status = "review"
-        version.status = "review"
-        cp.structure_status = "review"
-        cp.quality_score = version.quality_score
-        cp.source_template = version.source_template
-        return data
-    except Exception as exc:
-        current_app.logger.exception("[CP] extraction failed for %s", file_path)
-        version.extract_status = "failed"
-        version.status = "review"
-        version.extraction_error = str(exc)
-        cp.structure_status = "failed"
-        return None
+    cp.structure_status = "processing"
+    db.session.commit()
+    queue_extraction(current_app._get_current_object(), version.id, force_ai=force_ai)
 
 
 def _append_version(cp, file, revision):
@@ -173,10 +193,8 @@ def _append_version(cp, file, revision):
     cp.size = version.size
     cp.revision = revision
     cp.updated_at = datetime.utcnow()
-    cp.structure_status = "processing"
     db.session.flush()
-    data = _apply_extraction(cp, version, file_path)
-    return version, data
+    return version
 
 
 @cp_bp.route("/")
@@ -184,6 +202,9 @@ def index():
     process_type = request.args.get("process_type", "")
     supplier_id = request.args.get("supplier_id", "")
     q = request.args.get("q", "").strip()
+    char_q = request.args.get("char_q", "").strip()
+    special_class = request.args.get("special_class", "").strip()
+    key_only = request.args.get("key") == "1"
     query = ControlPlan.query.join(Part).join(
         Supplier, ControlPlan.supplier_id == Supplier.id
     ).filter(ControlPlan.status != "obsolete")
@@ -203,6 +224,19 @@ def index():
             | ControlPlan.cp_no.ilike(like)
         )
 
+    char_total, char_hits = 0, []
+    if char_q or special_class or key_only:
+        filters = dict(
+            special_class=special_class, key_only=key_only,
+            supplier_id=int(supplier_id) if supplier_id else None,
+            process_type=process_type or None,
+        )
+        matching_cps = characteristic_search(char_q, **filters).with_only_columns(
+            ControlPlan.id
+        ).distinct()
+        query = query.filter(ControlPlan.id.in_(matching_cps))
+        char_total, char_hits = search_characteristics(char_q, limit=50, **filters)
+
     cps = query.order_by(ControlPlan.updated_at.desc()).all()
     latest_versions = {cp.id: _latest_version(cp) for cp in cps}
     suppliers = Supplier.query.order_by(Supplier.code).all()
@@ -216,6 +250,11 @@ def index():
         selected_type=process_type,
         selected_supplier=supplier_id,
         q=q,
+        char_q=char_q,
+        special_class=special_class,
+        key_only=key_only,
+        char_total=char_total,
+        char_hits=char_hits,
     )
 
 
@@ -261,20 +300,12 @@ def upload():
     cp.notes = notes
     if audit_date:
         cp.audit_date = date.fromisoformat(audit_date)
-    version, data = _append_version(cp, file, revision)
-    db.session.commit()
-
-    if data and data.get("steps"):
-        char_count = sum(
-            len(step.get("characteristics", [])) for step in data["steps"]
-        )
-        flash(
-            f"版本 V{version.version_no} 已保存，识别到 "
-            f"{len(data['steps'])} 道工序、{char_count} 条控制特性，请审核后发布。",
-            "success",
-        )
-    else:
-        flash("原文件和版本已保存，但结构化内容需要人工检查。", "warning")
+    version = _append_version(cp, file, revision)
+    _queue_version(cp, version)
+    flash(
+        f"版本 V{version.version_no} 已保存，正在后台提取结构化内容，完成后请审核发布。",
+        "success",
+    )
     return redirect(url_for("cp.detail", cp_id=cp.id, tab="review", version_id=version.id))
 
 
@@ -293,25 +324,30 @@ def detail(cp_id):
         version = latest
     else:
         version = _selected_version(cp)
-    data = _version_data(version)
-    characteristic_count = sum(
-        len(step.get("characteristics", [])) for step in data.get("steps", [])
-    )
+    tab = requested_tab
+    if tab not in {"standard", "review", "original", "history", "changes"}:
+        tab = "review" if version and version.status == "review" else "standard"
+    # 标准页渲染整份草稿；其它页只要工序目录，审核页再单独取当前这一道工序
+    data = load_draft(version, with_characteristics=tab == "standard")
+    _, characteristic_count = draft_counts(version)
     critical_count = sum(
         issue.get("count", 0)
         for issue in data.get("quality_issues", [])
         if issue.get("severity") == "critical"
     )
     review_step_index = request.args.get("step", 0, type=int)
-    if data.get("steps"):
+    review_step = None
+    if data["steps"]:
         review_step_index = max(0, min(review_step_index, len(data["steps"]) - 1))
-        review_step = data["steps"][review_step_index]
+        if tab == "review":
+            review_step = draft_step(version, review_step_index)
     else:
         review_step_index = 0
-        review_step = None
-    tab = requested_tab
-    if tab not in {"standard", "review", "original", "history"}:
-        tab = "review" if version and version.status == "review" else "standard"
+    diff = None
+    if version and version.extract_status not in {"queued", "processing"}:
+        diff = version_diff(diff_base_version(cp, version), version)
+        if diff:
+            db.session.commit()
     return render_template(
         "cp/detail.html",
         cp=cp,
@@ -324,6 +360,11 @@ def detail(cp_id):
         review_step=review_step,
         tab=tab,
         process_labels=PROCESS_LABELS,
+        diff=diff,
+        extraction=(
+            extraction_progress(version)
+            if version and version.extract_status in {"queued", "processing"} else None
+        ),
     )
 
 
@@ -333,46 +374,45 @@ def save_review(cp_id, version_id):
     version = ControlPlanVersion.query.filter_by(
         id=version_id, cp_id=cp.id
     ).first_or_404()
-    data = _version_data(version)
-    metadata = data.setdefault("metadata", {})
+    metadata = load_draft(version, with_characteristics=False)["metadata"]
     for key in (
         "control_plan_number", "part_number", "part_name", "organization",
         "compiled_date", "revised_date",
     ):
         metadata[key] = (request.form.get(f"meta_{key}") or "").strip()
 
+    # 只改表单里这一道工序和它的特性行
     step_index = request.form.get("step_index", 0, type=int)
-    if 0 <= step_index < len(data.get("steps", [])):
-        step = data["steps"][step_index]
+    step = ControlPlanDraftStep.query.filter_by(
+        version_id=version.id, position=step_index
+    ).first()
+    if step:
         prefix = f"s{step_index}_"
-        step["process_code"] = (request.form.get(prefix + "process_code") or "").strip()
-        step["process_name"] = (
+        step.process_code = (request.form.get(prefix + "process_code") or "").strip()
+        step.process_name = (
             request.form.get(prefix + "process_name") or "Unspecified process"
         ).strip()
-        step["machine"] = (request.form.get(prefix + "machine") or "").strip()
-        step["notes"] = (request.form.get(prefix + "notes") or "").strip()
-        step["is_key_process"] = request.form.get(prefix + "is_key_process") == "1"
-        for char_index, characteristic in enumerate(step.get("characteristics", [])):
-            char_prefix = f"s{step_index}c{char_index}_"
+        step.machine = (request.form.get(prefix + "machine") or "").strip()
+        step.notes = (request.form.get(prefix + "notes") or "").strip()
+        step.is_key_process = request.form.get(prefix + "is_key_process") == "1"
+        for characteristic in step.characteristics:
+            char_prefix = f"s{step_index}c{characteristic.position}_"
             for key in (
                 "char_code", "char_name", "char_type", "special_class",
                 "spec_value", "measurement_method", "sample_size", "frequency",
                 "inspector", "control_method", "reaction_plan",
             ):
-                characteristic[key] = (
-                    request.form.get(char_prefix + key) or ""
-                ).strip()
-            characteristic["is_key_char"] = (
+                setattr(characteristic, key, (request.form.get(char_prefix + key) or "").strip())
+            characteristic.char_name = characteristic.char_name or "Control characteristic"
+            characteristic.is_key_char = (
                 request.form.get(char_prefix + "is_key_char") == "1"
             )
 
-    score, issues = assess_quality(data)
-    data["quality_score"] = score
-    data["quality_issues"] = issues
-    version.structured_json = json.dumps(data, ensure_ascii=False)
+    score, issues = draft_quality(version)
     version.metadata_json = json.dumps(metadata, ensure_ascii=False)
     version.quality_score = score
     version.quality_issues = json.dumps(issues, ensure_ascii=False)
+    version.draft_revision = (version.draft_revision or 0) + 1
     version.status = "review"
     version.extract_status = "review"
     cp.quality_score = score
@@ -391,50 +431,16 @@ def publish(cp_id, version_id):
     version = ControlPlanVersion.query.filter_by(
         id=version_id, cp_id=cp.id
     ).first_or_404()
-    data = _version_data(version)
+    data = load_draft(version)
     if not data.get("steps"):
         flash("没有可发布的结构化工序，请先重新识别或人工补充。", "error")
         return redirect(url_for("cp.detail", cp_id=cp.id, tab="review", version_id=version.id))
 
-    for old_step in cp.steps.all():
-        db.session.delete(old_step)
-    db.session.flush()
-
-    for step_data in data["steps"]:
-        step = ProcessStep(
-            cp_id=cp.id,
-            seq=step_data.get("seq") or 10,
-            process_name=step_data.get("process_name") or "Unspecified process",
-            process_code=step_data.get("process_code"),
-            machine=step_data.get("machine"),
-            is_key_process=bool(step_data.get("is_key_process")),
-            notes=step_data.get("notes"),
-            source_sheet=step_data.get("source_sheet"),
-            source_row=step_data.get("source_row"),
-        )
-        db.session.add(step)
-        db.session.flush()
-        for item in step_data.get("characteristics", []):
-            db.session.add(ControlCharacteristic(
-                step_id=step.id,
-                char_name=item.get("char_name") or "Control characteristic",
-                char_type=item.get("char_type") or "product",
-                char_code=item.get("char_code"),
-                special_class=item.get("special_class"),
-                spec_value=item.get("spec_value"),
-                spec_unit=item.get("spec_unit"),
-                tolerance=item.get("tolerance"),
-                measurement_method=item.get("measurement_method"),
-                control_method=item.get("control_method"),
-                sample_size=item.get("sample_size"),
-                frequency=item.get("frequency"),
-                inspector=item.get("inspector"),
-                reaction_plan=item.get("reaction_plan"),
-                is_key_char=bool(item.get("is_key_char")),
-                source_sheet=item.get("source_sheet"),
-                source_row=item.get("source_row"),
-                confidence=item.get("confidence"),
-            ))
+    previous = (
+        db.session.get(ControlPlanVersion, cp.published_version_id)
+        if cp.published_version_id and cp.published_version_id != version.id else None
+    )
+    _replace_structure(cp.id, data["steps"])
 
     ControlPlanVersion.query.filter(
         ControlPlanVersion.cp_id == cp.id,
@@ -450,6 +456,8 @@ def publish(cp_id, version_id):
     cp.revision = version.revision or cp.revision
     cp.quality_score = version.quality_score
     cp.updated_at = datetime.utcnow()
+    # 与上一发布版的差异在发布时算好存表，详情页 / CSV 直接读取
+    version_diff(previous, version)
     db.session.commit()
     flash(f"版本 V{version.version_no} 已发布为当前控制计划。", "success")
     return redirect(url_for("cp.detail", cp_id=cp.id, tab="standard"))
@@ -464,15 +472,40 @@ def reanalyze(cp_id, version_id):
     file_path = _safe_path(version.rel_path)
     if not os.path.exists(file_path):
         abort(404)
-    data = _apply_extraction(cp, version, file_path, force_ai=True)
-    db.session.commit()
-    if data and data.get("steps"):
-        flash("AI 已重新分析列结构，请检查提取结果。", "success")
-    else:
-        flash("AI 未能建立可靠映射，原文件仍已完整保留。", "warning")
+    if not is_ollama_available():
+        flash("AI 服务暂不可用（Ollama 未运行），当前提取结果保持不变。", "warning")
+        return redirect(url_for("cp.detail", cp_id=cp.id, tab="review", version_id=version.id))
+    if version.extract_status in {"queued", "processing"} and not extraction_stalled(version):
+        flash("该版本正在提取中，请等待完成。", "info")
+        return redirect(url_for("cp.detail", cp_id=cp.id, tab="review", version_id=version.id))
+    _queue_version(cp, version, force_ai=True)
+    flash("AI 重新识别已加入后台队列，完成后页面会自动刷新。", "success")
     return redirect(url_for("cp.detail", cp_id=cp.id, tab="review", version_id=version.id))
 
 
+@cp_bp.route("/<int:cp_id>/versions/<int:version_id>/extraction")
+def extraction_status(cp_id, version_id):
+    version = ControlPlanVersion.query.filter_by(
+        id=version_id, cp_id=cp_id
+    ).first_or_404()
+    return jsonify(extraction_progress(version))
+
+
+@cp_bp.route("/<int:cp_id>/versions/<int:version_id>/diff")
+def version_changes(cp_id, version_id):
+    """?base_version_id= 指定基准；默认对比上次发布的版本"""
+    cp = ControlPlan.query.get_or_404(cp_id)
+    version = ControlPlanVersion.query.filter_by(id=version_id, cp_id=cp.id).first_or_404()
+    base_id = request.args.get("base_version_id", type=int)
+    base = (
+        ControlPlanVersion.query.filter_by(id=base_id, cp_id=cp.id).first_or_404()
+        if base_id else diff_base_version(cp, version)
+    )
+    diff = version_diff(base, version)
+    db.session.commit()
+    return jsonify(diff or {"summary": None, "steps": []})
+
+
 @cp_bp.route("/<int:cp_id>/view")
 def view(cp_id):
     cp = ControlPlan.query.get_or_404(cp_id)
@@ -530,43 +563,76 @@ def download(cp_id):
     )
 
 
-@cp_bp.route("/<int:cp_id>/export.csv")
-def export_csv(cp_id):
+def _csv_response(rows, header, filename):
+    response = Response(
+        stream_with_context(iter_csv(header, rows)), mimetype="text/csv"
+    )
+    response.headers["Content-Type"] = "text/csv; charset=utf-8"
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _xlsx_response(rows, header, filename, title):
+    """边查询边压缩边发送，与 CSV 一样首字节立即发出，不占着 worker 先写完整本工作簿"""
+    response = Response(
+        stream_with_context(iter_xlsx(header, rows, title=title)), mimetype=XLSX_MIMETYPE
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@cp_bp.route("/<int:cp_id>/export.<fmt>")
+def export_plan(cp_id, fmt):
+    """单个控制计划的标准表：export.csv / export.xlsx；?changes=1 追加相对上次发布的变更列"""
+    if fmt not in {"csv", "xlsx"}:
+        abort(404)
     cp = ControlPlan.query.get_or_404(cp_id)
     version = _selected_version(cp, request.args.get("version_id", type=int))
-    data = _version_data(version)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "Process No.", "Process Name", "Equipment", "Characteristic No.",
-        "Characteristic", "Type", "Special Class", "Specification / Tolerance",
-        "Measurement Method", "Sample Size", "Frequency", "Inspector",
-        "Control Method", "Reaction Plan", "Source",
-    ])
-    for step in data.get("steps", []):
-        characteristics = step.get("characteristics") or [{}]
-        for item in characteristics:
-            writer.writerow([
-                step.get("process_code", ""),
-                step.get("process_name", ""),
-                step.get("machine", ""),
-                item.get("char_code", ""),
-                item.get("char_name", ""),
-                item.get("char_type", ""),
-                item.get("special_class", ""),
-                item.get("spec_value", ""),
-                item.get("measurement_method", ""),
-                item.get("sample_size", ""),
-                item.get("frequency", ""),
-                item.get("inspector", ""),
-                item.get("control_method", ""),
-                item.get("reaction_plan", ""),
-                f"{item.get('source_sheet', '')}!{item.get('source_row', '')}",
-            ])
-    response = make_response("\ufeff" + output.getvalue())
-    response.headers["Content-Type"] = "text/csv; charset=utf-8"
+    if not version:
+        abort(404)
+    diff = None
+    if request.args.get("changes") in {"1", "true"}:
+        diff = version_diff(diff_base_version(cp, version), version)
+        db.session.commit()
+    header = EXPORT_COLUMNS + (CHANGE_COLUMNS if diff else [])
+    rows = iter_draft_export_rows(version, diff)
+    filename = f"{secure_filename(cp.cp_no)}-standard.{fmt}"
+    if fmt == "xlsx":
+        return _xlsx_response(rows, header, filename, title=cp.cp_no)
+    return _csv_response(rows, header, filename)
+
+
+@cp_bp.route("/export.<fmt>")
+def export_bulk(fmt):
+    """已发布控制计划批量导出：?supplier_id= / ?process_type=，不带条件即全部"""
+    if fmt not in {"csv", "xlsx"}:
+        abort(404)
+    supplier_id = request.args.get("supplier_id", type=int)
+    process_type = request.args.get("process_type") or None
+    rows = iter_published_export_rows(supplier_id=supplier_id, process_type=process_type)
+    scope = "all"
+    if supplier_id:
+        supplier = Supplier.query.get_or_404(supplier_id)
+        scope = secure_filename(supplier.code) or str(supplier_id)
+    if process_type:
+        scope = f"{scope}-{secure_filename(process_type)}"
+    filename = f"control-plans-{scope}-{date.today():%Y%m%d}.{fmt}"
+    if fmt == "xlsx":
+        return _xlsx_response(rows, PLAN_EXPORT_COLUMNS, filename, title="Control Plans")
+    return _csv_response(rows, PLAN_EXPORT_COLUMNS, filename)
+
+
+@cp_bp.route("/<int:cp_id>/export.json")
+def export_json(cp_id):
+    """整份结构化草稿（工序 + 特性 + 元数据），与提取结果同一格式"""
+    cp = ControlPlan.query.get_or_404(cp_id)
+    version = _selected_version(cp, request.args.get("version_id", type=int))
+    if not version:
+        abort(404)
+    response = make_response(json.dumps(load_draft(version), ensure_ascii=False, indent=2))
+    response.headers["Content-Type"] = "application/json; charset=utf-8"
     response.headers["Content-Disposition"] = (
-        f'attachment; filename="{secure_filename(cp.cp_no)}-standard.csv"'
+        f'attachment; filename="{secure_filename(cp.cp_no)}-v{version.version_no}.json"'
     )
     return response
 
@@ -600,8 +666,8 @@ def edit(cp_id):
         if not _allowed(file.filename):
             flash("仅支持 PDF / Office 文档", "error")
             return redirect(url_for("cp.index"))
-        version, _ = _append_version(cp, file, revision)
-        db.session.commit()
+        version = _append_version(cp, file, revision)
+        _queue_version(cp, version)
         flash(f"已新增版本 V{version.version_no}，旧版本仍完整保留。", "success")
         return redirect(url_for("cp.detail", cp_id=cp.id, tab="review", version_id=version.id))
 
@@ -622,6 +688,23 @@ def delete(cp_id):
     return redirect(url_for("cp.index"))
 
 
+@cp_bp.route("/api/characteristics")
+def api_characteristics():
+    """跨控制计划特性检索：?q=porosity x-ray&special_class=SC&key=1&supplier_id=&process_type="""
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    offset = max(0, request.args.get("offset", 0, type=int))
+    total, items = search_characteristics(
+        request.args.get("q", ""),
+        special_class=request.args.get("special_class") or None,
+        key_only=request.args.get("key") in {"1", "true"},
+        supplier_id=request.args.get("supplier_id", type=int),
+        process_type=request.args.get("process_type") or None,
+        limit=limit,
+        offset=offset,
+    )
+    return jsonify({"total": total, "limit": limit, "offset": offset, "items": items})
+
+
 @cp_bp.route("/api/parts/<int:supplier_id>")
 def api_parts(supplier_id):
     parts = Part.query.filter_by(supplier_id=supplier_id).order_by(Part.pn).all()
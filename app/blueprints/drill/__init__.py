@@ -10,6 +10,8 @@ from flask import (
 )
 from sqlalchemy import func, or_
 
+from ...ai_helper import is_ollama_available
+from ...control_plan_helper import load_draft
 from ...drill_helper import generate_sqe_cards, schedule_review
 from ...extensions import db
 from ...models import (
@@ -176,11 +178,7 @@ def _source_payload(source_ref):
         cp = db.session.get(ControlPlan, source_id)
         if not cp:
             return None
-        version = cp.versions.first()
-        try:
-            data = json.loads(version.structured_json or "{}") if version else {}
-        except (TypeError, ValueError):
-            data = {}
+        data = load_draft(cp.versions.first())
         lines = []
         for step in (data.get("steps") or [])[:25]:
             process_name = step.get("process_name") or ""
@@ -378,6 +376,9 @@ def generate():
     category = (request.form.get("category") or source["category"]).strip()
     if category not in VALID_CATEGORIES:
         category = source["category"]
+    if not is_ollama_available():
+        flash("AI 服务暂不可用（Ollama 未运行），请稍后重试。", "error")
+        return redirect(url_for("drill.materials"))
     cards = generate_sqe_cards(
         source["text"],
         source["label"],
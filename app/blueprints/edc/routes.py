@@ -1,6 +1,7 @@
-from flask import render_template, request, jsonify, current_app
+from flask import render_template, request, jsonify, current_app, redirect, url_for, abort
 from . import edc_bp
 from app.models import EDCReport
+from app.part_quality_helper import part_history, rollup_payload
 from app.utils.edc_processor import start_sync_background, get_sync_state
 
 
@@ -55,4 +56,48 @@ def sync_start():
 
 @edc_bp.route('/sync/progress')
 def sync_progress():
-    return jsonify(get_sync_state())
\ No newline at end of file
+    return jsonify(get_sync_state())
+
+
+# ── 零件质量履历（按归一化零件号，读 part_quality_rollup）──────────────
+
+@edc_bp.route('/part')
+def part_lookup():
+    pn = request.args.get('pn', '').strip()
+    if not pn:
+        return redirect(url_for('edc.index'))
+    return redirect(url_for('edc.part_quality', pn=pn))
+
+
+@edc_bp.route('/part/<path:pn>')
+def part_quality(pn):
+    history = part_history(pn)
+    if history is None:
+        abort(404)
+    return render_template('edc/part_history.html', pn=pn, **history)
+
+
+@edc_bp.route('/api/part/<path:pn>')
+def part_quality_api(pn):
+    history = part_history(pn, limit=request.args.get('limit', 50, type=int))
+    if history is None or history["rollup"] is None:
+        return jsonify({"error": f"no EDC or TR records for {pn}"}), 404
+    return jsonify({
+        "part_key": history["part_key"],
+        "rollup": rollup_payload(history["rollup"]),
+        "monthly": history["monthly"],
+        "by_supplier": history["by_supplier"],
+        "parts": [{"id": p.id, "supplier_id": p.supplier_id, "pn": p.pn} for p in history["parts"]],
+        "edc_reports": [
+            {"report_no": r.report_no, "report_date": r.report_date.isoformat() if r.report_date else None,
+             "classification": r.classification, "supplier_id": r.supplier_id, "supplier_name": r.supplier_name,
+             "rejected_parts": r.rejected_parts, "received_parts": r.received_parts}
+            for r in history["edcs"]
+        ],
+        "trouble_reports": [
+            {"id": t.id, "tr_no": t.tr_no, "issue_date": t.issue_date.isoformat() if t.issue_date else None,
+             "status": t.status, "eight_d_status": t.eight_d_status, "supplier_id": t.supplier_id,
+             "supplier_name": t.supplier_name}
+            for t in history["trs"]
+        ],
+    })
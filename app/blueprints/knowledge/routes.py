@@ -2,13 +2,14 @@
 """
 Knowledge Base 路由 + 思维导图 API
 """
-from flask import render_template, request, redirect, url_for, flash, jsonify, abort
+from flask import render_template, request, redirect, url_for, flash, jsonify, abort, current_app
 from sqlalchemy import or_
 from datetime import datetime
 
 from . import knowledge_bp
 from ...extensions import db
 from ...models import KnowledgeItem, FileLibrary, NodeStandard, NodeKnowledgeLink
+from ...similar_helper import queue_reindex, remove_source, similar_issues
 from .mindmap_data import PROCESS_META, get_mindmap, get_node
 
 # ─────────────────────────────────────────────
@@ -135,6 +136,7 @@ def view_item(item_id):
         related_items=related_items,
         processes=PROCESSES,
         node_links=node_links,
+        similar_items=similar_issues("knowledge", item.id),
     )
 
 
@@ -186,6 +188,7 @@ def quick_add():
             db.session.add(link)
 
         db.session.commit()
+        queue_reindex(current_app._get_current_object(), "knowledge", item.id)
         flash(f"✅ 知识已记录：{title}", "success")
         return redirect(url_for("knowledge.view_item", item_id=item.id))
 
@@ -213,6 +216,7 @@ def edit_item(item_id):
             flash("❌ 请选择有效的工艺类型", "error")
         else:
             db.session.commit()
+            queue_reindex(current_app._get_current_object(), "knowledge", item.id)
             flash("✅ 知识已更新", "success")
             return redirect(url_for("knowledge.view_item", item_id=item.id))
 
@@ -228,6 +232,7 @@ def delete_item(item_id):
     title = item.title
     db.session.delete(item)
     db.session.commit()
+    remove_source("knowledge", item_id)
     flash(f"✅ 已删除知识：{title}", "success")
     return redirect(url_for("knowledge.index"))
 
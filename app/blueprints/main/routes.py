@@ -1,10 +1,171 @@
-from flask import render_template, request
+from flask import current_app, has_app_context, render_template, request
 from datetime import datetime, timedelta
-from sqlalchemy import func
+import time
+
+from sqlalchemy import case, event, func, literal, select, union_all
+from sqlalchemy.orm import Session, object_session
 
 from . import main_bp
 from ...extensions import db
 from ...models import Supplier, TroubleReport, BusinessTrip, KnowledgeItem, FileLibrary
+from ...scorecard_helper import scorecard_totals
+
+
+# ──────────────────────────────────────────────────────────
+# Dashboard 数据：计数一条 UNION ALL 聚合，最近活动一条 UNION ALL，
+# 组装结果放进进程内短 TTL 缓存；相关模型有写入提交时立即作废
+# ──────────────────────────────────────────────────────────
+
+DASHBOARD_CACHE_KEY = "dashboard_cache"
+_DIRTY_KEY = "dashboard_dirty"
+DASHBOARD_MODELS = (Supplier, TroubleReport, BusinessTrip, KnowledgeItem, FileLibrary)
+TR_PENDING_STATUSES = ('open', 'in_progress')
+RECENT_PER_TYPE = 3
+
+TR_ICON = '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 9v2m0 4h.01m-6.938 4h13.856c1.54 0 2.502-1.667 1.732-3L13.732 4c-.77-1.333-2.694-1.333-3.464 0L3.34 16c-.77 1.333.192 3 1.732 3z"/>'
+TRIP_ICON = '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M3.055 11H5a2 2 0 012 2v1a2 2 0 002 2 2 2 0 012 2v2.945M8 3.935V5.5A2.5 2.5 0 0010.5 8h.5a2 2 0 012 2 2 2 0 104 0 2 2 0 012-2h1.064M15 20.488V18a2 2 0 012-2h3.064M21 12a9 9 0 11-18 0 9 9 0 0118 0z"/>'
+KNOWLEDGE_ICON = '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9.663 17h4.673M12 3v1m6.364 1.636l-.707.707M21 12h-1M4 12H3m3.343-5.657l-.707-.707m2.828 9.9a5 5 0 117.072 0l-.548.547A3.374 3.374 0 0014 18.469V19a2 2 0 11-4 0v-.531c0-.895-.356-1.754-.988-2.386l-.548-.547z"/>'
+FILE_ICON = '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M7 21h10a2 2 0 002-2V9.414a1 1 0 00-.293-.707l-5.414-5.414A1 1 0 0012.586 3H7a2 2 0 00-2 2v14a2 2 0 002 2z"/>'
+
+
+def _count_stats(week_start):
+    """每张表一行 (kind, total, active, week)，UNION ALL 成一条查询"""
+    def row(kind, model, active=None):
+        return select(
+            literal(kind),
+            func.count(model.id),
+            func.sum(case((active, 1), else_=0)) if active is not None else literal(0),
+            func.sum(case((model.created_at >= week_start, 1), else_=0)),
+        )
+
+    stmt = union_all(
+        row('tr', TroubleReport, TroubleReport.status.in_(TR_PENDING_STATUSES)),
+        row('trip', BusinessTrip, BusinessTrip.status == 'ongoing'),
+        row('knowledge', KnowledgeItem),
+        row('file', FileLibrary),
+    )
+    return {kind: (total or 0, active or 0, week or 0) for kind, total, active, week in db.session.execute(stmt)}
+
+
+def _recent_rows():
+    """四类记录各取最近 RECENT_PER_TYPE 条，只取展示用的列（长文本在 SQL 里截断）"""
+    def latest(kind, model, title, owner, text, fallback):
+        return select(
+            literal(kind).label('kind'), model.id.label('id'), title.label('title'),
+            owner.label('owner'), func.substr(text, 1, 51).label('text'),
+            fallback.label('fallback'), model.created_at.label('created_at'),
+        ).order_by(model.created_at.desc()).limit(RECENT_PER_TYPE).subquery()
+
+    parts = [
+        latest('tr', TroubleReport, TroubleReport.tr_no, TroubleReport.supplier_code,
+               TroubleReport.issue_description, literal(None)),
+        latest('trip', BusinessTrip, BusinessTrip.trip_no, BusinessTrip.supplier_name,
+               BusinessTrip.purpose, literal(None)),
+        latest('knowledge', KnowledgeItem, KnowledgeItem.title, literal(None),
+               KnowledgeItem.content, literal(None)),
+        latest('file', FileLibrary, FileLibrary.title, literal(None),
+               FileLibrary.description, FileLibrary.original_name),
+    ]
+    return db.session.execute(union_all(*(select(part) for part in parts))).all()
+
+
+def _activity(row):
+    text = row.text or ''
+    if row.kind == 'tr':
+        return {
+            'type': 'tr', 'type_name': '8D报告', 'title': f"TR-{row.title}",
+            'description': f"{row.owner} - {text[:50]}..." if len(text) > 50 else text,
+            'url': f"/tr/{row.id}", 'icon': TR_ICON,
+        }
+    if row.kind == 'trip':
+        return {
+            'type': 'trip', 'type_name': '出差', 'title': row.title,
+            'description': f"{row.owner} - {text[:40]}..." if len(text) > 40 else text,
+            'url': f"/trip/{row.id}/edit", 'icon': TRIP_ICON,
+        }
+    if row.kind == 'knowledge':
+        return {
+            'type': 'knowledge', 'type_name': '知识', 'title': row.title,
+            'description': f"{text[:50]}..." if len(text) > 50 else text,
+            'url': f"/knowledge/item/{row.id}", 'icon': KNOWLEDGE_ICON,
+        }
+    return {
+        'type': 'file', 'type_name': '文件', 'title': row.title,
+        'description': text[:50] + "..." if len(text) > 50 else (row.text or row.fallback),
+        'url': f"/file/{row.id}/view", 'icon': FILE_ICON,
+    }
+
+
+def _build_dashboard(week_start):
+    supplier_totals = scorecard_totals()
+    counts = _count_stats(week_start)
+    stats = {
+        # 总数统计
+        'suppliers': supplier_totals['total'],
+        'suppliers_with_issues': supplier_totals['issues'],
+        'eight_d_pending': supplier_totals['eight_d_pending'],
+        'tr_total': counts['tr'][0],
+        'tr_pending': counts['tr'][1],
+        'trip_total': counts['trip'][0],
+        'trip_ongoing': counts['trip'][1],
+        'knowledge': counts['knowledge'][0],
+        'file': counts['file'][0],
+
+        # 本周统计（从周一开始）
+        'week_tr': counts['tr'][2],
+        'week_trip': counts['trip'][2],
+        'week_knowledge': counts['knowledge'][2],
+        'week_file': counts['file'][2],
+    }
+
+    # 最近活动（混合显示最近的 TR、出差、知识、文件），按时间排序取 10 条
+    activities = []
+    for row in _recent_rows():
+        item = _activity(row)
+        item['created_at'] = row.created_at
+        activities.append(item)
+    activities.sort(key=lambda x: x['created_at'] or datetime.min, reverse=True)
+    return stats, activities[:10]
+
+
+def _cached_dashboard(week_start):
+    ttl = current_app.config.get("DASHBOARD_CACHE_TTL", 0)
+    cache = current_app.extensions.get(DASHBOARD_CACHE_KEY)
+    if ttl and cache and cache["week_start"] == week_start and time.monotonic() - cache["ts"] < ttl:
+        return cache["stats"], cache["activities"]
+    stats, activities = _build_dashboard(week_start)
+    if ttl:
+        current_app.extensions[DASHBOARD_CACHE_KEY] = {
+            "ts": time.monotonic(), "week_start": week_start, "stats": stats, "activities": activities,
+        }
+    return stats, activities
+
+
+def invalidate_dashboard_cache():
+    if has_app_context():
+        current_app.extensions.pop(DASHBOARD_CACHE_KEY, None)
+
+
+def _mark_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[_DIRTY_KEY] = True
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        invalidate_dashboard_cache()
+
+
+def _discard_dirty(session, previous_transaction=None):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+for _model in DASHBOARD_MODELS:
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _mark_dirty)
+event.listen(Session, "after_commit", _invalidate_after_commit)
+event.listen(Session, "after_soft_rollback", _discard_dirty)
 
 
 @main_bp.route("/")
@@ -16,128 +177,15 @@ def index():
     weekdays = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
     weekday = weekdays[current_date.weekday()]
 
-    # 统计数据
-    stats = {
-        # 总数统计
-        'suppliers': Supplier.query.count(),
-        'tr_total': TroubleReport.query.count(),
-        'tr_pending': TroubleReport.query.filter(
-            TroubleReport.status.in_(['open', 'in_progress'])
-        ).count(),
-        'trip_total': BusinessTrip.query.count(),
-        'trip_ongoing': BusinessTrip.query.filter_by(status='ongoing').count(),
-        'knowledge': KnowledgeItem.query.count(),
-        'file': FileLibrary.query.count(),
-
-        # 本周统计（从周一开始）
-        'week_tr': 0,
-        'week_trip': 0,
-        'week_knowledge': 0,
-        'week_file': 0,
-    }
-
     # 计算本周一的日期
     days_since_monday = current_date.weekday()
     week_start = current_date - timedelta(days=days_since_monday)
     week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
 
-    # 本周新增统计
-    stats['week_tr'] = TroubleReport.query.filter(
-        TroubleReport.created_at >= week_start
-    ).count()
-
-    stats['week_trip'] = BusinessTrip.query.filter(
-        BusinessTrip.created_at >= week_start
-    ).count()
-
-    stats['week_knowledge'] = KnowledgeItem.query.filter(
-        KnowledgeItem.created_at >= week_start
-    ).count()
-
-    stats['week_file'] = FileLibrary.query.filter(
-        FileLibrary.created_at >= week_start
-    ).count()
-
-    # 最近活动（混合显示最近的 TR、出差、知识、文件）
-    recent_activities = []
-
-    # 获取最近的 TR
-    recent_trs = TroubleReport.query.order_by(
-        TroubleReport.created_at.desc()
-    ).limit(3).all()
-
-    for tr in recent_trs:
-        time_ago = get_time_ago(tr.created_at)
-        recent_activities.append({
-            'type': 'tr',
-            'type_name': '8D报告',
-            'title': f"TR-{tr.tr_no}",
-            'description': f"{tr.supplier_code} - {tr.issue_description[:50]}..." if len(
-                tr.issue_description) > 50 else tr.issue_description,
-            'url': f"/tr/{tr.id}",
-            'time_ago': time_ago,
-            'created_at': tr.created_at,
-            'icon': '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 9v2m0 4h.01m-6.938 4h13.856c1.54 0 2.502-1.667 1.732-3L13.732 4c-.77-1.333-2.694-1.333-3.464 0L3.34 16c-.77 1.333.192 3 1.732 3z"/>',
-        })
-
-    # 获取最近的出差
-    recent_trips = BusinessTrip.query.order_by(
-        BusinessTrip.created_at.desc()
-    ).limit(3).all()
-
-    for trip in recent_trips:
-        time_ago = get_time_ago(trip.created_at)
-        recent_activities.append({
-            'type': 'trip',
-            'type_name': '出差',
-            'title': trip.trip_no,
-            'description': f"{trip.supplier_name} - {trip.purpose[:40]}..." if len(trip.purpose) > 40 else trip.purpose,
-            'url': f"/trip/{trip.id}/edit",
-            'time_ago': time_ago,
-            'created_at': trip.created_at,
-            'icon': '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M3.055 11H5a2 2 0 012 2v1a2 2 0 002 2 2 2 0 012 2v2.945M8 3.935V5.5A2.5 2.5 0 0010.5 8h.5a2 2 0 012 2 2 2 0 104 0 2 2 0 012-2h1.064M15 20.488V18a2 2 0 012-2h3.064M21 12a9 9 0 11-18 0 9 9 0 0118 0z"/>',
-        })
-
-    # 获取最近的知识
-    recent_knowledge = KnowledgeItem.query.order_by(
-        KnowledgeItem.created_at.desc()
-    ).limit(3).all()
-
-    for item in recent_knowledge:
-        time_ago = get_time_ago(item.created_at)
-        recent_activities.append({
-            'type': 'knowledge',
-            'type_name': '知识',
-            'title': item.title,
-            'description': f"{item.content[:50]}..." if len(item.content) > 50 else item.content,
-            'url': f"/knowledge/item/{item.id}",
-            'time_ago': time_ago,
-            'created_at': item.created_at,
-            'icon': '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9.663 17h4.673M12 3v1m6.364 1.636l-.707.707M21 12h-1M4 12H3m3.343-5.657l-.707-.707m2.828 9.9a5 5 0 117.072 0l-.548.547A3.374 3.374 0 0014 18.469V19a2 2 0 11-4 0v-.531c0-.895-.356-1.754-.988-2.386l-.548-.547z"/>',
-        })
-
-    # 获取最近的文件
-    recent_files = FileLibrary.query.order_by(
-        FileLibrary.created_at.desc()
-    ).limit(3).all()
-
-    for file in recent_files:
-        time_ago = get_time_ago(file.created_at)
-        recent_activities.append({
-            'type': 'file',
-            'type_name': '文件',
-            'title': file.title,
-            'description': file.description[:50] + "..." if file.description and len(file.description) > 50 else (
-                        file.description or file.original_name),
-            'url': f"/file/{file.id}/view",
-            'time_ago': time_ago,
-            'created_at': file.created_at,
-            'icon': '<path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M7 21h10a2 2 0 002-2V9.414a1 1 0 00-.293-.707l-5.414-5.414A1 1 0 0012.586 3H7a2 2 0 00-2 2v14a2 2 0 002 2z"/>',
-        })
-
-    # 按时间排序，取最近的10条
-    recent_activities.sort(key=lambda x: x['created_at'], reverse=True)
-    recent_activities = recent_activities[:10]
+    stats, activities = _cached_dashboard(week_start)
+
+    # "x 分钟前" 每次请求现算，缓存里只存 created_at
+    recent_activities = [dict(item, time_ago=get_time_ago(item['created_at'])) for item in activities]
 
     return render_template(
         "main/index.html",
@@ -3,18 +3,22 @@ Supplier Workspace — 概览 Dashboard + 各 Tab 路由
 替换 app/blueprints/supplier_ws/routes.py
 """
 from datetime import datetime, timedelta
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
 import json
-import re
 
 from flask import render_template, abort, redirect, url_for, jsonify, request
-from sqlalchemy import func, or_
+from sqlalchemy import and_, case, func, or_, text as sql_text
 
 from ...models import (
-    Supplier, Part, TroubleReport, TRDocument,
+    Supplier, TroubleReport, TRDocument,
     AuditReport, AuditFinding, Drawing, ControlPlan,
+    TR_FTS_COLUMNS, TR_FTS_TABLE,
 )
 from ...extensions import db
+from ...report_helper import (
+    NO_PART_LABEL, build_report_context, collect_report_data, previous_range, resolve_period,
+)
+from ...scorecard_helper import scorecard_for
 from . import supplier_ws_bp
 
 
@@ -25,24 +29,32 @@ def get_supplier_or_404(supplier_code: str) -> Supplier:
     return s
 
 
-def _supplier_names(supplier):
-    """返回该供应商可能被 TR 使用的所有名字"""
-    names = set()
-    if supplier.name:
-        names.add(supplier.name)
-    if supplier.chinese_name:
-        names.add(supplier.chinese_name)
-    return list(names)
+# ──────────────────────────────────────────────────────────
+# TR 聚合（SQL 端 GROUP BY，只取图表需要的数字）
+# ──────────────────────────────────────────────────────────
+
+CLOSED_STATUSES = ("closed", "done", "completed")
 
 
-def _get_trs(supplier):
-    """获取该供应商关联的所有 TR"""
-    names = _supplier_names(supplier)
-    if not names:
-        return []
-    return TroubleReport.query.filter(
-        TroubleReport.supplier_name.in_(names)
-    ).order_by(TroubleReport.created_at.desc()).all()
+def _closed():
+    return func.lower(func.coalesce(TroubleReport.status, "")).in_(CLOSED_STATUSES)
+
+
+def _eight_d_counts(*criteria):
+    status = func.coalesce(TroubleReport.eight_d_status, "NOT_REQUIRED")
+    return dict(
+        db.session.query(status, func.count(TroubleReport.id))
+        .filter(*criteria).group_by(status).all()
+    )
+
+
+def _top_parts(limit, *criteria):
+    """[(零件号, 零件名, TR 数)]，同数量时最近出现的在前"""
+    pn = func.coalesce(func.nullif(TroubleReport.part_number, ""), NO_PART_LABEL)
+    return db.session.query(pn, func.max(TroubleReport.part_name), func.count(TroubleReport.id)) \
+        .filter(*criteria).group_by(pn) \
+        .order_by(func.count(TroubleReport.id).desc(), func.max(TroubleReport.created_at).desc()) \
+        .limit(limit).all()
 
 
 # ──────────────────────────────────────────────────────────
@@ -52,39 +64,22 @@ def _get_trs(supplier):
 @supplier_ws_bp.route("/<supplier_code>/")
 def overview(supplier_code):
     supplier = get_supplier_or_404(supplier_code)
-    trs = _get_trs(supplier)
-
-    # ── KPI 统计 ──
-    total_trs = len(trs)
-    open_trs = sum(1 for t in trs if (t.status or "").lower() not in ("closed", "done", "completed"))
-    closed_trs = total_trs - open_trs
-    eight_d_pending = sum(1 for t in trs if t.eight_d_status == "NOT_RECEIVED")
-
-    # 扣款汇总（本年）
-    current_year = datetime.utcnow().year
-    debit_eur = 0.0
-    debit_count = 0
-    for t in trs:
-        if t.debit_amount and t.debit_amount > 0:
-            if t.created_at and t.created_at.year == current_year:
-                debit_eur += t.debit_amount
-                debit_count += 1
-
-    # 零件数
-    parts_count = Part.query.filter_by(supplier_id=supplier.id).count()
+    of_supplier = TroubleReport.supplier_id == supplier.id
 
-    # 审核信息
-    audits = AuditReport.query.filter(
-        or_(
-            AuditReport.supplier_id == supplier.id,
-            AuditReport.supplier_name.in_(_supplier_names(supplier)),
-        )
-    ).order_by(AuditReport.audit_date.desc()).all()
+    # ── KPI：读计分卡；本年扣款按年份过滤，单独一条聚合 ──
+    card = scorecard_for(supplier)
+    total_trs, open_trs, closed_trs = card.total_trs, card.open_trs, card.closed_trs
+    eight_d_pending, parts_count, open_findings = card.eight_d_pending, card.parts_count, card.open_findings
+
+    year_start = datetime(datetime.utcnow().year, 1, 1)
+    debit_eur, debit_count = db.session.query(
+        func.coalesce(func.sum(TroubleReport.debit_amount), 0.0), func.count(TroubleReport.id)
+    ).filter(of_supplier, TroubleReport.debit_amount > 0, TroubleReport.created_at >= year_start).one()
 
+    # 审核信息
+    audits = AuditReport.query.filter(AuditReport.supplier_id == supplier.id) \
+        .order_by(AuditReport.audit_date.desc()).limit(5).all()
     last_audit = audits[0] if audits else None
-    open_findings = 0
-    for a in audits:
-        open_findings += a.open_findings or 0
 
     # ── 图表数据：近 12 个月 TR 趋势 ──
     now = datetime.utcnow()
@@ -104,15 +99,21 @@ def overview(supplier_code):
     monthly_closed = OrderedDict((m, 0) for m in month_labels)
     monthly_debit = OrderedDict((m, 0.0) for m in month_labels)
 
-    for t in trs:
-        key = t.created_at.strftime("%Y-%m") if t.created_at else None
-        if key and key in monthly_open:
-            if (t.status or "").lower() in ("closed", "done", "completed"):
-                monthly_closed[key] += 1
-            else:
-                monthly_open[key] += 1
-            if t.debit_amount and t.debit_amount > 0:
-                monthly_debit[key] += t.debit_amount
+    # (supplier_id, created_at) 索引只扫近 12 个月
+    month = func.strftime("%Y-%m", TroubleReport.created_at)
+    trend = db.session.query(
+        month,
+        func.sum(case((_closed(), 0), else_=1)),
+        func.sum(case((_closed(), 1), else_=0)),
+        func.sum(case((TroubleReport.debit_amount > 0, TroubleReport.debit_amount), else_=0.0)),
+    ).filter(
+        of_supplier, TroubleReport.created_at >= datetime.strptime(month_labels[0], "%Y-%m")
+    ).group_by(month).all()
+    for key, open_count, closed_count, debit_sum in trend:
+        if key in monthly_open:
+            monthly_open[key] = open_count
+            monthly_closed[key] = closed_count
+            monthly_debit[key] = debit_sum or 0.0
 
     # 短标签 (Jan, Feb...)
     short_labels = []
@@ -124,21 +125,17 @@ def overview(supplier_code):
 
     # ── 8D 分布 ──
     eight_d_dist = {"NOT_REQUIRED": 0, "NOT_RECEIVED": 0, "RECEIVED_REJECT": 0, "RECEIVED_PASS": 0}
-    for t in trs:
-        s = t.eight_d_status or "NOT_REQUIRED"
-        if s in eight_d_dist:
-            eight_d_dist[s] += 1
+    for status, count in _eight_d_counts(of_supplier).items():
+        if status in eight_d_dist:
+            eight_d_dist[status] = count
 
     # ── TOP 5 问题零件 ──
-    part_issues = defaultdict(int)
-    for t in trs:
-        if t.part_number:
-            part_issues[t.part_number] += 1
-    top_parts = sorted(part_issues.items(), key=lambda x: -x[1])[:5]
+    top_parts = [(pn, count) for pn, _, count in _top_parts(5, of_supplier, TroubleReport.part_number != "")]
 
     # ── 最近活动 ──
     activities = []
-    for t in trs[:10]:
+    recent_trs = TroubleReport.query.filter(of_supplier).order_by(TroubleReport.created_at.desc()).limit(10)
+    for t in recent_trs:
         activities.append({
             "date": t.created_at,
             "type": "tr",
@@ -196,10 +193,26 @@ def overview(supplier_code):
 # 质量问题 Tab（该供应商的 TR 列表）
 # ──────────────────────────────────────────────────────────
 
+QUALITY_CLOSED_STATUSES = ("closed", "done", "complete", "completed")
+INVESTIGATION_PLACEHOLDER = "No specific defect described"
+TR_FTS_MIN_TERM = 3     # trigram 分词：短于 3 个字符的搜索词走 LIKE
+
+
+def _tr_text_match(q):
+    """整串子串匹配（不区分大小写）；≥3 个字符走 trigram 全文索引，否则 LIKE"""
+    if len(q) >= TR_FTS_MIN_TERM:
+        return sql_text(
+            f"trouble_reports.id IN (SELECT rowid FROM {TR_FTS_TABLE} WHERE {TR_FTS_TABLE} MATCH :tr_match)"
+        ).bindparams(tr_match='"' + q.replace('"', '""') + '"')
+    # 用户输入里的 % / _ 按字面匹配
+    like = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return or_(*(getattr(TroubleReport, column).ilike(like, escape="\\") for column in TR_FTS_COLUMNS))
+
+
 @supplier_ws_bp.route("/<supplier_code>/quality")
 def quality(supplier_code):
     supplier = get_supplier_or_404(supplier_code)
-    all_trs = _get_trs(supplier)
+    of_supplier = TroubleReport.supplier_id == supplier.id
 
     q = (request.args.get("q") or "").strip()
     current_filter = (request.args.get("filter") or "all").strip().lower()
@@ -209,54 +222,28 @@ def quality(supplier_code):
     per_page = request.args.get("per_page", 12, type=int) or 12
     per_page = min(max(per_page, 5), 50)
 
-    def needs_investigation(tr):
-        is_placeholder = tr.issue_summary and "No specific defect described" in (tr.issue_summary or "")
-        has_inv = bool(tr.investigation_note and tr.investigation_note.strip())
-        return bool(is_placeholder and not has_inv)
-
-    def include_tr(tr):
-        status = (tr.status or "").lower()
-        is_closed = status in {"closed", "done", "complete", "completed"}
-        if current_filter == "open" and is_closed:
-            return False
-        if current_filter == "closed" and not is_closed:
-            return False
-        if current_filter == "investigation" and not needs_investigation(tr):
-            return False
-        if q:
-            haystack = " ".join([
-                tr.tr_no or "",
-                tr.part_number or "",
-                tr.part_name or "",
-                tr.issue_summary or "",
-                tr.issue_description or "",
-                tr.case_no or "",
-                tr.eight_d or "",
-                tr.debit_ref or "",
-            ]).lower()
-            if q.lower() not in haystack:
-                return False
-        return True
-
-    filtered_trs = [tr for tr in all_trs if include_tr(tr)]
-    total = len(filtered_trs)
-    pages = max((total + per_page - 1) // per_page, 1)
-    page = min(page, pages)
-    start = (page - 1) * per_page
-    trs = filtered_trs[start:start + per_page]
-
-    class Pager:
-        pass
-
-    pagination = Pager()
-    pagination.page = page
-    pagination.per_page = per_page
-    pagination.total = total
-    pagination.pages = pages
-    pagination.has_prev = page > 1
-    pagination.has_next = page < pages
-    pagination.prev_num = page - 1
-    pagination.next_num = page + 1
+    is_closed = func.lower(func.coalesce(TroubleReport.status, "")).in_(QUALITY_CLOSED_STATUSES)
+    query = TroubleReport.query.filter(of_supplier)
+    if current_filter == "open":
+        query = query.filter(~is_closed)
+    elif current_filter == "closed":
+        query = query.filter(is_closed)
+    elif current_filter == "investigation":
+        # AI 摘要是占位文本，且还没有人工调查记录
+        query = query.filter(
+            func.instr(TroubleReport.issue_summary, INVESTIGATION_PLACEHOLDER) > 0,
+            func.trim(func.coalesce(TroubleReport.investigation_note, "")) == "",
+        )
+    if q:
+        query = query.filter(_tr_text_match(q))
+    query = query.order_by(TroubleReport.created_at.desc(), TroubleReport.id.desc())
+
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    if pagination.pages and page > pagination.pages:
+        pagination = query.paginate(page=pagination.pages, per_page=per_page, error_out=False)
+    trs = pagination.items
+
+    total_quality = db.session.query(func.count(TroubleReport.id)).filter(of_supplier).scalar()
 
     return render_template(
         "supplier_ws/quality.html",
@@ -267,7 +254,7 @@ def quality(supplier_code):
         current_filter=current_filter,
         per_page=per_page,
         pagination=pagination,
-        total_quality=len(all_trs),
+        total_quality=total_quality,
     )
 
 
@@ -278,9 +265,11 @@ def quality(supplier_code):
 @supplier_ws_bp.route("/<supplier_code>/debit")
 def debit(supplier_code):
     supplier = get_supplier_or_404(supplier_code)
-    trs = _get_trs(supplier)
-    debit_trs = [t for t in trs if t.debit_amount and t.debit_amount > 0]
-    total_debit = sum(t.debit_amount for t in debit_trs)
+    has_debit = and_(TroubleReport.supplier_id == supplier.id, TroubleReport.debit_amount > 0)
+    debit_trs = TroubleReport.query.filter(has_debit).order_by(TroubleReport.created_at.desc()).all()
+    total_debit = db.session.query(
+        func.coalesce(func.sum(TroubleReport.debit_amount), 0.0)
+    ).filter(has_debit).scalar()
 
     return render_template(
         "supplier_ws/debit.html",
@@ -298,12 +287,7 @@ def debit(supplier_code):
 @supplier_ws_bp.route("/<supplier_code>/audits")
 def audits(supplier_code):
     supplier = get_supplier_or_404(supplier_code)
-    audit_list = AuditReport.query.filter(
-        or_(
-            AuditReport.supplier_id == supplier.id,
-            AuditReport.supplier_name.in_(_supplier_names(supplier)),
-        )
-    ).order_by(AuditReport.audit_date.desc()).all()
+    audit_list = AuditReport.query.filter(AuditReport.supplier_id == supplier.id).order_by(AuditReport.audit_date.desc()).all()
 
     return render_template(
         "supplier_ws/audits.html",
@@ -314,71 +298,8 @@ def audits(supplier_code):
 
 # ──────────────────────────────────────────────────────────
 # 单供应商质量报告（打印 / 导出 PDF）
-#   用法：把这段加到 supplier_ws/routes.py 末尾
-#   依赖文件顶部已 import 的：render_template, request(需补), Supplier, TroubleReport
-#   若顶部没 import request，请加上： from flask import request
+#   数据和上下文与批量报告共用 report_helper
 # ──────────────────────────────────────────────────────────
-from datetime import date as _date, datetime as _datetime
-from collections import Counter, OrderedDict
-from flask import request
-
-
-def _tr_effective_date(tr):
-    """TR 的有效日期：优先取 remark 末段的 dd.mm.yyyy，否则用 created_at"""
-    if tr.remark and "|" in tr.remark:
-        seg = tr.remark.split("|")[-1].strip()
-        for fmt in ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y"):
-            try:
-                return _datetime.strptime(seg, fmt).date()
-            except ValueError:
-                continue
-    if tr.created_at:
-        return tr.created_at.date()
-    return None
-
-
-def _supplier_short_name(supplier):
-    """Build a concise English display name from the supplier legal name."""
-    words = re.findall(r"[A-Za-z0-9&]+", supplier.name or "")
-    ignored = {
-        "ALUMINUM", "AND", "AUTO", "AUTOPARTS", "CHONGQING", "CO", "DEVELOPMENT",
-        "EXP", "GEAR", "GROUP", "HENAN", "IMP", "LTD", "MACHINE", "MACHINERY",
-        "MAGNESIUM", "MANUFACTURE", "MANUFACTURING", "MOTORCYCLE", "PARTS", "QINGDAO",
-        "TECH", "TECHNOLOGY", "WEIHAI", "WHEEL", "ZHEJIANG",
-    }
-    meaningful = [word.upper() for word in words if word.upper() not in ignored]
-    return meaningful[0] if meaningful else ((supplier.name or supplier.code).strip().upper())
-
-
-def _resolve_period(period, custom_start, custom_end):
-    """返回 (start_date, end_date, 双语标签, 英文标签)。"""
-    today = _date.today()
-    if period == "this_month":
-        start = today.replace(day=1)
-        month_en = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")[start.month - 1]
-        period_en = f"{month_en} {start.year}"
-        return start, today, f"{start.year}年{start.month}月 / {period_en}", period_en
-    if period == "this_quarter":
-        q = (today.month - 1) // 3
-        start = _date(today.year, q * 3 + 1, 1)
-        period_en = f"Q{q + 1} {start.year}"
-        return start, today, f"{start.year}年 Q{q + 1} / {period_en}", period_en
-    if period == "this_half":
-        if today.month <= 6:
-            return _date(today.year, 1, 1), today, f"{today.year}年上半年 / H1 {today.year}", f"H1 {today.year}"
-        return _date(today.year, 7, 1), today, f"{today.year}年下半年 / H2 {today.year}", f"H2 {today.year}"
-    if period == "this_year":
-        return _date(today.year, 1, 1), today, f"{today.year}年 / Year {today.year}", f"Year {today.year}"
-    if period == "custom" and custom_start and custom_end:
-        try:
-            s = _datetime.strptime(custom_start, "%Y-%m-%d").date()
-            e = _datetime.strptime(custom_end, "%Y-%m-%d").date()
-            period_en = f"{s.strftime('%Y/%m/%d')} - {e.strftime('%Y/%m/%d')}"
-            return s, e, period_en, period_en
-        except ValueError:
-            pass
-    return None, None, "全部时间 / All Time", "All Time"
-
 
 @supplier_ws_bp.route("/<supplier_code>/report")
 def report(supplier_code):
@@ -387,126 +308,13 @@ def report(supplier_code):
     custom_start = request.args.get("start", "")
     custom_end = request.args.get("end", "")
 
-    start, end, period_label, period_label_en = _resolve_period(period, custom_start, custom_end)
-
-    all_trs = _get_trs(supplier)  # 已按 created_at 倒序
-
-    # 按周期过滤
-    def in_period(tr):
-        if start is None:
-            return True
-        d = _tr_effective_date(tr)
-        return d is not None and start <= d <= end
-
-    trs = [t for t in all_trs if in_period(t)]
-
-    # ── KPI ──
-    total = len(trs)
-    closed = sum(1 for t in trs if (t.status or "").lower() in ("closed", "done", "completed"))
-    open_cnt = total - closed
-    pending_8d = sum(1 for t in trs if t.eight_d_status == "NOT_RECEIVED")
-    debit_counter = defaultdict(float)
-    for t in trs:
-        if t.debit_amount:
-            debit_counter[(t.debit_currency or "EUR").upper()] += t.debit_amount
-    currency_symbols = {"EUR": "€", "USD": "$", "CNY": "¥", "VND": "₫"}
-    debit_totals = [
-        {
-            "currency": currency,
-            "symbol": currency_symbols.get(currency, f"{currency} "),
-            "amount": amount,
-        }
-        for currency, amount in sorted(debit_counter.items())
-    ]
-
-    # ── 环比（仅固定周期）──
-    prev_total = None
-    if start is not None and period != "custom":
-        span = (end - start).days
-        prev_end = start.replace(day=1) if False else (start - __import__("datetime").timedelta(days=1))
-        prev_start = prev_end - __import__("datetime").timedelta(days=span)
-        prev_total = sum(1 for t in all_trs
-                         if (_tr_effective_date(t) or _date(1900, 1, 1)) >= prev_start
-                         and (_tr_effective_date(t) or _date(1900, 1, 1)) <= prev_end)
-
-    # ── 月度趋势 ──
-    month_counter = Counter()
-    for t in trs:
-        d = _tr_effective_date(t)
-        if d:
-            month_counter[(d.year, d.month)] += 1
-    if month_counter:
-        keys = sorted(month_counter.keys())
-        # 补齐区间内空月
-        months = OrderedDict()
-        y, m = keys[0]
-        ey, em = keys[-1]
-        while (y, m) <= (ey, em):
-            months[(y, m)] = month_counter.get((y, m), 0)
-            m += 1
-            if m > 12:
-                m = 1; y += 1
-        month_names_en = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
-        monthly = [
-            {"label": f"{k[1]}月 / {month_names_en[k[1] - 1]}", "label_en": month_names_en[k[1] - 1], "count": v}
-            for k, v in months.items()
-        ]
-    else:
-        monthly = []
-    month_max = max([x["count"] for x in monthly], default=1) or 1
-
-    # ── 8D 状态分布 ──
-    d8_map = {
-        "NOT_REQUIRED": ("Not Required / 不要求", "Not Required"),
-        "NOT_RECEIVED": ("Not Received / 未收到", "Not Received"),
-        "RECEIVED_REJECT": ("Received, Rejected / 已收到（拒收）", "Received, Rejected"),
-        "RECEIVED_PASS": ("Received, Accepted / 已收到（通过）", "Received, Accepted"),
-    }
-    d8_counter = Counter((t.eight_d_status or "NOT_REQUIRED") for t in trs)
-    eight_d = [{"key": k, "label": d8_map.get(k, (k, k))[0], "label_en": d8_map.get(k, (k, k))[1], "count": d8_counter.get(k, 0)}
-               for k in ["NOT_RECEIVED", "RECEIVED_REJECT", "RECEIVED_PASS", "NOT_REQUIRED"]]
-
-    # ── Top 问题零件 ──
-    part_counter = Counter()
-    part_name_map = {}
-    for t in trs:
-        pn = t.part_number or "No Part No. / 未填零件号"
-        part_counter[pn] += 1
-        if pn not in part_name_map and t.part_name:
-            part_name_map[pn] = t.part_name
-    top_parts = [{"pn": pn, "name": part_name_map.get(pn, ""), "count": c}
-                 for pn, c in part_counter.most_common(8)]
-    top_max = max([p["count"] for p in top_parts], default=1) or 1
-
-    # ── 评级 ──
-    if open_cnt >= 4:
-        rating = {"label": "Attention Required / 需重点关注", "label_en": "Attention Required", "color": "red"}
-    elif open_cnt >= 1:
-        rating = {"label": "Follow-up Required / 持续跟进", "label_en": "Follow-up Required", "color": "amber"}
-    else:
-        rating = {"label": "Good Performance / 表现良好", "label_en": "Good Performance", "color": "green"}
-
-    # TR 列表（按日期倒序，未闭环优先）
-    trs_sorted = sorted(
-        trs,
-        key=lambda t: ((t.status or "").lower() in ("closed", "done", "completed"),
-                       -(( _tr_effective_date(t) or _date(1900, 1, 1)).toordinal())),
-    )
+    start, end, period_label, period_label_en = resolve_period(period, custom_start, custom_end)
+    # 按周期过滤：(supplier_id, issue_date) 索引上的范围查询
+    data = collect_report_data([supplier.id], start, end, previous_range(period, start, end))[supplier.id]
 
     return render_template(
         "supplier_ws/report.html",
-        supplier=supplier,
-        supplier_short_name=_supplier_short_name(supplier),
-        period=period, period_label=period_label, period_label_en=period_label_en,
-        custom_start=custom_start, custom_end=custom_end,
-        total=total, open_cnt=open_cnt, closed=closed,
-        pending_8d=pending_8d, debit_totals=debit_totals,
-        prev_total=prev_total,
-        monthly=monthly, month_max=month_max,
-        eight_d=eight_d,
-        top_parts=top_parts, top_max=top_max,
-        rating=rating,
-        trs=trs_sorted,
-        tr_date=_tr_effective_date,
-        generated_at=_datetime.now(),
+        **build_report_context(
+            supplier, data, period, period_label, period_label_en, custom_start, custom_end
+        ),
     )
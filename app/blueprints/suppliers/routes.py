@@ -1,12 +1,16 @@
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, jsonify, abort, send_file, current_app
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func, or_, case
+from sqlalchemy import func, nulls_last
 from datetime import datetime, timedelta
+import os
 import re
 
 from . import suppliers_bp
 from ...extensions import db
-from ...models import Supplier, Part, TroubleReport
+from ...models import Supplier, SupplierMatchReview, SupplierScorecard
+from ...report_helper import BATCH_PERIODS, get_batch_job, start_batch_job
+from ...scorecard_helper import refresh_scorecards, scorecard_totals
+from ...supplier_helper import ignore_review, resolve_review
 
 
 # 头像调色板
@@ -56,86 +60,26 @@ def _normalize_reminder_emails(raw):
     return "\n".join(emails) or None
 
 
-def _enrich_suppliers(suppliers):
-    """为每个供应商附加统计信息"""
-    if not suppliers:
-        return []
-
-    # ── 批量查询：零件数 ──
-    supplier_ids = [s.id for s in suppliers]
-    parts_counts = dict(
-        db.session.query(Part.supplier_id, func.count(Part.id))
-        .filter(Part.supplier_id.in_(supplier_ids))
-        .group_by(Part.supplier_id).all()
-    )
-
-    # ── 批量查询：TR 统计（按 supplier_name 匹配） ──
-    # 收集所有可能的名字
-    all_names = set()
-    name_to_supplier = {}
-    for s in suppliers:
-        if s.name:
-            all_names.add(s.name)
-            name_to_supplier[s.name] = s.id
-        if s.chinese_name:
-            all_names.add(s.chinese_name)
-            name_to_supplier[s.chinese_name] = s.id
-
-    # 一次查所有相关 TR
-    tr_stats = {}  # supplier_id -> {open, closed, debit, last_activity}
-    if all_names:
-        trs = TroubleReport.query.filter(
-            TroubleReport.supplier_name.in_(all_names)
-        ).all()
-        for tr in trs:
-            sid = name_to_supplier.get(tr.supplier_name)
-            if sid is None:
-                continue
-            if sid not in tr_stats:
-                tr_stats[sid] = {"open": 0, "closed": 0, "debit": 0.0, "last": None}
-
-            st = (tr.status or "").lower()
-            if st in ("closed", "done", "completed"):
-                tr_stats[sid]["closed"] += 1
-            else:
-                tr_stats[sid]["open"] += 1
-
-            if tr.debit_amount and tr.debit_amount > 0:
-                tr_stats[sid]["debit"] += tr.debit_amount
-
-            if tr.created_at:
-                cur = tr_stats[sid]["last"]
-                if cur is None or tr.created_at > cur:
-                    tr_stats[sid]["last"] = tr.created_at
-
-    # ── 组装结果 ──
-    enriched = []
-    for s in suppliers:
-        stats = tr_stats.get(s.id, {"open": 0, "closed": 0, "debit": 0.0, "last": None})
-        bg, fg = _avatar_for(s.code or s.name or "")
-
+def _supplier_item(s, card):
+    """列表卡片需要的字段；card 为 supplier_scorecard 行（尚未刷新时为 None）"""
+    bg, fg = _avatar_for(s.code or s.name or "")
+    open_trs = card.open_trs if card else 0
+    return {
+        "supplier": s,
+        "open_trs": open_trs,
+        "closed_trs": card.closed_trs if card else 0,
+        "total_trs": card.total_trs if card else 0,
+        "eight_d_pending": card.eight_d_pending if card else 0,
+        "debit": card.debit_total if card else 0.0,
+        "last_activity": card.last_activity if card else None,
+        "parts_count": card.parts_count if card else 0,
+        "cp_coverage": card.cp_coverage if card else None,
+        "avatar_letter": _avatar_letter(s),
+        "avatar_bg": bg,
+        "avatar_fg": fg,
         # 状态：red(4+) / yellow(1-3) / green(0)
-        if stats["open"] >= 4:
-            status_color = "red"
-        elif stats["open"] >= 1:
-            status_color = "yellow"
-        else:
-            status_color = "green"
-
-        enriched.append({
-            "supplier": s,
-            "open_trs": stats["open"],
-            "closed_trs": stats["closed"],
-            "total_trs": stats["open"] + stats["closed"],
-            "debit": stats["debit"],
-            "last_activity": stats["last"],
-            "parts_count": parts_counts.get(s.id, 0),
-            "avatar_letter": _avatar_letter(s),
-            "avatar_bg": bg,
-            "avatar_fg": fg,
-            "status_color": status_color,
-        })
-    return enriched
+        "status_color": card.status_color if card else "green",
+    }
 
 
 @suppliers_bp.get("/")
@@ -144,7 +88,10 @@ def index():
     filter_mode = request.args.get("filter", "all")  # all / issues / quiet / recent
     sort_mode = request.args.get("sort", "recent")     # name / recent / issues
 
-    query = Supplier.query
+    # 统计全部来自 supplier_scorecard：一条 LEFT JOIN，筛选 / 排序都在 SQL 里
+    card = SupplierScorecard
+    open_trs = func.coalesce(card.open_trs, 0)
+    query = db.session.query(Supplier, card).outerjoin(card, card.supplier_id == Supplier.id)
     if q:
         like = f"%{q}%"
         query = query.filter(
@@ -153,39 +100,24 @@ def index():
             (Supplier.chinese_name.ilike(like))
         )
 
-    suppliers = query.all()
-    enriched = _enrich_suppliers(suppliers)
-
-    # 客户端筛选
     if filter_mode == "issues":
-        enriched = [e for e in enriched if e["open_trs"] > 0]
+        query = query.filter(open_trs > 0)
     elif filter_mode == "quiet":
-        enriched = [e for e in enriched if e["open_trs"] == 0]
+        query = query.filter(open_trs == 0)
     elif filter_mode == "recent":
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        enriched = [
-            e for e in enriched
-            if e["last_activity"] and e["last_activity"] > seven_days_ago
-        ]
+        query = query.filter(card.last_activity > datetime.utcnow() - timedelta(days=7))
 
-    # 排序
     if sort_mode == "recent":
-        enriched.sort(key=lambda e: e["last_activity"] or datetime(2000, 1, 1), reverse=True)
+        query = query.order_by(nulls_last(card.last_activity.desc()), Supplier.code)
     elif sort_mode == "issues":
-        enriched.sort(key=lambda e: -e["open_trs"])
+        query = query.order_by(open_trs.desc(), Supplier.code)
     else:  # name (按 code)
-        enriched.sort(key=lambda e: e["supplier"].code or "")
+        query = query.order_by(Supplier.code)
+
+    enriched = [_supplier_item(s, c) for s, c in query.all()]
 
     # 全局统计（不受 filter 影响）
-    all_enriched = _enrich_suppliers(Supplier.query.all())
-    total_count = len(all_enriched)
-    issues_count = sum(1 for e in all_enriched if e["open_trs"] > 0)
-    quiet_count = sum(1 for e in all_enriched if e["open_trs"] == 0)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_count = sum(
-        1 for e in all_enriched
-        if e["last_activity"] and e["last_activity"] > seven_days_ago
-    )
+    totals = scorecard_totals(recent_days=7)
 
     return render_template(
         "suppliers/index.html",
@@ -194,11 +126,12 @@ def index():
         filter_mode=filter_mode,
         sort_mode=sort_mode,
         stats={
-            "total": total_count,
-            "issues": issues_count,
-            "quiet": quiet_count,
-            "recent": recent_count,
+            "total": totals["total"],
+            "issues": totals["issues"],
+            "quiet": totals["quiet"],
+            "recent": totals["recent"],
         },
+        review_pending=SupplierMatchReview.query.filter_by(status="pending").count(),
     )
 
 
@@ -277,3 +210,105 @@ def delete_supplier(supplier_id):
     db.session.commit()
     flash(f"已删除供应商：{s.code}", "success")
     return redirect(url_for("suppliers.index"))
+
+
+# ──────────────────────────────────────────────────────────
+# 批量周期报告（后台任务 + 进度轮询）
+# ──────────────────────────────────────────────────────────
+
+def _batch_job_payload(job):
+    payload = {key: job[key] for key in ("id", "status", "done", "total", "current", "errors", "skipped", "message")}
+    if job["status"] == "done":
+        payload["download_url"] = url_for("suppliers.download_batch_reports", job_id=job["id"])
+    return payload
+
+
+@suppliers_bp.post("/reports/batch")
+def start_batch_reports():
+    period = request.form.get("period", "this_quarter")
+    if period not in BATCH_PERIODS:
+        return jsonify({"error": f"unknown period {period}"}), 400
+    codes = [code.strip() for code in request.form.getlist("code") if code.strip()]
+    job_id = start_batch_job(
+        current_app._get_current_object(),
+        period=period,
+        custom_start=request.form.get("start", ""),
+        custom_end=request.form.get("end", ""),
+        codes=codes or None,
+        include_empty=request.form.get("include_empty") == "1",
+        pdf=request.form.get("pdf") == "1",
+    )
+    return jsonify({"job_id": job_id, "status_url": url_for("suppliers.batch_reports_status", job_id=job_id)}), 202
+
+
+@suppliers_bp.get("/reports/batch/<job_id>")
+def batch_reports_status(job_id):
+    job = get_batch_job(job_id)
+    if not job:
+        abort(404)
+    return jsonify(_batch_job_payload(job))
+
+
+@suppliers_bp.get("/reports/batch/<job_id>/download")
+def download_batch_reports(job_id):
+    job = get_batch_job(job_id)
+    if not job or job["status"] != "done":
+        abort(404)
+    return send_file(job["zip"], as_attachment=True, download_name=os.path.basename(job["zip"]))
+
+
+# ──────────────────────────────────────────────────────────
+# 供应商名称待确认队列
+# ──────────────────────────────────────────────────────────
+
+REVIEW_STATUSES = ("pending", "ignored", "resolved")
+
+
+@suppliers_bp.get("/aliases/review")
+def alias_review():
+    status = request.args.get("status", "pending")
+    if status not in REVIEW_STATUSES:
+        status = "pending"
+    reviews = (
+        SupplierMatchReview.query.filter_by(status=status)
+        .order_by(SupplierMatchReview.occurrences.desc(), SupplierMatchReview.last_seen.desc())
+        .limit(500).all()
+    )
+    counts = dict(
+        db.session.query(SupplierMatchReview.status, func.count())
+        .group_by(SupplierMatchReview.status).all()
+    )
+    return render_template(
+        "suppliers/alias_review.html",
+        reviews=reviews,
+        status=status,
+        counts=counts,
+        suppliers=Supplier.query.order_by(Supplier.code).all(),
+    )
+
+
+@suppliers_bp.post("/aliases/review/<int:review_id>/resolve")
+def resolve_alias_review(review_id):
+    review = db.session.get(SupplierMatchReview, review_id) or abort(404)
+    supplier = db.session.get(Supplier, request.form.get("supplier_id", type=int) or 0)
+    if not supplier:
+        flash("请选择供应商", "error")
+        return redirect(url_for("suppliers.alias_review"))
+    report = resolve_review(review, supplier)
+    if report is None:
+        db.session.rollback()
+        flash(f"“{review.raw_name}” 已登记给其他供应商，请先检查别名", "error")
+        return redirect(url_for("suppliers.alias_review"))
+    refresh_scorecards([supplier.id])     # 补挂是批量 UPDATE，不经过计分卡的 mapper 事件
+    db.session.commit()
+    linked = sum(stats["name"] + stats["code"] for stats in report.values())
+    flash(f"“{review.raw_name}” → {supplier.code}，补挂 {linked} 条记录", "success")
+    return redirect(url_for("suppliers.alias_review"))
+
+
+@suppliers_bp.post("/aliases/review/<int:review_id>/ignore")
+def ignore_alias_review(review_id):
+    review = db.session.get(SupplierMatchReview, review_id) or abort(404)
+    ignore_review(review)
+    db.session.commit()
+    return redirect(url_for("suppliers.alias_review"))
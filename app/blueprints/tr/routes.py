@@ -18,9 +18,11 @@ from urllib.parse import urlsplit
 
 from . import tr_bp
 from ...extensions import db
-from ...models import TroubleReport, TRDocument, Supplier
+from ...models import TroubleReport, TRDocument, Supplier, remark_issue_date, tr_issue_date
 
-from ...ai_helper import summarize_issue
+from ...ai_helper import ai_queue_stats, defer_until_available, is_ollama_available, summarize_issue
+from ...similar_helper import queue_reindex, remove_source, similar_issues
+from ...supplier_helper import resolve_supplier
 
 # ──────────────────────────────────────────────────────────
 # EDC 缓存与预下载状态
@@ -272,19 +274,27 @@ def _start_scheduler_if_needed(app):
 
 
 # ── 自动导入 EDC 附件 ──
-def _generate_issue_summary(app, tr_id):
+def _generate_issue_summary(app, tr_id, priority="background"):
     """后台用 AI 提取并转述 TR 的问题描述"""
     with app.app_context():
         try:
             tr = TroubleReport.query.get(tr_id)
             if not tr or not tr.issue_description:
                 return
+            if not is_ollama_available():
+                defer_until_available(
+                    ("summary", tr_id),
+                    lambda: _generate_issue_summary(app, tr_id, priority),
+                    logger=app.logger,
+                )
+                return
 
-            summary = summarize_issue(tr.issue_description, logger=app.logger)
+            summary = summarize_issue(tr.issue_description, logger=app.logger, priority=priority)
             if summary:
                 tr.issue_summary = summary
                 db.session.commit()
                 app.logger.info(f"[AI] TR {tr.tr_no} summary saved")
+                queue_reindex(app, "tr", tr_id)
         except Exception as e:
             app.logger.warning(f"[AI] summary failed for TR {tr_id}: {e}")
 
@@ -447,21 +457,12 @@ def _split_email_list(raw):
 
 
 def _find_supplier_for_tr(tr):
-    if tr.supplier_code and tr.supplier_code != "N/A":
-        supplier = Supplier.query.filter(func.lower(Supplier.code) == tr.supplier_code.lower()).first()
+    if tr.supplier_id:
+        supplier = db.session.get(Supplier, tr.supplier_id)
         if supplier:
             return supplier
-
-    supplier_name = (tr.supplier_name or "").strip()
-    if not supplier_name:
-        return None
-
-    return Supplier.query.filter(
-        or_(
-            func.lower(Supplier.name) == supplier_name.lower(),
-            func.lower(Supplier.chinese_name) == supplier_name.lower(),
-        )
-    ).first()
+    # 尚未回填 supplier_id 的旧记录：按别名表解析（索引查询）
+    return resolve_supplier(tr.supplier_code, tr.supplier_name)
 
 
 def _tr_reminder_recipients(tr):
@@ -611,15 +612,8 @@ def _tr_reminder_attachments(tr):
 
 
 def _notification_date_for_tr(tr):
-    remark = (tr.remark or "").strip()
-    if remark:
-        parts = [p.strip() for p in remark.split("|")]
-        issue_date = _parse_issue_date(parts[-1]) if parts else None
-        if issue_date:
-            return issue_date
-    if tr.created_at:
-        return tr.created_at.date()
-    return None
+    # issue_date 写入时维护；未保存的对象现算
+    return tr.issue_date or tr_issue_date(tr.remark, tr.created_at)
 
 
 def _build_8d_reminder_email(tr, attachments=None, reminder_no=1):
@@ -699,22 +693,10 @@ def _build_8d_reminder_email(tr, attachments=None, reminder_no=1):
     return subject, body
 
 
-def _parse_issue_date(raw):
-    raw = (raw or "").strip()
-    if not raw:
-        return None
-    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y"):
-        try:
-            return datetime.strptime(raw, fmt).date()
-        except ValueError:
-            continue
-    return None
-
-
 def _issue_date_input_from_remark(remark):
     if not remark or "|" not in remark:
         return ""
-    issue_date = _parse_issue_date(remark.split("|")[-1].strip())
+    issue_date = remark_issue_date(remark)
     return issue_date.strftime("%Y-%m-%d") if issue_date else ""
 
 
@@ -723,14 +705,14 @@ def _remark_without_issue_date(remark):
     if not remark or "|" not in remark:
         return remark
     parts = [p.strip() for p in remark.split("|")]
-    if _parse_issue_date(parts[-1]):
+    if remark_issue_date(parts[-1]):
         return " | ".join(p for p in parts[:-1] if p).strip()
     return remark
 
 
 def _merge_remark_issue_date(remark, issue_date_raw):
     base = _remark_without_issue_date(remark)
-    issue_date = _parse_issue_date(issue_date_raw)
+    issue_date = remark_issue_date(issue_date_raw)
     if not issue_date:
         return base or None
     display_date = issue_date.strftime("%d.%m.%Y")
@@ -1219,6 +1201,7 @@ def new_tr():
             )
         db.session.commit()
         _edc_cache["data"] = None
+        queue_reindex(current_app._get_current_object(), "tr", tr.id)
 
         if tr_no.startswith("TR-EDC-"):
             threading.Thread(target=_auto_import_edc_attachments,
@@ -1308,6 +1291,7 @@ def edit_tr(tr_id):
                 synced_case_count = _sync_case_fields_from_tr(tr)
 
         db.session.commit()
+        queue_reindex(current_app._get_current_object(), "tr", tr.id)
         if not (pulled_case_source and tr.issue_summary):
             threading.Thread(target=_generate_issue_summary,
                             args=(current_app._get_current_object(), tr.id), daemon=True).start()
@@ -1325,7 +1309,8 @@ def edit_tr(tr_id):
                            suppliers=suppliers, next_url=next_url,
                            issue_date_value=_issue_date_input_from_remark(tr.remark),
                            remark_value=_remark_without_issue_date(tr.remark),
-                           case_options=_case_options())
+                           case_options=_case_options(),
+                           similar_items=similar_issues("tr", tr.id))
 
 
 @tr_bp.route("/<int:tr_id>/delete", methods=["POST"])
@@ -1337,6 +1322,7 @@ def delete_tr(tr_id):
             try: os.remove(fp)
             except OSError: pass
     db.session.delete(tr); db.session.commit()
+    remove_source("tr", tr_id)
     flash("✅ TR deleted successfully", "success")
     next_url = request.form.get("next") or request.args.get("next") or url_for("tr.index")
     return redirect(next_url)
@@ -1795,9 +1781,12 @@ def regenerate_summary(tr_id):
     tr = TroubleReport.query.get_or_404(tr_id)
     threading.Thread(
         target=_generate_issue_summary,
-        args=(current_app._get_current_object(), tr.id),
+        args=(current_app._get_current_object(), tr.id, "interactive"),
         daemon=True
     ).start()
+    if not is_ollama_available():
+        flash("⏳ AI 服务暂不可用，已排队，恢复后自动生成摘要", "warning")
+        return redirect(url_for("tr.edit_tr", tr_id=tr_id))
     flash("✅ AI 正在重新生成问题摘要，稍后刷新查看", "success")
     return redirect(url_for("tr.edit_tr", tr_id=tr_id))
 
@@ -1809,6 +1798,10 @@ def ai_status(tr_id):
         "summary": tr.issue_summary or "",
     })
 
+@tr_bp.route("/ai-queue")
+def ai_queue():
+    return jsonify(ai_queue_stats())
+
 @tr_bp.route("/8d-detail/<int:tr_id>")
 def eight_d_detail(tr_id):
     tr = TroubleReport.query.get_or_404(tr_id)
@@ -1831,7 +1824,7 @@ def eight_d_detail(tr_id):
         "escape_action_en": tr.eight_d_escape_action_en or "",
     })
 
-def _extract_8d_for_tr(app, tr_id):
+def _extract_8d_for_tr(app, tr_id, priority="background"):
     """找到该 TR 的 8D 报告附件，AI 提取根因和措施"""
     import os
     from ...ai_helper import extract_8d
@@ -1845,6 +1838,13 @@ def _extract_8d_for_tr(app, tr_id):
             ).order_by(TRDocument.created_at.desc()).limit(3).all()
             if not docs:
                 return
+            if not is_ollama_available():
+                defer_until_available(
+                    ("8d", tr_id),
+                    lambda: _extract_8d_for_tr(app, tr_id, priority),
+                    logger=app.logger,
+                )
+                return
 
             result = None
             selected_doc = None
@@ -1854,7 +1854,7 @@ def _extract_8d_for_tr(app, tr_id):
                 file_path = os.path.join(app.config["UPLOAD_DIR"], doc.rel_path)
                 if not os.path.exists(file_path):
                     continue
-                current = extract_8d(file_path, logger=app.logger)
+                current = extract_8d(file_path, logger=app.logger, priority=priority)
                 if not current:
                     continue
                 if not fallback_result:
@@ -1895,6 +1895,7 @@ def _extract_8d_for_tr(app, tr_id):
                     f"esc_cn={len(tr.eight_d_escape_cause)} esc_en={len(tr.eight_d_escape_cause_en)} "
                     f"synced_case={synced_count}"
                 )
+                queue_reindex(app, "tr", tr_id)
         except Exception as e:
             app.logger.warning(f"[AI 8D] failed for TR {tr_id}: {e}")
 
@@ -1906,9 +1907,11 @@ def eight_d_extract_ajax(tr_id):
         return jsonify({"ok": False, "msg": "该 TR 没有 8D 报告附件"})
     threading.Thread(
         target=_extract_8d_for_tr,
-        args=(current_app._get_current_object(), tr.id),
+        args=(current_app._get_current_object(), tr.id, "interactive"),
         daemon=True
     ).start()
+    if not is_ollama_available():
+        return jsonify({"ok": True, "queued": True, "msg": "AI 服务暂不可用，已排队，恢复后自动分析"})
     return jsonify({"ok": True, "msg": "AI 正在分析，约 20-40 秒后刷新查看"})
 
 @tr_bp.route("/<int:tr_id>/toggle-pin", methods=["POST"])
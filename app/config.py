@@ -22,6 +22,25 @@ class Config:
     # 最大上传文件大小：50MB
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024
 
+    # 控制计划上传后在后台线程提取；True 时在请求内同步执行（测试 / 调试用）
+    CP_EXTRACT_SYNC = False
+
+    # 供应商计分卡全量重算间隔（秒）；写入时已增量刷新，这里只是兜底。0 = 不启动后台线程
+    SCORECARD_REFRESH_INTERVAL = 3600
+
+    # 首页 Dashboard 进程内缓存（秒）；相关表有写入提交时立即作废，0 = 不缓存
+    DASHBOARD_CACHE_TTL = 60
+
+    # 供应商名称匹配：进程内别名快照的兜底重建间隔（秒），别名变更提交后立即作废；0 = 每次现建
+    SUPPLIER_MATCHER_TTL = 300
+    # 三元组相似度 ≥ AUTO 且领先第二名 MARGIN 时自动关联；≥ SUGGEST 时作为待确认队列的建议
+    SUPPLIER_MATCH_AUTO = 0.8
+    SUPPLIER_MATCH_MARGIN = 0.15
+    SUPPLIER_MATCH_SUGGEST = 0.4
+
+    # 批量周期报告的渲染进程数；None = report_helper.BATCH_WORKERS
+    REPORT_BATCH_WORKERS = None
+
     # ── EDC Sync 配置 ──────────────────────────────────────
     EDC_ONEDRIVE_PATH = r"D:\OneDrive - Piaggio & C. SPA\File di Chen De Feng - EDC reports"
     EDC_OUTLOOK_FOLDER = "FPVT-EDC Ass."
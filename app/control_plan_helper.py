@@ -2,18 +2,61 @@
 from __future__ import annotations
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import csv
 from datetime import date, datetime
+from functools import lru_cache
 import hashlib
+import io
 import json
 import os
+import posixpath
+import queue
 import re
+import threading
+import zipfile
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape
+
+from flask import current_app
+from sqlalchemy import func, insert, or_, select, text as sql_text
+from sqlalchemy.exc import IntegrityError
 
 from app.ai_helper import OLLAMA_MODEL, _call_ollama, _parse_json
+from app.extensions import db
+from app.models import (
+    CHARACTERISTIC_FTS_COLUMNS, CHARACTERISTIC_FTS_TABLE, ControlCharacteristic, ControlPlan,
+    ControlPlanDraftCharacteristic, ControlPlanDraftStep, ControlPlanExtraction, ControlPlanVersion,
+    ControlPlanVersionDiff, Part, ProcessStep, Supplier,
+)
 
 
 PARSER_VERSION = "cp-parser-1.2"
 SUPPORTED_SPREADSHEETS = {"xlsx", "xlsm", "xls"}
 SUPPORTED_PDFS = {"pdf"}
+XLSX_MAX_ROWS = 2000
+XLSX_MAX_COLS = 80
+# 两阶段选表：每张表先读前 SHEET_PROBE_ROWS 行粗筛，与最高分相差不超过
+# SHEET_CANDIDATE_MARGIN 的前 SHEET_MAX_CANDIDATES 张再完整读取、精确打分
+SHEET_PROBE_ROWS = 40
+SHEET_CANDIDATE_MARGIN = 6
+SHEET_MAX_CANDIDATES = 3
+SHEET_WORKERS = max(1, int(os.getenv("CP_SHEET_WORKERS", "1")))
+
+# PDF 逐页提表：页数达到 PDF_PARALLEL_MIN_PAGES 才开进程池（进程启动约需 1 秒）
+PDF_WORKERS = max(1, int(os.getenv("CP_PDF_WORKERS", str(min(4, os.cpu_count() or 1)))))
+PDF_PARALLEL_MIN_PAGES = 12
+
+# 后台提取阶段：stage -> (进度百分比, 页面显示)
+EXTRACTION_STAGES = OrderedDict([
+    ("queued", (0, "排队中")),
+    ("reading", (10, "读取附件")),
+    ("header_detection", (30, "识别表头")),
+    ("parsing", (55, "解析工序与特性")),
+    ("ai_mapping", (70, "AI 列映射")),
+    ("quality_scoring", (90, "质量评分")),
+    ("done", (100, "完成")),
+])
 
 
 def sha256_file(file_path):
@@ -49,40 +92,128 @@ def _join_unique(values):
     return " ".join(output)
 
 
-def _read_xlsx(file_path):
-    from openpyxl import load_workbook
+_MERGE_CELL_RE = re.compile(rb'<(?:\w+:)?mergeCell\s+ref="([A-Z]+[0-9]+(?::[A-Z]+[0-9]+)?)"')
+
+
+def _xml_local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _xlsx_sheet_paths(archive):
+    """工作表名 -> 压缩包内 XML 路径（兼容 transitional / strict 命名空间）"""
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target", "") for rel in rels}
+    paths = {}
+    for sheet in workbook.iter():
+        if _xml_local(sheet.tag) != "sheet":
+            continue
+        rel_id = next((v for k, v in sheet.attrib.items() if _xml_local(k) == "id"), None)
+        target = targets.get(rel_id, "")
+        if target.startswith("/"):
+            paths[sheet.get("name")] = target.lstrip("/")
+        elif target:
+            paths[sheet.get("name")] = posixpath.normpath(posixpath.join("xl", target))
+    return paths
+
+
+def _xlsx_merged_ranges(archive, path, chunk_size=1 << 20):
+    """只扫描工作表 XML 里的 <mergeCell ref=...>，不解析单元格"""
     from openpyxl.utils.cell import range_boundaries
 
-    workbook = load_workbook(file_path, data_only=True, read_only=False)
-    sheets = []
-    for sheet in workbook.worksheets:
-        max_row = min(sheet.max_row or 1, 2000)
-        max_col = min(sheet.max_column or 1, 80)
+    refs = set()
+    tail = b""
+    with archive.open(path) as source:
+        while True:
+            block = source.read(chunk_size)
+            if not block:
+                break
+            data = tail + block
+            refs.update(m.group(1).decode() for m in _MERGE_CELL_RE.finditer(data))
+            tail = data[-256:]
+    return [range_boundaries(ref) for ref in refs if ":" in ref]
+
+
+def _expand_merged(matrix, ranges):
+    """稀疏展开：只把合并区域中落在已读取行列内的格子填成左上角的值"""
+    row_count = len(matrix)
+    for min_col, min_row, max_col, max_row in ranges:
+        if min_row > row_count:
+            continue
+        anchor_row = matrix[min_row - 1]
+        if min_col > len(anchor_row):
+            continue
+        anchor = anchor_row[min_col - 1]
+        for row in matrix[min_row - 1:min(max_row, row_count)]:
+            for col in range(min_col - 1, min(max_col, len(row))):
+                row[col] = anchor
+
+
+class _XlsxReader:
+    """Read-only streaming access to an .xlsx workbook, one sheet at a time.
+
+    iter_rows(values_only=True) 逐行流式读取，合并单元格从 XML 中单独扫描后按需展开，
+    不构建 openpyxl 的完整单元格对象模型。
+    """
+
+    def __init__(self, file_path):
+        from openpyxl import load_workbook
+
+        self.workbook = load_workbook(file_path, data_only=True, read_only=True)
+        self._archive = zipfile.ZipFile(file_path)
+        try:
+            self._paths = _xlsx_sheet_paths(self._archive)
+        except (KeyError, ET.ParseError):
+            self._paths = {}
+        self.sheet_names = [sheet.title for sheet in self.workbook.worksheets]
+
+    def read(self, name, max_rows=XLSX_MAX_ROWS):
+        sheet = self.workbook[name]
+        # 部分生成工具写入的 dimension 不准（如只写 A1），按实际行读取
+        sheet.reset_dimensions()
         matrix = [
-            [_text(sheet.cell(row=row, column=col).value) for col in range(1, max_col + 1)]
-            for row in range(1, max_row + 1)
+            [_text(value) for value in row]
+            for row in sheet.iter_rows(max_row=max_rows, max_col=XLSX_MAX_COLS, values_only=True)
         ]
-        for merged_range in sheet.merged_cells.ranges:
-            min_col, min_row, max_merged_col, max_merged_row = range_boundaries(str(merged_range))
-            if min_row > max_row or min_col > max_col:
-                continue
-            anchor = matrix[min_row - 1][min_col - 1]
-            for row in range(min_row, min(max_merged_row, max_row) + 1):
-                for col in range(min_col, min(max_merged_col, max_col) + 1):
-                    matrix[row - 1][col - 1] = anchor
-        sheets.append({"name": sheet.title, "matrix": matrix})
-    workbook.close()
-    return sheets
-
-
-def _read_xls(file_path):
-    import xlrd
-
-    workbook = xlrd.open_workbook(file_path, formatting_info=False)
-    sheets = []
-    for sheet in workbook.sheets():
-        max_row = min(sheet.nrows, 2000)
-        max_col = min(sheet.ncols, 80)
+        if name in self._paths:
+            _expand_merged(matrix, _xlsx_merged_ranges(self._archive, self._paths[name]))
+        while matrix and not any(matrix[-1]):
+            matrix.pop()
+        width = max(
+            (max((i for i, value in enumerate(row) if value), default=-1) + 1 for row in matrix),
+            default=0,
+        )
+        return [row[:max(width, 1)] for row in matrix]
+
+    def close(self):
+        self.workbook.close()
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_xlsx(file_path):
+    with _XlsxReader(file_path) as reader:
+        return [{"name": name, "matrix": reader.read(name)} for name in reader.sheet_names]
+
+
+class _XlsReader:
+    """Lazy .xls access: on_demand=True 只在读到某张表时才解析它"""
+
+    def __init__(self, file_path):
+        import xlrd
+
+        self.workbook = xlrd.open_workbook(file_path, formatting_info=False, on_demand=True)
+        self.sheet_names = self.workbook.sheet_names()
+
+    def read(self, name, max_rows=XLSX_MAX_ROWS):
+        sheet = self.workbook.sheet_by_name(name)
+        max_row = min(sheet.nrows, max_rows)
+        max_col = min(sheet.ncols, XLSX_MAX_COLS)
         matrix = [
             [_text(sheet.cell_value(row, col)) for col in range(max_col)]
             for row in range(max_row)
@@ -94,104 +225,218 @@ def _read_xls(file_path):
             for row in range(min_row, min(max_row_exclusive, max_row)):
                 for col in range(min_col, min(max_col_exclusive, max_col)):
                     matrix[row][col] = anchor
-        sheets.append({"name": sheet.name, "matrix": matrix})
-    return sheets
+        return matrix
+
+    def close(self):
+        self.workbook.release_resources()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _score_candidate(reader, name):
+    sheet = {"name": name, "matrix": reader.read(name)}
+    score, header = _sheet_score(sheet)
+    return score, sheet, header
+
+
+def _best_sheet(open_reader, workers=None, progress=None):
+    """两阶段选表，解析时间不再随无关的说明 / 修订 / 零件清单页增长
+
+    open_reader() 返回 _XlsxReader / _XlsReader；workers > 1 时候选表在线程池中
+    各自打开一个 reader 并行完整读取和打分（reader 不跨线程共享）。
+    """
+    workers = SHEET_WORKERS if workers is None else workers
+    with open_reader() as reader:
+        names = reader.sheet_names
+        if not names:
+            return None, None
+        if progress:
+            progress("header_detection")
+        probe_scores = [
+            _sheet_score({"name": name, "matrix": reader.read(name, max_rows=SHEET_PROBE_ROWS)})[0]
+            for name in names
+        ]
+        best = max(probe_scores)
+        shortlist = sorted(
+            (index for index, score in enumerate(probe_scores)
+             if score >= best - SHEET_CANDIDATE_MARGIN),
+            key=lambda index: -probe_scores[index],
+        )[:SHEET_MAX_CANDIDATES]
+        # 保持工作表原顺序，同分时与 _rank_sheets 一样取靠前的一张
+        candidates = [names[index] for index in sorted(shortlist)]
+
+        if workers > 1 and len(candidates) > 1:
+            def score_in_own_reader(name):
+                with open_reader() as own:
+                    return _score_candidate(own, name)
+
+            with ThreadPoolExecutor(max_workers=min(workers, len(candidates))) as pool:
+                ranked = list(pool.map(score_in_own_reader, candidates))
+        else:
+            ranked = [_score_candidate(reader, name) for name in candidates]
+    _, sheet, header = max(ranked, key=lambda item: item[0])
+    return sheet, header
+
+
+def _best_xlsx_sheet(file_path, workers=None, progress=None):
+    return _best_sheet(lambda: _XlsxReader(file_path), workers, progress)
+
+
+def _best_xls_sheet(file_path, workers=None, progress=None):
+    return _best_sheet(lambda: _XlsReader(file_path), workers, progress)
+
+
+def _pdf_table_candidates(tables):
+    candidates = []
+    for table in tables or []:
+        if not table:
+            continue
+        column_count = max((len(row or []) for row in table), default=0)
+        populated = sum(
+            bool(_text(cell))
+            for row in table
+            for cell in (row or [])
+        )
+        if column_count >= 4 and populated:
+            candidates.append((populated, column_count, table))
+    return candidates
 
 
-def _read_pdf(file_path):
-    """Merge ruled control-plan tables from every PDF page into one matrix."""
+def _pdf_scan_pages(file_path, page_indexes):
+    """逐页取文本、pdfplumber 默认表格和网格线。进程池 worker，返回值可 pickle"""
     import pdfplumber
 
-    matrix = []
-    page_text = []
-    table_page_count = 0
-    page_count = 0
-    expected_columns = None
+    scans = []
+    with pdfplumber.open(file_path) as document:
+        for index in page_indexes:
+            page = document.pages[index]
+            candidates = _pdf_table_candidates(page.extract_tables())
+            scans.append({
+                "index": index,
+                "text": page.extract_text(x_tolerance=2, y_tolerance=3) or "",
+                "selected": max(candidates, key=lambda item: item[:2]) if candidates else None,
+                "verticals": sorted({
+                    round(line["x0"], 1)
+                    for line in page.lines
+                    if abs(line["x0"] - line["x1"]) < 1
+                    and abs(line["bottom"] - line["top"]) > page.height * 0.08
+                }),
+                "horizontals": sorted({
+                    round(line["top"], 1)
+                    for line in page.lines
+                    if abs(line["top"] - line["bottom"]) < 1
+                    and abs(line["x1"] - line["x0"]) > page.width * 0.05
+                }),
+            })
+            page.close()
+    return scans
 
-    def table_candidates(tables):
-        candidates = []
-        for table in tables or []:
-            if not table:
-                continue
-            column_count = max((len(row or []) for row in table), default=0)
-            populated = sum(
-                bool(_text(cell))
-                for row in table
-                for cell in (row or [])
-            )
-            if column_count >= 4 and populated:
-                candidates.append((populated, column_count, table))
-        return candidates
+
+def _pdf_recover_grids(file_path, jobs):
+    """jobs: [(page_index, verticals, horizontals)] -> [(page_index, 按显式网格线重建的最佳表格)]"""
+    import pdfplumber
+
+    recovered = []
+    with pdfplumber.open(file_path) as document:
+        for index, verticals, horizontals in jobs:
+            page = document.pages[index]
+            candidates = _pdf_table_candidates(page.extract_tables({
+                "vertical_strategy": "explicit",
+                "explicit_vertical_lines": verticals,
+                "horizontal_strategy": "explicit",
+                "explicit_horizontal_lines": horizontals,
+                "intersection_tolerance": 5,
+                "snap_tolerance": 3,
+                "join_tolerance": 3,
+            }))
+            recovered.append((index, max(candidates, key=lambda item: item[:2]) if candidates else None))
+            page.close()
+    return recovered
+
+
+def _pdf_map(fn, file_path, items, workers):
+    """把 items 切成连续的块交给进程池（每个进程自己打开 PDF），结果按原顺序拼回"""
+    if workers <= 1 or len(items) < 2:
+        return fn(file_path, items)
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(workers, len(items))
+    size = -(-len(items) // workers)
+    chunks = [items[start:start + size] for start in range(0, len(items), size)]
+    # spawn：在 Web 服务的后台线程里 fork 不安全，Windows 上也只有 spawn
+    with ProcessPoolExecutor(
+        max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        return [result for part in pool.map(fn, [file_path] * len(chunks), chunks) for result in part]
+
+
+def _read_pdf(file_path, workers=None):
+    """Merge ruled control-plan tables from every PDF page into one matrix.
+
+    页面级工作（取表格 / 网格重建）可以在进程池中并行；expected_columns 的
+    确定和行的拼接始终按页序在主进程完成，结果与串行逐页处理一致。
+    """
+    import pdfplumber
 
     with pdfplumber.open(file_path) as document:
         page_count = len(document.pages)
-        for page_number, page in enumerate(document.pages, start=1):
-            text = page.extract_text(x_tolerance=2, y_tolerance=3) or ""
-            if text:
-                page_text.append(text)
-
-            default_candidates = table_candidates(page.extract_tables())
-            selected = max(default_candidates, key=lambda item: item[:2]) if default_candidates else None
-            if expected_columns is None and selected:
-                expected_columns = selected[1]
-
-            verticals = sorted({
-                round(line["x0"], 1)
-                for line in page.lines
-                if abs(line["x0"] - line["x1"]) < 1
-                and abs(line["bottom"] - line["top"]) > page.height * 0.08
-            })
-            horizontals = sorted({
-                round(line["top"], 1)
-                for line in page.lines
-                if abs(line["top"] - line["bottom"]) < 1
-                and abs(line["x1"] - line["x0"]) > page.width * 0.05
-            })
+    workers = PDF_WORKERS if workers is None else workers
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        workers = 1
 
-            # Keep pdfplumber's merged-cell interpretation when the page has
-            # the expected shape. Only reconstruct the ruled grid on pages
-            # where a large vertical merge collapses columns (common in long
-            # supplier control plans that continue across pages).
-            needs_grid_recovery = (
-                selected is None
-                or (expected_columns and selected[1] != expected_columns)
-            )
-            if needs_grid_recovery and len(verticals) >= 8 and len(horizontals) >= 2:
-                recovered = table_candidates(page.extract_tables({
-                    "vertical_strategy": "explicit",
-                    "explicit_vertical_lines": verticals,
-                    "horizontal_strategy": "explicit",
-                    "explicit_horizontal_lines": horizontals,
-                    "intersection_tolerance": 5,
-                    "snap_tolerance": 3,
-                    "join_tolerance": 3,
-                }))
-                if recovered:
-                    recovered_best = max(recovered, key=lambda item: item[:2])
-                    if (
-                        selected is None
-                        or recovered_best[1] == expected_columns
-                        or abs(recovered_best[1] - expected_columns)
-                        < abs(selected[1] - expected_columns)
-                    ):
-                        selected = recovered_best
-
-            if selected is None:
-                continue
+    scans = _pdf_map(_pdf_scan_pages, file_path, list(range(page_count)), workers)
+    expected_columns = next(
+        (scan["selected"][1] for scan in scans if scan["selected"]), None
+    )
 
-            # Supplier PDFs commonly contain one full-width process table per page.
-            _, column_count, table = selected
-            table_page_count += 1
-            for row in table:
-                # pdfplumber uses None for cells covered by a vertical merge and
-                # an empty string for a genuinely blank cell. Preserve that
-                # distinction so the parser can inherit merged control fields.
-                normalized = [
-                    None if cell is None else _text(cell)
-                    for cell in (row or [])
-                ]
-                normalized.extend([None] * (column_count - len(normalized)))
-                matrix.append(normalized)
+    # Keep pdfplumber's merged-cell interpretation when the page has
+    # the expected shape. Only reconstruct the ruled grid on pages
+    # where a large vertical merge collapses columns (common in long
+    # supplier control plans that continue across pages).
+    recovery_jobs = [
+        (scan["index"], scan["verticals"], scan["horizontals"])
+        for scan in scans
+        if (scan["selected"] is None
+            or (expected_columns and scan["selected"][1] != expected_columns))
+        and len(scan["verticals"]) >= 8 and len(scan["horizontals"]) >= 2
+    ]
+    recovered = dict(_pdf_map(_pdf_recover_grids, file_path, recovery_jobs, workers))
+
+    matrix = []
+    page_text = []
+    table_page_count = 0
+    for scan in scans:
+        if scan["text"]:
+            page_text.append(scan["text"])
+        selected = scan["selected"]
+        recovered_best = recovered.get(scan["index"])
+        if recovered_best and (
+            selected is None
+            or recovered_best[1] == expected_columns
+            or abs(recovered_best[1] - expected_columns) < abs(selected[1] - expected_columns)
+        ):
+            selected = recovered_best
+        if selected is None:
+            continue
+
+        # Supplier PDFs commonly contain one full-width process table per page.
+        _, column_count, table = selected
+        table_page_count += 1
+        for row in table:
+            # pdfplumber uses None for cells covered by a vertical merge and
+            # an empty string for a genuinely blank cell. Preserve that
+            # distinction so the parser can inherit merged control fields.
+            normalized = [
+                None if cell is None else _text(cell)
+                for cell in (row or [])
+            ]
+            normalized.extend([None] * (column_count - len(normalized)))
+            matrix.append(normalized)
 
     return [{
         "name": f"PDF pages 1-{page_count}",
@@ -274,21 +519,33 @@ DOCUMENT_HEADER_LABELS = {
 }
 
 
+# 别名预先归一化；表头单元格 -> 命中的 (semantic, 别名长度) 按文本缓存，
+# _find_header 每张表要试 45 × 3 组表头，同样的单元格文本会反复出现
+_ALIAS_NORMS = [
+    (semantic, sorted({_norm(alias) for alias in aliases if _norm(alias)}, key=len, reverse=True))
+    for semantic, aliases in HEADER_ALIASES.items()
+]
+
+
+@lru_cache(maxsize=4096)
+def _header_matches(header_norm):
+    matches = []
+    if header_norm:
+        for semantic, aliases in _ALIAS_NORMS:
+            length = next((len(alias) for alias in aliases if alias in header_norm), 0)
+            if length:
+                matches.append((semantic, length))
+    return tuple(matches)
+
+
 def _column_mapping(headers):
-    mapping = {}
-    normalized = [_norm(header) for header in headers]
-    for semantic, aliases in HEADER_ALIASES.items():
-        best = None
-        for index, header in enumerate(normalized):
-            for alias in aliases:
-                alias_norm = _norm(alias)
-                if alias_norm and alias_norm in header:
-                    candidate = (len(alias_norm), index)
-                    if best is None or candidate > best:
-                        best = candidate
-        if best is not None:
-            mapping[semantic] = best[1]
-    return mapping
+    best = {}
+    for index, header in enumerate(headers):
+        for semantic, length in _header_matches(_norm(header)):
+            candidate = (length, index)
+            if semantic not in best or candidate > best[semantic]:
+                best[semantic] = candidate
+    return {semantic: best[semantic][1] for semantic in HEADER_ALIASES if semantic in best}
 
 
 def _find_header(matrix):
@@ -354,6 +611,15 @@ def _sheet_score(sheet):
     return score, header
 
 
+def _rank_sheets(sheets):
+    ranked = []
+    for sheet in sheets:
+        score, header = _sheet_score(sheet)
+        ranked.append((score, sheet, header))
+    _, sheet, header = max(ranked, key=lambda item: item[0])
+    return sheet, header
+
+
 def _extract_metadata(matrix, extra_text=""):
     cells = []
     seen = set()
@@ -670,7 +936,7 @@ def _parse_process_record(matrix, header, sheet_name):
     return steps
 
 
-def _ai_map_matrix(matrix, logger=None):
+def _ai_map_matrix(matrix, logger=None, priority="interactive"):
     rows = []
     for row_number, row in enumerate(matrix[:40], start=1):
         cells = [_text(cell)[:160] for cell in row[:20]]
@@ -699,7 +965,7 @@ approval, contact, revision, or other document metadata rows as the header.
 Spreadsheet rows:
 {json.dumps(rows, ensure_ascii=False)}
 """
-    raw = _call_ollama(prompt, timeout=90, num_predict=600, logger=logger)
+    raw = _call_ollama(prompt, timeout=90, num_predict=600, logger=logger, priority=priority)
     parsed = _parse_json(raw)
     if not isinstance(parsed, dict) or not isinstance(parsed.get("columns"), dict):
         return None
@@ -822,7 +1088,10 @@ def assess_quality(data):
     return max(0, score), issues
 
 
-def extract_control_plan(file_path, force_ai=False, logger=None):
+def extract_control_plan(file_path, force_ai=False, logger=None, priority="interactive",
+                         progress=None):
+    """progress(stage) 在进入 EXTRACTION_STAGES 中各阶段时回调（后台提取用来汇报进度）"""
+    report = progress or (lambda stage: None)
     extension = os.path.splitext(file_path)[1].lower().lstrip(".")
     base = {
         "parser_version": PARSER_VERSION,
@@ -845,12 +1114,13 @@ def extract_control_plan(file_path, force_ai=False, logger=None):
         return base
 
     is_pdf = extension in SUPPORTED_PDFS
+    report("reading")
     if is_pdf:
         sheets = _read_pdf(file_path)
-    elif extension == "xls":
-        sheets = _read_xls(file_path)
     else:
-        sheets = _read_xlsx(file_path)
+        best_sheet = _best_xls_sheet if extension == "xls" else _best_xlsx_sheet
+        selected_sheet, header = best_sheet(file_path, progress=report)
+        sheets = [selected_sheet] if selected_sheet else []
     if not sheets:
         raise ValueError("附件中没有可读取的控制计划内容")
 
@@ -870,14 +1140,14 @@ def extract_control_plan(file_path, force_ai=False, logger=None):
         base.update({"quality_score": score, "quality_issues": issues})
         return base
 
-    ranked = []
-    for sheet in sheets:
-        score, header = _sheet_score(sheet)
-        ranked.append((score, sheet, header))
-    _, selected_sheet, header = max(ranked, key=lambda item: item[0])
+    if is_pdf:
+        report("header_detection")
+        selected_sheet, header = _rank_sheets(sheets)
     matrix = selected_sheet["matrix"]
     ai_used = False
 
+    report("parsing")
+
     if header["kind"] == "aiag" and header["score"] >= 10:
         steps = _parse_aiag(
             matrix, header, selected_sheet["name"],
@@ -898,7 +1168,8 @@ def extract_control_plan(file_path, force_ai=False, logger=None):
     # A clear ruled PDF table is more reliable than asking a text-only model to
     # guess its columns again. AI mapping remains the fallback for weak tables.
     if (force_ai and not is_pdf) or not steps:
-        ai_header = _ai_map_matrix(matrix, logger=logger)
+        report("ai_mapping")
+        ai_header = _ai_map_matrix(matrix, logger=logger, priority=priority)
         if ai_header:
             ai_header = _align_ai_header(ai_header, header)
             if ai_header["kind"] == "process_record":
@@ -934,7 +1205,1077 @@ def extract_control_plan(file_path, force_ai=False, logger=None):
         ),
         "steps": steps,
     }
+    report("quality_scoring")
     quality_score, quality_issues = assess_quality(data)
     data["quality_score"] = quality_score
     data["quality_issues"] = quality_issues
     return data
+
+
+# ──────────────────────────────────────────────────────────
+# 提取结果缓存
+# ──────────────────────────────────────────────────────────
+
+def _cacheable(data, force_ai):
+    """需要 AI 却没用上（Ollama 不可用 / 映射被拒）的结果不缓存，下次仍会重试
+
+    "unsupported" 是按扩展名判定的，同样的字节换个正确扩展名再上传要重新提取，也不缓存。
+    """
+    template = data.get("source_template") or ""
+    if template == "unsupported":
+        return False
+    if data.get("ai_model") or template == "pdf_no_table":
+        return True
+    wanted_ai = (force_ai and not template.startswith("pdf")) or not data.get("steps")
+    return not wanted_ai
+
+
+def extract_control_plan_cached(file_path, file_sha256=None, force_ai=False, logger=None,
+                                priority="interactive", progress=None):
+    """按 (file_sha256, PARSER_VERSION, force_ai) 复用 extract_control_plan 的结果
+
+    同一文件再次上传到别的零件 / 版本或重新分析时直接返回缓存；
+    PARSER_VERSION 升级后旧结果自然不再命中，写入新结果时顺手清掉。
+    用过 AI 的结果还要求 ai_model 与当前 OLLAMA_MODEL 一致，换模型后重新提取并覆盖。
+    缓存行只加入当前会话，由调用方提交。
+    """
+    file_sha256 = file_sha256 or sha256_file(file_path)
+    cached = ControlPlanExtraction.query.filter_by(
+        file_sha256=file_sha256, parser_version=PARSER_VERSION, force_ai=bool(force_ai)
+    ).first()
+    if cached and cached.ai_model not in (None, OLLAMA_MODEL):
+        cached = None
+    if cached:
+        cached.hit_count = (cached.hit_count or 0) + 1
+        cached.last_used_at = datetime.utcnow()
+        if logger:
+            logger.info(f"[CP] extraction cache hit {file_sha256[:12]} ({PARSER_VERSION})")
+        return json.loads(cached.result_json)
+
+    data = extract_control_plan(
+        file_path, force_ai=force_ai, logger=logger, priority=priority, progress=progress
+    )
+    if not _cacheable(data, force_ai):
+        return data
+    # 旧解析器版本的结果，以及同键下旧模型的 AI 结果
+    ControlPlanExtraction.query.filter(
+        ControlPlanExtraction.file_sha256 == file_sha256,
+        or_(ControlPlanExtraction.parser_version != PARSER_VERSION,
+            ControlPlanExtraction.force_ai == bool(force_ai)),
+    ).delete(synchronize_session=False)
+    try:
+        with db.session.begin_nested():
+            db.session.add(ControlPlanExtraction(
+                file_sha256=file_sha256,
+                parser_version=PARSER_VERSION,
+                force_ai=bool(force_ai),
+                ai_model=data.get("ai_model"),
+                result_json=json.dumps(data, ensure_ascii=False),
+            ))
+    except IntegrityError:
+        # 同一文件被并发提取，另一请求已写入
+        pass
+    return data
+
+
+# ──────────────────────────────────────────────────────────
+# 后台提取：上传请求立即返回，版本上记录当前阶段供页面轮询
+# ──────────────────────────────────────────────────────────
+
+def apply_extraction(cp, version, file_path, force_ai=False, logger=None, progress=None,
+                     priority="background"):
+    """提取并写回版本 / CP 的结构化字段；失败时记录错误并返回 None。由调用方提交"""
+    version.extract_status = "processing"
+    version.extraction_error = None
+    db.session.flush()
+    try:
+        data = extract_control_plan_cached(
+            file_path, file_sha256=version.file_sha256, force_ai=force_ai,
+            logger=logger, priority=priority, progress=progress,
+        )
+        store_draft(version, data)
+        version.source_sheet = data.get("source_sheet")
+        version.source_template = data.get("source_template")
+        version.parser_version = data.get("parser_version") or PARSER_VERSION
+        version.ai_model = data.get("ai_model")
+        version.confidence = data.get("confidence")
+        version.extract_status = "review"
+        version.extract_stage = "done"
+        version.status = "review"
+        cp.structure_status = "review"
+        cp.quality_score = version.quality_score
+        cp.source_template = version.source_template
+        return data
+    except Exception as exc:
+        if logger:
+            logger.exception("[CP] extraction failed for %s", file_path)
+        version.extract_status = "failed"
+        version.status = "review"
+        version.extraction_error = str(exc)
+        cp.structure_status = "failed"
+        return None
+
+
+def run_version_extraction(version_id, force_ai=False, logger=None, priority="background"):
+    """后台线程（或 CP_EXTRACT_SYNC 时在请求内）执行一个版本的提取
+
+    后台队列走 background 通道，不占用页面上交互式 AI 调用的优先级。
+    """
+    version = db.session.get(ControlPlanVersion, version_id)
+    if not version:
+        return None
+    cp = db.session.get(ControlPlan, version.cp_id)
+    file_path = os.path.join(
+        current_app.config["UPLOAD_DIR"], (version.rel_path or "").replace("/", os.sep)
+    )
+
+    def progress(stage):
+        version.extract_stage = stage
+        db.session.commit()
+
+    try:
+        data = apply_extraction(
+            cp, version, file_path, force_ai=force_ai, logger=logger, progress=progress,
+            priority=priority,
+        )
+        if data is not None:
+            # 顺带算好与当前发布版的差异，审核页打开即可看到变更
+            version_diff(diff_base_version(cp, version), version)
+        db.session.commit()
+        return data
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class _ExtractionWorker:
+    """单线程提取队列：大 PDF / AI 映射逐个处理，不与页面请求争抢
+
+    队列只在内存里：进程重启后停在 queued / processing 的版本由 recover_extractions 重新排队。
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._active = {}            # version_id -> 队列里（含正在处理）的次数
+        self._recovered = False
+
+    def submit(self, app, version_id, force_ai=False):
+        with self._lock:
+            self._active[version_id] = self._active.get(version_id, 0) + 1
+        self._queue.put((app, version_id, force_ai))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="cp-extraction", daemon=True
+                )
+                self._thread.start()
+
+    def is_active(self, version_id):
+        with self._lock:
+            return version_id in self._active
+
+    def claim_recovery(self):
+        """每个进程只做一次重启恢复"""
+        with self._lock:
+            first, self._recovered = not self._recovered, True
+            return first
+
+    def _run(self):
+        while True:
+            app, version_id, force_ai = self._queue.get()
+            try:
+                with app.app_context():
+                    run_version_extraction(
+                        version_id, force_ai=force_ai, logger=app.logger, priority="background"
+                    )
+            except Exception:
+                app.logger.exception("[CP] background extraction crashed for version %s", version_id)
+            finally:
+                with self._lock:
+                    remaining = self._active.pop(version_id, 1) - 1
+                    if remaining:
+                        self._active[version_id] = remaining
+                self._queue.task_done()
+
+
+_worker = _ExtractionWorker()
+
+
+def extraction_stalled(version):
+    """状态停在 queued / processing，但本进程队列里没有它（重启或崩溃丢了），可以重新提交"""
+    return (
+        version.extract_status in ("queued", "processing")
+        and not _worker.is_active(version.id)
+    )
+
+
+def recover_extractions(app, exclude=None):
+    """把停在 queued / processing、队列里又没有的版本重新排队；返回重新排队的版本 id"""
+    _worker.claim_recovery()
+    with app.app_context():
+        stuck = db.session.execute(
+            select(ControlPlanVersion.id)
+            .where(ControlPlanVersion.extract_status.in_(("queued", "processing")))
+            .order_by(ControlPlanVersion.id)
+        ).scalars().all()
+    requeued = [
+        version_id for version_id in stuck
+        if version_id != exclude and not _worker.is_active(version_id)
+    ]
+    for version_id in requeued:
+        _worker.submit(app, version_id)
+    if requeued:
+        app.logger.info("[CP] re-queued %d interrupted extraction(s)", len(requeued))
+    return requeued
+
+
+def queue_extraction(app, version_id, force_ai=False):
+    """版本需已提交（extract_status='queued'）；CP_EXTRACT_SYNC=True 时直接在当前线程执行"""
+    if app.config.get("CP_EXTRACT_SYNC"):
+        # 同步模式在请求内执行，用户正等着结果
+        return run_version_extraction(
+            version_id, force_ai=force_ai, logger=app.logger, priority="interactive"
+        )
+    if _worker.claim_recovery():
+        recover_extractions(app, exclude=version_id)
+    _worker.submit(app, version_id, force_ai)
+    return None
+
+
+def extraction_progress(version):
+    """轮询接口的返回内容"""
+    status = version.extract_status
+    if status in ("queued", "processing"):
+        stage = version.extract_stage or "queued"
+    elif status == "failed":
+        stage = version.extract_stage or "reading"
+    else:
+        stage = "done"
+    percent, label = EXTRACTION_STAGES.get(stage, (0, stage))
+    step_count, characteristic_count = (
+        draft_counts(version) if status not in ("queued", "processing") else (0, 0)
+    )
+    return {
+        "version_id": version.id,
+        "extract_status": status,
+        "stage": stage,
+        "stage_label": label,
+        "progress": percent,
+        "done": status not in ("queued", "processing"),
+        "stalled": extraction_stalled(version),
+        "error": version.extraction_error,
+        "quality_score": version.quality_score,
+        "step_count": step_count,
+        "characteristic_count": characteristic_count,
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# 版本草稿（规范化存储）
+# ──────────────────────────────────────────────────────────
+# 草稿按行存在 control_plan_draft_steps / control_plan_draft_characteristics；
+# 审核保存只改动对应行，页面只查要显示的部分。整份 dict（load_draft）是导出格式。
+
+DRAFT_STEP_FIELDS = (
+    "seq", "process_code", "process_name", "machine", "is_key_process", "notes",
+    "source_sheet", "source_row",
+)
+DRAFT_CHAR_FIELDS = (
+    "char_code", "char_name", "char_type", "special_class", "spec_value", "spec_unit",
+    "tolerance", "measurement_method", "sample_size", "frequency", "inspector",
+    "control_method", "reaction_plan", "is_key_char", "source_sheet", "source_row",
+    "confidence",
+)
+
+
+def _json_field(value, default):
+    try:
+        parsed = json.loads(value) if value else default
+    except (TypeError, ValueError):
+        return default
+    return parsed if parsed is not None else default
+
+
+def _draft_step_row(step):
+    row = {field: step.get(field) for field in DRAFT_STEP_FIELDS}
+    row["process_name"] = step.get("process_name") or "Unspecified process"
+    row["is_key_process"] = bool(step.get("is_key_process"))
+    return row
+
+
+def _draft_char_row(item):
+    row = {field: item.get(field) for field in DRAFT_CHAR_FIELDS}
+    row["char_name"] = item.get("char_name") or "Control characteristic"
+    row["char_type"] = item.get("char_type") or "product"
+    row["is_key_char"] = bool(item.get("is_key_char"))
+    return row
+
+
+def store_draft(version, data):
+    """用一份结构化 dict 整体替换版本草稿，并写入元数据 / 评分。由调用方提交
+
+    与 _replace_structure 相同的集合写法：两条 DELETE、工序批量 INSERT ... RETURNING、特性批量 INSERT。
+    """
+    if version.id is None:
+        db.session.flush()
+    ControlPlanDraftCharacteristic.query.filter_by(version_id=version.id).delete(
+        synchronize_session=False
+    )
+    ControlPlanDraftStep.query.filter_by(version_id=version.id).delete(synchronize_session=False)
+    steps = data.get("steps") or []
+    if steps:
+        step_ids = db.session.scalars(
+            insert(ControlPlanDraftStep).returning(
+                ControlPlanDraftStep.id, sort_by_parameter_order=True
+            ),
+            [
+                {"version_id": version.id, "position": position, **_draft_step_row(step)}
+                for position, step in enumerate(steps)
+            ],
+        ).all()
+        characteristics = [
+            {
+                "version_id": version.id, "draft_step_id": step_id, "position": position,
+                **_draft_char_row(item),
+            }
+            for step_id, step in zip(step_ids, steps)
+            for position, item in enumerate(step.get("characteristics") or [])
+        ]
+        if characteristics:
+            db.session.execute(insert(ControlPlanDraftCharacteristic), characteristics)
+    version.metadata_json = json.dumps(data.get("metadata") or {}, ensure_ascii=False)
+    version.quality_score = data.get("quality_score")
+    version.quality_issues = json.dumps(data.get("quality_issues") or [], ensure_ascii=False)
+    version.structured_json = None
+    version.draft_revision = (version.draft_revision or 0) + 1
+
+
+def _draft_steps_query(version):
+    table = ControlPlanDraftStep.__table__
+    return (
+        select(table.c.id, *(table.c[field] for field in DRAFT_STEP_FIELDS))
+        .where(table.c.version_id == version.id)
+        .order_by(table.c.position)
+    )
+
+
+def _draft_chars_query():
+    table = ControlPlanDraftCharacteristic.__table__
+    return (
+        select(table.c.draft_step_id, *(table.c[field] for field in DRAFT_CHAR_FIELDS))
+        .order_by(table.c.draft_step_id, table.c.position)
+    )
+
+
+def load_draft(version, with_characteristics=True):
+    """草稿的整份 dict（导出格式）；with_characteristics=False 只取工序行，用于目录 / 计数"""
+    if not version:
+        return {"metadata": {}, "steps": [], "quality_score": 0, "quality_issues": []}
+    # 一次 fetchall + zip 成 dict：上万行特性时比逐行 .mappings() 快好几倍
+    steps, by_step = [], {}
+    for row in db.session.execute(_draft_steps_query(version)).all():
+        step = dict(zip(DRAFT_STEP_FIELDS, row[1:]))
+        step["characteristics"] = by_step[row[0]] = []
+        steps.append(step)
+    if with_characteristics and steps:
+        table = ControlPlanDraftCharacteristic.__table__
+        for row in db.session.execute(
+            _draft_chars_query().where(table.c.version_id == version.id)
+        ).all():
+            by_step[row[0]].append(dict(zip(DRAFT_CHAR_FIELDS, row[1:])))
+    return {
+        "parser_version": version.parser_version,
+        "source_sheet": version.source_sheet,
+        "source_template": version.source_template,
+        "confidence": version.confidence,
+        "ai_model": version.ai_model,
+        "metadata": _json_field(version.metadata_json, {}),
+        "steps": steps,
+        "quality_score": version.quality_score or 0,
+        "quality_issues": _json_field(version.quality_issues, []),
+    }
+
+
+def draft_step(version, position):
+    """审核页当前这一道工序（含特性）"""
+    table = ControlPlanDraftStep.__table__
+    row = db.session.execute(
+        _draft_steps_query(version).where(table.c.position == position)
+    ).first()
+    if row is None:
+        return None
+    step = dict(zip(DRAFT_STEP_FIELDS, row[1:]))
+    chars = ControlPlanDraftCharacteristic.__table__
+    step["characteristics"] = [
+        dict(zip(DRAFT_CHAR_FIELDS, item[1:]))
+        for item in db.session.execute(
+            _draft_chars_query().where(chars.c.draft_step_id == row[0])
+        ).all()
+    ]
+    return step
+
+
+# assess_quality 只看这些特性字段
+QUALITY_CHAR_FIELDS = (
+    "spec_value", "measurement_method", "sample_size", "frequency",
+    "control_method", "reaction_plan", "is_key_char",
+)
+
+
+def draft_quality(version):
+    """按草稿行重新评分：只取 assess_quality 用到的列，返回 (score, issues)"""
+    steps_table = ControlPlanDraftStep.__table__
+    chars_table = ControlPlanDraftCharacteristic.__table__
+    by_step = {
+        step_id: []
+        for step_id in db.session.scalars(
+            select(steps_table.c.id).where(steps_table.c.version_id == version.id)
+        )
+    }
+    for row in db.session.execute(
+        select(chars_table.c.draft_step_id, *(chars_table.c[f] for f in QUALITY_CHAR_FIELDS))
+        .where(chars_table.c.version_id == version.id)
+    ).all():
+        by_step[row[0]].append(dict(zip(QUALITY_CHAR_FIELDS, row[1:])))
+    return assess_quality({
+        "steps": [{"characteristics": items} for items in by_step.values()]
+    })
+
+
+def draft_counts(version):
+    """(工序数, 特性数)"""
+    if not version:
+        return 0, 0
+    step_count = db.session.scalar(
+        select(func.count(ControlPlanDraftStep.id)).where(ControlPlanDraftStep.version_id == version.id)
+    )
+    char_count = db.session.scalar(
+        select(func.count(ControlPlanDraftCharacteristic.id))
+        .where(ControlPlanDraftCharacteristic.version_id == version.id)
+    )
+    return step_count or 0, char_count or 0
+
+
+# ──────────────────────────────────────────────────────────
+# 跨控制计划特性检索
+# ──────────────────────────────────────────────────────────
+
+FTS_MIN_TERM = 3    # trigram 分词：少于 3 个字符的词无法走全文索引，改用 LIKE
+
+
+def _search_terms(query_text):
+    return [term for term in re.split(r"\s+", (query_text or "").strip()) if term]
+
+
+def characteristic_search(query_text="", special_class=None, key_only=False,
+                          supplier_id=None, process_type=None):
+    """已发布控制计划中的特性：全文 + 结构化条件；返回未排序分页的 Select
+
+    每个词都要命中（AND），在特性名 / 规格 / 测量方法 / 控制方法 / 频次 / 反应计划中任意一列即可。
+    """
+    stmt = (
+        select(ControlCharacteristic, ProcessStep, ControlPlan, Supplier, Part)
+        .join(ProcessStep, ControlCharacteristic.step_id == ProcessStep.id)
+        .join(ControlPlan, ProcessStep.cp_id == ControlPlan.id)
+        .join(Supplier, ControlPlan.supplier_id == Supplier.id)
+        .join(Part, ControlPlan.part_id == Part.id)
+        .where(ControlPlan.status != "obsolete", ControlPlan.published_version_id.isnot(None))
+    )
+    long_terms = []
+    for term in _search_terms(query_text):
+        if len(term) >= FTS_MIN_TERM:
+            long_terms.append('"' + term.replace('"', '""') + '"')
+        else:
+            # 用户输入里的 % / _ 按字面匹配
+            like = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            stmt = stmt.where(or_(*(
+                getattr(ControlCharacteristic, column).ilike(like, escape="\\")
+                for column in CHARACTERISTIC_FTS_COLUMNS
+            )))
+    if long_terms:
+        stmt = stmt.where(sql_text(
+            f"control_characteristics.id IN (SELECT rowid FROM {CHARACTERISTIC_FTS_TABLE} "
+            f"WHERE {CHARACTERISTIC_FTS_TABLE} MATCH :fts_match)"
+        ).bindparams(fts_match=" AND ".join(long_terms)))
+    if special_class:
+        stmt = stmt.where(func.lower(ControlCharacteristic.special_class) == special_class.strip().lower())
+    if key_only:
+        stmt = stmt.where(ControlCharacteristic.is_key_char.is_(True))
+    if supplier_id:
+        stmt = stmt.where(ControlPlan.supplier_id == supplier_id)
+    if process_type:
+        stmt = stmt.where(ControlPlan.process_type == process_type)
+    return stmt
+
+
+def search_characteristics(query_text="", special_class=None, key_only=False,
+                           supplier_id=None, process_type=None, limit=50, offset=0):
+    """返回 (总数, [dict])，按供应商 / 零件 / 工序顺序排列"""
+    stmt = characteristic_search(query_text, special_class, key_only, supplier_id, process_type)
+    # 只数 id，不把五个实体的列全部物化
+    total = db.session.scalar(stmt.with_only_columns(func.count(ControlCharacteristic.id)))
+    rows = db.session.execute(
+        stmt.order_by(Supplier.code, Part.pn, ProcessStep.seq, ControlCharacteristic.id)
+        .limit(limit).offset(offset)
+    ).all()
+    return total, [
+        {
+            "id": char.id,
+            "char_name": char.char_name,
+            "char_type": char.char_type,
+            "special_class": char.special_class,
+            "is_key_char": bool(char.is_key_char),
+            "spec_value": char.spec_value,
+            "measurement_method": char.measurement_method,
+            "sample_size": char.sample_size,
+            "frequency": char.frequency,
+            "control_method": char.control_method,
+            "reaction_plan": char.reaction_plan,
+            "process_code": step.process_code,
+            "process_name": step.process_name,
+            "cp_id": cp.id,
+            "cp_no": cp.cp_no,
+            "process_type": cp.process_type,
+            "supplier_id": supplier.id,
+            "supplier_code": supplier.code,
+            "supplier_name": supplier.name,
+            "part_id": part.id,
+            "part_pn": part.pn,
+        }
+        for char, step, cp, supplier, part in rows
+    ]
+
+
+# ──────────────────────────────────────────────────────────
+# 版本对比（结构化 diff）
+# ──────────────────────────────────────────────────────────
+
+DIFF_VERSION = "cp-diff-1.0"
+STEP_DIFF_FIELDS = ("process_code", "process_name", "machine", "is_key_process", "notes")
+CHAR_DIFF_FIELDS = (
+    "char_code", "char_name", "char_type", "special_class", "spec_value",
+    "measurement_method", "sample_size", "frequency", "inspector",
+    "control_method", "reaction_plan", "is_key_char",
+)
+STEP_NAME_SIMILARITY = 0.8
+CHAR_NAME_SIMILARITY = 0.75
+
+
+def _diff_value(item, field):
+    value = item.get(field)
+    if field.startswith("is_"):
+        return bool(value)
+    return _text(value)
+
+
+def _signature(item, fields):
+    return tuple(_diff_value(item, field) for field in fields)
+
+
+def _field_changes(old, new, fields):
+    """old / new 为 _signature 元组"""
+    return [
+        {"field": field, "old": before, "new": after}
+        for field, before, after in zip(fields, old, new)
+        if before != after
+    ]
+
+
+def _align(base, target, exact_keys, fuzzy_key, threshold):
+    """把两组条目一一对应：先按 exact_keys 依次精确匹配，剩下的按名称相似度贪心配对
+
+    返回 (pairs[(base_index, target_index)], 未匹配的 base 下标, 未匹配的 target 下标)。
+    """
+    from difflib import SequenceMatcher
+
+    free_base = set(range(len(base)))
+    free_target = list(range(len(target)))
+    pairs = []
+    for key in exact_keys:
+        if not free_base or not free_target:
+            break
+        buckets = {}
+        for index in sorted(free_base):
+            value = key(base[index])
+            if value:
+                buckets.setdefault(value, []).append(index)
+        remaining = []
+        for index in free_target:
+            candidates = buckets.get(key(target[index]) or None)
+            if candidates:
+                match = candidates.pop(0)
+                free_base.discard(match)
+                pairs.append((match, index))
+            else:
+                remaining.append(index)
+        free_target = remaining
+
+    remaining = []
+    for index in free_target:
+        name = fuzzy_key(target[index])
+        best, best_ratio = None, threshold
+        matcher = SequenceMatcher(None, "", name, autojunk=False)
+        for candidate in sorted(free_base):
+            other = fuzzy_key(base[candidate])
+            if not name or not other:
+                continue
+            matcher.set_seq1(other)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        if best is None:
+            remaining.append(index)
+        else:
+            free_base.discard(best)
+            pairs.append((best, index))
+    return pairs, sorted(free_base), remaining
+
+
+def _char_label(item):
+    return {
+        "char_code": _text(item.get("char_code")),
+        "char_name": _text(item.get("char_name")),
+        "spec_value": _text(item.get("spec_value")),
+    }
+
+
+def _diff_characteristics(base_chars, target_chars):
+    # 每个特性只取一次字段值，对齐和逐字段比较都用这份元组
+    base_rows = [(_signature(item, CHAR_DIFF_FIELDS), item) for item in base_chars]
+    target_rows = [(_signature(item, CHAR_DIFF_FIELDS), item) for item in target_chars]
+    code, name = CHAR_DIFF_FIELDS.index("char_code"), CHAR_DIFF_FIELDS.index("char_name")
+    pairs, removed, added = _align(
+        base_rows, target_rows,
+        exact_keys=(
+            lambda row: row[0],
+            lambda row: (_norm(row[0][code]), _norm(row[0][name])) if row[0][name] else None,
+            lambda row: _norm(row[0][name]),
+            lambda row: _norm(row[0][code]),
+        ),
+        fuzzy_key=lambda row: _norm(row[0][name]),
+        threshold=CHAR_NAME_SIMILARITY,
+    )
+    entries = []
+    for base_index, target_index in pairs:
+        changes = _field_changes(base_rows[base_index][0], target_rows[target_index][0], CHAR_DIFF_FIELDS)
+        if changes:
+            entries.append({
+                "status": "changed", "base_index": base_index, "target_index": target_index,
+                **_char_label(target_chars[target_index]), "changes": changes,
+            })
+    for target_index in added:
+        entries.append({
+            "status": "added", "base_index": None, "target_index": target_index,
+            **_char_label(target_chars[target_index]), "changes": [],
+        })
+    for base_index in removed:
+        entries.append({
+            "status": "removed", "base_index": base_index, "target_index": None,
+            **_char_label(base_chars[base_index]), "changes": [],
+        })
+    entries.sort(key=lambda e: (
+        e["target_index"] if e["target_index"] is not None else len(target_chars),
+        e["base_index"] if e["base_index"] is not None else -1,
+    ))
+    return entries
+
+
+def diff_structures(base_data, target_data):
+    """两个版本的草稿（load_draft 的 dict）逐工序、逐特性对比
+
+    工序按 (工序号, 工序名) → 工序号 → 工序名 → 名称相似度 对齐；特性在对齐的工序内
+    按 完全一致 → (特性编号, 名称) → 名称 → 编号 → 名称相似度 对齐。
+    只保留有变化的工序 / 特性；下标指向各自版本的 steps / characteristics 列表。
+    """
+    base_steps = (base_data or {}).get("steps") or []
+    target_steps = (target_data or {}).get("steps") or []
+    pairs, removed, added = _align(
+        base_steps, target_steps,
+        exact_keys=(
+            lambda step: (_norm(step.get("process_code")), _norm(step.get("process_name")))
+            if step.get("process_code") else None,
+            lambda step: _norm(step.get("process_code")),
+            lambda step: _norm(step.get("process_name")),
+        ),
+        fuzzy_key=lambda step: _norm(step.get("process_name")),
+        threshold=STEP_NAME_SIMILARITY,
+    )
+    summary = dict.fromkeys(
+        ("steps_added", "steps_removed", "steps_changed",
+         "chars_added", "chars_removed", "chars_changed"), 0
+    )
+
+    def step_entry(status, base_index, target_index, step, changes, characteristics):
+        return {
+            "status": status,
+            "base_index": base_index,
+            "target_index": target_index,
+            "process_code": _text(step.get("process_code")),
+            "process_name": _text(step.get("process_name")),
+            "changes": changes,
+            "characteristics": characteristics,
+        }
+
+    entries = []
+    for base_index, target_index in pairs:
+        old, new = base_steps[base_index], target_steps[target_index]
+        changes = _field_changes(
+            _signature(old, STEP_DIFF_FIELDS), _signature(new, STEP_DIFF_FIELDS), STEP_DIFF_FIELDS
+        )
+        characteristics = _diff_characteristics(
+            old.get("characteristics") or [], new.get("characteristics") or []
+        )
+        if not changes and not characteristics:
+            continue
+        summary["steps_changed"] += 1
+        for item in characteristics:
+            summary[f"chars_{item['status']}"] += 1
+        entries.append(step_entry("changed", base_index, target_index, new, changes, characteristics))
+    for target_index in added:
+        step = target_steps[target_index]
+        characteristics = _diff_characteristics([], step.get("characteristics") or [])
+        summary["steps_added"] += 1
+        summary["chars_added"] += len(characteristics)
+        entries.append(step_entry("added", None, target_index, step, [], characteristics))
+    for base_index in removed:
+        step = base_steps[base_index]
+        characteristics = _diff_characteristics(step.get("characteristics") or [], [])
+        summary["steps_removed"] += 1
+        summary["chars_removed"] += len(characteristics)
+        entries.append(step_entry("removed", base_index, None, step, [], characteristics))
+    entries.sort(key=lambda e: (
+        e["target_index"] if e["target_index"] is not None else len(target_steps),
+        e["base_index"] if e["base_index"] is not None else -1,
+    ))
+    return {"diff_version": DIFF_VERSION, "summary": summary, "steps": entries}
+
+
+def last_published_before(version):
+    """version 之前最近一次发布过的版本（当前发布版或已被替代的版本）"""
+    return (
+        ControlPlanVersion.query
+        .filter(
+            ControlPlanVersion.cp_id == version.cp_id,
+            ControlPlanVersion.version_no < version.version_no,
+            ControlPlanVersion.published_at.isnot(None),
+        )
+        .order_by(ControlPlanVersion.version_no.desc())
+        .first()
+    )
+
+
+def diff_base_version(cp, version):
+    """"自上次发布以来的变更" 的基准：未发布的版本对比当前发布版，发布版对比上一个发布版"""
+    if not version:
+        return None
+    if cp.published_version_id and cp.published_version_id != version.id:
+        return db.session.get(ControlPlanVersion, cp.published_version_id)
+    return last_published_before(version)
+
+
+def version_diff(base, target):
+    """返回 base → target 的 diff（dict）；结果按版本对存表，内容没变时直接读取
+
+    调用方负责提交（新算或重算时会 flush 一行 ControlPlanVersionDiff）。
+    """
+    if base is None or target is None or base.id == target.id:
+        return None
+    stored = ControlPlanVersionDiff.query.filter_by(
+        base_version_id=base.id, target_version_id=target.id
+    ).first()
+    if (stored and stored.diff_version == DIFF_VERSION
+            and stored.base_revision == base.draft_revision
+            and stored.target_revision == target.draft_revision):
+        diff = json.loads(stored.diff_json)
+    else:
+        diff = diff_structures(load_draft(base), load_draft(target))
+        if stored is None:
+            stored = ControlPlanVersionDiff(
+                cp_id=target.cp_id, base_version_id=base.id, target_version_id=target.id
+            )
+            db.session.add(stored)
+        stored.diff_version = DIFF_VERSION
+        stored.base_revision = base.draft_revision
+        stored.target_revision = target.draft_revision
+        stored.diff_json = json.dumps(diff, ensure_ascii=False)
+        stored.created_at = datetime.utcnow()
+        for key, value in diff["summary"].items():
+            setattr(stored, key, value)
+        db.session.flush()
+    diff.update(
+        base_version_id=base.id, base_version_no=base.version_no,
+        target_version_id=target.id, target_version_no=target.version_no,
+    )
+    return diff
+
+
+def diff_row_status(diff):
+    """CSV 导出用：{(工序下标, 特性下标): (状态, 变更字段)}，特性下标 None 表示工序本身"""
+    rows = {}
+    for step in (diff or {}).get("steps", []):
+        if step["target_index"] is None:
+            continue
+        if step["status"] == "added" or step["changes"]:
+            rows[(step["target_index"], None)] = (
+                step["status"], [change["field"] for change in step["changes"]]
+            )
+        for item in step["characteristics"]:
+            if item["target_index"] is not None:
+                rows[(step["target_index"], item["target_index"])] = (
+                    item["status"], [change["field"] for change in item["changes"]]
+                )
+    return rows
+
+
+# ──────────────────────────────────────────────────────────
+# 导出（逐行生成，CSV / XLSX 都不在内存里拼整份文件）
+# ──────────────────────────────────────────────────────────
+
+EXPORT_COLUMNS = [
+    "Process No.", "Process Name", "Equipment", "Characteristic No.",
+    "Characteristic", "Type", "Special Class", "Specification / Tolerance",
+    "Measurement Method", "Sample Size", "Frequency", "Inspector",
+    "Control Method", "Reaction Plan", "Source",
+]
+CHANGE_COLUMNS = ["Change", "Changed Fields"]
+PLAN_EXPORT_COLUMNS = [
+    "Supplier Code", "Supplier Name", "Part No.", "Control Plan No.", "Revision", "Process Type",
+] + EXPORT_COLUMNS
+EXPORT_YIELD_PER = 1000
+CSV_CHUNK_ROWS = 500
+# 导出列里特性部分的字段（Process No. / Name / Equipment 之后）
+_EXPORT_CHAR_FIELDS = (
+    "char_code", "char_name", "char_type", "special_class", "spec_value",
+    "measurement_method", "sample_size", "frequency", "inspector",
+    "control_method", "reaction_plan",
+)
+
+
+def _export_row(process_code, process_name, machine, item, source_sheet, source_row):
+    source = f"{source_sheet or ''}!{source_row or ''}" if item else "!"
+    return [process_code or "", process_name or "", machine or ""] + [
+        (item or {}).get(field) or "" for field in _EXPORT_CHAR_FIELDS
+    ] + [source]
+
+
+def iter_draft_export_rows(version, diff=None):
+    """一个版本草稿的导出行（不含表头）；diff 不为空时追加变更列，并在末尾列出被删除的行
+
+    工序 LEFT JOIN 特性一条查询，按 yield_per 分批取，不构造整份 dict。
+    """
+    steps = ControlPlanDraftStep.__table__
+    chars = ControlPlanDraftCharacteristic.__table__
+    stmt = (
+        select(
+            steps.c.position, steps.c.process_code, steps.c.process_name, steps.c.machine,
+            chars.c.position, *(chars.c[field] for field in _EXPORT_CHAR_FIELDS),
+            chars.c.source_sheet, chars.c.source_row,
+        )
+        .select_from(steps.outerjoin(chars, chars.c.draft_step_id == steps.c.id))
+        .where(steps.c.version_id == version.id)
+        .order_by(steps.c.position, chars.c.position)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    changed_rows = diff_row_status(diff)
+    for row in db.session.execute(stmt):
+        step_index, process_code, process_name, machine, char_index = row[:5]
+        item = dict(zip(_EXPORT_CHAR_FIELDS, row[5:-2])) if char_index is not None else None
+        values = _export_row(process_code, process_name, machine, item, row[-2], row[-1])
+        if diff:
+            status, fields = changed_rows.get(
+                (step_index, char_index),
+                changed_rows.get((step_index, None), ("", [])),
+            )
+            values += [status, " ".join(fields)]
+        yield values
+    for step in (diff or {}).get("steps", []):
+        removed = [item for item in step["characteristics"] if item["status"] == "removed"]
+        if step["status"] == "removed" and not removed:
+            removed = [{"char_code": "", "char_name": "", "spec_value": ""}]
+        for item in removed:
+            yield (
+                [step["process_code"], step["process_name"], "", item["char_code"],
+                 item["char_name"], "", "", item["spec_value"]]
+                + [""] * 7 + ["removed", ""]
+            )
+
+
+def published_export_query(supplier_id=None, process_type=None):
+    """全部已发布（未归档）控制计划的正式结构，每个特性一行；没有特性的工序也占一行"""
+    stmt = (
+        select(
+            Supplier.code, Supplier.name, Part.pn, ControlPlan.cp_no, ControlPlan.revision,
+            ControlPlan.process_type, ProcessStep.process_code, ProcessStep.process_name,
+            ProcessStep.machine, ControlCharacteristic.id,
+            *(getattr(ControlCharacteristic, field) for field in _EXPORT_CHAR_FIELDS),
+            ControlCharacteristic.source_sheet, ControlCharacteristic.source_row,
+        )
+        .select_from(ControlPlan)
+        .join(Supplier, ControlPlan.supplier_id == Supplier.id)
+        .join(Part, ControlPlan.part_id == Part.id)
+        .join(ProcessStep, ProcessStep.cp_id == ControlPlan.id)
+        .outerjoin(ControlCharacteristic, ControlCharacteristic.step_id == ProcessStep.id)
+        .where(ControlPlan.status != "obsolete", ControlPlan.published_version_id.isnot(None))
+        .order_by(Supplier.code, Part.pn, ControlPlan.cp_no, ProcessStep.seq, ProcessStep.id,
+                  ControlCharacteristic.id)
+    )
+    if supplier_id:
+        stmt = stmt.where(ControlPlan.supplier_id == supplier_id)
+    if process_type:
+        stmt = stmt.where(ControlPlan.process_type == process_type)
+    return stmt
+
+
+def iter_published_export_rows(supplier_id=None, process_type=None):
+    stmt = published_export_query(supplier_id, process_type).execution_options(
+        yield_per=EXPORT_YIELD_PER
+    )
+    for row in db.session.execute(stmt):
+        item = dict(zip(_EXPORT_CHAR_FIELDS, row[10:-2])) if row[9] is not None else None
+        yield [value or "" for value in row[:6]] + _export_row(
+            row[6], row[7], row[8], item, row[-2], row[-1]
+        )
+
+
+def iter_csv(header, rows, chunk_rows=CSV_CHUNK_ROWS):
+    """带 BOM 的 UTF-8 CSV，每 chunk_rows 行输出一块 bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    pending = 1
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+_SHEET_TITLE_INVALID_RE = re.compile(r"[\[\]:*?/\\]")
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '<Relationship Id="rId2" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'
+    ),
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+
+def xlsx_sheet_title(title):
+    """Excel 工作表名：不能含 []:*?/\\、不能以单引号开头 / 结尾，最长 31 字符"""
+    return _SHEET_TITLE_INVALID_RE.sub("", title or "").strip("'")[:31] or "Sheet1"
+
+
+class _ZipSink:
+    """ZipFile 的只写目标：收集压缩后的字节，由生成器分块取走（不可 seek，ZipFile 用数据描述符）"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _xlsx_row(index, values):
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    from openpyxl.utils import get_column_letter
+
+    cells = []
+    for col, value in enumerate(values, start=1):
+        if value is None or value == "":
+            continue
+        ref = f"{get_column_letter(col)}{index}"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            continue
+        # PDF / 旧 xls 里偶尔带控制字符，XML 里不合法
+        text = xml_escape(ILLEGAL_CHARACTERS_RE.sub("", str(value)))
+        cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{index}">{"".join(cells)}</row>'
+
+
+def iter_xlsx(header, rows, title="Control Plan", chunk_rows=CSV_CHUNK_ROWS):
+    """单表 XLSX 按块输出 bytes：边查边压缩边发送，首字节不必等整本工作簿写完
+
+    行用 inlineStr 直接写进 sheet1.xml，不建共享字符串表，内存不随行数增长。
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{xml_escape(xlsx_sheet_title(title), {chr(34): "&quot;"})}" '
+            'sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        yield sink.drain()
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row(1, header)
+            ).encode("utf-8"))
+            pending = []
+            for index, row in enumerate(rows, start=2):
+                pending.append(_xlsx_row(index, row))
+                if len(pending) >= chunk_rows:
+                    sheet.write("".join(pending).encode("utf-8"))
+                    pending.clear()
+                    yield sink.drain()
+            sheet.write(("".join(pending) + "</sheetData></worksheet>").encode("utf-8"))
+    yield sink.drain()
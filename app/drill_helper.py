@@ -157,7 +157,9 @@ Source label: {source_label}
 Source:
 {source_text[:6000]}
 """
-    raw = _call_ollama(prompt, timeout=150, num_predict=1600, logger=logger)
+    raw = _call_ollama(
+        prompt, timeout=150, num_predict=1600, logger=logger, priority="interactive"
+    )
     parsed = _parse_json(raw)
     if not isinstance(parsed, dict) or not isinstance(parsed.get("cards"), list):
         return []
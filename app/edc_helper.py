@@ -0,0 +1,191 @@
+"""
+EDC 报告关联 —— edc_reports.supplier_id / part_id
+放到 app/edc_helper.py
+
+PDF 里只有 Supplier code / Ditta 名称和 Drawing 字符串。同步时每批建一次查找表：
+  供应商  supplier_helper 的别名匹配器（代码优先，其次名称）
+  零件    (supplier_id, pn_key) → part_id；供应商没解析出来时只认全局唯一的 pn_key
+之后 supplier.edc_reports / part.edc_reports 都按索引外键走，不再按字符串扫描。
+
+零件新增 / 改 PN 时增量补挂尚未关联的 EDC；EDC 事后才关联上供应商（新增 / 改名 / 确认待审写法）时
+按该供应商的零件重解 part_id；历史数据用 relink_edc_reports.py 一次回填。
+"""
+from collections import Counter
+
+from sqlalchemy import bindparam, event, func, inspect, or_, select, update
+
+from .extensions import db
+from .models import EDCReport, Part, part_key
+from .part_quality_helper import mark_part_keys
+from .supplier_helper import enqueue_review, link_records, match_supplier
+
+_AMBIGUOUS = object()
+
+
+def _part_key_sql(column):
+    # parts 表没有存 part_key，数同号零件时用的近似 SQL 表达式（不含 NFKC）
+    return func.upper(func.replace(func.trim(column), " ", ""))
+
+
+# ──────────────────────────────────────────────────────────
+# 批次查找表
+# ──────────────────────────────────────────────────────────
+
+class EDCLinker:
+    """一次同步批次 / 一次回填用的零件查找表；供应商走进程内的别名匹配器"""
+
+    def __init__(self, parts):
+        self.by_supplier = {}
+        self.by_key = {}
+        for part_id, supplier_id, pn in parts:
+            key = part_key(pn)
+            if not key:
+                continue
+            self.by_supplier[(supplier_id, key)] = part_id
+            self.by_key[key] = _AMBIGUOUS if key in self.by_key else part_id
+
+    @classmethod
+    def load(cls, executor=None):
+        executor = executor if executor is not None else db.session
+        return cls(executor.execute(select(Part.id, Part.supplier_id, Part.pn)).all())
+
+    def part_id(self, supplier_id, drawing):
+        """供应商已知时只在该供应商的零件里找，未知时只认全局唯一的零件号"""
+        key = part_key(drawing)
+        if not key:
+            return None
+        if supplier_id is not None:
+            return self.by_supplier.get((supplier_id, key))
+        found = self.by_key.get(key)
+        return None if found is _AMBIGUOUS else found
+
+    def link(self, row, executor=None):
+        """给一条待插入的 EDC dict 填 supplier_id / part_id / part_key，返回供应商的 SupplierMatch"""
+        match = match_supplier(row.get("supplier_code"), row.get("supplier_name"), executor)
+        row["supplier_id"] = match.supplier_id
+        row["part_id"] = self.part_id(match.supplier_id, row.get("drawing"))
+        row["part_key"] = part_key(row.get("drawing"))
+        return match
+
+
+def link_edc_batch(batch):
+    """同步批次入库前调用；未匹配的 Ditta 名称进待确认队列，零件质量汇总记账（与记录同一事务提交）"""
+    linker = EDCLinker.load()
+    for row in batch:
+        match = linker.link(row)
+        if match.supplier_id is None and row.get("supplier_name"):
+            enqueue_review(row["supplier_name"], row.get("supplier_code"), EDCReport.__tablename__, match.suggestion)
+    mark_part_keys(db.session, [row["part_key"] for row in batch])
+    return linker
+
+
+# ──────────────────────────────────────────────────────────
+# 历史回填
+# ──────────────────────────────────────────────────────────
+
+def relink_edc_reports(executor=None, only_unlinked=True):
+    """先按别名表回填 supplier_id，再按零件查找表回填 part_id
+
+    返回 {"suppliers": link_records 的统计, "parts": {total, already, linked, relinked, unmatched: Counter}}。
+    """
+    executor = executor if executor is not None else db.session
+    supplier_stats = link_records(executor, only_unlinked=only_unlinked, models=(EDCReport,), link_parts=False)
+    linker = EDCLinker.load(executor)
+    table = EDCReport.__table__
+    stmt = select(table.c.report_no, table.c.supplier_id, table.c.drawing, table.c.part_id, table.c.part_key)
+    if only_unlinked:
+        stmt = stmt.where(table.c.part_id.is_(None))
+    stats = {"total": 0, "already": 0, "linked": 0, "relinked": 0, "unmatched": Counter()}
+    updates = []
+    for report_no, supplier_id, drawing, current, stored_key in executor.execute(stmt):
+        stats["total"] += 1
+        key = part_key(drawing)
+        part_id = linker.part_id(supplier_id, drawing)
+        if part_id is None:
+            stats["unmatched"][(drawing or "").strip() or "(blank)"] += 1
+        if part_id == current:
+            stats["already"] += current is not None
+            if key == stored_key:
+                continue
+        elif part_id is not None:
+            stats["relinked" if current else "linked"] += 1
+        updates.append({"_no": report_no, "_part_id": part_id, "_key": key})
+    if updates:
+        executor.execute(
+            update(table).where(table.c.report_no == bindparam("_no"))
+            .values(part_id=bindparam("_part_id"), part_key=bindparam("_key")),
+            updates,
+        )
+    return {"suppliers": supplier_stats[table.name], "parts": stats}
+
+
+def relink_edc_parts(report_nos, executor=None, chunk_size=500):
+    """supplier_id 刚变过的 EDC（新供应商 / 改名 / 确认待审写法）按新供应商的零件重解 part_id；返回改动条数"""
+    if not report_nos:
+        return 0
+    executor = executor if executor is not None else db.session
+    linker = EDCLinker.load(executor)
+    table = EDCReport.__table__
+    updates = []
+    for start in range(0, len(report_nos), chunk_size):
+        rows = executor.execute(
+            select(table.c.report_no, table.c.supplier_id, table.c.drawing, table.c.part_id)
+            .where(table.c.report_no.in_(report_nos[start:start + chunk_size]))
+        )
+        for report_no, supplier_id, drawing, current in rows:
+            part_id = linker.part_id(supplier_id, drawing)
+            if part_id != current:
+                updates.append({"_no": report_no, "_part_id": part_id})
+    if updates:
+        executor.execute(
+            update(table).where(table.c.report_no == bindparam("_no")).values(part_id=bindparam("_part_id")),
+            updates,
+        )
+    return len(updates)
+
+
+# ──────────────────────────────────────────────────────────
+# 零件增删改时增量维护（mapper 事件）
+# ──────────────────────────────────────────────────────────
+
+def _link_part(connection, part):
+    key = part_key(part.pn)
+    if not key:
+        return
+    table = EDCReport.__table__
+    owners = connection.execute(
+        select(func.count()).select_from(Part.__table__)
+        .where(_part_key_sql(Part.__table__.c.pn) == key)
+    ).scalar()
+    # 同号零件只有这一个时，供应商未解析的 EDC 也一并挂上
+    supplier_match = table.c.supplier_id == part.supplier_id
+    if owners <= 1:
+        supplier_match = or_(supplier_match, table.c.supplier_id.is_(None))
+    connection.execute(
+        update(table)
+        .where(table.c.part_id.is_(None), supplier_match, table.c.part_key == key)
+        .values(part_id=part.id)
+    )
+
+
+def _part_inserted(mapper, connection, target):
+    _link_part(connection, target)
+
+
+def _part_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in ("pn", "supplier_id")):
+        return
+    table = EDCReport.__table__
+    connection.execute(update(table).where(table.c.part_id == target.id).values(part_id=None))
+    _link_part(connection, target)
+
+
+def _part_deleted(mapper, connection, target):
+    table = EDCReport.__table__
+    connection.execute(update(table).where(table.c.part_id == target.id).values(part_id=None))
+
+
+event.listen(Part, "after_insert", _part_inserted)
+event.listen(Part, "after_update", _part_updated)
+event.listen(Part, "before_delete", _part_deleted)
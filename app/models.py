@@ -1,7 +1,9 @@
 from datetime import date, datetime
 import json
+import re
+import unicodedata
 from .extensions import db
-from sqlalchemy import CheckConstraint
+from sqlalchemy import DDL, CheckConstraint, event
 
 class Supplier(db.Model):
     __tablename__ = "suppliers"
@@ -15,6 +17,98 @@ class Supplier(db.Model):
 
     parts = db.relationship("Part", backref="supplier", lazy=True, cascade="all, delete-orphan")
     documents = db.relationship("Document", backref="supplier", lazy=True, cascade="all, delete-orphan")
+    aliases = db.relationship("SupplierAlias", backref="supplier", lazy=True, cascade="all, delete-orphan")
+    scorecard = db.relationship(
+        "SupplierScorecard", backref="supplier", uselist=False, lazy=True, cascade="all, delete-orphan"
+    )
+
+
+class SupplierAlias(db.Model):
+    """供应商别名：TR / 出差 / 审核里出现过的代码和名称写法 -> supplier_id
+
+    alias_key 为归一化后的写法（大小写、空格、标点、公司后缀不敏感），唯一索引，
+    写入记录时按它解析 supplier_id，见 supplier_helper。
+    """
+    __tablename__ = "supplier_aliases"
+
+    id = db.Column(db.Integer, primary_key=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id"), nullable=False, index=True)
+    alias = db.Column(db.String(255), nullable=False)        # 原始写法
+    alias_key = db.Column(db.String(255), nullable=False, unique=True, index=True)
+    source = db.Column(db.String(20), nullable=False, default="name")  # code / name / manual / review
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class SupplierMatchReview(db.Model):
+    """供应商名称待确认队列：写入时别名和模糊匹配都没能确定供应商的写法
+
+    同一 name_key 只占一行，重复出现累加 occurrences；确认后登记为别名并补挂历史记录，
+    见 supplier_helper.resolve_review。
+    """
+    __tablename__ = "supplier_match_reviews"
+
+    id = db.Column(db.Integer, primary_key=True)
+    raw_name = db.Column(db.String(255), nullable=False)      # 第一次出现时的原始写法
+    name_key = db.Column(db.String(255), nullable=False, unique=True, index=True)
+    supplier_code = db.Column(db.String(64))                  # 同时出现的供应商代码（若有）
+    source = db.Column(db.String(30), nullable=False)         # trouble_reports / business_trips / audit_reports / edc_reports
+    occurrences = db.Column(db.Integer, nullable=False, default=1)
+    suggested_supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id", ondelete="SET NULL"))
+    suggested_score = db.Column(db.Float)
+    status = db.Column(db.String(20), nullable=False, default="pending", index=True)  # pending / resolved / ignored
+    resolved_supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id", ondelete="SET NULL"))
+    first_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+
+    suggested_supplier = db.relationship("Supplier", foreign_keys=[suggested_supplier_id])
+    resolved_supplier = db.relationship("Supplier", foreign_keys=[resolved_supplier_id])
+
+
+class SupplierScorecard(db.Model):
+    """供应商计分卡：供应商列表 / 工作台表头 / 首页直接读的预计算统计
+
+    写入 TR / 审核 / 零件 / CP 时在提交前按 supplier_id 增量重算，
+    后台线程定时全量重算，见 scorecard_helper。
+    """
+    __tablename__ = "supplier_scorecard"
+
+    supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id", ondelete="CASCADE"), primary_key=True)
+
+    total_trs = db.Column(db.Integer, nullable=False, default=0)
+    open_trs = db.Column(db.Integer, nullable=False, default=0, index=True)
+    closed_trs = db.Column(db.Integer, nullable=False, default=0)
+    eight_d_pending = db.Column(db.Integer, nullable=False, default=0)
+
+    debit_total = db.Column(db.Float, nullable=False, default=0.0)   # 正向扣款合计（不分币种）
+    debit_by_currency_json = db.Column(db.Text)                      # {"EUR": 130.0, "USD": 50.0}
+
+    audit_count = db.Column(db.Integer, nullable=False, default=0)
+    open_findings = db.Column(db.Integer, nullable=False, default=0)
+
+    parts_count = db.Column(db.Integer, nullable=False, default=0)
+    cp_parts = db.Column(db.Integer, nullable=False, default=0)      # 有有效控制计划的零件数
+
+    last_activity = db.Column(db.DateTime, index=True)               # 最近一条 TR / 审核的创建时间
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def debit_by_currency(self):
+        return json.loads(self.debit_by_currency_json or "{}")
+
+    @property
+    def cp_coverage(self):
+        """CP 覆盖率（%），没有零件时为 None"""
+        if not self.parts_count:
+            return None
+        return round(100.0 * self.cp_parts / self.parts_count, 1)
+
+    @property
+    def status_color(self):
+        # red(4+) / yellow(1-3) / green(0)
+        if self.open_trs >= 4:
+            return "red"
+        return "yellow" if self.open_trs else "green"
 
 
 class Part(db.Model):
@@ -88,6 +182,8 @@ class TroubleReport(db.Model):
     tr_no = db.Column(db.String(50), nullable=False, unique=True, index=True)
     supplier_code = db.Column(db.String(50), nullable=False, index=True)
     supplier_name = db.Column(db.String(255), nullable=False)
+    # 写入时按 supplier_aliases 解析；无法匹配时为 NULL（见 backfill_supplier_links.py 报告）
+    supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id", ondelete="SET NULL"), nullable=True, index=True)
 
     part_number = db.Column(db.String(100), nullable=True, index=True)
     part_name = db.Column(db.String(255), nullable=True)
@@ -135,17 +231,72 @@ class TroubleReport(db.Model):
     # 格式建议 CASE-YYYY-NNN，例如 CASE-2026-001
     # NULL = 独立 TR，没和任何 TR 关联
 
+    # 有效日期（通知日期）：remark 末段的日期（表单 "... | dd.mm.yyyy"），没有则取 created_at
+    # 写入时由 _sync_tr_issue_date 维护，周期报表按它做范围查询
+    issue_date = db.Column(db.Date, nullable=True, index=True)
+    # 归一化零件号（part_key(part_number)），写入时由 _sync_tr_part_key 维护；零件质量汇总按它和 EDC 的 Drawing 对齐
+    part_key = db.Column(db.String(128), nullable=True, index=True)
+
     __table_args__ = (
         CheckConstraint(
             "eight_d_status IN ('NOT_REQUIRED','NOT_RECEIVED','RECEIVED_REJECT','RECEIVED_PASS')",
             name="ck_tr_8d_status"
         ),
+        # 供应商工作台：按供应商 + 时间范围聚合
+        db.Index("ix_trouble_reports_supplier_created", "supplier_id", "created_at"),
+        db.Index("ix_trouble_reports_supplier_issue_date", "supplier_id", "issue_date"),
     )
 
     def __repr__(self):
         return f"<TR {self.tr_no}>"
 
 
+REMARK_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y")
+
+
+def remark_issue_date(remark):
+    """remark 以 "|" 分段，最后一段是日期时返回该日期"""
+    remark = (remark or "").strip()
+    if not remark:
+        return None
+    raw = remark.split("|")[-1].strip()
+    for fmt in REMARK_DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def tr_issue_date(remark, created_at):
+    issue_date = remark_issue_date(remark)
+    if issue_date:
+        return issue_date
+    return created_at.date() if created_at else None
+
+
+_PN_SPACES = re.compile(r"\s+")
+
+
+def part_key(pn):
+    """零件号归一化：NFKC、去空白、大写；TR 零件号 / EDC Drawing / Part.pn 统一按它比较"""
+    return _PN_SPACES.sub("", unicodedata.normalize("NFKC", pn or "")).upper()[:128] or None
+
+
+@event.listens_for(TroubleReport, "before_insert")
+@event.listens_for(TroubleReport, "before_update")
+def _sync_tr_issue_date(mapper, connection, target):
+    if target.created_at is None:
+        target.created_at = datetime.utcnow()
+    target.issue_date = tr_issue_date(target.remark, target.created_at)
+
+
+@event.listens_for(TroubleReport, "before_insert")
+@event.listens_for(TroubleReport, "before_update")
+def _sync_tr_part_key(mapper, connection, target):
+    target.part_key = part_key(target.part_number)
+
+
 class TRDocument(db.Model):
     __tablename__ = "tr_documents"
 
@@ -191,6 +342,7 @@ class BusinessTrip(db.Model):
     supplier_code = db.Column(db.String(50), index=True)  # 供应商代码
     supplier_name = db.Column(db.String(200), nullable=False, index=True)  # 供应商名称
     supplier_location = db.Column(db.String(200))  # 供应商地址
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id', ondelete='SET NULL'), nullable=True, index=True)
 
     # 出差信息
     purpose = db.Column(db.Text, nullable=False)  # 出差目的（审核类型）
@@ -379,7 +531,7 @@ class AuditReport(db.Model):
     audit_type = db.Column(db.String(50), default='ANFIA')  # ANFIA, SQA, etc.
 
     # 供应商信息
-    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=True, index=True)
     supplier_name = db.Column(db.String(255), nullable=False, index=True)
 
     # 审核信息
@@ -737,14 +889,15 @@ class EDCReport(db.Model):
     # 4. 供应商关联信息
     supplier_code = db.Column(db.String(64), index=True)  # PDF 中的 Supplier Code
     supplier_name = db.Column(db.String(255))           # PDF 中的 Rif./Ditta 名称
-    # 逻辑关联外键
-    supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id"), nullable=True)
+    # 逻辑关联外键（同步时按供应商别名解析，见 edc_helper）
+    supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id"), nullable=True, index=True)
 
     # 5. 零部件/图纸信息
     drawing = db.Column(db.String(128), index=True)      # PDF 中的 Drawing
+    part_key = db.Column(db.String(128), index=True)     # part_key(drawing)，写入时维护
     part_name = db.Column(db.String(255))               # PDF 中的 Description
-    # 逻辑关联外键
-    part_id = db.Column(db.Integer, db.ForeignKey("parts.id"), nullable=True)
+    # 逻辑关联外键（同步时按 (supplier_id, PN) 解析，见 edc_helper）
+    part_id = db.Column(db.Integer, db.ForeignKey("parts.id"), nullable=True, index=True)
 
     # 6. 质量数据
     rejected_parts = db.Column(db.Integer, default=0)
@@ -775,6 +928,49 @@ class EDCReport(db.Model):
         return "orange"
 
 
+@event.listens_for(EDCReport, "before_insert")
+@event.listens_for(EDCReport, "before_update")
+def _sync_edc_part_key(mapper, connection, target):
+    # 同步用 bulk_insert_mappings 时由 edc_helper.EDCLinker 预先填好
+    target.part_key = part_key(target.drawing)
+
+
+class PartQualityRollup(db.Model):
+    """零件质量汇总：每个归一化零件号一行，EDC 与 TR 的累计统计
+
+    不要求零件已在 parts 表登记，EDC 档案里出现过的任何图号都有一行。
+    写入 TR / EDC 时在提交前按 part_key 增量重算，见 part_quality_helper。
+    """
+    __tablename__ = "part_quality_rollup"
+
+    part_key = db.Column(db.String(128), primary_key=True)
+    pn = db.Column(db.String(128), nullable=False)              # 显示用的原始写法
+    edc_count = db.Column(db.Integer, nullable=False, default=0)
+    rejected_parts = db.Column(db.Integer, nullable=False, default=0)
+    received_parts = db.Column(db.Integer, nullable=False, default=0)
+    tr_count = db.Column(db.Integer, nullable=False, default=0)
+    open_trs = db.Column(db.Integer, nullable=False, default=0)
+    open_8d = db.Column(db.Integer, nullable=False, default=0)   # 8D 未收到 / 被退回
+    last_edc_date = db.Column(db.Date)
+    last_tr_date = db.Column(db.Date)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def ppm(self):
+        """EDC 不合格率（ppm）；没有来料数时为 None"""
+        if not self.received_parts:
+            return None
+        return round((self.rejected_parts or 0) * 1_000_000 / self.received_parts)
+
+    @property
+    def status_color(self):
+        if self.open_8d or self.open_trs >= 3:
+            return "red"
+        if self.open_trs or (self.ppm or 0) >= 1000:
+            return "yellow"
+        return "green"
+
+
 # ── 在 models.py 末尾追加以下内容 ──────────────────────────────────────────
 
 class NodeStandard(db.Model):
@@ -945,6 +1141,8 @@ class ControlPlanVersion(db.Model):
     revision = db.Column(db.String(20))
     status = db.Column(db.String(20), default='review', nullable=False, index=True)
     extract_status = db.Column(db.String(20), default='pending', nullable=False, index=True)
+    # pending / queued / processing / review / failed / complete
+    extract_stage = db.Column(db.String(30))   # 后台提取当前阶段，见 EXTRACTION_STAGES
 
     original_name = db.Column(db.String(255), nullable=False)
     stored_name = db.Column(db.String(255), nullable=False)
@@ -961,7 +1159,9 @@ class ControlPlanVersion(db.Model):
     quality_score = db.Column(db.Integer)
     quality_issues = db.Column(db.Text)
     metadata_json = db.Column(db.Text)
+    # 旧的整份草稿 JSON；草稿现存于 control_plan_draft_steps / _characteristics，此列不再读写
     structured_json = db.Column(db.Text)
+    draft_revision = db.Column(db.Integer, default=0, nullable=False)   # 草稿每次写入 +1
     extraction_error = db.Column(db.Text)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -971,10 +1171,136 @@ class ControlPlanVersion(db.Model):
         db.UniqueConstraint('cp_id', 'version_no', name='uq_cp_version_no'),
     )
 
+    draft_steps = db.relationship(
+        'ControlPlanDraftStep', backref='version',
+        lazy='dynamic', cascade='all, delete-orphan',
+        order_by='ControlPlanDraftStep.position'
+    )
+
     def __repr__(self):
         return f'<ControlPlanVersion {self.cp_id} v{self.version_no}>'
 
 
+class ControlPlanDraftStep(db.Model):
+    """版本草稿的工序行：审核编辑只改对应行，发布时复制到 process_steps"""
+    __tablename__ = 'control_plan_draft_steps'
+    __table_args__ = (
+        db.UniqueConstraint('version_id', 'position', name='uq_cp_draft_step_position'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    version_id = db.Column(
+        db.Integer, db.ForeignKey('control_plan_versions.id'), nullable=False, index=True
+    )
+    position = db.Column(db.Integer, nullable=False)    # 草稿内顺序（0 起），审核页按它翻页
+    seq = db.Column(db.Integer)
+    process_code = db.Column(db.String(50))
+    process_name = db.Column(db.String(255), nullable=False)
+    machine = db.Column(db.Text)
+    is_key_process = db.Column(db.Boolean, default=False)
+    notes = db.Column(db.Text)
+    source_sheet = db.Column(db.String(255))
+    source_row = db.Column(db.Integer)
+
+    characteristics = db.relationship(
+        'ControlPlanDraftCharacteristic', backref='step',
+        lazy='dynamic', cascade='all, delete-orphan',
+        order_by='ControlPlanDraftCharacteristic.position'
+    )
+
+    def __repr__(self):
+        return f'<ControlPlanDraftStep v{self.version_id} #{self.position}: {self.process_name}>'
+
+
+class ControlPlanDraftCharacteristic(db.Model):
+    """版本草稿的控制特性行，字段与 ControlCharacteristic 一致"""
+    __tablename__ = 'control_plan_draft_characteristics'
+
+    id = db.Column(db.Integer, primary_key=True)
+    draft_step_id = db.Column(
+        db.Integer, db.ForeignKey('control_plan_draft_steps.id'), nullable=False, index=True
+    )
+    version_id = db.Column(
+        db.Integer, db.ForeignKey('control_plan_versions.id'), nullable=False, index=True
+    )
+    position = db.Column(db.Integer, nullable=False)
+    char_name = db.Column(db.String(255), nullable=False)
+    char_type = db.Column(db.String(20), default='product')
+    char_code = db.Column(db.String(50))
+    special_class = db.Column(db.String(50))
+    spec_value = db.Column(db.Text)
+    spec_unit = db.Column(db.String(30))
+    tolerance = db.Column(db.String(50))
+    measurement_method = db.Column(db.Text)
+    control_method = db.Column(db.Text)
+    sample_size = db.Column(db.String(50))
+    frequency = db.Column(db.String(50))
+    inspector = db.Column(db.String(100))
+    reaction_plan = db.Column(db.Text)
+    is_key_char = db.Column(db.Boolean, default=False)
+    source_sheet = db.Column(db.String(255))
+    source_row = db.Column(db.Integer)
+    confidence = db.Column(db.Float)
+
+    def __repr__(self):
+        return f'<ControlPlanDraftCharacteristic {self.char_name}>'
+
+
+class ControlPlanExtraction(db.Model):
+    """提取结果缓存：同一文件 + 同一解析器版本 + 是否强制 AI，结果可直接复用"""
+    __tablename__ = 'control_plan_extractions'
+    __table_args__ = (
+        db.UniqueConstraint(
+            'file_sha256', 'parser_version', 'force_ai', name='uq_cp_extraction_key'
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_sha256 = db.Column(db.String(64), nullable=False, index=True)
+    parser_version = db.Column(db.String(30), nullable=False, index=True)
+    force_ai = db.Column(db.Boolean, default=False, nullable=False)
+    ai_model = db.Column(db.String(100))
+    result_json = db.Column(db.Text, nullable=False)
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ControlPlanExtraction {self.file_sha256[:12]} {self.parser_version}>'
+
+
+class ControlPlanVersionDiff(db.Model):
+    """版本对比结果：每对 (基准版本, 目标版本) 一行；任一版本的 draft_revision 变了就重算"""
+    __tablename__ = 'control_plan_version_diffs'
+    __table_args__ = (
+        db.UniqueConstraint('base_version_id', 'target_version_id', name='uq_cp_version_diff_pair'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cp_id = db.Column(db.Integer, db.ForeignKey('control_plans.id'), nullable=False, index=True)
+    base_version_id = db.Column(
+        db.Integer, db.ForeignKey('control_plan_versions.id'), nullable=False, index=True
+    )
+    target_version_id = db.Column(
+        db.Integer, db.ForeignKey('control_plan_versions.id'), nullable=False, index=True
+    )
+    diff_version = db.Column(db.String(30), nullable=False)
+    base_revision = db.Column(db.Integer, nullable=False)
+    target_revision = db.Column(db.Integer, nullable=False)
+
+    steps_added = db.Column(db.Integer, default=0, nullable=False)
+    steps_removed = db.Column(db.Integer, default=0, nullable=False)
+    steps_changed = db.Column(db.Integer, default=0, nullable=False)
+    chars_added = db.Column(db.Integer, default=0, nullable=False)
+    chars_removed = db.Column(db.Integer, default=0, nullable=False)
+    chars_changed = db.Column(db.Integer, default=0, nullable=False)
+    diff_json = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ControlPlanVersionDiff {self.base_version_id}->{self.target_version_id}>'
+
+
 class ProcessStep(db.Model):
     """
     工序步骤表
@@ -1022,7 +1348,7 @@ class ControlCharacteristic(db.Model):
     char_name      = db.Column(db.String(255), nullable=False)  # 特性名称：模具温度
     char_type      = db.Column(db.String(20), default='product')
     char_code      = db.Column(db.String(50))
-    special_class  = db.Column(db.String(50))
+    special_class  = db.Column(db.String(50), index=True)
     spec_value     = db.Column(db.Text)         # 规格值（数值或文本）：220
     spec_unit      = db.Column(db.String(30))   # 单位：°C / MPa / mm / s
     tolerance      = db.Column(db.String(50))   # 公差：±10 / +0.05/-0.02
@@ -1032,7 +1358,7 @@ class ControlCharacteristic(db.Model):
     frequency      = db.Column(db.String(50))   # 检验频次：每批次 / 每小时 / 连续
     inspector      = db.Column(db.String(100))
     reaction_plan  = db.Column(db.Text)         # 超差反应计划
-    is_key_char    = db.Column(db.Boolean, default=False)  # 关键特性 KCC flag
+    is_key_char    = db.Column(db.Boolean, default=False, index=True)  # 关键特性 KCC flag
     source_sheet   = db.Column(db.String(255))
     source_row     = db.Column(db.Integer)
     confidence     = db.Column(db.Float)
@@ -1051,6 +1377,81 @@ class ControlCharacteristic(db.Model):
             parts.append(self.tolerance)
         return ' '.join(parts)
 
+
+# 跨控制计划的特性全文索引（SQLite FTS5 外部内容表，trigram 分词支持中文子串）
+# 由触发器与 control_characteristics 同步；create_all 时一并创建，迁移见 f3c8a1d47b26
+CHARACTERISTIC_FTS_TABLE = 'control_characteristics_fts'
+CHARACTERISTIC_FTS_COLUMNS = (
+    'char_name', 'spec_value', 'measurement_method',
+    'control_method', 'frequency', 'reaction_plan',
+)
+
+
+def characteristic_fts_ddl():
+    cols = ', '.join(CHARACTERISTIC_FTS_COLUMNS)
+    new_cols = ', '.join(f'new.{c}' for c in CHARACTERISTIC_FTS_COLUMNS)
+    old_cols = ', '.join(f'old.{c}' for c in CHARACTERISTIC_FTS_COLUMNS)
+    fts = CHARACTERISTIC_FTS_TABLE
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='control_characteristics', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS control_characteristics_ai AFTER INSERT ON control_characteristics "
+        f"BEGIN INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS control_characteristics_ad AFTER DELETE ON control_characteristics "
+        f"BEGIN INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS control_characteristics_au AFTER UPDATE ON control_characteristics "
+        f"BEGIN INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+for _statement in characteristic_fts_ddl():
+    event.listen(
+        ControlCharacteristic.__table__, 'after_create',
+        DDL(_statement).execute_if(dialect='sqlite'),
+    )
+event.listen(
+    ControlCharacteristic.__table__, 'before_drop',
+    DDL(f'DROP TABLE IF EXISTS {CHARACTERISTIC_FTS_TABLE}').execute_if(dialect='sqlite'),
+)
+
+# TR 文本检索（供应商工作台质量页）：同样是 trigram 外部内容表，迁移见 0b7e3d5a9c14
+# 更新触发器只在这些列变化时重建索引行，状态 / 时间戳等更新不碰 FTS
+TR_FTS_TABLE = 'trouble_reports_fts'
+TR_FTS_COLUMNS = (
+    'tr_no', 'part_number', 'part_name', 'issue_summary',
+    'issue_description', 'case_no', 'eight_d', 'debit_ref',
+)
+
+
+def tr_fts_ddl():
+    cols = ', '.join(TR_FTS_COLUMNS)
+    new_cols = ', '.join(f'new.{c}' for c in TR_FTS_COLUMNS)
+    old_cols = ', '.join(f'old.{c}' for c in TR_FTS_COLUMNS)
+    fts = TR_FTS_TABLE
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='trouble_reports', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS trouble_reports_ai AFTER INSERT ON trouble_reports "
+        f"BEGIN INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS trouble_reports_ad AFTER DELETE ON trouble_reports "
+        f"BEGIN INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS trouble_reports_au AFTER UPDATE OF {cols} ON trouble_reports "
+        f"BEGIN INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+for _statement in tr_fts_ddl():
+    event.listen(
+        TroubleReport.__table__, 'after_create',
+        DDL(_statement).execute_if(dialect='sqlite'),
+    )
+event.listen(
+    TroubleReport.__table__, 'before_drop',
+    DDL(f'DROP TABLE IF EXISTS {TR_FTS_TABLE}').execute_if(dialect='sqlite'),
+)
+
 # ── 追加到 app/models.py 末尾 ──────────────────────────────────────────────
 # SQE English Lab：素材、服务器端复习进度和练习记录
 
@@ -1153,3 +1554,25 @@ class DrillAttempt(db.Model):
     phrase = db.relationship(
         "DrillPhrase", backref=db.backref("attempt_history", lazy="dynamic", cascade="all, delete-orphan")
     )
+
+
+class IssueEmbedding(db.Model):
+    """相似问题检索：TR / 知识条目的文本向量（float32，已归一化）"""
+    __tablename__ = "issue_embeddings"
+    __table_args__ = (
+        db.UniqueConstraint("source_type", "source_id", name="uq_issue_embedding_source"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_type = db.Column(db.String(20), nullable=False, index=True)   # tr | knowledge
+    source_id = db.Column(db.Integer, nullable=False, index=True)
+    model = db.Column(db.String(100), nullable=False)
+    text_hash = db.Column(db.String(64), nullable=False)
+    dim = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True
+    )
+
+    def __repr__(self):
+        return f'<IssueEmbedding {self.source_type}:{self.source_id}>'
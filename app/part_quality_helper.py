@@ -0,0 +1,231 @@
+"""
+零件质量汇总 —— part_quality_rollup 的刷新与查询
+放到 app/part_quality_helper.py
+
+"零件 X 表现如何"：EDC 报告数、不合格 / 来料数（ppm）、TR 数、未关 TR、未关 8D。
+TR 的 part_number 和 EDC 的 Drawing 写入时都归一化成 part_key（带索引），
+汇总表按 part_key 一行，任何出现过的图号都能直接按主键读出，不依赖 parts 表登记。
+
+刷新方式：
+  增量  TR / EDC 写入时（mapper 事件）记下受影响的 part_key，提交前在同一事务里只重算这几个；
+        EDC 同步走 bulk_insert_mappings，由 edc_helper.link_edc_batch 调 mark_part_keys 记账
+  全量  refresh_part_quality.py（迁移之后或批量 SQL 改过数据时手工跑一次）
+"""
+from datetime import date, datetime
+
+from sqlalchemy import case, delete, event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from .extensions import db
+from .models import EDCReport, Part, PartQualityRollup, Supplier, TroubleReport, part_key
+from .scorecard_helper import CLOSED_STATUSES
+
+OPEN_8D_STATUSES = ("NOT_RECEIVED", "RECEIVED_REJECT")
+HISTORY_LIMIT = 200
+
+_DIRTY_KEY = "part_quality_dirty_keys"
+
+# 这些字段变化才会影响汇总
+TRACKED_FIELDS = {
+    TroubleReport: ("part_key", "status", "eight_d_status", "issue_date"),
+    EDCReport: ("part_key", "rejected_parts", "received_parts", "report_date"),
+}
+
+
+# ──────────────────────────────────────────────────────────
+# 计算
+# ──────────────────────────────────────────────────────────
+
+def _grouped(executor, key_col, columns, keys):
+    stmt = select(key_col, *columns).where(key_col.is_not(None)).group_by(key_col)
+    if keys is not None:
+        stmt = stmt.where(key_col.in_(keys))
+    return {row[0]: row[1:] for row in executor.execute(stmt)}
+
+
+def compute_rollups(keys=None, executor=None):
+    """{part_key: 汇总字段}，keys 为 None 时计算全部零件号"""
+    executor = executor if executor is not None else db.session
+    keys = sorted({k for k in keys if k}) if keys is not None else None
+    if keys == []:
+        return {}
+
+    edcs = _grouped(executor, EDCReport.part_key, (
+        func.max(EDCReport.drawing),
+        func.count(),
+        func.coalesce(func.sum(EDCReport.rejected_parts), 0),
+        func.coalesce(func.sum(EDCReport.received_parts), 0),
+        func.max(EDCReport.report_date),
+    ), keys)
+    closed = func.lower(func.coalesce(TroubleReport.status, "")).in_(CLOSED_STATUSES)
+    trs = _grouped(executor, TroubleReport.part_key, (
+        func.max(TroubleReport.part_number),
+        func.count(),
+        func.sum(case((closed, 0), else_=1)),
+        func.sum(case((TroubleReport.eight_d_status.in_(OPEN_8D_STATUSES), 1), else_=0)),
+        func.max(TroubleReport.issue_date),
+    ), keys)
+
+    now = datetime.utcnow()
+    rollups = {}
+    for key in sorted(set(edcs) | set(trs)):
+        drawing, edc_count, rejected, received, last_edc = edcs.get(key, (None, 0, 0, 0, None))
+        part_number, tr_count, open_trs, open_8d, last_tr = trs.get(key, (None, 0, 0, 0, None))
+        rollups[key] = {
+            "part_key": key,
+            "pn": ((drawing or part_number or key).strip() or key)[:128],
+            "edc_count": edc_count or 0,
+            "rejected_parts": rejected or 0,
+            "received_parts": received or 0,
+            "tr_count": tr_count or 0,
+            "open_trs": open_trs or 0,
+            "open_8d": open_8d or 0,
+            "last_edc_date": last_edc,
+            "last_tr_date": last_tr,
+            "refreshed_at": now,
+        }
+    return rollups
+
+
+def refresh_rollups(keys=None, executor=None):
+    """重算并整行替换；keys 为 None 时全量（顺带清掉已没有记录的零件号）。返回刷新行数"""
+    executor = executor if executor is not None else db.session
+    table = PartQualityRollup.__table__
+    rollups = compute_rollups(keys, executor)
+    stmt = delete(table)
+    if keys is not None:
+        stmt = stmt.where(table.c.part_key.in_({k for k in keys if k}))
+    executor.execute(stmt)
+    if rollups:
+        executor.execute(table.insert(), list(rollups.values()))
+    return len(rollups)
+
+
+def rollup_for(pn):
+    """按零件号读汇总；还没有行（刚迁移、尚未全量刷新）时现算一份，不写库。没有任何记录时为 None"""
+    key = part_key(pn)
+    if not key:
+        return None
+    rollup = db.session.get(PartQualityRollup, key)
+    if rollup is not None:
+        return rollup
+    data = compute_rollups([key]).get(key)
+    return PartQualityRollup(**data) if data else None
+
+
+def rollups_for_parts(parts):
+    """{part.id: PartQualityRollup}，零件列表用；一次 IN 查询"""
+    keys = {p.id: part_key(p.pn) for p in parts}
+    wanted = {k for k in keys.values() if k}
+    if not wanted:
+        return {}
+    rows = {r.part_key: r for r in PartQualityRollup.query.filter(PartQualityRollup.part_key.in_(wanted))}
+    return {part_id: rows[key] for part_id, key in keys.items() if key in rows}
+
+
+def part_history(pn, months=24, limit=HISTORY_LIMIT):
+    """零件履历页 / API 的数据：汇总、按月 ppm、按供应商拆分、最近的 EDC 和 TR"""
+    key = part_key(pn)
+    if not key:
+        return None
+    rollup = rollup_for(pn)
+    limit = min(max(limit, 1), HISTORY_LIMIT)
+
+    month = func.strftime("%Y-%m", EDCReport.report_date)
+    today = date.today()
+    first = today.year * 12 + today.month - months      # 含本月共 months 个自然月
+    since = date(first // 12, first % 12 + 1, 1)
+    monthly = [
+        {"month": m, "edc_count": n, "rejected_parts": rej or 0, "received_parts": rec or 0,
+         "ppm": round((rej or 0) * 1_000_000 / rec) if rec else None}
+        for m, n, rej, rec in db.session.execute(
+            select(month, func.count(), func.sum(EDCReport.rejected_parts), func.sum(EDCReport.received_parts))
+            .where(EDCReport.part_key == key, EDCReport.report_date >= since)
+            .group_by(month).order_by(month)
+        )
+    ]
+
+    by_supplier = [
+        {"supplier_id": sid, "supplier": code or name or "—", "edc_count": n,
+         "rejected_parts": rej or 0, "received_parts": rec or 0}
+        for sid, code, name, n, rej, rec in db.session.execute(
+            select(EDCReport.supplier_id, Supplier.code, func.max(EDCReport.supplier_name), func.count(),
+                   func.sum(EDCReport.rejected_parts), func.sum(EDCReport.received_parts))
+            .outerjoin(Supplier, Supplier.id == EDCReport.supplier_id)
+            .where(EDCReport.part_key == key)
+            .group_by(EDCReport.supplier_id, Supplier.code)
+            .order_by(func.count().desc())
+        )
+    ]
+
+    edcs = (EDCReport.query.filter(EDCReport.part_key == key)
+            .order_by(EDCReport.report_date.desc().nulls_last(), EDCReport.report_no.desc())
+            .limit(limit).all())
+    trs = (TroubleReport.query.filter(TroubleReport.part_key == key)
+           .order_by(TroubleReport.issue_date.desc().nulls_last(), TroubleReport.id.desc())
+           .limit(limit).all())
+    # 已登记的零件（可能多家供应商同号）；Part.pn 只有原始写法的索引，按常见写法 IN 查询
+    parts = [p for p in Part.query.filter(Part.pn.in_({pn.strip(), pn.strip().upper(), key}))
+             if part_key(p.pn) == key]
+    return {"part_key": key, "rollup": rollup, "monthly": monthly, "by_supplier": by_supplier,
+            "edcs": edcs, "trs": trs, "parts": parts}
+
+
+def rollup_payload(rollup):
+    if rollup is None:
+        return None
+    return {
+        "part_key": rollup.part_key, "pn": rollup.pn,
+        "edc_count": rollup.edc_count, "rejected_parts": rollup.rejected_parts,
+        "received_parts": rollup.received_parts, "ppm": rollup.ppm,
+        "tr_count": rollup.tr_count, "open_trs": rollup.open_trs, "open_8d": rollup.open_8d,
+        "last_edc_date": rollup.last_edc_date.isoformat() if rollup.last_edc_date else None,
+        "last_tr_date": rollup.last_tr_date.isoformat() if rollup.last_tr_date else None,
+        "status_color": rollup.status_color,
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# 增量刷新（mapper 事件记账，提交前统一重算）
+# ──────────────────────────────────────────────────────────
+
+def mark_part_keys(session, keys):
+    """绕过 mapper 事件的写入（EDC 批量导入）手工记账"""
+    session.info.setdefault(_DIRTY_KEY, set()).update(k for k in keys if k)
+
+
+def _mark_record(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        mark_part_keys(session, [target.part_key])
+
+
+def _mark_record_update(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS[mapper.class_]):
+        return
+    session = object_session(target)
+    if session is not None:
+        # 改了零件号时，旧零件号也要重算
+        mark_part_keys(session, [target.part_key, *state.attrs.part_key.history.deleted])
+
+
+def _refresh_before_commit(session):
+    if not (session.new or session.dirty or session.deleted or session.info.get(_DIRTY_KEY)):
+        return
+    session.flush()
+    keys = session.info.pop(_DIRTY_KEY, None)
+    if keys:
+        refresh_rollups(keys, session)
+
+
+def _discard_marks(session, previous_transaction=None):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+for _model in TRACKED_FIELDS:
+    event.listen(_model, "after_insert", _mark_record)
+    event.listen(_model, "after_update", _mark_record_update)
+    event.listen(_model, "after_delete", _mark_record)
+event.listen(Session, "before_commit", _refresh_before_commit)
+event.listen(Session, "after_soft_rollback", _discard_marks)
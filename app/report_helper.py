@@ -0,0 +1,446 @@
+"""
+供应商周期质量报告 —— 单个页面 / 批量导出共用
+放到 app/report_helper.py
+
+  collect_report_data   SQL 聚合：每类统计一条 GROUP BY supplier_id，一次取齐所选供应商
+  build_report_context  纯 Python：把一个供应商的数据整理成 supplier_ws/report.html 的上下文
+  run_batch_reports     批量：聚合一次，按供应商分发到进程池渲染，写静态 HTML（可选 PDF）
+                        + index.html / manifest.json，最后打成 zip
+
+季度评审不用再逐个供应商打开报告页：页面上的"批量报告"或
+batch_supplier_reports.py 一次生成全部。
+"""
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import case, func, select
+
+from .ai_helper import _find_soffice
+from .extensions import db
+from .models import Supplier, TroubleReport, tr_issue_date
+from .scorecard_helper import CLOSED_STATUSES
+
+NO_PART_LABEL = "No Part No. / 未填零件号"
+TOP_PARTS = 8
+MONTH_NAMES_EN = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+CURRENCY_SYMBOLS = {"EUR": "€", "USD": "$", "CNY": "¥", "VND": "₫"}
+EIGHT_D_LABELS = {
+    "NOT_REQUIRED": ("Not Required / 不要求", "Not Required"),
+    "NOT_RECEIVED": ("Not Received / 未收到", "Not Received"),
+    "RECEIVED_REJECT": ("Received, Rejected / 已收到（拒收）", "Received, Rejected"),
+    "RECEIVED_PASS": ("Received, Accepted / 已收到（通过）", "Received, Accepted"),
+}
+EIGHT_D_ORDER = ("NOT_RECEIVED", "RECEIVED_REJECT", "RECEIVED_PASS", "NOT_REQUIRED")
+BATCH_PERIODS = ("this_month", "this_quarter", "this_half", "this_year", "all", "custom")
+# 渲染进程数默认值：spawn 的子进程各自重新 import app；并行太多 LibreOffice 反而拖慢整机
+BATCH_WORKERS = 4
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+TAILWIND_CSS = Path(__file__).resolve().parent / "static" / "css" / "tailwind.css"
+
+_batch_jobs = {}
+_batch_jobs_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────────────────
+# 周期
+# ──────────────────────────────────────────────────────────
+
+def resolve_period(period, custom_start, custom_end, today=None):
+    """返回 (start_date, end_date, 双语标签, 英文标签)。"""
+    today = today or date.today()
+    if period == "this_month":
+        start = today.replace(day=1)
+        period_en = f"{MONTH_NAMES_EN[start.month - 1]} {start.year}"
+        return start, today, f"{start.year}年{start.month}月 / {period_en}", period_en
+    if period == "this_quarter":
+        q = (today.month - 1) // 3
+        start = date(today.year, q * 3 + 1, 1)
+        period_en = f"Q{q + 1} {start.year}"
+        return start, today, f"{start.year}年 Q{q + 1} / {period_en}", period_en
+    if period == "this_half":
+        if today.month <= 6:
+            return date(today.year, 1, 1), today, f"{today.year}年上半年 / H1 {today.year}", f"H1 {today.year}"
+        return date(today.year, 7, 1), today, f"{today.year}年下半年 / H2 {today.year}", f"H2 {today.year}"
+    if period == "this_year":
+        return date(today.year, 1, 1), today, f"{today.year}年 / Year {today.year}", f"Year {today.year}"
+    if period == "custom" and custom_start and custom_end:
+        try:
+            s = datetime.strptime(custom_start, "%Y-%m-%d").date()
+            e = datetime.strptime(custom_end, "%Y-%m-%d").date()
+            period_en = f"{s.strftime('%Y/%m/%d')} - {e.strftime('%Y/%m/%d')}"
+            return s, e, period_en, period_en
+        except ValueError:
+            pass
+    return None, None, "全部时间 / All Time", "All Time"
+
+
+def previous_range(period, start, end):
+    """环比区间（仅固定周期）：紧挨着本期、长度相同"""
+    if start is None or period == "custom":
+        return None
+    prev_end = start - timedelta(days=1)
+    return prev_end - timedelta(days=(end - start).days), prev_end
+
+
+def supplier_short_name(supplier):
+    """Build a concise English display name from the supplier legal name."""
+    words = re.findall(r"[A-Za-z0-9&]+", supplier.name or "")
+    ignored = {
+        "ALUMINUM", "AND", "AUTO", "AUTOPARTS", "CHONGQING", "CO", "DEVELOPMENT",
+        "EXP", "GEAR", "GROUP", "HENAN", "IMP", "LTD", "MACHINE", "MACHINERY",
+        "MAGNESIUM", "MANUFACTURE", "MANUFACTURING", "MOTORCYCLE", "PARTS", "QINGDAO",
+        "TECH", "TECHNOLOGY", "WEIHAI", "WHEEL", "ZHEJIANG",
+    }
+    meaningful = [word.upper() for word in words if word.upper() not in ignored]
+    return meaningful[0] if meaningful else ((supplier.name or supplier.code).strip().upper())
+
+
+# ──────────────────────────────────────────────────────────
+# 数据：所选供应商一次聚合
+# ──────────────────────────────────────────────────────────
+
+def _empty_data():
+    return {
+        "total": 0, "closed": 0, "eight_d_pending": 0, "prev_total": None,
+        "debit": {}, "monthly": {}, "eight_d": {}, "parts": [], "trs": [],
+    }
+
+
+def collect_report_data(supplier_ids, start=None, end=None, prev=None):
+    """{supplier_id: 报告数据}；start 为 None 时不限周期，prev 为 (start, end) 时附带上期 TR 数"""
+    ids = sorted(set(supplier_ids))
+    data = {sid: _empty_data() for sid in ids}
+    if not ids:
+        return data
+
+    tr = TroubleReport
+    sid_col = tr.supplier_id
+    scope = [sid_col.in_(ids)]
+    if start is not None:
+        scope.append(tr.issue_date.between(start, end))
+    closed = func.lower(func.coalesce(tr.status, "")).in_(CLOSED_STATUSES)
+
+    def grouped(*columns, where=(), group=()):
+        stmt = select(sid_col, *columns).where(*scope, *where).group_by(sid_col, *group)
+        return db.session.execute(stmt).all()
+
+    for sid, total, closed_count, pending in grouped(
+        func.count(tr.id),
+        func.sum(case((closed, 1), else_=0)),
+        func.sum(case((tr.eight_d_status == "NOT_RECEIVED", 1), else_=0)),
+    ):
+        data[sid].update(total=total, closed=closed_count or 0, eight_d_pending=pending or 0)
+
+    currency = func.upper(func.coalesce(tr.debit_currency, "EUR"))
+    for sid, code, amount in grouped(currency, func.sum(tr.debit_amount), where=(tr.debit_amount != 0,), group=(currency,)):
+        data[sid]["debit"][code] = amount
+
+    if prev is not None:
+        for sid in ids:
+            data[sid]["prev_total"] = 0
+        stmt = select(sid_col, func.count(tr.id)) \
+            .where(sid_col.in_(ids), tr.issue_date.between(*prev)).group_by(sid_col)
+        for sid, count in db.session.execute(stmt):
+            data[sid]["prev_total"] = count
+
+    month = func.strftime("%Y-%m", tr.issue_date)
+    for sid, key, count in grouped(month, func.count(tr.id), where=(tr.issue_date.isnot(None),), group=(month,)):
+        data[sid]["monthly"][tuple(int(x) for x in key.split("-"))] = count
+
+    status = func.coalesce(tr.eight_d_status, "NOT_REQUIRED")
+    for sid, key, count in grouped(status, func.count(tr.id), group=(status,)):
+        data[sid]["eight_d"][key] = count
+
+    # 同数量时最近出现的在前
+    pn = func.coalesce(func.nullif(tr.part_number, ""), NO_PART_LABEL)
+    for sid, number, name, count, last in grouped(
+        pn, func.max(tr.part_name), func.count(tr.id), func.max(tr.created_at), group=(pn,)
+    ):
+        data[sid]["parts"].append((number, name, count, last))
+    for item in data.values():
+        item["parts"].sort(key=lambda p: (-p[2], -(p[3].timestamp() if p[3] else 0)))
+        del item["parts"][TOP_PARTS:]
+
+    # TR 列表：未闭环优先，按日期倒序；只取模板要展示的列
+    stmt = select(
+        sid_col, tr.id, tr.tr_no, tr.part_number, tr.part_name, tr.issue_summary, tr.issue_description,
+        tr.eight_d_status, tr.status, tr.issue_date, tr.remark, tr.created_at,
+    ).where(*scope).order_by(sid_col, closed, tr.issue_date.desc(), tr.created_at.desc())
+    for row in db.session.execute(stmt):
+        data[row.supplier_id]["trs"].append(SimpleNamespace(
+            id=row.id, tr_no=row.tr_no, part_number=row.part_number, part_name=row.part_name,
+            issue_summary=row.issue_summary, issue_description=row.issue_description,
+            eight_d_status=row.eight_d_status, status=row.status,
+            issue_date=row.issue_date or tr_issue_date(row.remark, row.created_at),
+        ))
+    return data
+
+
+# ──────────────────────────────────────────────────────────
+# 上下文（不碰数据库，子进程里也能用）
+# ──────────────────────────────────────────────────────────
+
+def report_row_date(tr):
+    """TR 的有效日期（issue_date：remark 末段日期，否则 created_at）"""
+    return tr.issue_date
+
+
+def build_report_context(supplier, data, period, period_label, period_label_en, custom_start="", custom_end=""):
+    total, closed = data["total"], data["closed"]
+    open_cnt = total - closed
+
+    debit_totals = [
+        {"currency": code, "symbol": CURRENCY_SYMBOLS.get(code, f"{code} "), "amount": amount}
+        for code, amount in sorted(data["debit"].items())
+    ]
+
+    # 月度趋势：补齐区间内空月
+    monthly = []
+    if data["monthly"]:
+        keys = sorted(data["monthly"])
+        months = OrderedDict()
+        y, m = keys[0]
+        while (y, m) <= keys[-1]:
+            months[(y, m)] = data["monthly"].get((y, m), 0)
+            m += 1
+            if m > 12:
+                m = 1; y += 1
+        monthly = [
+            {"label": f"{k[1]}月 / {MONTH_NAMES_EN[k[1] - 1]}", "label_en": MONTH_NAMES_EN[k[1] - 1], "count": v}
+            for k, v in months.items()
+        ]
+    month_max = max([x["count"] for x in monthly], default=1) or 1
+
+    eight_d = [
+        {"key": k, "label": EIGHT_D_LABELS[k][0], "label_en": EIGHT_D_LABELS[k][1], "count": data["eight_d"].get(k, 0)}
+        for k in EIGHT_D_ORDER
+    ]
+
+    top_parts = [{"pn": pn, "name": name or "", "count": count} for pn, name, count, _ in data["parts"]]
+    top_max = max([p["count"] for p in top_parts], default=1) or 1
+
+    # 评级
+    if open_cnt >= 4:
+        rating = {"label": "Attention Required / 需重点关注", "label_en": "Attention Required", "color": "red"}
+    elif open_cnt >= 1:
+        rating = {"label": "Follow-up Required / 持续跟进", "label_en": "Follow-up Required", "color": "amber"}
+    else:
+        rating = {"label": "Good Performance / 表现良好", "label_en": "Good Performance", "color": "green"}
+
+    return {
+        "supplier": supplier,
+        "supplier_short_name": supplier_short_name(supplier),
+        "period": period, "period_label": period_label, "period_label_en": period_label_en,
+        "custom_start": custom_start, "custom_end": custom_end,
+        "total": total, "open_cnt": open_cnt, "closed": closed,
+        "pending_8d": data["eight_d_pending"], "debit_totals": debit_totals,
+        "prev_total": data["prev_total"],
+        "monthly": monthly, "month_max": month_max,
+        "eight_d": eight_d,
+        "top_parts": top_parts, "top_max": top_max,
+        "rating": rating,
+        "trs": data["trs"],
+        "tr_date": report_row_date,
+        "generated_at": datetime.now(),
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# 批量渲染（子进程）
+# ──────────────────────────────────────────────────────────
+
+_worker_env = None
+
+
+def _template_env():
+    global _worker_env
+    if _worker_env is None:
+        _worker_env = Environment(
+            loader=FileSystemLoader(str(TEMPLATE_DIR)), autoescape=select_autoescape(["html"])
+        )
+    return _worker_env
+
+
+def _html_to_pdf(html_path):
+    """LibreOffice 转 PDF；每个进程用独立的用户配置目录（用完删掉），避免并行时互相锁住"""
+    soffice = _find_soffice()
+    if not soffice:
+        return None, "LibreOffice not found"
+    profile = Path(tempfile.gettempdir()) / f"lo_report_profile_{os.getpid()}"
+    try:
+        result = subprocess.run(
+            [soffice, f"-env:UserInstallation={profile.as_uri()}", "--headless",
+             "--convert-to", "pdf", "--outdir", str(html_path.parent), str(html_path)],
+            timeout=120, capture_output=True, text=True,
+        )
+    except Exception as exc:
+        return None, str(exc)
+    finally:
+        shutil.rmtree(profile, ignore_errors=True)
+    pdf_path = html_path.with_suffix(".pdf")
+    if result.returncode != 0 or not pdf_path.exists():
+        return None, (result.stderr or "conversion failed")[:300]
+    return pdf_path, None
+
+
+def render_report_file(context, html_path, pdf=False):
+    """渲染一个供应商的静态报告；返回 (html 文件名, pdf 文件名或 None, 错误)"""
+    html_path = Path(html_path)
+    html = _template_env().get_template("supplier_ws/report.html").render(
+        **context, tr_date=report_row_date, static_export=True
+    )
+    html_path.write_text(html, encoding="utf-8")
+    if not pdf:
+        return html_path.name, None, None
+    pdf_path, error = _html_to_pdf(html_path)
+    return html_path.name, pdf_path.name if pdf_path else None, error
+
+
+def _safe_name(text):
+    return re.sub(r"[^\w.-]+", "_", text or "").strip("_") or "supplier"
+
+
+def run_batch_reports(out_dir, period="this_quarter", custom_start="", custom_end="", codes=None,
+                      include_empty=False, workers=None, pdf=False, progress=None):
+    """批量生成周期报告（需在 app context 内调用）
+
+    codes 为空时取全部供应商；include_empty=False 时跳过本期没有 TR 的供应商。
+    progress(done, total, supplier_code) 每完成一份回调一次。返回 manifest（同时写入 manifest.json）。
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    start, end, period_label, period_label_en = resolve_period(period, custom_start, custom_end)
+
+    query = Supplier.query.order_by(Supplier.code)
+    if codes:
+        query = query.filter(Supplier.code.in_(codes))
+    suppliers = query.all()
+    data = collect_report_data(
+        [s.id for s in suppliers], start, end, previous_range(period, start, end)
+    )
+
+    jobs, skipped = [], []
+    for s in suppliers:
+        if not include_empty and not data[s.id]["total"]:
+            skipped.append(s.code)
+            continue
+        supplier = SimpleNamespace(id=s.id, code=s.code, name=s.name, chinese_name=s.chinese_name)
+        context = build_report_context(supplier, data[s.id], period, period_label, period_label_en,
+                                       custom_start, custom_end)
+        context.pop("tr_date")                # 函数不跨进程传，子进程里补上
+        filename = f"{_safe_name(s.code)}_{_safe_name(period_label_en)}.html"
+        jobs.append((s.code, context, out_dir / filename))
+
+    if jobs:
+        (out_dir / "assets").mkdir(exist_ok=True)
+        if TAILWIND_CSS.exists():
+            shutil.copyfile(TAILWIND_CSS, out_dir / "assets" / "tailwind.css")
+
+    reports, errors = [], []
+
+    def record(code, context, result):
+        html_name, pdf_name, error = result
+        reports.append({
+            "code": code, "name": context["supplier"].name, "html": html_name, "pdf": pdf_name,
+            "total": context["total"], "open": context["open_cnt"], "rating": context["rating"]["label_en"],
+        })
+        if error:
+            errors.append({"code": code, "error": error})
+        if progress:
+            progress(len(reports), len(jobs), code)
+
+    workers = max(1, min(workers or BATCH_WORKERS, len(jobs) or 1))
+    if workers == 1:
+        for code, context, path in jobs:
+            try:
+                record(code, context, render_report_file(context, path, pdf))
+            except Exception as exc:
+                record(code, context, (None, None, str(exc)))
+    else:
+        # spawn：批量任务跑在 Web 服务的后台线程里，fork 不安全；Windows 上也只有 spawn
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(render_report_file, context, path, pdf): (code, context)
+                       for code, context, path in jobs}
+            for future in as_completed(futures):
+                code, context = futures[future]
+                try:
+                    record(code, context, future.result())
+                except Exception as exc:
+                    record(code, context, (None, None, str(exc)))
+
+    reports.sort(key=lambda r: r["code"])
+    manifest = {
+        "period": period, "period_label": period_label, "period_label_en": period_label_en,
+        "start": start.isoformat() if start else None, "end": end.isoformat() if end else None,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "reports": reports, "skipped": skipped, "errors": errors,
+    }
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    (out_dir / "index.html").write_text(
+        _template_env().get_template("supplier_ws/report_bundle_index.html").render(manifest=manifest),
+        encoding="utf-8",
+    )
+
+    zip_path = out_dir.with_suffix(".zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for path in sorted(out_dir.rglob("*")):
+            if path.is_file():
+                bundle.write(path, Path(out_dir.name) / path.relative_to(out_dir))
+    manifest["zip"] = str(zip_path)
+    return manifest
+
+
+# ──────────────────────────────────────────────────────────
+# 后台任务（页面上的"批量报告"）
+# ──────────────────────────────────────────────────────────
+
+def start_batch_job(app, **options):
+    """后台线程跑 run_batch_reports，返回 job_id；进度用 get_batch_job(job_id) 查询"""
+    job_id = uuid.uuid4().hex[:12]
+    out_dir = Path(app.config["UPLOAD_DIR"]) / "reports" / f"batch_{datetime.now():%Y%m%d_%H%M%S}_{job_id}"
+    job = {"id": job_id, "status": "running", "done": 0, "total": None, "current": None,
+           "errors": [], "skipped": [], "zip": None, "message": None}
+    with _batch_jobs_lock:
+        _batch_jobs[job_id] = job
+
+    def progress(done, total, code):
+        job.update(done=done, total=total, current=code)
+
+    def _run():
+        with app.app_context():
+            try:
+                manifest = run_batch_reports(
+                    out_dir, workers=app.config.get("REPORT_BATCH_WORKERS"), progress=progress, **options
+                )
+                job.update(status="done", total=len(manifest["reports"]), zip=manifest["zip"],
+                           errors=manifest["errors"], skipped=manifest["skipped"])
+            except Exception as exc:
+                app.logger.exception("[Report] batch job failed")
+                job.update(status="failed", message=str(exc))
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=_run, daemon=True, name=f"report-batch-{job_id}")
+    job["thread"] = thread
+    thread.start()
+    return job_id
+
+
+def get_batch_job(job_id):
+    with _batch_jobs_lock:
+        return _batch_jobs.get(job_id)
@@ -0,0 +1,242 @@
+"""
+供应商计分卡 —— supplier_scorecard 的刷新
+放到 app/scorecard_helper.py
+
+供应商列表、工作台表头和首页不再每次把 TR 全部读进 Python 统计，而是直接读
+supplier_scorecard（每个供应商一行）。
+
+刷新方式：
+  增量  TR / 审核 / 零件 / CP / 供应商写入时（mapper 事件）记下受影响的 supplier_id，
+        提交前在同一事务里只重算这几个供应商
+  全量  后台线程每 SCORECARD_REFRESH_INTERVAL 秒重算一次（兜底绕过 ORM 的批量 SQL），
+        只由 run.py 的 Web 服务进程启动（create_app 不启动，脚本 / 子进程不会带上）；
+        也可手工运行 refresh_supplier_scorecards.py
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, delete, event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from .extensions import db
+from .models import AuditReport, ControlPlan, Part, Supplier, SupplierScorecard, TroubleReport
+
+CLOSED_STATUSES = ("closed", "done", "completed")
+INACTIVE_CP_STATUSES = ("obsolete",)
+
+_DIRTY_KEY = "scorecard_dirty_suppliers"
+
+# 这些字段变化才会影响计分卡；其余字段（备注、附件路径……）的修改不触发重算
+TRACKED_FIELDS = {
+    TroubleReport: ("supplier_id", "status", "eight_d_status", "debit_amount", "debit_currency", "created_at"),
+    AuditReport: ("supplier_id", "open_findings", "created_at"),
+    Part: ("supplier_id",),
+    ControlPlan: ("supplier_id", "part_id", "status"),
+}
+
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────────────────
+# 计算
+# ──────────────────────────────────────────────────────────
+
+def _grouped(executor, supplier_col, columns, ids, *criteria):
+    stmt = select(supplier_col, *columns).where(supplier_col.is_not(None), *criteria).group_by(supplier_col)
+    if ids is not None:
+        stmt = stmt.where(supplier_col.in_(ids))
+    return {row[0]: row[1:] for row in executor.execute(stmt)}
+
+
+def compute_scorecards(supplier_ids=None, executor=None):
+    """{supplier_id: 计分卡字段}，supplier_ids 为 None 时计算全部供应商"""
+    executor = executor if executor is not None else db.session
+    ids = sorted(set(supplier_ids)) if supplier_ids is not None else None
+
+    stmt = select(Supplier.id)
+    if ids is not None:
+        stmt = stmt.where(Supplier.id.in_(ids))
+    existing = list(executor.execute(stmt).scalars())
+    if not existing:
+        return {}
+
+    closed = func.lower(func.coalesce(TroubleReport.status, "")).in_(CLOSED_STATUSES)
+    trs = _grouped(executor, TroubleReport.supplier_id, (
+        func.count(TroubleReport.id),
+        func.sum(case((closed, 1), else_=0)),
+        func.sum(case((TroubleReport.eight_d_status == "NOT_RECEIVED", 1), else_=0)),
+        func.sum(case((TroubleReport.debit_amount > 0, TroubleReport.debit_amount), else_=0.0)),
+        func.max(TroubleReport.created_at),
+    ), ids)
+
+    currency = func.upper(func.coalesce(TroubleReport.debit_currency, "EUR"))
+    debits = {}
+    stmt = select(TroubleReport.supplier_id, currency, func.sum(TroubleReport.debit_amount)) \
+        .where(TroubleReport.supplier_id.is_not(None), TroubleReport.debit_amount != 0) \
+        .group_by(TroubleReport.supplier_id, currency)
+    if ids is not None:
+        stmt = stmt.where(TroubleReport.supplier_id.in_(ids))
+    for supplier_id, code, amount in executor.execute(stmt):
+        debits.setdefault(supplier_id, {})[code] = round(amount or 0.0, 2)
+
+    audits = _grouped(executor, AuditReport.supplier_id, (
+        func.count(AuditReport.id),
+        func.coalesce(func.sum(AuditReport.open_findings), 0),
+        func.max(AuditReport.created_at),
+    ), ids)
+    parts = _grouped(executor, Part.supplier_id, (func.count(Part.id),), ids)
+    cp_parts = _grouped(
+        executor, ControlPlan.supplier_id, (func.count(func.distinct(ControlPlan.part_id)),), ids,
+        func.coalesce(ControlPlan.status, "active").not_in(INACTIVE_CP_STATUSES),
+    )
+
+    now = datetime.utcnow()
+    cards = {}
+    for supplier_id in existing:
+        total, closed_count, pending, debit_total, last_tr = trs.get(supplier_id, (0, 0, 0, 0.0, None))
+        audit_count, open_findings, last_audit = audits.get(supplier_id, (0, 0, None))
+        cards[supplier_id] = {
+            "supplier_id": supplier_id,
+            "total_trs": total or 0,
+            "open_trs": (total or 0) - (closed_count or 0),
+            "closed_trs": closed_count or 0,
+            "eight_d_pending": pending or 0,
+            "debit_total": debit_total or 0.0,
+            "debit_by_currency_json": json.dumps(debits.get(supplier_id, {}), sort_keys=True),
+            "audit_count": audit_count or 0,
+            "open_findings": open_findings or 0,
+            "parts_count": parts.get(supplier_id, (0,))[0],
+            "cp_parts": cp_parts.get(supplier_id, (0,))[0],
+            "last_activity": max((d for d in (last_tr, last_audit) if d), default=None),
+            "refreshed_at": now,
+        }
+    return cards
+
+
+def refresh_scorecards(supplier_ids=None, executor=None):
+    """重算并整行替换；supplier_ids 为 None 时全量（顺带清掉已删除供应商的行）。返回刷新行数"""
+    executor = executor if executor is not None else db.session
+    table = SupplierScorecard.__table__
+    cards = compute_scorecards(supplier_ids, executor)
+    stmt = delete(table)
+    if supplier_ids is not None:
+        stmt = stmt.where(table.c.supplier_id.in_(set(supplier_ids)))
+    executor.execute(stmt)
+    if cards:
+        executor.execute(table.insert(), list(cards.values()))
+    return len(cards)
+
+
+def scorecard_for(supplier):
+    """读计分卡；还没有行（例如刚迁移、尚未全量刷新）时现算一份，不写库"""
+    if supplier.scorecard is not None:
+        return supplier.scorecard
+    card = compute_scorecards([supplier.id]).get(supplier.id)
+    return SupplierScorecard(**card) if card else None
+
+
+def scorecard_totals(recent_days=7):
+    """所有供应商的汇总：一条 suppliers LEFT JOIN supplier_scorecard 聚合"""
+    card = SupplierScorecard
+    open_trs = func.coalesce(card.open_trs, 0)
+    recent_since = datetime.utcnow() - timedelta(days=recent_days)
+    columns = {
+        "total": func.count(Supplier.id),
+        "issues": func.sum(case((open_trs > 0, 1), else_=0)),
+        "recent": func.sum(case((card.last_activity > recent_since, 1), else_=0)),
+        "open_trs": func.sum(open_trs),
+        "eight_d_pending": func.sum(func.coalesce(card.eight_d_pending, 0)),
+        "open_findings": func.sum(func.coalesce(card.open_findings, 0)),
+    }
+    row = db.session.query(*columns.values()) \
+        .outerjoin(card, card.supplier_id == Supplier.id).one()
+    totals = {name: value or 0 for name, value in zip(columns, row)}
+    totals["quiet"] = totals["total"] - totals["issues"]
+    return totals
+
+
+# ──────────────────────────────────────────────────────────
+# 增量刷新（mapper 事件记账，提交前统一重算）
+# ──────────────────────────────────────────────────────────
+
+def _mark(target, *supplier_ids):
+    session = object_session(target)
+    if session is None:
+        return
+    session.info.setdefault(_DIRTY_KEY, set()).update(sid for sid in supplier_ids if sid is not None)
+
+
+def _mark_record(mapper, connection, target):
+    _mark(target, target.supplier_id)
+
+
+def _mark_record_update(mapper, connection, target):
+    state = inspect(target)
+    fields = TRACKED_FIELDS[mapper.class_]
+    if not any(state.attrs[field].history.has_changes() for field in fields):
+        return
+    # 换了供应商时，旧供应商也要重算
+    _mark(target, target.supplier_id, *state.attrs.supplier_id.history.deleted)
+
+
+def _mark_supplier(mapper, connection, target):
+    # 新增 / 改名会按别名补挂历史 TR（supplier_helper），删除则把该行一并清掉
+    _mark(target, target.id)
+
+
+def _refresh_before_commit(session):
+    if not (session.new or session.dirty or session.deleted or session.info.get(_DIRTY_KEY)):
+        return
+    session.flush()
+    supplier_ids = session.info.pop(_DIRTY_KEY, None)
+    if supplier_ids:
+        refresh_scorecards(supplier_ids, session)
+
+
+def _discard_marks(session, previous_transaction=None):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+for _model in TRACKED_FIELDS:
+    event.listen(_model, "after_insert", _mark_record)
+    event.listen(_model, "after_update", _mark_record_update)
+    event.listen(_model, "after_delete", _mark_record)
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Supplier, _event, _mark_supplier)
+event.listen(Session, "before_commit", _refresh_before_commit)
+event.listen(Session, "after_soft_rollback", _discard_marks)
+
+
+# ──────────────────────────────────────────────────────────
+# 定时全量刷新
+# ──────────────────────────────────────────────────────────
+
+def start_scorecard_scheduler(app):
+    """后台线程：启动后立即全量刷新一次，之后每 SCORECARD_REFRESH_INTERVAL 秒一次（0 关闭）"""
+    global _scheduler_started
+    interval = int(app.config.get("SCORECARD_REFRESH_INTERVAL") or 0)
+    if interval <= 0:
+        return
+    with _scheduler_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
+
+    def _run():
+        while True:
+            with app.app_context():
+                try:
+                    count = refresh_scorecards()
+                    db.session.commit()
+                    app.logger.info(f"[Scorecard] refreshed {count} supplier(s)")
+                except Exception as exc:
+                    db.session.rollback()
+                    app.logger.warning(f"[Scorecard] full refresh failed: {exc}")
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+
+    threading.Thread(target=_run, daemon=True, name="scorecard-refresh").start()
@@ -0,0 +1,345 @@
+"""
+相似问题检索 —— TR / 知识条目的本地向量索引
+放到 app/similar_helper.py
+
+向量由本地 Ollama embedding 模型生成，存在 issue_embeddings 表（float32 BLOB）；
+进程内拼成一个已归一化的连续矩阵，查询 = 一次矩阵乘法 + argpartition 取 top-k，
+完全离线，几万行也是毫秒级。写入时只增量更新对应的一行。
+"""
+import hashlib
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func
+
+from .ai_helper import OLLAMA_EMBED_MODEL, defer_until_available, embed_texts, is_ollama_available
+from .extensions import db
+from .models import IssueEmbedding, KnowledgeItem, TroubleReport
+
+SOURCE_TYPES = ("tr", "knowledge")
+EMBED_MAX_CHARS = 2000      # 单条送入 embedding 的最大字符数
+MIN_SIMILARITY = 0.35       # 低于此余弦相似度不展示
+INDEX_CHECK_SECONDS = 60    # 读路径最多每隔这么久核对一次数据库（发现回填脚本等其他进程的写入）
+
+
+# ──────────────────────────────────────────────────────────
+# 文本拼接
+# ──────────────────────────────────────────────────────────
+
+def tr_embedding_text(tr):
+    """问题描述 / 摘要 + 8D 根因 / 流出原因"""
+    parts = [
+        tr.issue_summary,
+        tr.issue_description,
+        tr.eight_d_root_cause_en or tr.eight_d_root_cause,
+        tr.eight_d_escape_cause_en or tr.eight_d_escape_cause,
+    ]
+    return "\n".join(p.strip() for p in parts if p and p.strip())[:EMBED_MAX_CHARS]
+
+
+def knowledge_embedding_text(item):
+    parts = [item.title, item.content]
+    return "\n".join(p.strip() for p in parts if p and p.strip())[:EMBED_MAX_CHARS]
+
+
+def _load_source(source_type, source_id):
+    if source_type == "tr":
+        obj = db.session.get(TroubleReport, source_id)
+        return obj, tr_embedding_text(obj) if obj else ""
+    if source_type == "knowledge":
+        obj = db.session.get(KnowledgeItem, source_id)
+        return obj, knowledge_embedding_text(obj) if obj else ""
+    raise ValueError(f"unknown source type: {source_type}")
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _normalize(vector):
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm > 0 else None
+
+
+# ──────────────────────────────────────────────────────────
+# 进程内向量矩阵
+# ──────────────────────────────────────────────────────────
+
+class _VectorIndex:
+    """Dense float32 matrix of unit vectors with a key -> row map.
+
+    行按容量倍增预分配；删除时用最后一行填补空位，矩阵始终连续。
+    本进程的写入直接改对应行（或 invalidate 后下次读重载）；其他进程 / 脚本的写入
+    靠读路径每 INDEX_CHECK_SECONDS 核对一次 (count, max id, max updated_at) 发现，变化时整体重载。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._check_after = 0.0
+        self.reset()
+
+    def reset(self):
+        self._keys = []
+        self._rows = {}
+        self._types = np.zeros(0, dtype=np.uint8)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._signature = None
+
+    def invalidate(self):
+        """写入时矩阵已和数据库不一致：下次读整体重载"""
+        with self._lock:
+            self._signature = None
+
+    @property
+    def size(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _db_signature():
+        count, max_id, max_updated = db.session.query(
+            func.count(IssueEmbedding.id),
+            func.max(IssueEmbedding.id),
+            func.max(IssueEmbedding.updated_at),
+        ).filter(IssueEmbedding.model == OLLAMA_EMBED_MODEL).one()
+        return count, max_id, max_updated
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self._signature is not None and time.monotonic() < self._check_after:
+                return
+        signature = self._db_signature()
+        with self._lock:
+            self._check_after = time.monotonic() + INDEX_CHECK_SECONDS
+            if signature == self._signature:
+                return
+            self.reset()
+            rows = (
+                db.session.query(IssueEmbedding.source_type, IssueEmbedding.source_id,
+                                 IssueEmbedding.dim, IssueEmbedding.vector)
+                .filter(IssueEmbedding.model == OLLAMA_EMBED_MODEL)
+                .order_by(IssueEmbedding.id)
+                .all()
+            )
+            if rows:
+                dim = rows[0].dim
+                rows = [r for r in rows if r.dim == dim]
+                self._matrix = np.frombuffer(
+                    b"".join(r.vector for r in rows), dtype=np.float32
+                ).reshape(len(rows), dim).copy()
+                self._keys = [(r.source_type, r.source_id) for r in rows]
+                self._rows = {key: i for i, key in enumerate(self._keys)}
+                self._types = np.array(
+                    [SOURCE_TYPES.index(t) for t, _ in self._keys], dtype=np.uint8
+                )
+            self._signature = signature
+
+    def upsert(self, key, unit_vector):
+        with self._lock:
+            if self._matrix.shape[1] != unit_vector.shape[0]:
+                if self._keys:
+                    # embedding 模型换了维度：旧矩阵作废，等下次 ensure_loaded 重载
+                    self.reset()
+                    return
+                self._matrix = np.zeros((16, unit_vector.shape[0]), dtype=np.float32)
+                self._types = np.zeros(16, dtype=np.uint8)
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._keys)
+                if row >= self._matrix.shape[0]:
+                    capacity = max(16, self._matrix.shape[0] * 2)
+                    self._matrix = np.resize(self._matrix, (capacity, self._matrix.shape[1]))
+                    self._types = np.resize(self._types, capacity)
+                self._keys.append(key)
+                self._rows[key] = row
+            self._matrix[row] = unit_vector
+            self._types[row] = SOURCE_TYPES.index(key[0])
+
+    def remove(self, key):
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return
+            last = len(self._keys) - 1
+            if row != last:
+                moved = self._keys[last]
+                self._matrix[row] = self._matrix[last]
+                self._types[row] = self._types[last]
+                self._keys[row] = moved
+                self._rows[moved] = row
+            self._keys.pop()
+
+    def in_sync(self):
+        """写入前调用：矩阵已加载且与数据库一致时，写入后可以只改对应行"""
+        signature = self._db_signature()
+        with self._lock:
+            return self._signature is not None and self._signature == signature
+
+    def mark_synced(self):
+        signature = self._db_signature()
+        with self._lock:
+            if self._signature is not None:
+                self._signature = signature
+
+    def search(self, key, k=5, source_types=SOURCE_TYPES, min_score=MIN_SIMILARITY):
+        """以已索引条目 key 的向量为查询，返回 [(source_type, source_id, score)]"""
+        with self._lock:
+            row = self._rows.get(key)
+            n = len(self._keys)
+            if row is None or n < 2:
+                return []
+            matrix = self._matrix[:n]
+            scores = matrix @ matrix[row]
+            allowed = np.isin(self._types[:n], [SOURCE_TYPES.index(t) for t in source_types])
+            scores = np.where(allowed, scores, -np.inf)
+            scores[row] = -np.inf
+            top = min(k, n - 1)
+            idx = np.argpartition(-scores, top - 1)[:top]
+            idx = idx[np.argsort(-scores[idx])]
+            return [
+                (*self._keys[i], round(float(scores[i]), 3))
+                for i in idx if scores[i] >= min_score
+            ]
+
+
+_index = _VectorIndex()
+
+
+# ──────────────────────────────────────────────────────────
+# 写入：增量索引 / 删除 / 回填
+# ──────────────────────────────────────────────────────────
+
+def _store_vectors(items, vectors):
+    """items: [(source_type, source_id, text_hash)]，与 vectors 一一对应"""
+    in_sync = _index.in_sync()
+    stored = []
+    for (source_type, source_id, text_hash), vector in zip(items, vectors):
+        unit = _normalize(vector)
+        if unit is None:
+            continue
+        row = IssueEmbedding.query.filter_by(source_type=source_type, source_id=source_id).first()
+        if not row:
+            row = IssueEmbedding(source_type=source_type, source_id=source_id)
+            db.session.add(row)
+        row.model = OLLAMA_EMBED_MODEL
+        row.text_hash = text_hash
+        row.dim = int(unit.shape[0])
+        row.vector = unit.tobytes()
+        stored.append(((source_type, source_id), unit))
+    db.session.commit()
+    if in_sync:
+        for key, unit in stored:
+            _index.upsert(key, unit)
+        _index.mark_synced()
+    elif stored:
+        _index.invalidate()
+    return len(stored)
+
+
+def index_source(source_type, source_id, logger=None, priority="background"):
+    """文本有变化才重新向量化；返回 True 表示已是最新或已更新"""
+    obj, text = _load_source(source_type, source_id)
+    if not obj or not text:
+        remove_source(source_type, source_id)
+        return False
+    text_hash = _text_hash(text)
+    current = IssueEmbedding.query.filter_by(source_type=source_type, source_id=source_id).first()
+    if current and current.text_hash == text_hash and current.model == OLLAMA_EMBED_MODEL:
+        return True
+    vectors = embed_texts([text], logger=logger, priority=priority)
+    if not vectors:
+        return False
+    _store_vectors([(source_type, source_id, text_hash)], vectors)
+    if logger:
+        logger.info(f"[Similar] indexed {source_type}:{source_id}")
+    return True
+
+
+def remove_source(source_type, source_id):
+    in_sync = _index.in_sync()
+    deleted = IssueEmbedding.query.filter_by(source_type=source_type, source_id=source_id).delete()
+    db.session.commit()
+    if deleted and in_sync:
+        _index.remove((source_type, source_id))
+        _index.mark_synced()
+    elif deleted:
+        _index.invalidate()
+
+
+def queue_reindex(app, source_type, source_id):
+    """保存后在后台线程更新向量；Ollama 不可用时登记，恢复后补做"""
+    def _run():
+        with app.app_context():
+            try:
+                if not is_ollama_available():
+                    defer_until_available(("embed", source_type, source_id), _start, logger=app.logger)
+                    return
+                index_source(source_type, source_id, logger=app.logger)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f"[Similar] index failed for {source_type}:{source_id}: {e}")
+
+    def _start():
+        threading.Thread(target=_run, daemon=True).start()
+
+    _start()
+
+
+def index_missing(batch_size=32, logger=None, priority="batch"):
+    """回填：找出没有向量或文本已变化的条目，分批向量化；返回 (已更新, 待处理总数)"""
+    existing = {
+        (r.source_type, r.source_id): (r.text_hash, r.model)
+        for r in db.session.query(IssueEmbedding.source_type, IssueEmbedding.source_id,
+                                  IssueEmbedding.text_hash, IssueEmbedding.model)
+    }
+    pending = []
+    for tr in TroubleReport.query.order_by(TroubleReport.id):
+        text = tr_embedding_text(tr)
+        if text and existing.get(("tr", tr.id)) != (_text_hash(text), OLLAMA_EMBED_MODEL):
+            pending.append(("tr", tr.id, text))
+    for item in KnowledgeItem.query.order_by(KnowledgeItem.id):
+        text = knowledge_embedding_text(item)
+        if text and existing.get(("knowledge", item.id)) != (_text_hash(text), OLLAMA_EMBED_MODEL):
+            pending.append(("knowledge", item.id, text))
+
+    done = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        vectors = embed_texts([text for _, _, text in batch], logger=logger, priority=priority)
+        if not vectors:
+            if logger:
+                logger.warning(f"[Similar] embedding failed, {len(pending) - done} left")
+            break
+        done += _store_vectors(
+            [(t, i, _text_hash(text)) for t, i, text in batch], vectors
+        )
+    return done, len(pending)
+
+
+# ──────────────────────────────────────────────────────────
+# 查询
+# ──────────────────────────────────────────────────────────
+
+def similar_issues(source_type, source_id, k=6):
+    """页面用：返回 [{"type", "score", "obj"}]，只读本地索引，不调用 Ollama"""
+    try:
+        _index.ensure_loaded()
+        hits = _index.search((source_type, source_id), k=k)
+    except Exception:
+        db.session.rollback()
+        return []
+    if not hits:
+        return []
+
+    tr_ids = [sid for stype, sid, _ in hits if stype == "tr"]
+    ki_ids = [sid for stype, sid, _ in hits if stype == "knowledge"]
+    objects = {}
+    if tr_ids:
+        objects.update({("tr", o.id): o for o in TroubleReport.query.filter(TroubleReport.id.in_(tr_ids))})
+    if ki_ids:
+        objects.update({("knowledge", o.id): o for o in KnowledgeItem.query.filter(KnowledgeItem.id.in_(ki_ids))})
+    return [
+        {"type": stype, "score": score, "obj": objects[(stype, sid)]}
+        for stype, sid, score in hits if (stype, sid) in objects
+    ]
@@ -0,0 +1,492 @@
+"""
+供应商关联 —— TR / 出差 / 审核记录的 supplier_id 解析
+放到 app/supplier_helper.py
+
+记录里的 supplier_code / supplier_name 是手填或从 EDC / PDF 抽取的自由文本。
+写入时把它们归一化成 alias_key，在 supplier_aliases（唯一索引）里查一次得到
+supplier_id；之后所有供应商视图都按 supplier_id 走索引，不再按名字 IN / lower() 扫描。
+
+别名来源：
+  code / name  供应商新增或改名时自动登记（旧名字保留，历史记录仍能匹配）
+  manual       backfill_supplier_links.py --alias "写法=供应商代码" 手工补充的拼写变体
+  review       在待确认队列（/suppliers/aliases/review）里确认的写法
+
+解析顺序：进程内 SupplierMatcher 的别名字典（微秒级）→ 别名表索引查询（同一事务里
+刚登记的别名、其他进程新增的别名）→ 三元组相似度。相似度足够高且领先第二名时直接关联，
+否则把写法连同最接近的供应商放进 supplier_match_reviews 等人工确认。
+"""
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, case, event, func, inspect, null, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, object_session
+
+from .extensions import db
+from .models import (
+    AuditReport, BusinessTrip, EDCReport, Supplier, SupplierAlias, SupplierMatchReview, TroubleReport,
+)
+
+# EDC 的 bulk_insert_mappings 不触发 mapper 事件，同步时由 edc_helper.EDCLinker 预先解析
+LINKED_MODELS = (TroubleReport, BusinessTrip, AuditReport, EDCReport)
+PLACEHOLDER_CODES = {"", "n/a", "na", "-", "none"}
+
+# 末尾的公司类型后缀不参与匹配："ACME Co., Ltd." == "Acme Co Ltd" == "ACME"
+# 拉丁写法按整词去掉（"Metalco" 不等于 "Metal"），S.p.A. / S.r.l. 这类带点写法按词组；
+# 中文没有词界，只认这几个完整的公司类型结尾
+_LEGAL_SUFFIX_TOKENS = (
+    ("company",), ("limited",), ("co",), ("ltd",), ("gmbh",), ("spa",), ("srl",), ("inc",), ("corp",),
+    ("s", "p", "a"), ("s", "r", "l"),
+)
+_LEGAL_SUFFIXES_CJK = ("股份有限公司", "有限责任公司", "有限公司")
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+# 增量补挂时先在 SQL 里粗筛：key 的字符按顺序都出现在原文里（LIKE '%a%c%m%e%'），只取前几个字符
+_KEY_PREFILTER_CHARS = 8
+
+MATCHER_CACHE_KEY = "supplier_matcher"
+_ALIASES_CHANGED = "supplier_aliases_changed"
+
+SupplierMatch = namedtuple("SupplierMatch", "supplier_id score via suggestion")
+_NO_MATCH = SupplierMatch(None, 0.0, None, None)
+
+
+# ──────────────────────────────────────────────────────────
+# 归一化
+# ──────────────────────────────────────────────────────────
+
+def supplier_key(text):
+    """NFKC + casefold，按空白 / 标点分词，去掉末尾整词的公司类型后缀后拼接"""
+    tokens = [t for t in _NON_WORD.split(unicodedata.normalize("NFKC", text or "").casefold()) if t]
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in _LEGAL_SUFFIX_TOKENS:
+            if len(tokens) > len(suffix) and tuple(tokens[-len(suffix):]) == suffix:
+                del tokens[-len(suffix):]
+                stripped = True
+                break
+        else:
+            for suffix in _LEGAL_SUFFIXES_CJK:
+                if tokens and tokens[-1].endswith(suffix) and len(tokens[-1]) > len(suffix):
+                    tokens[-1] = tokens[-1][:-len(suffix)]
+                    stripped = True
+                    break
+    return "".join(tokens)[:255]
+
+
+def _code_key(code):
+    code = (code or "").strip()
+    return "" if code.lower() in PLACEHOLDER_CODES else supplier_key(code)
+
+
+def _lookup_keys(code, name):
+    """先按代码，再按名称"""
+    return [key for key in (_code_key(code), supplier_key(name)) if key]
+
+
+# ──────────────────────────────────────────────────────────
+# 内存匹配器
+# ──────────────────────────────────────────────────────────
+
+def _trigrams(key):
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SupplierMatcher:
+    """别名表的进程内快照：alias_key 字典 + 三元组倒排索引"""
+
+    def __init__(self, pairs):
+        self.exact = {}
+        self._owners = []
+        self._sizes = []
+        self._index = defaultdict(list)
+        for key, supplier_id in pairs:
+            self.exact[key] = supplier_id
+            grams = _trigrams(key)
+            for gram in grams:
+                self._index[gram].append(len(self._owners))
+            self._owners.append(supplier_id)
+            self._sizes.append(len(grams))
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def load(cls, executor=None):
+        executor = executor if executor is not None else db.session
+        return cls(executor.execute(select(SupplierAlias.alias_key, SupplierAlias.supplier_id)).all())
+
+    def lookup(self, keys):
+        for key in keys:
+            if key in self.exact:
+                return self.exact[key]
+        return None
+
+    def similar(self, key, limit=3):
+        """按 Dice 系数返回 [(supplier_id, score)]，每个供应商只取其最像的一个别名"""
+        grams = _trigrams(key) if key else set()
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._index.get(gram, ()))
+        best = {}
+        for pos, common in shared.items():
+            score = 2.0 * common / (len(grams) + self._sizes[pos])
+            owner = self._owners[pos]
+            if score > best.get(owner, 0.0):
+                best[owner] = score
+        return sorted(best.items(), key=lambda item: -item[1])[:limit]
+
+
+def supplier_matcher(executor=None):
+    """当前进程的匹配器；别名变更提交后作废，SUPPLIER_MATCHER_TTL 秒后兜底重建"""
+    if not has_app_context():
+        return SupplierMatcher.load(executor)
+    ttl = current_app.config.get("SUPPLIER_MATCHER_TTL", 300)
+    matcher = current_app.extensions.get(MATCHER_CACHE_KEY)
+    if matcher is None or not ttl or time.monotonic() - matcher.built_at >= ttl:
+        matcher = SupplierMatcher.load(executor)
+        if ttl:
+            current_app.extensions[MATCHER_CACHE_KEY] = matcher
+    return matcher
+
+
+def invalidate_supplier_matcher():
+    if has_app_context():
+        current_app.extensions.pop(MATCHER_CACHE_KEY, None)
+
+
+def _lookup_alias_table(keys, executor):
+    found = dict(executor.execute(
+        select(SupplierAlias.alias_key, SupplierAlias.supplier_id)
+        .where(SupplierAlias.alias_key.in_(keys))
+    ).all())
+    for key in keys:
+        if key in found:
+            return found[key]
+    return None
+
+
+def match_supplier(code=None, name=None, executor=None):
+    """解析一条记录的供应商，返回 SupplierMatch(supplier_id, score, via, suggestion)
+
+    via 为 "alias"（精确命中）/ "fuzzy"（相似度自动关联）/ None；
+    未关联时 suggestion 为 (supplier_id, score) 形式的最接近候选或 None。
+    executor 可以是 session 或 flush 中的 connection。
+    """
+    keys = _lookup_keys(code, name)
+    if not keys:
+        return _NO_MATCH
+    executor = executor if executor is not None else db.session
+    matcher = supplier_matcher(executor)
+    supplier_id = matcher.lookup(keys) or _lookup_alias_table(keys, executor)
+    if supplier_id:
+        return SupplierMatch(supplier_id, 1.0, "alias", None)
+
+    candidates = matcher.similar(supplier_key(name))
+    if not candidates:
+        return _NO_MATCH
+    (best_id, best), runner_up = candidates[0], (candidates[1][1] if len(candidates) > 1 else 0.0)
+    config = current_app.config if has_app_context() else {}
+    if best >= config.get("SUPPLIER_MATCH_AUTO", 0.8) and best - runner_up >= config.get("SUPPLIER_MATCH_MARGIN", 0.15):
+        return SupplierMatch(best_id, best, "fuzzy", None)
+    suggestion = (best_id, best) if best >= config.get("SUPPLIER_MATCH_SUGGEST", 0.4) else None
+    return SupplierMatch(None, best, None, suggestion)
+
+
+def resolve_supplier_id(code=None, name=None, executor=None):
+    return match_supplier(code, name, executor).supplier_id
+
+
+def resolve_supplier(code=None, name=None):
+    supplier_id = resolve_supplier_id(code, name)
+    return db.session.get(Supplier, supplier_id) if supplier_id else None
+
+
+# ──────────────────────────────────────────────────────────
+# 别名登记
+# ──────────────────────────────────────────────────────────
+
+def _supplier_aliases(supplier):
+    yield supplier.code, _code_key(supplier.code), "code"
+    for name in (supplier.name, supplier.chinese_name):
+        yield name, supplier_key(name), "name"
+
+
+def _insert_aliases(executor, supplier_id, candidates):
+    """登记尚不存在的 alias_key，返回新登记的 key；已属于其他供应商的写法不抢占"""
+    candidates = [(alias, key, source) for alias, key, source in candidates if key]
+    if not candidates:
+        return []
+    existing = set(executor.execute(
+        select(SupplierAlias.alias_key)
+        .where(SupplierAlias.alias_key.in_({key for _, key, _ in candidates}))
+    ).scalars())
+    rows = []
+    for alias, key, source in candidates:
+        if key in existing:
+            continue
+        existing.add(key)
+        rows.append({
+            "supplier_id": supplier_id, "alias": alias.strip()[:255],
+            "alias_key": key, "source": source,
+        })
+    if rows:
+        executor.execute(SupplierAlias.__table__.insert(), rows)
+    return [row["alias_key"] for row in rows]
+
+
+def _mark_aliases_changed(session):
+    if session is not None:
+        session.info[_ALIASES_CHANGED] = True
+
+
+def sync_supplier_aliases(supplier, executor=None):
+    executor = executor if executor is not None else db.session
+    new_keys = _insert_aliases(executor, supplier.id, _supplier_aliases(supplier))
+    if new_keys:
+        _mark_aliases_changed(db.session)
+    return new_keys
+
+
+def add_supplier_alias(supplier, alias, source="manual"):
+    """手工登记一个拼写变体；该写法已指向其他供应商时返回 False"""
+    key = supplier_key(alias)
+    if not key:
+        return False
+    owner = db.session.execute(
+        select(SupplierAlias.supplier_id).where(SupplierAlias.alias_key == key)
+    ).scalar()
+    if owner is not None:
+        return owner == supplier.id
+    _insert_aliases(db.session, supplier.id, [(alias, key, source)])
+    _mark_aliases_changed(db.session)
+    return True
+
+
+# ──────────────────────────────────────────────────────────
+# 待确认队列
+# ──────────────────────────────────────────────────────────
+
+def enqueue_review(name, code=None, source="", suggestion=None, executor=None, count=1):
+    """登记一个未能关联的写法；同一 name_key 累加次数，已确认过的写法再次落空时重新打开"""
+    key = supplier_key(name)
+    if not key:
+        return
+    executor = executor if executor is not None else db.session
+    table = SupplierMatchReview.__table__
+    now = datetime.utcnow()
+    suggested_id, score = suggestion or (None, None)
+    code = (code or "").strip()
+    stmt = sqlite_insert(table).values(
+        raw_name=name.strip()[:255], name_key=key,
+        supplier_code=code[:64] if code.lower() not in PLACEHOLDER_CODES else None,
+        source=source, occurrences=count, suggested_supplier_id=suggested_id, suggested_score=score,
+        status="pending", first_seen=now, last_seen=now,
+    )
+    executor.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.name_key],
+        set_={
+            "occurrences": table.c.occurrences + stmt.excluded.occurrences,
+            "last_seen": stmt.excluded.last_seen,
+            "status": case((table.c.status == "resolved", "pending"), else_=table.c.status),
+            "suggested_supplier_id": func.coalesce(stmt.excluded.suggested_supplier_id, table.c.suggested_supplier_id),
+            "suggested_score": func.coalesce(stmt.excluded.suggested_score, table.c.suggested_score),
+        },
+    ))
+
+
+def enqueue_unmatched(report, executor=None):
+    """把 link_records 报告里的未匹配写法批量放进队列（附最接近的供应商）"""
+    executor = executor if executor is not None else db.session
+    matcher = supplier_matcher(executor)
+    queued = 0
+    for table_name, stats in report.items():
+        for name, count in stats["unmatched"].items():
+            key = supplier_key(name)
+            if not key:
+                continue
+            candidates = matcher.similar(key, limit=1)
+            suggestion = candidates[0] if candidates and candidates[0][1] >= current_app.config.get(
+                "SUPPLIER_MATCH_SUGGEST", 0.4) else None
+            enqueue_review(name, source=table_name, suggestion=suggestion, executor=executor, count=count)
+            queued += 1
+    return queued
+
+
+def resolve_review(review, supplier):
+    """确认写法属于 supplier：登记 review 别名并补挂历史记录；写法已属于其他供应商时返回 None"""
+    if not add_supplier_alias(supplier, review.raw_name, source="review"):
+        return None
+    report = link_records(only_unlinked=True, keys=[review.name_key])
+    review.status = "resolved"
+    review.resolved_supplier_id = supplier.id
+    review.resolved_at = datetime.utcnow()
+    return report
+
+
+def ignore_review(review):
+    review.status = "ignored"
+    review.resolved_at = datetime.utcnow()
+
+
+# ──────────────────────────────────────────────────────────
+# 批量关联（backfill / 新增别名后补挂历史记录）
+# ──────────────────────────────────────────────────────────
+
+def _key_prefilter(columns, keys):
+    """归一化 key 是原文 casefold、去掉标点空白后的前缀，原文必然按顺序含有这些字符
+
+    SQLite 的 LIKE 对 ASCII 不分大小写；有大小写的非 ASCII 字母用 _ 占位。
+    全角字母、ß 这类要 NFKC / casefold 才能对上的写法筛不出来，由 backfill_supplier_links.py 的全量回填兜底。
+    """
+    patterns = {
+        "%" + "%".join(
+            ch if ch.isascii() or ch.upper() == ch.lower() else "_"
+            for ch in key[:_KEY_PREFILTER_CHARS]
+        ) + "%"
+        for key in keys
+    }
+    return or_(*(column.like(pattern) for column in columns for pattern in sorted(patterns)))
+
+
+def link_records(executor=None, only_unlinked=True, keys=None, models=LINKED_MODELS, link_parts=True):
+    """按当前别名表给关联表批量回填 supplier_id
+
+    keys 非空时只处理归一化后落在 keys 里的记录（新增别名后的增量补挂），SQL 里先粗筛，
+    不把整张表读进 Python。EDC 换了 supplier_id 的记录顺带按新供应商的零件重解 part_id
+    （link_parts=False 时跳过，由调用方自己做全量零件回填）。
+    返回 {表名: {total, already, code, name, relinked, unmatched: Counter}}。
+    """
+    executor = executor if executor is not None else db.session
+    alias_map = dict(executor.execute(select(SupplierAlias.alias_key, SupplierAlias.supplier_id)).all())
+    keys = {key for key in keys if key} if keys is not None else None
+    report = {}
+    for model in models:
+        table = model.__table__
+        pk = table.primary_key.columns[0]          # edc_reports 的主键是 report_no
+        code_col = table.c.get("supplier_code")
+        stmt = select(pk, table.c.supplier_id, table.c.supplier_name,
+                      code_col if code_col is not None else null())
+        if only_unlinked:
+            stmt = stmt.where(table.c.supplier_id.is_(None))
+        stats = {"total": 0, "already": 0, "code": 0, "name": 0, "relinked": 0, "unmatched": Counter()}
+        if keys is not None:
+            if not keys:
+                report[table.name] = stats
+                continue
+            columns = [table.c.supplier_name] + ([code_col] if code_col is not None else [])
+            stmt = stmt.where(_key_prefilter(columns, keys))
+        updates = []
+        for row_id, current, name, code in executor.execute(stmt):
+            code_key, name_key = _code_key(code), supplier_key(name)
+            if keys is not None and code_key not in keys and name_key not in keys:
+                continue
+            stats["total"] += 1
+            if code_key in alias_map:
+                supplier_id, via = alias_map[code_key], "code"
+            elif name_key in alias_map:
+                supplier_id, via = alias_map[name_key], "name"
+            else:
+                supplier_id, via = None, None
+                stats["unmatched"][(name or "").strip() or "(blank)"] += 1
+            if supplier_id == current:
+                stats["already"] += current is not None
+                continue
+            if via:
+                stats["relinked" if current else via] += 1
+            updates.append({"_id": row_id, "_supplier_id": supplier_id})
+        if updates:
+            executor.execute(
+                update(table).where(pk == bindparam("_id"))
+                .values(supplier_id=bindparam("_supplier_id")),
+                updates,
+            )
+            if model is EDCReport and link_parts:
+                # edc_helper 依赖本模块，按需导入
+                from .edc_helper import relink_edc_parts
+                relink_edc_parts([u["_id"] for u in updates], executor)
+        report[table.name] = stats
+    return report
+
+
+# ──────────────────────────────────────────────────────────
+# 写入时解析（mapper 事件，覆盖路由和脚本的所有写入路径）
+# ──────────────────────────────────────────────────────────
+
+def _changed(target, *fields):
+    state = inspect(target)
+    return any(
+        field in state.attrs and state.attrs[field].history.has_changes()
+        for field in fields
+    )
+
+
+def _resolve(mapper, connection, target):
+    code = getattr(target, "supplier_code", None)
+    match = match_supplier(code, target.supplier_name, connection)
+    target.supplier_id = match.supplier_id
+    if match.supplier_id is None:
+        enqueue_review(target.supplier_name, code, mapper.local_table.name, match.suggestion, connection)
+
+
+def _resolve_on_insert(mapper, connection, target):
+    if target.supplier_id is None:
+        _resolve(mapper, connection, target)
+
+
+def _resolve_on_update(mapper, connection, target):
+    # 明确指定了 supplier_id（例如出差表单选了下拉供应商）时以指定的为准
+    if _changed(target, "supplier_code", "supplier_name") and not _changed(target, "supplier_id"):
+        _resolve(mapper, connection, target)
+
+
+def _register_supplier_aliases(mapper, connection, target):
+    if not _changed(target, "code", "name", "chinese_name"):
+        return
+    new_keys = _insert_aliases(connection, target.id, _supplier_aliases(target))
+    if new_keys:
+        _mark_aliases_changed(object_session(target))
+        link_records(connection, only_unlinked=True, keys=new_keys)
+        reviews = SupplierMatchReview.__table__
+        connection.execute(
+            update(reviews)
+            .where(reviews.c.name_key.in_(new_keys), reviews.c.status == "pending")
+            .values(status="resolved", resolved_supplier_id=target.id, resolved_at=datetime.utcnow())
+        )
+
+
+def _unlink_supplier(mapper, connection, target):
+    _mark_aliases_changed(object_session(target))
+    for model in LINKED_MODELS:
+        table = model.__table__
+        connection.execute(
+            update(table).where(table.c.supplier_id == target.id).values(supplier_id=None)
+        )
+    reviews = SupplierMatchReview.__table__
+    for column in (reviews.c.suggested_supplier_id, reviews.c.resolved_supplier_id):
+        connection.execute(update(reviews).where(column == target.id).values({column.name: None}))
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop(_ALIASES_CHANGED, False):
+        invalidate_supplier_matcher()
+
+
+def _invalidate_after_rollback(session, previous_transaction=None):
+    # 事务内可能已经按未提交的别名重建过匹配器，回滚后同样作废
+    if session.info.pop(_ALIASES_CHANGED, False):
+        invalidate_supplier_matcher()
+
+
+for _model in LINKED_MODELS:
+    event.listen(_model, "before_insert", _resolve_on_insert)
+    event.listen(_model, "before_update", _resolve_on_update)
+event.listen(Supplier, "after_insert", _register_supplier_aliases)
+event.listen(Supplier, "after_update", _register_supplier_aliases)
+event.listen(Supplier, "before_delete", _unlink_supplier)
+event.listen(Session, "after_commit", _invalidate_after_commit)
+event.listen(Session, "after_soft_rollback", _invalidate_after_rollback)
@@ -205,6 +205,7 @@ def _sync_worker(app):
     with app.app_context():
         from app.models import EDCReport
         from app.extensions import db
+        from app.edc_helper import link_edc_batch
 
         try:
             # ── 只处理数据库里还没有的报告编号 ────────────────
@@ -279,6 +280,8 @@ def _sync_worker(app):
                 if len(batch) >= BATCH_SIZE or i == total:
                     if batch:
                         try:
+                            # 供应商 / 零件按本批次的查找表解析（bulk insert 不走 mapper 事件）
+                            link_edc_batch(batch)
                             db.session.bulk_insert_mappings(EDCReport, batch)
                             db.session.commit()
                             for d in batch:
@@ -1,16 +1,21 @@
 """Extract structured drafts for existing control-plan attachments."""
 import argparse
-import json
 import os
 
 from app import create_app
-from app.control_plan_helper import PARSER_VERSION, extract_control_plan, sha256_file
+from app.ai_helper import is_ollama_available
+from app.control_plan_helper import (
+    PARSER_VERSION, extract_control_plan, extract_control_plan_cached, sha256_file, store_draft,
+)
 from app.extensions import db
 from app.models import ControlPlan, ControlPlanVersion
 
 
-def backfill(force=False, force_ai=False, only_id=None):
+def backfill(force=False, force_ai=False, only_id=None, use_cache=True):
     app = create_app()
+    if force_ai and not is_ollama_available():
+        print("Ollama is not running; --force-ai needs the model. Nothing was changed.")
+        return
     with app.app_context():
         query = ControlPlan.query.order_by(ControlPlan.id)
         if only_id:
@@ -42,7 +47,8 @@ def backfill(force=False, force_ai=False, only_id=None):
                     versions = [version]
 
             for version in versions:
-                if not force and version.extract_status not in {"pending", "failed"}:
+                # queued / processing：服务重启时后台队列里未完成的版本
+                if not force and version.extract_status not in {"pending", "queued", "processing", "failed"}:
                     continue
                 file_path = os.path.join(
                     app.config["UPLOAD_DIR"], version.rel_path.replace("/", os.sep)
@@ -55,23 +61,22 @@ def backfill(force=False, force_ai=False, only_id=None):
                     print(f"[missing] {cp.cp_no} V{version.version_no}: {file_path}")
                     continue
                 try:
-                    data = extract_control_plan(
-                        file_path, force_ai=force_ai, logger=app.logger
-                    )
-                    version.structured_json = json.dumps(data, ensure_ascii=False)
-                    version.metadata_json = json.dumps(
-                        data.get("metadata", {}), ensure_ascii=False
-                    )
-                    version.quality_issues = json.dumps(
-                        data.get("quality_issues", []), ensure_ascii=False
-                    )
+                    version.file_sha256 = version.file_sha256 or sha256_file(file_path)
+                    if use_cache:
+                        data = extract_control_plan_cached(
+                            file_path, file_sha256=version.file_sha256, force_ai=force_ai,
+                            logger=app.logger, priority="batch",
+                        )
+                    else:
+                        data = extract_control_plan(
+                            file_path, force_ai=force_ai, logger=app.logger, priority="batch"
+                        )
+                    store_draft(version, data)
                     version.source_sheet = data.get("source_sheet")
                     version.source_template = data.get("source_template")
                     version.parser_version = data.get("parser_version") or PARSER_VERSION
                     version.ai_model = data.get("ai_model")
                     version.confidence = data.get("confidence")
-                    version.quality_score = data.get("quality_score")
-                    version.file_sha256 = version.file_sha256 or sha256_file(file_path)
                     version.extract_status = "review"
                     version.status = "review"
                     version.extraction_error = None
@@ -106,5 +111,9 @@ if __name__ == "__main__":
     parser.add_argument("--force", action="store_true")
     parser.add_argument("--force-ai", action="store_true")
     parser.add_argument("--only-id", type=int)
+    parser.add_argument("--no-cache", action="store_true", help="忽略提取结果缓存，重新解析")
     args = parser.parse_args()
-    backfill(force=args.force, force_ai=args.force_ai, only_id=args.only_id)
+    backfill(
+        force=args.force, force_ai=args.force_ai, only_id=args.only_id,
+        use_cache=not args.no_cache,
+    )
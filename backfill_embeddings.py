@@ -0,0 +1,23 @@
+"""Build or refresh the similar-issue embedding index for TRs and knowledge items."""
+import argparse
+
+from app import create_app
+from app.ai_helper import OLLAMA_EMBED_MODEL, is_ollama_available
+from app.similar_helper import index_missing
+
+
+def backfill(batch_size=32):
+    app = create_app()
+    with app.app_context():
+        if not is_ollama_available():
+            print("Ollama is not running; embeddings need the local model. Nothing was changed.")
+            return
+        done, pending = index_missing(batch_size=batch_size, logger=app.logger)
+        print(f"Completed: {done}/{pending} item(s) embedded with {OLLAMA_EMBED_MODEL}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+    backfill(batch_size=args.batch_size)
@@ -0,0 +1,69 @@
+"""Link trouble reports, business trips and audit reports to suppliers by supplier_id.
+
+    python backfill_supplier_links.py                       # 登记别名 + 回填未关联记录 + 匹配报告
+    python backfill_supplier_links.py --dry-run             # 只看报告，不写库
+    python backfill_supplier_links.py --alias "Acme Precision=ZSU0026419" --alias "爱克美=ZSU0026419"
+    python backfill_supplier_links.py --relink-all          # 别名调整后重新解析全部记录
+
+未匹配的写法会进入 /suppliers/aliases/review 待确认队列（附最接近的供应商）。
+"""
+import argparse
+
+from app import create_app
+from app.extensions import db
+from app.models import Supplier
+from app.scorecard_helper import refresh_scorecards
+from app.supplier_helper import add_supplier_alias, enqueue_unmatched, link_records, sync_supplier_aliases
+
+
+def _print_report(report, top):
+    print(f"{'table':<18}{'rows':>8}{'already':>9}{'by code':>9}{'by name':>9}{'relinked':>10}{'unmatched':>11}")
+    for table, stats in report.items():
+        print(f"{table:<18}{stats['total']:>8}{stats['already']:>9}{stats['code']:>9}"
+              f"{stats['name']:>9}{stats['relinked']:>10}{sum(stats['unmatched'].values()):>11}")
+    for table, stats in report.items():
+        if not stats["unmatched"]:
+            continue
+        print(f"\nUnmatched supplier names in {table} (add with --alias \"NAME=CODE\"):")
+        for name, count in stats["unmatched"].most_common(top):
+            print(f"  {count:>5}  {name}")
+
+
+def backfill(aliases=(), relink_all=False, dry_run=False, top=30):
+    app = create_app()
+    with app.app_context():
+        registered = 0
+        for supplier in Supplier.query.order_by(Supplier.id).all():
+            registered += len(sync_supplier_aliases(supplier))
+        for entry in aliases:
+            alias, _, code = entry.rpartition("=")
+            supplier = Supplier.query.filter_by(code=code.strip()).first()
+            if not alias.strip() or not supplier:
+                print(f"[skip] {entry}: expected NAME=CODE with an existing supplier code")
+                continue
+            if add_supplier_alias(supplier, alias):
+                registered += 1
+            else:
+                print(f"[conflict] {alias.strip()!r} already belongs to another supplier")
+
+        report = link_records(only_unlinked=not relink_all)
+        _print_report(report, top)
+        if dry_run:
+            db.session.rollback()
+            print(f"\nDry run: {registered} alias(es) and the links above were not saved.")
+        else:
+            # 批量 UPDATE 绕过了 mapper 事件，计分卡整体重算一次
+            refresh_scorecards()
+            queued = enqueue_unmatched(report)
+            db.session.commit()
+            print(f"\nCompleted: {registered} alias(es) registered, {queued} unmatched name(s) queued for review.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alias", action="append", default=[], help="拼写变体，格式 NAME=SUPPLIER_CODE")
+    parser.add_argument("--relink-all", action="store_true", help="已关联的记录也按当前别名重新解析")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--top", type=int, default=30, help="每张表列出的未匹配名称数")
+    args = parser.parse_args()
+    backfill(aliases=args.alias, relink_all=args.relink_all, dry_run=args.dry_run, top=args.top)
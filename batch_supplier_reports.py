@@ -0,0 +1,51 @@
+"""Generate period quality reports for all (or selected) suppliers in one job.
+
+    python batch_supplier_reports.py                                  # 本季度，有 TR 的全部供应商
+    python batch_supplier_reports.py --period this_year --workers 2
+    python batch_supplier_reports.py --period custom --start 2026-07-01 --end 2026-09-30
+    python batch_supplier_reports.py --code ZSU0026419 --code ZSU0031002 --pdf
+    python batch_supplier_reports.py --include-empty --out D:\\reports\\2026Q3
+
+数据一次聚合，按供应商分发到多个进程渲染成静态 HTML（--pdf 时再用 LibreOffice 转 PDF），
+输出目录里有 index.html / manifest.json，同时打包成同名 zip。
+"""
+import argparse
+import os
+from datetime import datetime
+
+from app import create_app
+from app.report_helper import BATCH_PERIODS, run_batch_reports
+
+
+def main(period, start="", end="", codes=(), include_empty=False, workers=None, pdf=False, out=None):
+    app = create_app()
+    with app.app_context():
+        out = out or os.path.join(app.config["UPLOAD_DIR"], "reports", f"batch_{datetime.now():%Y%m%d_%H%M%S}")
+
+        def progress(done, total, code):
+            print(f"[{done:>4}/{total}] {code}")
+
+        manifest = run_batch_reports(
+            out, period=period, custom_start=start, custom_end=end, codes=list(codes) or None,
+            include_empty=include_empty, workers=workers or app.config.get("REPORT_BATCH_WORKERS"),
+            pdf=pdf, progress=progress,
+        )
+        for error in manifest["errors"]:
+            print(f"[error] {error['code']}: {error['error']}")
+        print(f"\nCompleted: {len(manifest['reports'])} report(s), {len(manifest['skipped'])} skipped "
+              f"({manifest['period_label_en']}).")
+        print(f"Output: {out}\nBundle: {manifest['zip']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--period", default="this_quarter", choices=BATCH_PERIODS)
+    parser.add_argument("--start", default="", help="--period custom 时的开始日期 YYYY-MM-DD")
+    parser.add_argument("--end", default="", help="--period custom 时的结束日期 YYYY-MM-DD")
+    parser.add_argument("--code", action="append", default=[], help="只生成这些供应商代码，可重复")
+    parser.add_argument("--include-empty", action="store_true", help="本期没有 TR 的供应商也生成")
+    parser.add_argument("--workers", type=int, default=None, help="渲染进程数，默认 4")
+    parser.add_argument("--pdf", action="store_true", help="同时用 LibreOffice 转 PDF")
+    parser.add_argument("--out", default=None, help="输出目录，默认 UPLOAD_DIR/reports/batch_<时间>")
+    args = parser.parse_args()
+    main(args.period, args.start, args.end, args.code, args.include_empty, args.workers, args.pdf, args.out)
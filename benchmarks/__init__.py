@@ -0,0 +1 @@
+"""Offline benchmarks for the supplier portal (run with ``python -m benchmarks.<name>``)."""
@@ -0,0 +1,261 @@
+"""
+AI 提取基准：summarize_issue / extract_8d / control_plan_helper._ai_map_matrix
+
+    python -m benchmarks.ai_extraction                      # stub：固定回复，测管道开销和解析
+    python -m benchmarks.ai_extraction --ollama live --record   # 真模型，同时录制回复
+    python -m benchmarks.ai_extraction --ollama replay      # 用录制的回复重放（按 prompt 哈希匹配）
+    python -m benchmarks.ai_extraction --json out.json      # 保存结果，换模型 / 改提示词前后对比
+
+每个用例报告分阶段耗时（ms）：
+  extract   读取文件文本 / 工作簿矩阵
+  generate  Ollama 调用（replay 模式计入录制时的耗时，不真正等待；total 同样加上这段）
+  parse     模型输出 JSON 解析
+  prompt    其余部分：提示词拼接、分段、合并和后处理
+以及字段准确率：golden 中每个字段的关键词召回率（CP 为列号逐项比对）。
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+from app import ai_helper, control_plan_helper
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "ai"
+RECORDINGS_FILE = FIXTURE_DIR / "recordings.json"
+STAGES = ("extract", "prompt", "generate", "parse")
+
+
+def load_cases(fixture_dir=FIXTURE_DIR, kinds=None):
+    cases = json.loads((fixture_dir / "cases.json").read_text(encoding="utf-8"))
+    return [c for c in cases if not kinds or c["kind"] in kinds]
+
+
+def _prompt_key(payload):
+    text = f"{payload.get('model', '')}\n{payload.get('prompt', '')}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ──────────────────────────────────────────────────────────
+# Ollama 替身
+# ──────────────────────────────────────────────────────────
+
+class _OllamaDouble:
+    """Replaces ai_helper._ollama_post for stub / replay / live(+record) runs."""
+
+    def __init__(self, mode, clock, recordings=None, record=False):
+        self.mode = mode
+        self.clock = clock
+        self.recordings = recordings if recordings is not None else {}
+        self.record = record
+        self.stub = []
+        self.calls = 0
+        self.misses = 0
+        self._live_post = ai_helper._ollama_post
+
+    def __call__(self, url, payload, timeout=120, logger=None, priority="background", queue_timeout=None):
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            if self.mode == "stub":
+                return self._stub_response(payload.get("prompt", ""))
+            if self.mode == "replay":
+                hit = self.recordings.get(_prompt_key(payload))
+                if not hit:
+                    self.misses += 1
+                    return None
+                # 录制时的耗时记到 generate，同时计入 total（墙钟里没有这段等待）
+                self.clock["generate"] += hit.get("seconds", 0.0)
+                self.clock["replayed"] += hit.get("seconds", 0.0)
+                return {"response": hit["response"]}
+            data = self._live_post(
+                url, payload, timeout=timeout, logger=logger, priority=priority, queue_timeout=queue_timeout
+            )
+            if self.record and data:
+                self.recordings[_prompt_key(payload)] = {
+                    "response": data.get("response", ""),
+                    "seconds": round(time.perf_counter() - started, 3),
+                }
+            return data
+        finally:
+            self.clock["generate"] += time.perf_counter() - started
+
+    def _stub_response(self, prompt):
+        for entry in self.stub:
+            if entry["match"] in prompt:
+                return {"response": entry["response"]}
+        self.misses += 1
+        return None
+
+
+def _timed(clock, stage, fn):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            clock[stage] += time.perf_counter() - started
+    return wrapper
+
+
+# ──────────────────────────────────────────────────────────
+# 各类用例
+# ──────────────────────────────────────────────────────────
+
+def _run_summary(case, fixture_dir, clock):
+    started = time.perf_counter()
+    raw = (fixture_dir / case["input"]).read_text(encoding="utf-8")
+    clock["extract"] += time.perf_counter() - started
+    return {"summary": ai_helper.summarize_issue(raw, priority="batch") or ""}
+
+
+def _run_8d(case, fixture_dir, clock):
+    return ai_helper.extract_8d(str(fixture_dir / case["input"]), priority="batch") or {}
+
+
+def _run_cp(case, fixture_dir, clock):
+    started = time.perf_counter()
+    from openpyxl import Workbook
+
+    rows = json.loads((fixture_dir / case["input"]).read_text(encoding="utf-8"))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cp.xlsx")
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        clock["setup"] += time.perf_counter() - started
+        started = time.perf_counter()
+        matrix = control_plan_helper._read_xlsx(path)[0]["matrix"]
+        clock["extract"] += time.perf_counter() - started
+    mapped = control_plan_helper._ai_map_matrix(matrix, priority="batch") or {}
+    return {
+        "kind": mapped.get("kind"),
+        "header_row": mapped["start"] + 1 if "start" in mapped else None,
+        "columns": {k: v + 1 for k, v in (mapped.get("mapping") or {}).items()},
+    }
+
+
+RUNNERS = {"summary": _run_summary, "8d": _run_8d, "cp": _run_cp}
+
+
+def score_case(kind, golden, output):
+    """字段 -> 0..1；文本字段按关键词召回，CP 按列号 / 类型是否一致"""
+    scores = {}
+    if kind == "cp":
+        for key, expected in golden["columns"].items():
+            scores[f"columns.{key}"] = float(output.get("columns", {}).get(key) == expected)
+        scores["kind"] = float(output.get("kind") == golden["kind"])
+        scores["header_row"] = float(output.get("header_row") == golden["header_row"])
+        return scores
+    for field, keywords in golden.items():
+        text = (output.get(field) or "").lower()
+        scores[field] = sum(k.lower() in text for k in keywords) / len(keywords) if keywords else 1.0
+    return scores
+
+
+def run_case(case, double, fixture_dir=FIXTURE_DIR, repeat=1):
+    """跑一个用例 repeat 次；返回中位数阶段耗时、字段得分和最后一次输出"""
+    timings = defaultdict(list)
+    output = {}
+    for _ in range(repeat):
+        clock = defaultdict(float)
+        double.clock = clock
+        double.stub = case.get("stub", [])
+        with ExitStack() as stack:
+            stack.enter_context(patch.object(ai_helper, "_ollama_post", double))
+            stack.enter_context(patch.object(
+                ai_helper, "extract_text_from_file",
+                _timed(clock, "extract", ai_helper.extract_text_from_file)))
+            stack.enter_context(patch.object(
+                ai_helper, "_parse_json", _timed(clock, "parse", ai_helper._parse_json)))
+            stack.enter_context(patch.object(
+                control_plan_helper, "_parse_json", _timed(clock, "parse", ai_helper._parse_json)))
+            started = time.perf_counter()
+            output = RUNNERS[case["kind"]](case, fixture_dir, clock)
+            total = time.perf_counter() - started - clock.pop("setup", 0.0) + clock.pop("replayed", 0.0)
+        # map 阶段并行时 generate 为各线程累计，可能超过墙钟；prompt 取不小于 0 的剩余
+        clock["prompt"] = max(0.0, total - clock["extract"] - clock["generate"] - clock["parse"])
+        clock["total"] = total
+        for stage, seconds in clock.items():
+            timings[stage].append(seconds)
+    return {
+        "id": case["id"],
+        "kind": case["kind"],
+        "ms": {stage: round(statistics.median(values) * 1000, 2) for stage, values in timings.items()},
+        "scores": score_case(case["kind"], case["golden"], output),
+        "output": output,
+    }
+
+
+def run_benchmark(mode="stub", kinds=None, repeat=1, record=False, fixture_dir=FIXTURE_DIR):
+    recordings = {}
+    if mode == "replay" or record:
+        if RECORDINGS_FILE.exists():
+            recordings = json.loads(RECORDINGS_FILE.read_text(encoding="utf-8"))
+    double = _OllamaDouble(mode, defaultdict(float), recordings=recordings, record=record)
+    results = [run_case(case, double, fixture_dir, repeat) for case in load_cases(fixture_dir, kinds)]
+    if record:
+        RECORDINGS_FILE.write_text(
+            json.dumps(recordings, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+    return {
+        "mode": mode,
+        "model": ai_helper.OLLAMA_MODEL,
+        "calls": double.calls,
+        "misses": double.misses,
+        "results": results,
+    }
+
+
+def _print_report(report):
+    print(f"mode={report['mode']} model={report['model']} "
+          f"ollama_calls={report['calls']} misses={report['misses']}")
+    header = f"{'case':<18}{'total':>9}" + "".join(f"{s:>10}" for s in STAGES) + f"{'accuracy':>10}"
+    print(header)
+    print("-" * len(header))
+    by_kind = defaultdict(list)
+    for r in report["results"]:
+        accuracy = statistics.mean(r["scores"].values()) if r["scores"] else 0.0
+        by_kind[r["kind"]].append(accuracy)
+        print(f"{r['id']:<18}{r['ms'].get('total', 0):>9.1f}"
+              + "".join(f"{r['ms'].get(s, 0):>10.1f}" for s in STAGES)
+              + f"{accuracy:>10.0%}")
+        for field, score in r["scores"].items():
+            if score < 1:
+                print(f"{'':<18}  {field}: {score:.0%}")
+    print("-" * len(header))
+    for kind, values in by_kind.items():
+        print(f"{kind:<18}mean accuracy {statistics.mean(values):.0%} over {len(values)} case(s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ollama", choices=("stub", "replay", "live"), default="stub")
+    parser.add_argument("--record", action="store_true", help="live 模式下把回复写入 recordings.json")
+    parser.add_argument("--kind", action="append", choices=sorted(RUNNERS))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args(argv)
+    if args.record and args.ollama != "live":
+        parser.error("--record needs --ollama live")
+    if args.ollama == "live" and not ai_helper.is_ollama_available():
+        print("Ollama is not running; use --ollama stub or replay.")
+        return 1
+
+    report = run_benchmark(args.ollama, kinds=args.kind, repeat=args.repeat, record=args.record)
+    _print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
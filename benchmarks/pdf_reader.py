@@ -0,0 +1,162 @@
+"""
+控制计划 PDF 读取基准：逐页串行 vs 进程池并行（_read_pdf）
+
+    python -m benchmarks.pdf_reader                        # 生成 10 / 30 / 60 页的合成语料
+    python -m benchmarks.pdf_reader --pages 40 --workers 4
+    python -m benchmarks.pdf_reader --file a.pdf --file b.pdf
+
+报告每个文件串行和并行的耗时（ms，中位数）、加速比，并校验两种方式得到的
+矩阵 / 文本完全一致。进程池收益取决于 CPU 核数，会一并打印。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from app import control_plan_helper
+from app.control_plan_helper import _read_pdf
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595          # A4 横向
+MARGIN = 30
+COLUMNS = [
+    "Process No.", "Process Name", "Machine", "Product", "Process", "Class",
+    "Specification / Tolerance", "Measurement", "Sample", "Frequency",
+    "Control Method", "Reaction Plan",
+]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(page_no, rows):
+    """一页 AIAG 表格：外框 + 全部行列网格线 + 单元格文字"""
+    width = PAGE_WIDTH - 2 * MARGIN
+    col_width = width / len(COLUMNS)
+    row_height = 14
+    top = PAGE_HEIGHT - MARGIN - 20
+    ops = ["0.5 w", "BT /F1 10 Tf", f"{MARGIN} {PAGE_HEIGHT - MARGIN} Td",
+           f"(CONTROL PLAN  CP-BENCH-001  page {page_no}) Tj", "ET"]
+    table = [COLUMNS] + rows
+    bottom = top - row_height * len(table)
+    for i in range(len(table) + 1):
+        y = top - i * row_height
+        ops.append(f"{MARGIN} {y} m {MARGIN + width} {y} l S")
+    for j in range(len(COLUMNS) + 1):
+        x = MARGIN + j * col_width
+        ops.append(f"{x:.1f} {top} m {x:.1f} {bottom} l S")
+    ops.append("BT /F1 6 Tf")
+    for i, row in enumerate(table):
+        for j, cell in enumerate(row):
+            x = MARGIN + j * col_width + 2
+            y = top - (i + 1) * row_height + 4
+            ops.append(f"1 0 0 1 {x:.1f} {y} Tm ({_escape(cell[:22])}) Tj")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def build_pdf(path, pages=30, rows_per_page=30):
+    """手写最小 PDF（Helvetica + 直线），不依赖额外的 PDF 生成库"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_no in range(1, pages + 1):
+        rows = []
+        for r in range(rows_per_page):
+            n = (page_no - 1) * rows_per_page + r
+            rows.append([
+                str(10 * (n // 5 + 1)), f"Operation {n // 5}", f"M-{n % 7}",
+                f"Dim {n}" if n % 2 else "", "" if n % 2 else f"Param {n}",
+                "SC" if n % 13 == 0 else "", f"{n % 40}.0 +/- 0.{n % 9 + 1}",
+                "Caliper", "5 pcs", "Per shift", "SPC chart", "Stop and adjust",
+            ])
+        stream = _page_stream(page_no, rows)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, content_ref)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref
+    )
+    with open(path, "wb") as handle:
+        handle.write(body)
+
+
+def _median_ms(fn, repeat):
+    seconds, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - started)
+    return statistics.median(seconds) * 1000, result
+
+
+def run(paths, workers, repeat=1):
+    rows = []
+    for path in paths:
+        serial_ms, serial = _median_ms(lambda: _read_pdf(path, workers=1), repeat)
+        # 小文件本来就会退回串行，这里临时放开门槛，测的是纯并行路径
+        threshold = control_plan_helper.PDF_PARALLEL_MIN_PAGES
+        control_plan_helper.PDF_PARALLEL_MIN_PAGES = 0
+        try:
+            parallel_ms, parallel = _median_ms(lambda: _read_pdf(path, workers=workers), repeat)
+        finally:
+            control_plan_helper.PDF_PARALLEL_MIN_PAGES = threshold
+        rows.append({
+            "file": os.path.basename(path),
+            "pages": serial[0]["page_count"],
+            "rows": len(serial[0]["matrix"]),
+            "serial_ms": serial_ms,
+            "parallel_ms": parallel_ms,
+            "identical": serial == parallel,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--file", action="append")
+    parser.add_argument("--pages", type=int, action="append")
+    parser.add_argument("--workers", type=int, default=max(2, control_plan_helper.PDF_WORKERS))
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = list(args.file or [])
+        if not paths:
+            for pages in args.pages or (10, 30, 60):
+                path = os.path.join(tmp, f"cp_{pages:02d}p.pdf")
+                build_pdf(path, pages=pages)
+                paths.append(path)
+        rows = run(paths, args.workers, repeat=args.repeat)
+
+    print(f"cpu_count={os.cpu_count()} workers={args.workers} "
+          f"serial below {control_plan_helper.PDF_PARALLEL_MIN_PAGES} pages in production")
+    print(f"{'file':<18}{'pages':>6}{'rows':>7}{'serial ms':>12}{'parallel ms':>13}{'speedup':>9}  same")
+    for r in rows:
+        print(f"{r['file']:<18}{r['pages']:>6}{r['rows']:>7}{r['serial_ms']:>12.0f}"
+              f"{r['parallel_ms']:>13.0f}{r['serial_ms'] / r['parallel_ms']:>8.2f}x  "
+              f"{'yes' if r['identical'] else 'NO'}")
+    return 0 if all(r["identical"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
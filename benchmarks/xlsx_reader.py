@@ -0,0 +1,173 @@
+"""
+控制计划 XLSX 读取基准：旧的逐格读取 vs 只读流式读取 vs 两阶段选表（粗筛后只读候选表）
+
+    python -m benchmarks.xlsx_reader                 # 生成 12 张表的合成工作簿
+    python -m benchmarks.xlsx_reader --sheets 30 --rows 1500
+    python -m benchmarks.xlsx_reader --file path/to/cp.xlsx
+    python -m benchmarks.xlsx_reader --workers 4     # 候选表并行打分
+
+报告每种方式的耗时（ms，中位数）和 tracemalloc 峰值内存（MB）：
+  read:   只读取矩阵（不打分）
+  select: 读取 + _sheet_score 选表，即 extract_control_plan 选表前的全部开销
+并校验两阶段选出的表和矩阵与旧读取方式一致。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from app import control_plan_helper
+from app.control_plan_helper import (
+    SHEET_PROBE_ROWS, _XlsxReader, _best_xlsx_sheet, _rank_sheets, _read_xlsx, _text,
+)
+
+CP_HEADER = [
+    ["Process Number", "Process Name", "Machine", "Characteristic", "", "", "Special Char. Class",
+     "Methods", "", "", "", "Reaction Plan"],
+    ["", "", "", "No.", "Product", "Process", "", "Specification / Tolerance",
+     "Evaluation Measurement Technique", "Sample Size", "Frequency", ""],
+]
+
+
+def dense_read_xlsx(file_path):
+    """改造前的读取方式（read_only=False + sheet.cell 逐格），仅作基线"""
+    from openpyxl import load_workbook
+    from openpyxl.utils.cell import range_boundaries
+
+    workbook = load_workbook(file_path, data_only=True, read_only=False)
+    sheets = []
+    for sheet in workbook.worksheets:
+        max_row = min(sheet.max_row or 1, 2000)
+        max_col = min(sheet.max_column or 1, 80)
+        matrix = [
+            [_text(sheet.cell(row=row, column=col).value) for col in range(1, max_col + 1)]
+            for row in range(1, max_row + 1)
+        ]
+        for merged_range in sheet.merged_cells.ranges:
+            min_col, min_row, max_merged_col, max_merged_row = range_boundaries(str(merged_range))
+            if min_row > max_row or min_col > max_col:
+                continue
+            anchor = matrix[min_row - 1][min_col - 1]
+            for row in range(min_row, min(max_merged_row, max_row) + 1):
+                for col in range(min_col, min(max_merged_col, max_col) + 1):
+                    matrix[row - 1][col - 1] = anchor
+        sheets.append({"name": sheet.title, "matrix": matrix})
+    workbook.close()
+    return sheets
+
+
+def build_workbook(path, sheets=12, rows=1200, cols=24):
+    """一张控制计划表 + 若干说明 / 修订记录 / 零件清单表"""
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    cp = workbook.active
+    cp.title = "Control Plan"
+    cp.append(["CONTROL PLAN"])
+    cp.merge_cells("A1:L1")
+    for header in CP_HEADER:
+        cp.append(header)
+    cp.merge_cells("D2:F2")
+    cp.merge_cells("H2:K2")
+    for column in "ABCGL":
+        cp.merge_cells(f"{column}2:{column}3")
+    for i in range(rows):
+        step = i // 6
+        cp.append([
+            str(10 + step * 10), f"Operation {step}", f"M-{step % 9}", str(i + 1),
+            f"Dimension {i}" if i % 2 else "", "" if i % 2 else f"Parameter {i}",
+            "SC" if i % 11 == 0 else "", f"{i % 50}±0.{i % 9 + 1}", "Caliper",
+            "5", "Per shift", "Stop and adjust",
+        ])
+    for n in range(1, sheets):
+        sheet = workbook.create_sheet(f"Tab {n:02d}")
+        sheet.append([f"Revision log {n}"])
+        sheet.merge_cells(f"A1:{chr(64 + min(cols, 26))}1")
+        for r in range(rows):
+            sheet.append([f"r{r}c{c}" if (r + c) % 3 else None for c in range(cols)])
+    workbook.save(path)
+
+
+def _measure(fn, repeat):
+    """耗时取不开 tracemalloc 的中位数；峰值内存单独跑一次测量"""
+    seconds, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(seconds) * 1000, peak / (1 << 20), result
+
+
+def _trimmed(matrix):
+    rows = [list(row) for row in matrix]
+    while rows and not any(rows[-1]):
+        rows.pop()
+    width = max((max((i for i, v in enumerate(r) if v), default=-1) + 1 for r in rows), default=0)
+    return [r[:max(width, 1)] for r in rows]
+
+
+def run(file_path, repeat=3, workers=1):
+    def probe_read(winner):
+        with _XlsxReader(file_path) as reader:
+            probes = [reader.read(name, max_rows=SHEET_PROBE_ROWS) for name in reader.sheet_names]
+            return probes, reader.read(winner)
+
+    def dense_select():
+        return _rank_sheets(dense_read_xlsx(file_path))
+
+    winner = dense_select()[0]["name"]
+    results = {}
+    for label, fn in (
+        ("read: dense, all", lambda: dense_read_xlsx(file_path)),
+        ("read: streaming, all", lambda: _read_xlsx(file_path)),
+        ("read: probe + winner", lambda: probe_read(winner)),
+        ("select: dense + rank", dense_select),
+        ("select: two-phase", lambda: _best_xlsx_sheet(file_path, workers=1)),
+    ) + ((
+        (f"select: two-phase x{workers}", lambda: _best_xlsx_sheet(file_path, workers=workers)),
+    ) if workers > 1 else ()):
+        results[label] = _measure(fn, repeat)
+
+    baseline_sheet, baseline_header = results["select: dense + rank"][2]
+    probe_sheet, probe_header = results["select: two-phase"][2]
+    same = (
+        baseline_sheet["name"] == probe_sheet["name"]
+        and baseline_header == probe_header
+        and _trimmed(baseline_sheet["matrix"]) == probe_sheet["matrix"]
+    )
+    return results, same
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--file")
+    parser.add_argument("--sheets", type=int, default=12)
+    parser.add_argument("--rows", type=int, default=1200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = args.file
+        if not file_path:
+            file_path = os.path.join(tmp, "bench_cp.xlsx")
+            build_workbook(file_path, sheets=args.sheets, rows=args.rows)
+        results, same = run(file_path, repeat=args.repeat, workers=args.workers)
+
+    print(f"{os.path.basename(file_path)}  parser={control_plan_helper.PARSER_VERSION}")
+    print(f"{'reader':<28}{'ms':>10}{'peak MB':>10}")
+    for label, (ms, peak_mb, _) in results.items():
+        print(f"{label:<28}{ms:>10.1f}{peak_mb:>10.1f}")
+    print(f"selected sheet identical to dense reader: {'yes' if same else 'NO'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Full-text index over trouble report text for the supplier quality tab
+
+Revision ID: 0b7e3d5a9c14
+Revises: 9a4f0c7d2b61
+Create Date: 2026-10-19 19:00:00
+
+"""
+from alembic import op
+
+
+revision = "0b7e3d5a9c14"
+down_revision = "9a4f0c7d2b61"
+branch_labels = None
+depends_on = None
+
+FTS = "trouble_reports_fts"
+COLUMNS = (
+    "tr_no", "part_number", "part_name", "issue_summary",
+    "issue_description", "case_no", "eight_d", "debit_ref",
+)
+
+
+def upgrade():
+    cols = ", ".join(COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in COLUMNS)
+    op.execute(
+        f"CREATE VIRTUAL TABLE {FTS} USING fts5({cols}, "
+        f"content='trouble_reports', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        f"CREATE TRIGGER trouble_reports_ai AFTER INSERT ON trouble_reports "
+        f"BEGIN INSERT INTO {FTS}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER trouble_reports_ad AFTER DELETE ON trouble_reports "
+        f"BEGIN INSERT INTO {FTS}({FTS}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER trouble_reports_au AFTER UPDATE OF {cols} ON trouble_reports "
+        f"BEGIN INSERT INTO {FTS}({FTS}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {FTS}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+    )
+    op.execute(f"INSERT INTO {FTS}({FTS}) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trouble_reports_au")
+    op.execute("DROP TRIGGER IF EXISTS trouble_reports_ad")
+    op.execute("DROP TRIGGER IF EXISTS trouble_reports_ai")
+    op.execute(f"DROP TABLE IF EXISTS {FTS}")
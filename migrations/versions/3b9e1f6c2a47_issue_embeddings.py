@@ -0,0 +1,49 @@
+"""Issue embeddings for similar-issue retrieval
+
+Revision ID: 3b9e1f6c2a47
+Revises: 8d4a2c9e710b
+Create Date: 2026-10-19 09:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "3b9e1f6c2a47"
+down_revision = "8d4a2c9e710b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "issue_embeddings",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("source_type", sa.String(length=20), nullable=False),
+        sa.Column("source_id", sa.Integer(), nullable=False),
+        sa.Column("model", sa.String(length=100), nullable=False),
+        sa.Column("text_hash", sa.String(length=64), nullable=False),
+        sa.Column("dim", sa.Integer(), nullable=False),
+        sa.Column("vector", sa.LargeBinary(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("source_type", "source_id", name="uq_issue_embedding_source"),
+    )
+    with op.batch_alter_table("issue_embeddings", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_issue_embeddings_source_type"), ["source_type"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_issue_embeddings_source_id"), ["source_id"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_issue_embeddings_updated_at"), ["updated_at"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("issue_embeddings", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_issue_embeddings_updated_at"))
+        batch_op.drop_index(batch_op.f("ix_issue_embeddings_source_id"))
+        batch_op.drop_index(batch_op.f("ix_issue_embeddings_source_type"))
+
+    op.drop_table("issue_embeddings")
@@ -0,0 +1,62 @@
+"""Persisted issue_date on trouble_reports
+
+Revision ID: 5d1c8e3a7f90
+Revises: 0b7e3d5a9c14
+Create Date: 2026-10-19 19:30:00
+
+issue_date is the date in the last "|" segment of remark, falling back to
+created_at. Existing rows are backfilled here; afterwards the model keeps
+it in sync on every insert / update. Plain ADD COLUMN (no batch
+recreate) so the trouble_reports FTS triggers are left in place.
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "5d1c8e3a7f90"
+down_revision = "0b7e3d5a9c14"
+branch_labels = None
+depends_on = None
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y")
+BATCH = 1000
+
+
+def _issue_date(remark, created_at):
+    raw = (remark or "").strip().split("|")[-1].strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at) if created_at else None
+    return created_at.date() if created_at else None
+
+
+def upgrade():
+    op.add_column("trouble_reports", sa.Column("issue_date", sa.Date(), nullable=True))
+    op.create_index("ix_trouble_reports_issue_date", "trouble_reports", ["issue_date"], unique=False)
+    op.create_index(
+        "ix_trouble_reports_supplier_issue_date", "trouble_reports", ["supplier_id", "issue_date"], unique=False
+    )
+
+    bind = op.get_bind()
+    trs = sa.table("trouble_reports", sa.column("id", sa.Integer), sa.column("issue_date", sa.Date))
+    rows = bind.execute(sa.text("SELECT id, remark, created_at FROM trouble_reports")).all()
+    updates = [
+        {"tr_id": tr_id, "value": _issue_date(remark, created_at)}
+        for tr_id, remark, created_at in rows
+    ]
+    statement = trs.update().where(trs.c.id == sa.bindparam("tr_id")).values(issue_date=sa.bindparam("value"))
+    for i in range(0, len(updates), BATCH):
+        bind.execute(statement, updates[i:i + BATCH])
+
+
+def downgrade():
+    op.drop_index("ix_trouble_reports_supplier_issue_date", table_name="trouble_reports")
+    op.drop_index("ix_trouble_reports_issue_date", table_name="trouble_reports")
+    # ALTER TABLE ... DROP COLUMN（SQLite ≥ 3.35），同样不重建表、不丢 FTS 触发器
+    op.execute("ALTER TABLE trouble_reports DROP COLUMN issue_date")
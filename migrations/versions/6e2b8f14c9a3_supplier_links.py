@@ -0,0 +1,62 @@
+"""Supplier aliases and supplier_id on trouble reports / business trips
+
+Revision ID: 6e2b8f14c9a3
+Revises: d91f4b6a2e37
+Create Date: 2026-10-19 18:00:00
+
+Existing rows keep supplier_id NULL until backfill_supplier_links.py has
+registered the aliases and reported what could not be matched.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "6e2b8f14c9a3"
+down_revision = "d91f4b6a2e37"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "supplier_aliases",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("supplier_id", sa.Integer(), nullable=False),
+        sa.Column("alias", sa.String(length=255), nullable=False),
+        sa.Column("alias_key", sa.String(length=255), nullable=False),
+        sa.Column("source", sa.String(length=20), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["supplier_id"], ["suppliers.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("supplier_aliases", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_supplier_aliases_alias_key"), ["alias_key"], unique=True)
+        batch_op.create_index(batch_op.f("ix_supplier_aliases_supplier_id"), ["supplier_id"], unique=False)
+
+    for table in ("trouble_reports", "business_trips"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column("supplier_id", sa.Integer(), nullable=True))
+            batch_op.create_index(batch_op.f(f"ix_{table}_supplier_id"), ["supplier_id"], unique=False)
+            batch_op.create_foreign_key(
+                f"fk_{table}_supplier_id", "suppliers", ["supplier_id"], ["id"], ondelete="SET NULL"
+            )
+
+    with op.batch_alter_table("audit_reports", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_audit_reports_supplier_id"), ["supplier_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("audit_reports", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_audit_reports_supplier_id"))
+
+    for table in ("business_trips", "trouble_reports"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(f"fk_{table}_supplier_id", type_="foreignkey")
+            batch_op.drop_index(batch_op.f(f"ix_{table}_supplier_id"))
+            batch_op.drop_column("supplier_id")
+
+    with op.batch_alter_table("supplier_aliases", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_supplier_aliases_supplier_id"))
+        batch_op.drop_index(batch_op.f("ix_supplier_aliases_alias_key"))
+
+    op.drop_table("supplier_aliases")
@@ -0,0 +1,24 @@
+"""Composite (supplier_id, created_at) index on trouble_reports
+
+Revision ID: 9a4f0c7d2b61
+Revises: 6e2b8f14c9a3
+Create Date: 2026-10-19 18:30:00
+
+"""
+from alembic import op
+
+
+revision = "9a4f0c7d2b61"
+down_revision = "6e2b8f14c9a3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_trouble_reports_supplier_created", "trouble_reports", ["supplier_id", "created_at"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_trouble_reports_supplier_created", table_name="trouble_reports")
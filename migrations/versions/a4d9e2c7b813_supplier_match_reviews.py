@@ -0,0 +1,50 @@
+"""Supplier name review queue
+
+Revision ID: a4d9e2c7b813
+Revises: c3e8a1f5d204
+Create Date: 2026-10-19 21:00:00
+
+Starts empty; new unmatched names are queued on write, and
+backfill_supplier_links.py queues the historical ones.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "a4d9e2c7b813"
+down_revision = "c3e8a1f5d204"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "supplier_match_reviews",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("raw_name", sa.String(length=255), nullable=False),
+        sa.Column("name_key", sa.String(length=255), nullable=False),
+        sa.Column("supplier_code", sa.String(length=64), nullable=True),
+        sa.Column("source", sa.String(length=30), nullable=False),
+        sa.Column("occurrences", sa.Integer(), nullable=False),
+        sa.Column("suggested_supplier_id", sa.Integer(), nullable=True),
+        sa.Column("suggested_score", sa.Float(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("resolved_supplier_id", sa.Integer(), nullable=True),
+        sa.Column("first_seen", sa.DateTime(), nullable=True),
+        sa.Column("last_seen", sa.DateTime(), nullable=True),
+        sa.Column("resolved_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["suggested_supplier_id"], ["suppliers.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["resolved_supplier_id"], ["suppliers.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("supplier_match_reviews", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_supplier_match_reviews_name_key"), ["name_key"], unique=True)
+        batch_op.create_index(batch_op.f("ix_supplier_match_reviews_status"), ["status"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("supplier_match_reviews", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_supplier_match_reviews_status"))
+        batch_op.drop_index(batch_op.f("ix_supplier_match_reviews_name_key"))
+
+    op.drop_table("supplier_match_reviews")
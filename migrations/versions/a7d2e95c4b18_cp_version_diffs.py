@@ -0,0 +1,57 @@
+"""Stored structured diffs between control plan versions
+
+Revision ID: a7d2e95c4b18
+Revises: f3c8a1d47b26
+Create Date: 2026-10-19 16:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "a7d2e95c4b18"
+down_revision = "f3c8a1d47b26"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "control_plan_version_diffs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("cp_id", sa.Integer(), nullable=False),
+        sa.Column("base_version_id", sa.Integer(), nullable=False),
+        sa.Column("target_version_id", sa.Integer(), nullable=False),
+        sa.Column("diff_version", sa.String(length=30), nullable=False),
+        sa.Column("base_hash", sa.String(length=64), nullable=False),
+        sa.Column("target_hash", sa.String(length=64), nullable=False),
+        sa.Column("steps_added", sa.Integer(), nullable=False),
+        sa.Column("steps_removed", sa.Integer(), nullable=False),
+        sa.Column("steps_changed", sa.Integer(), nullable=False),
+        sa.Column("chars_added", sa.Integer(), nullable=False),
+        sa.Column("chars_removed", sa.Integer(), nullable=False),
+        sa.Column("chars_changed", sa.Integer(), nullable=False),
+        sa.Column("diff_json", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["cp_id"], ["control_plans.id"]),
+        sa.ForeignKeyConstraint(["base_version_id"], ["control_plan_versions.id"]),
+        sa.ForeignKeyConstraint(["target_version_id"], ["control_plan_versions.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("base_version_id", "target_version_id", name="uq_cp_version_diff_pair"),
+    )
+    with op.batch_alter_table("control_plan_version_diffs", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_control_plan_version_diffs_cp_id"), ["cp_id"], unique=False)
+        batch_op.create_index(
+            batch_op.f("ix_control_plan_version_diffs_base_version_id"), ["base_version_id"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_control_plan_version_diffs_target_version_id"), ["target_version_id"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("control_plan_version_diffs", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_control_plan_version_diffs_target_version_id"))
+        batch_op.drop_index(batch_op.f("ix_control_plan_version_diffs_base_version_id"))
+        batch_op.drop_index(batch_op.f("ix_control_plan_version_diffs_cp_id"))
+
+    op.drop_table("control_plan_version_diffs")
@@ -0,0 +1,134 @@
+"""Recompute supplier alias / review keys with whole-word legal suffixes
+
+Revision ID: b7e4d2a9c316
+Revises: f1a7c3e9d458
+Create Date: 2026-10-20 10:00:00
+
+supplier_key used to strip legal-form suffixes from the squashed string, so
+"Metalco" and "Metal" both became "metal" and the first supplier owned the
+key. Keys are now built from whole trailing words. Existing alias_key /
+name_key values are recomputed here; when two rows land on the same key the
+older one is kept (review occurrences are merged). Afterwards run
+backfill_supplier_links.py --relink-all so records linked through a
+colliding key are re-resolved.
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "b7e4d2a9c316"
+down_revision = "f1a7c3e9d458"
+branch_labels = None
+depends_on = None
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_LEGAL_SUFFIX_TOKENS = (
+    ("company",), ("limited",), ("co",), ("ltd",), ("gmbh",), ("spa",), ("srl",), ("inc",), ("corp",),
+    ("s", "p", "a"), ("s", "r", "l"),
+)
+_LEGAL_SUFFIXES_CJK = ("股份有限公司", "有限责任公司", "有限公司")
+_OLD_LEGAL_SUFFIXES = (
+    "股份有限公司", "有限责任公司", "有限公司", "companylimited", "coltd", "limited", "ltd",
+    "gmbh", "spa", "srl", "inc", "corp", "co",
+)
+_PLACEHOLDER_CODES = {"", "n/a", "na", "-", "none"}
+
+
+def _supplier_key(text):
+    tokens = [t for t in _NON_WORD.split(unicodedata.normalize("NFKC", text or "").casefold()) if t]
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in _LEGAL_SUFFIX_TOKENS:
+            if len(tokens) > len(suffix) and tuple(tokens[-len(suffix):]) == suffix:
+                del tokens[-len(suffix):]
+                stripped = True
+                break
+        else:
+            for suffix in _LEGAL_SUFFIXES_CJK:
+                if tokens and tokens[-1].endswith(suffix) and len(tokens[-1]) > len(suffix):
+                    tokens[-1] = tokens[-1][:-len(suffix)]
+                    stripped = True
+                    break
+    return "".join(tokens)[:255]
+
+
+def _old_supplier_key(text):
+    key = _NON_WORD.sub("", unicodedata.normalize("NFKC", text or "").casefold())
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in _OLD_LEGAL_SUFFIXES:
+            if key.endswith(suffix) and len(key) > len(suffix):
+                key = key[:-len(suffix)]
+                stripped = True
+                break
+    return key[:255]
+
+
+def _alias_key(key_fn, alias, source):
+    if source == "code" and (alias or "").strip().lower() in _PLACEHOLDER_CODES:
+        return ""
+    return key_fn(alias)
+
+
+def _rekey_aliases(bind, key_fn):
+    rows = bind.execute(sa.text("SELECT id, alias, alias_key, source FROM supplier_aliases ORDER BY id")).all()
+    seen, updates, duplicates = set(), [], []
+    for row_id, alias, alias_key, source in rows:
+        key = _alias_key(key_fn, alias, source)
+        if not key or key in seen:
+            duplicates.append(row_id)
+            continue
+        seen.add(key)
+        if key != alias_key:
+            updates.append({"row_id": row_id, "key": key})
+    _apply(bind, "supplier_aliases", "alias_key", updates, duplicates)
+
+
+def _rekey_reviews(bind, key_fn):
+    rows = bind.execute(sa.text(
+        "SELECT id, raw_name, name_key, occurrences FROM supplier_match_reviews ORDER BY id"
+    )).all()
+    kept, duplicates = {}, []
+    for row_id, raw_name, name_key, occurrences in rows:
+        key = key_fn(raw_name)
+        if not key:
+            continue
+        if key in kept:
+            kept[key]["occurrences"] += occurrences or 0
+            duplicates.append(row_id)
+            continue
+        kept[key] = {"row_id": row_id, "key": key, "occurrences": occurrences or 0, "changed": key != name_key}
+    _apply(bind, "supplier_match_reviews", "name_key", [], duplicates)
+    for row in kept.values():
+        bind.execute(
+            sa.text("UPDATE supplier_match_reviews SET occurrences = :occurrences WHERE id = :row_id"),
+            {"occurrences": row["occurrences"], "row_id": row["row_id"]},
+        )
+    _apply(bind, "supplier_match_reviews", "name_key",
+           [{"row_id": r["row_id"], "key": r["key"]} for r in kept.values() if r["changed"]], [])
+
+
+def _apply(bind, table, column, updates, duplicates):
+    if duplicates:
+        bind.execute(sa.text(f"DELETE FROM {table} WHERE id = :row_id"), [{"row_id": i} for i in duplicates])
+    if updates:
+        # 先挪到临时 key 再写新值，避免逐行改写时撞上唯一索引
+        bind.execute(sa.text(f"UPDATE {table} SET {column} = '#' || id WHERE id = :row_id"), updates)
+        bind.execute(sa.text(f"UPDATE {table} SET {column} = :key WHERE id = :row_id"), updates)
+
+
+def upgrade():
+    bind = op.get_bind()
+    _rekey_aliases(bind, _supplier_key)
+    _rekey_reviews(bind, _supplier_key)
+
+
+def downgrade():
+    bind = op.get_bind()
+    _rekey_aliases(bind, _old_supplier_key)
+    _rekey_reviews(bind, _old_supplier_key)
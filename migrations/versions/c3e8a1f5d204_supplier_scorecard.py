@@ -0,0 +1,49 @@
+"""Precomputed supplier scorecard
+
+Revision ID: c3e8a1f5d204
+Revises: 5d1c8e3a7f90
+Create Date: 2026-10-19 20:00:00
+
+The table starts empty; the app fills it on startup (scorecard scheduler) or
+run refresh_supplier_scorecards.py right after upgrading.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "c3e8a1f5d204"
+down_revision = "5d1c8e3a7f90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "supplier_scorecard",
+        sa.Column("supplier_id", sa.Integer(), nullable=False),
+        sa.Column("total_trs", sa.Integer(), nullable=False),
+        sa.Column("open_trs", sa.Integer(), nullable=False),
+        sa.Column("closed_trs", sa.Integer(), nullable=False),
+        sa.Column("eight_d_pending", sa.Integer(), nullable=False),
+        sa.Column("debit_total", sa.Float(), nullable=False),
+        sa.Column("debit_by_currency_json", sa.Text(), nullable=True),
+        sa.Column("audit_count", sa.Integer(), nullable=False),
+        sa.Column("open_findings", sa.Integer(), nullable=False),
+        sa.Column("parts_count", sa.Integer(), nullable=False),
+        sa.Column("cp_parts", sa.Integer(), nullable=False),
+        sa.Column("last_activity", sa.DateTime(), nullable=True),
+        sa.Column("refreshed_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["supplier_id"], ["suppliers.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("supplier_id"),
+    )
+    with op.batch_alter_table("supplier_scorecard", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_supplier_scorecard_open_trs"), ["open_trs"], unique=False)
+        batch_op.create_index(batch_op.f("ix_supplier_scorecard_last_activity"), ["last_activity"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("supplier_scorecard", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_supplier_scorecard_last_activity"))
+        batch_op.drop_index(batch_op.f("ix_supplier_scorecard_open_trs"))
+
+    op.drop_table("supplier_scorecard")
@@ -0,0 +1,48 @@
+"""Control plan extraction result cache
+
+Revision ID: c41d7e2b9f05
+Revises: 3b9e1f6c2a47
+Create Date: 2026-10-19 11:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "c41d7e2b9f05"
+down_revision = "3b9e1f6c2a47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "control_plan_extractions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("file_sha256", sa.String(length=64), nullable=False),
+        sa.Column("parser_version", sa.String(length=30), nullable=False),
+        sa.Column("force_ai", sa.Boolean(), nullable=False),
+        sa.Column("ai_model", sa.String(length=100), nullable=True),
+        sa.Column("result_json", sa.Text(), nullable=False),
+        sa.Column("hit_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "file_sha256", "parser_version", "force_ai", name="uq_cp_extraction_key"
+        ),
+    )
+    with op.batch_alter_table("control_plan_extractions", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_control_plan_extractions_file_sha256"), ["file_sha256"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_control_plan_extractions_parser_version"), ["parser_version"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("control_plan_extractions", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_control_plan_extractions_parser_version"))
+        batch_op.drop_index(batch_op.f("ix_control_plan_extractions_file_sha256"))
+
+    op.drop_table("control_plan_extractions")
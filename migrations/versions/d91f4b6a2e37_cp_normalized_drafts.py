@@ -0,0 +1,172 @@
+"""Normalized control plan draft rows
+
+Revision ID: d91f4b6a2e37
+Revises: a7d2e95c4b18
+Create Date: 2026-10-19 17:00:00
+
+Drafts move from control_plan_versions.structured_json into
+control_plan_draft_steps / control_plan_draft_characteristics. Existing
+JSON is copied into the new tables and left in place; the application no
+longer reads it. Stored version diffs are keyed by draft_revision instead
+of a JSON hash, so they are discarded and recomputed on demand.
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "d91f4b6a2e37"
+down_revision = "a7d2e95c4b18"
+branch_labels = None
+depends_on = None
+
+STEP_FIELDS = (
+    "seq", "process_code", "process_name", "machine", "is_key_process", "notes",
+    "source_sheet", "source_row",
+)
+CHAR_FIELDS = (
+    "char_code", "char_name", "char_type", "special_class", "spec_value", "spec_unit",
+    "tolerance", "measurement_method", "sample_size", "frequency", "inspector",
+    "control_method", "reaction_plan", "is_key_char", "source_sheet", "source_row",
+    "confidence",
+)
+
+
+def _copy_json_drafts():
+    bind = op.get_bind()
+    steps_table = sa.Table(
+        "control_plan_draft_steps", sa.MetaData(),
+        sa.Column("id", sa.Integer, primary_key=True), sa.Column("version_id", sa.Integer),
+        sa.Column("position", sa.Integer),
+        *(sa.Column(field) for field in STEP_FIELDS),
+    )
+    chars_table = sa.table(
+        "control_plan_draft_characteristics",
+        sa.column("draft_step_id", sa.Integer), sa.column("version_id", sa.Integer),
+        sa.column("position", sa.Integer),
+        *(sa.column(field) for field in CHAR_FIELDS),
+    )
+    versions = bind.execute(sa.text(
+        "SELECT id, structured_json FROM control_plan_versions WHERE structured_json IS NOT NULL"
+    )).all()
+    for version_id, raw in versions:
+        try:
+            steps = (json.loads(raw) or {}).get("steps") or []
+        except (TypeError, ValueError):
+            continue
+        for position, step in enumerate(steps):
+            row = {field: step.get(field) for field in STEP_FIELDS}
+            row["process_name"] = step.get("process_name") or "Unspecified process"
+            row["is_key_process"] = bool(step.get("is_key_process"))
+            step_id = bind.execute(
+                steps_table.insert().values(version_id=version_id, position=position, **row)
+            ).inserted_primary_key[0]
+            chars = []
+            for char_position, item in enumerate(step.get("characteristics") or []):
+                char = {field: item.get(field) for field in CHAR_FIELDS}
+                char["char_name"] = item.get("char_name") or "Control characteristic"
+                char["char_type"] = item.get("char_type") or "product"
+                char["is_key_char"] = bool(item.get("is_key_char"))
+                chars.append({
+                    "draft_step_id": step_id, "version_id": version_id,
+                    "position": char_position, **char,
+                })
+            if chars:
+                bind.execute(chars_table.insert(), chars)
+
+
+def upgrade():
+    op.create_table(
+        "control_plan_draft_steps",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version_id", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=True),
+        sa.Column("process_code", sa.String(length=50), nullable=True),
+        sa.Column("process_name", sa.String(length=255), nullable=False),
+        sa.Column("machine", sa.Text(), nullable=True),
+        sa.Column("is_key_process", sa.Boolean(), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("source_sheet", sa.String(length=255), nullable=True),
+        sa.Column("source_row", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["version_id"], ["control_plan_versions.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("version_id", "position", name="uq_cp_draft_step_position"),
+    )
+    with op.batch_alter_table("control_plan_draft_steps", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_control_plan_draft_steps_version_id"), ["version_id"], unique=False
+        )
+
+    op.create_table(
+        "control_plan_draft_characteristics",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("draft_step_id", sa.Integer(), nullable=False),
+        sa.Column("version_id", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("char_name", sa.String(length=255), nullable=False),
+        sa.Column("char_type", sa.String(length=20), nullable=True),
+        sa.Column("char_code", sa.String(length=50), nullable=True),
+        sa.Column("special_class", sa.String(length=50), nullable=True),
+        sa.Column("spec_value", sa.Text(), nullable=True),
+        sa.Column("spec_unit", sa.String(length=30), nullable=True),
+        sa.Column("tolerance", sa.String(length=50), nullable=True),
+        sa.Column("measurement_method", sa.Text(), nullable=True),
+        sa.Column("control_method", sa.Text(), nullable=True),
+        sa.Column("sample_size", sa.String(length=50), nullable=True),
+        sa.Column("frequency", sa.String(length=50), nullable=True),
+        sa.Column("inspector", sa.String(length=100), nullable=True),
+        sa.Column("reaction_plan", sa.Text(), nullable=True),
+        sa.Column("is_key_char", sa.Boolean(), nullable=True),
+        sa.Column("source_sheet", sa.String(length=255), nullable=True),
+        sa.Column("source_row", sa.Integer(), nullable=True),
+        sa.Column("confidence", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["draft_step_id"], ["control_plan_draft_steps.id"]),
+        sa.ForeignKeyConstraint(["version_id"], ["control_plan_versions.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("control_plan_draft_characteristics", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_control_plan_draft_characteristics_draft_step_id"),
+            ["draft_step_id"], unique=False,
+        )
+        batch_op.create_index(
+            batch_op.f("ix_control_plan_draft_characteristics_version_id"),
+            ["version_id"], unique=False,
+        )
+
+    with op.batch_alter_table("control_plan_versions", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("draft_revision", sa.Integer(), nullable=False, server_default="1")
+        )
+
+    op.execute("DELETE FROM control_plan_version_diffs")
+    with op.batch_alter_table("control_plan_version_diffs", schema=None) as batch_op:
+        batch_op.drop_column("base_hash")
+        batch_op.drop_column("target_hash")
+        batch_op.add_column(sa.Column("base_revision", sa.Integer(), nullable=False))
+        batch_op.add_column(sa.Column("target_revision", sa.Integer(), nullable=False))
+
+    _copy_json_drafts()
+
+
+def downgrade():
+    op.execute("DELETE FROM control_plan_version_diffs")
+    with op.batch_alter_table("control_plan_version_diffs", schema=None) as batch_op:
+        batch_op.drop_column("target_revision")
+        batch_op.drop_column("base_revision")
+        batch_op.add_column(sa.Column("base_hash", sa.String(length=64), nullable=False))
+        batch_op.add_column(sa.Column("target_hash", sa.String(length=64), nullable=False))
+
+    with op.batch_alter_table("control_plan_versions", schema=None) as batch_op:
+        batch_op.drop_column("draft_revision")
+
+    with op.batch_alter_table("control_plan_draft_characteristics", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_control_plan_draft_characteristics_version_id"))
+        batch_op.drop_index(batch_op.f("ix_control_plan_draft_characteristics_draft_step_id"))
+    op.drop_table("control_plan_draft_characteristics")
+
+    with op.batch_alter_table("control_plan_draft_steps", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_control_plan_draft_steps_version_id"))
+    op.drop_table("control_plan_draft_steps")
@@ -0,0 +1,24 @@
+"""Background control plan extraction stage
+
+Revision ID: e6a0b3d85c12
+Revises: c41d7e2b9f05
+Create Date: 2026-10-19 13:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "e6a0b3d85c12"
+down_revision = "c41d7e2b9f05"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("control_plan_versions", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("extract_stage", sa.String(length=30), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("control_plan_versions", schema=None) as batch_op:
+        batch_op.drop_column("extract_stage")
@@ -0,0 +1,27 @@
+"""Index edc_reports.supplier_id / part_id
+
+Revision ID: e8b5c1d3f692
+Revises: a4d9e2c7b813
+Create Date: 2026-10-19 22:00:00
+
+Existing rows stay unlinked until relink_edc_reports.py has run.
+"""
+from alembic import op
+
+
+revision = "e8b5c1d3f692"
+down_revision = "a4d9e2c7b813"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("edc_reports", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_edc_reports_supplier_id"), ["supplier_id"], unique=False)
+        batch_op.create_index(batch_op.f("ix_edc_reports_part_id"), ["part_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("edc_reports", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_edc_reports_part_id"))
+        batch_op.drop_index(batch_op.f("ix_edc_reports_supplier_id"))
@@ -0,0 +1,76 @@
+"""Normalized part_key on trouble_reports / edc_reports and part_quality_rollup
+
+Revision ID: f1a7c3e9d458
+Revises: e8b5c1d3f692
+Create Date: 2026-10-19 23:00:00
+
+part_key is part_number / drawing with NFKC, whitespace removed and upper
+case. Existing rows are backfilled here; afterwards the models keep it in
+sync on every insert / update. Plain ADD COLUMN (no batch recreate) so the
+trouble_reports FTS triggers are left in place. The rollup table starts
+empty; run refresh_part_quality.py right after upgrading (pages compute a
+missing row on the fly until then).
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "f1a7c3e9d458"
+down_revision = "e8b5c1d3f692"
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+_SPACES = re.compile(r"\s+")
+
+
+def _part_key(pn):
+    return _SPACES.sub("", unicodedata.normalize("NFKC", pn or "")).upper()[:128] or None
+
+
+def _backfill(bind, table_name, pk, source):
+    table = sa.table(table_name, sa.column(pk), sa.column("part_key", sa.String))
+    rows = bind.execute(sa.text(f"SELECT {pk}, {source} FROM {table_name}")).all()
+    updates = [{"row_pk": row_pk, "value": _part_key(value)} for row_pk, value in rows if value]
+    statement = table.update().where(table.c[pk] == sa.bindparam("row_pk")).values(part_key=sa.bindparam("value"))
+    for i in range(0, len(updates), BATCH):
+        bind.execute(statement, updates[i:i + BATCH])
+
+
+def upgrade():
+    op.add_column("trouble_reports", sa.Column("part_key", sa.String(length=128), nullable=True))
+    op.create_index("ix_trouble_reports_part_key", "trouble_reports", ["part_key"], unique=False)
+    op.add_column("edc_reports", sa.Column("part_key", sa.String(length=128), nullable=True))
+    op.create_index("ix_edc_reports_part_key", "edc_reports", ["part_key"], unique=False)
+
+    op.create_table(
+        "part_quality_rollup",
+        sa.Column("part_key", sa.String(length=128), nullable=False),
+        sa.Column("pn", sa.String(length=128), nullable=False),
+        sa.Column("edc_count", sa.Integer(), nullable=False),
+        sa.Column("rejected_parts", sa.Integer(), nullable=False),
+        sa.Column("received_parts", sa.Integer(), nullable=False),
+        sa.Column("tr_count", sa.Integer(), nullable=False),
+        sa.Column("open_trs", sa.Integer(), nullable=False),
+        sa.Column("open_8d", sa.Integer(), nullable=False),
+        sa.Column("last_edc_date", sa.Date(), nullable=True),
+        sa.Column("last_tr_date", sa.Date(), nullable=True),
+        sa.Column("refreshed_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("part_key"),
+    )
+
+    bind = op.get_bind()
+    _backfill(bind, "trouble_reports", "id", "part_number")
+    _backfill(bind, "edc_reports", "report_no", "drawing")
+
+
+def downgrade():
+    op.drop_table("part_quality_rollup")
+    op.drop_index("ix_edc_reports_part_key", table_name="edc_reports")
+    op.execute("ALTER TABLE edc_reports DROP COLUMN part_key")
+    op.drop_index("ix_trouble_reports_part_key", table_name="trouble_reports")
+    # ALTER TABLE ... DROP COLUMN（SQLite ≥ 3.35），同样不重建表、不丢 FTS 触发器
+    op.execute("ALTER TABLE trouble_reports DROP COLUMN part_key")
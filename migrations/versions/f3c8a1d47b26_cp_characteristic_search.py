@@ -0,0 +1,63 @@
+"""Cross-plan characteristic search: FTS5 index and filter indexes
+
+Revision ID: f3c8a1d47b26
+Revises: e6a0b3d85c12
+Create Date: 2026-10-19 15:00:00
+"""
+from alembic import op
+
+
+revision = "f3c8a1d47b26"
+down_revision = "e6a0b3d85c12"
+branch_labels = None
+depends_on = None
+
+FTS = "control_characteristics_fts"
+COLUMNS = (
+    "char_name", "spec_value", "measurement_method",
+    "control_method", "frequency", "reaction_plan",
+)
+
+
+def upgrade():
+    with op.batch_alter_table("control_characteristics", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_control_characteristics_special_class"), ["special_class"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_control_characteristics_is_key_char"), ["is_key_char"], unique=False
+        )
+
+    cols = ", ".join(COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in COLUMNS)
+    op.execute(
+        f"CREATE VIRTUAL TABLE {FTS} USING fts5({cols}, "
+        f"content='control_characteristics', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        f"CREATE TRIGGER control_characteristics_ai AFTER INSERT ON control_characteristics "
+        f"BEGIN INSERT INTO {FTS}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER control_characteristics_ad AFTER DELETE ON control_characteristics "
+        f"BEGIN INSERT INTO {FTS}({FTS}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER control_characteristics_au AFTER UPDATE ON control_characteristics "
+        f"BEGIN INSERT INTO {FTS}({FTS}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {FTS}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+    )
+    # 已发布的特性一次性建索引
+    op.execute(f"INSERT INTO {FTS}({FTS}) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS control_characteristics_au")
+    op.execute("DROP TRIGGER IF EXISTS control_characteristics_ad")
+    op.execute("DROP TRIGGER IF EXISTS control_characteristics_ai")
+    op.execute(f"DROP TABLE IF EXISTS {FTS}")
+
+    with op.batch_alter_table("control_characteristics", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_control_characteristics_is_key_char"))
+        batch_op.drop_index(batch_op.f("ix_control_characteristics_special_class"))
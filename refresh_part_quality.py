@@ -0,0 +1,29 @@
+"""Recompute part_quality_rollup for all part numbers (or a few of them).
+
+    python refresh_part_quality.py                  # 全量重算
+    python refresh_part_quality.py --pn 1A000123    # 只重算指定零件号
+
+写入 TR / EDC 时已按 part_key 增量刷新；刚迁移完或批量 SQL 改过数据时手工跑一次。
+"""
+import argparse
+
+from app import create_app
+from app.extensions import db
+from app.models import part_key
+from app.part_quality_helper import refresh_rollups
+
+
+def refresh(pns=()):
+    app = create_app()
+    with app.app_context():
+        keys = [part_key(pn) for pn in pns] if pns else None
+        count = refresh_rollups(keys)
+        db.session.commit()
+        print(f"Completed: {count} part rollup(s) refreshed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pn", action="append", default=[], help="只重算这些零件号，可重复")
+    args = parser.parse_args()
+    refresh(pns=args.pn)
@@ -0,0 +1,34 @@
+"""Recompute supplier_scorecard for all suppliers (or a few supplier codes).
+
+    python refresh_supplier_scorecards.py                    # 全量重算
+    python refresh_supplier_scorecards.py --code ZSU0026419  # 只重算指定供应商
+
+写入时已按 supplier_id 增量刷新，应用内也有定时全量刷新；批量 SQL 改过数据或刚迁移完时手工跑一次。
+"""
+import argparse
+
+from app import create_app
+from app.extensions import db
+from app.models import Supplier
+from app.scorecard_helper import refresh_scorecards
+
+
+def refresh(codes=()):
+    app = create_app()
+    with app.app_context():
+        supplier_ids = None
+        if codes:
+            suppliers = Supplier.query.filter(Supplier.code.in_(codes)).all()
+            for code in sorted(set(codes) - {s.code for s in suppliers}):
+                print(f"[skip] unknown supplier code {code}")
+            supplier_ids = [s.id for s in suppliers]
+        count = refresh_scorecards(supplier_ids)
+        db.session.commit()
+        print(f"Completed: {count} scorecard(s) refreshed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--code", action="append", default=[], help="只重算这些供应商代码，可重复")
+    args = parser.parse_args()
+    refresh(codes=args.code)
@@ -0,0 +1,56 @@
+"""Link EDC reports to suppliers and parts by supplier_id / part_id.
+
+    python relink_edc_reports.py                  # 回填尚未关联的 EDC 记录 + 匹配报告
+    python relink_edc_reports.py --dry-run        # 只看报告，不写库
+    python relink_edc_reports.py --all            # 别名 / 零件号调整后重新解析全部记录
+
+供应商按别名表解析（先跑 backfill_supplier_links.py 登记别名效果最好），
+零件按 (supplier_id, PN) 解析；未匹配的 Ditta 名称进入 /suppliers/aliases/review 待确认队列。
+"""
+import argparse
+
+from app import create_app
+from app.edc_helper import relink_edc_reports
+from app.extensions import db
+from app.part_quality_helper import refresh_rollups
+from app.supplier_helper import enqueue_unmatched
+
+
+def _print_report(report, top):
+    suppliers, parts = report["suppliers"], report["parts"]
+    print(f"{'link':<10}{'rows':>8}{'already':>9}{'linked':>9}{'relinked':>10}{'unmatched':>11}")
+    print(f"{'supplier':<10}{suppliers['total']:>8}{suppliers['already']:>9}"
+          f"{suppliers['code'] + suppliers['name']:>9}{suppliers['relinked']:>10}"
+          f"{sum(suppliers['unmatched'].values()):>11}")
+    print(f"{'part':<10}{parts['total']:>8}{parts['already']:>9}{parts['linked']:>9}"
+          f"{parts['relinked']:>10}{sum(parts['unmatched'].values()):>11}")
+    for label, counter in (("supplier names", suppliers["unmatched"]), ("drawings", parts["unmatched"])):
+        if counter:
+            print(f"\nMost frequent unmatched {label}:")
+            for value, count in counter.most_common(top):
+                print(f"  {count:>5}  {value}")
+
+
+def relink(relink_all=False, dry_run=False, top=20):
+    app = create_app()
+    with app.app_context():
+        report = relink_edc_reports(only_unlinked=not relink_all)
+        _print_report(report, top)
+        if dry_run:
+            db.session.rollback()
+            print("\nDry run: the links above were not saved.")
+        else:
+            queued = enqueue_unmatched({"edc_reports": report["suppliers"]})
+            # part_key 可能被修正过，批量 UPDATE 不经过 mapper 事件，零件质量汇总整体重算一次
+            refresh_rollups()
+            db.session.commit()
+            print(f"\nCompleted: {queued} unmatched supplier name(s) queued for review.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--all", action="store_true", help="已关联的记录也按当前别名 / 零件号重新解析")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--top", type=int, default=20, help="列出的未匹配名称 / 图号数")
+    args = parser.parse_args()
+    relink(relink_all=args.all, dry_run=args.dry_run, top=args.top)
@@ -34,9 +34,12 @@ with app.app_context():
     start = time.time()
     ok = fail = 0
     for i, tr in enumerate(trs, 1):
+        if not is_ollama_available():
+            print(f"\n⚠ Ollama 中途不可用，剩余 {len(trs) - i + 1} 条留空，可用 batch_summarize.py 补齐")
+            break
         print(f"[{i}/{len(trs)}] {tr.tr_no} ... ", end="", flush=True)
         t0 = time.time()
-        s = summarize_issue(tr.issue_description)
+        s = summarize_issue(tr.issue_description, priority="batch")
         el = time.time() - t0
         if s:
             tr.issue_summary = s
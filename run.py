@@ -1,6 +1,15 @@
+import os
+
 from app import create_app
+from app.control_plan_helper import recover_extractions
+from app.scorecard_helper import start_scorecard_scheduler
 
 app = create_app()
 
 if __name__ == "__main__":
+    # 计分卡定时刷新 / CP 提取队列恢复只在 Web 服务进程里启动：脚本 / 子进程 import run.py 或调 create_app 都不会带上线程；
+    # 调试重载时父进程只负责监视文件，只在真正跑服务的子进程（WERKZEUG_RUN_MAIN）里启动
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_scorecard_scheduler(app)
+        recover_extractions(app)
     app.run(debug=True, threaded=True)
@@ -0,0 +1,19 @@
+"""测试共用的辅助函数（tests/ 在 sys.path 上，测试文件直接 from conftest import）"""
+from contextlib import contextmanager
+
+from flask import template_rendered
+
+
+@contextmanager
+def captured_context(app):
+    """收集请求期间渲染模板时的 context，按渲染顺序"""
+    recorded = []
+
+    def record(sender, template, context, **extra):
+        recorded.append(context)
+
+    template_rendered.connect(record, app)
+    try:
+        yield recorded
+    finally:
+        template_rendered.disconnect(record, app)
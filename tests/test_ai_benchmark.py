@@ -0,0 +1,49 @@
+import unittest
+from collections import defaultdict
+
+from benchmarks.ai_extraction import _OllamaDouble, _prompt_key, load_cases, run_benchmark, run_case, score_case
+
+
+class AIExtractionBenchmarkTests(unittest.TestCase):
+    def test_stub_corpus_matches_golden_outputs(self):
+        report = run_benchmark("stub")
+
+        self.assertEqual(report["misses"], 0)
+        self.assertEqual({r["kind"] for r in report["results"]}, {"summary", "8d", "cp"})
+        for result in report["results"]:
+            with self.subTest(case=result["id"]):
+                self.assertEqual(set(result["scores"].values()), {1.0}, result["scores"])
+                self.assertGreater(result["ms"]["total"], 0)
+                self.assertIn("generate", result["ms"])
+
+    def test_replay_adds_recorded_seconds_to_total(self):
+        case = load_cases(kinds=("summary",))[0]
+        recordings = {}
+
+        class Recorder(_OllamaDouble):
+            def __call__(self, url, payload, *args, **kwargs):
+                data = super().__call__(url, payload, *args, **kwargs)
+                recordings[_prompt_key(payload)] = {"response": data["response"], "seconds": 5.0}
+                return data
+
+        run_case(case, Recorder("stub", defaultdict(float)))
+        result = run_case(case, _OllamaDouble("replay", defaultdict(float), recordings=recordings))
+
+        ms = result["ms"]
+        self.assertGreaterEqual(ms["generate"], 5000)
+        self.assertGreaterEqual(ms["total"], ms["generate"])
+        self.assertLess(ms["prompt"], 5000)
+        self.assertNotIn("replayed", ms)
+
+    def test_keyword_recall_scores_partial_fields(self):
+        scores = score_case(
+            "8d",
+            {"root_cause_en": ["vacuum valve", "porosity"], "action_en": ["clean"]},
+            {"root_cause_en": "Porosity from the die", "action_en": ""},
+        )
+
+        self.assertEqual(scores, {"root_cause_en": 0.5, "action_en": 0.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from app import ai_helper
+from app.ai_helper import _OllamaCircuit, _OllamaGovernor, _split_8d_sections
+
+
+class OllamaGovernorTests(unittest.TestCase):
+    def test_interactive_lane_is_served_before_queued_batch_work(self):
+        governor = _OllamaGovernor(1)
+        self.assertIsNotNone(governor.acquire("background"))
+        order = []
+
+        def worker(lane):
+            governor.acquire(lane)
+            order.append(lane)
+            governor.release()
+
+        batch = threading.Thread(target=worker, args=("batch",))
+        batch.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=worker, args=("interactive",))
+        interactive.start()
+        time.sleep(0.05)
+
+        snapshot = governor.snapshot()
+        self.assertEqual(snapshot["active"], 1)
+        self.assertEqual(snapshot["lanes"]["batch"]["waiting"], 1)
+        self.assertEqual(snapshot["lanes"]["interactive"]["waiting"], 1)
+
+        governor.release()
+        batch.join(2)
+        interactive.join(2)
+        self.assertEqual(order, ["interactive", "batch"])
+
+    def test_queue_timeout_gives_up_and_is_counted(self):
+        governor = _OllamaGovernor(1)
+        governor.acquire("interactive")
+
+        self.assertIsNone(governor.acquire("batch", timeout=0.05))
+        self.assertEqual(governor.snapshot()["lanes"]["batch"]["timeouts"], 1)
+        self.assertEqual(governor.snapshot()["lanes"]["batch"]["waiting"], 0)
+
+
+class OllamaCircuitTests(unittest.TestCase):
+    def setUp(self):
+        self.circuit = _OllamaCircuit(backoff=(5, 40), ttl=15)
+
+    def test_failures_open_circuit_with_exponential_backoff(self):
+        self.circuit.record_failure()
+        self.assertFalse(self.circuit.allow())
+        self.assertAlmostEqual(self.circuit.seconds_until_probe(), 5, delta=0.5)
+
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+        self.assertAlmostEqual(self.circuit.seconds_until_probe(), 40, delta=0.5)
+
+    def test_half_open_admits_a_single_trial_then_recovers(self):
+        self.circuit.record_failure()
+        self.circuit.next_probe_at = 0.0
+
+        self.assertTrue(self.circuit.allow())
+        self.assertEqual(self.circuit.state, "half_open")
+        self.assertFalse(self.circuit.allow())
+
+        self.circuit.record_success()
+        self.assertEqual(self.circuit.state, "closed")
+        self.assertTrue(self.circuit.fresh_health())
+
+    def test_open_circuit_fails_fast_without_http_call(self):
+        with patch.object(ai_helper, "_circuit", self.circuit):
+            self.circuit.record_failure()
+            with patch("app.ai_helper.requests.post") as post, \
+                    patch("app.ai_helper.requests.get") as get:
+                self.assertIsNone(ai_helper._call_ollama("prompt", priority="interactive"))
+                self.assertFalse(ai_helper.is_ollama_available())
+                post.assert_not_called()
+                get.assert_not_called()
+
+    def test_deferred_work_runs_once_ollama_recovers(self):
+        ran = threading.Event()
+        with patch.object(ai_helper, "_circuit", self.circuit), \
+                patch.object(ai_helper, "_deferred", {}), \
+                patch.object(ai_helper, "_deferred_watcher", {"running": True}):
+            ai_helper.defer_until_available(("summary", 1), ran.set)
+            self.assertEqual(ai_helper.ai_queue_stats()["deferred"], 1)
+            self.circuit.record_success()
+            self.assertTrue(ran.wait(2))
+            self.assertEqual(ai_helper.ai_queue_stats()["deferred"], 0)
+
+
+def _long_8d_report():
+    filler = "\n".join(f"Team member {i} | Quality | Plant 2" for i in range(400))
+    return "\n".join([
+        "D1 Team",
+        filler,
+        "D2 Problem description",
+        "Housing leak found at customer incoming inspection.",
+        "D4 Root Cause",
+        "Why 1 | Porosity in casting wall",
+        "Why 2 | Vacuum valve clogged, die not evacuated",
+        "未检出原因 Reason for Non-detection",
+        "Leak test pressure set too low after changeover",
+        "D5 Corrective Action",
+        "Clean vacuum valve every shift | Production | 2026-05-01",
+        "Lock leak test pressure recipe | Quality | 2026-05-02",
+    ])
+
+
+class EightDChunkingTests(unittest.TestCase):
+    def test_sections_split_on_d_headings_within_size_limit(self):
+        raw = _long_8d_report()
+
+        chunks = _split_8d_sections(raw, max_chars=2000)
+
+        self.assertTrue(all(len(chunk) <= 2000 for chunk in chunks))
+        self.assertEqual(
+            [line for line in raw.splitlines() if line.strip()],
+            [line for chunk in chunks for line in chunk.splitlines()],
+        )
+        d4 = next(chunk for chunk in chunks if "D4 Root Cause" in chunk)
+        self.assertIn("Why 2 | Vacuum valve clogged", d4)
+
+    def test_long_report_is_mapped_by_section_then_reduced(self):
+        prompts = []
+
+        def fake_call(prompt, **kwargs):
+            prompts.append(prompt)
+            if "partial extractions" in prompt.lower():
+                return json.dumps({
+                    "occurrence_cause": "真空阀堵塞导致气孔",
+                    "occurrence_cause_en": "Clogged vacuum valve caused porosity",
+                    "escape_cause_en": "Leak test pressure too low",
+                    "occurrence_action_en": "Clean vacuum valve every shift",
+                })
+            if "D4 Root Cause" in prompt:
+                return json.dumps({
+                    "occurrence_cause_en": "Clogged vacuum valve caused porosity",
+                    "escape_cause_en": "Leak test pressure too low",
+                })
+            return json.dumps({"occurrence_action_en": "Clean vacuum valve every shift"})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "8d.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(_long_8d_report())
+            with patch.object(ai_helper, "EIGHT_D_SINGLE_PASS_CHARS", 3000), \
+                    patch.object(ai_helper, "EIGHT_D_CHUNK_CHARS", 150), \
+                    patch.object(ai_helper, "_call_ollama", side_effect=fake_call):
+                result = ai_helper.extract_8d(path)
+
+        map_prompts = [p for p in prompts if p.startswith("You are reading PART")]
+        self.assertEqual(len(map_prompts), 3)
+        self.assertTrue(all("Team member 10 |" not in p for p in map_prompts))
+        self.assertEqual(len(prompts), len(map_prompts) + 1)
+        self.assertEqual(result["root_cause_en"], "Clogged vacuum valve caused porosity")
+        self.assertEqual(result["escape_cause_en"], "Leak test pressure too low")
+
+    def test_map_runs_at_governor_concurrency_and_logs_missing_parts(self):
+        calls = []
+
+        def fake_call(prompt, **kwargs):
+            if prompt.startswith("You are reading PART"):
+                calls.append((threading.current_thread().name, kwargs["queue_timeout"]))
+            if "D4 Root Cause" in prompt:
+                return None
+            return json.dumps({"occurrence_action_en": "Clean vacuum valve every shift"})
+
+        logger = Mock()
+        with patch.object(ai_helper, "EIGHT_D_SINGLE_PASS_CHARS", 300), \
+                patch.object(ai_helper, "EIGHT_D_CHUNK_CHARS", 150), \
+                patch.object(ai_helper, "_call_ollama", side_effect=fake_call):
+            data = ai_helper._extract_8d_data(_long_8d_report(), "", timeout=5, logger=logger)
+
+        # 默认并发 1：逐段在调用线程里执行，排队上限不是单次 timeout
+        self.assertEqual({name for name, _ in calls}, {threading.current_thread().name})
+        self.assertEqual({q for _, q in calls}, {ai_helper.EIGHT_D_MAP_QUEUE_SECONDS})
+        self.assertEqual(data["occurrence_action_en"], "Clean vacuum valve every shift")
+        warning = logger.warning.call_args.args[0]
+        self.assertIn("8D map incomplete", warning)
+
+    def test_failed_reduce_falls_back_to_ordered_merge(self):
+        partials = [
+            {"occurrence_cause_en": "Valve clogged", "occurrence_action_en": "Clean valve"},
+            {"occurrence_cause_en": "valve clogged", "escape_cause_en": "Low test pressure"},
+        ]
+        with patch.object(ai_helper, "_call_ollama", return_value=None):
+            merged = ai_helper._reduce_8d_partials(partials, "", 10, None, "background")
+
+        self.assertEqual(merged["occurrence_cause_en"], "Valve clogged")
+        self.assertEqual(merged["escape_cause_en"], "Low test pressure")
+        self.assertEqual(merged["occurrence_action_en"], "Clean valve")
+
+
+if __name__ == "__main__":
+    unittest.main()
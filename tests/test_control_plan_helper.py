@@ -1,10 +1,15 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
+from app import control_plan_helper, create_app
 from app.control_plan_helper import (
-    _align_ai_header, _extract_metadata, _find_header, _parse_aiag, _parse_process_record,
-    assess_quality, extract_control_plan,
+    SHEET_PROBE_ROWS, _XlsxReader, _best_xlsx_sheet, _align_ai_header, _extract_metadata, _find_header, _parse_aiag,
+    _parse_process_record, assess_quality, extract_control_plan, extract_control_plan_cached,
 )
+from app.extensions import db
+from app.models import ControlPlanExtraction
 
 
 class ControlPlanParserTests(unittest.TestCase):
@@ -216,5 +221,185 @@ class ControlPlanParserTests(unittest.TestCase):
         self.assertEqual(header["mapping"]["inspector"], 11)
 
 
+class XlsxReaderTests(unittest.TestCase):
+    def setUp(self):
+        from openpyxl import Workbook
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cp.xlsx")
+        workbook = Workbook()
+        notes = workbook.active
+        notes.title = "Instructions"
+        for i in range(60):
+            notes.append([f"Fill in row {i}", "", "see revision log"])
+        cp = workbook.create_sheet("CP 1A00-2231")
+        cp.append(["Process Number", "Process Name", "Machine", "Characteristic", "", "",
+                   "Specification / Tolerance", "Evaluation Measurement Technique",
+                   "Sample Size", "Frequency", "Control Method", "Reaction Plan"])
+        cp.append(["", "", "", "No.", "Product", "Process", "", "", "", "", "", ""])
+        cp.merge_cells("D1:F1")
+        for column in "ABCGHIJKL":
+            cp.merge_cells(f"{column}1:{column}2")
+        cp.append(["10", "Die casting", "DC-800", "1", "", "Die temperature",
+                   "220±20°C", "Thermocouple", "1", "Continuous", "SPC", "Adjust"])
+        cp.append(["", "", "", "2", "Porosity", "", "No pores", "X-ray", "5", "Per shift",
+                   "Record", "Quarantine"])
+        cp.merge_cells("A3:A4")
+        cp.merge_cells("B3:B4")
+        cp.merge_cells("C3:C4")
+        workbook.save(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_streaming_reader_expands_merged_cells_and_trims_empty_columns(self):
+        with _XlsxReader(self.path) as reader:
+            self.assertEqual(reader.sheet_names, ["Instructions", "CP 1A00-2231"])
+            matrix = reader.read("CP 1A00-2231")
+            probe = reader.read("Instructions", max_rows=10)
+
+        self.assertEqual(matrix[0][3:6], ["Characteristic"] * 3)
+        self.assertEqual(matrix[1][:3], ["Process Number", "Process Name", "Machine"])
+        self.assertEqual(matrix[3][:3], ["10", "Die casting", "DC-800"])
+        self.assertEqual({len(row) for row in matrix}, {12})
+        self.assertEqual(len(probe), 10)
+        self.assertEqual(len(probe[0]), 3)
+
+    def test_extract_picks_control_plan_sheet_from_probe(self):
+        data = extract_control_plan(self.path)
+
+        self.assertEqual(data["source_sheet"], "CP 1A00-2231")
+        self.assertEqual(data["source_template"], "aiag")
+        first = data["steps"][0]["characteristics"][0]
+        self.assertEqual((first["char_name"], first["spec_value"]), ("Die temperature", "220±20°C"))
+
+    def test_two_phase_selection_reads_only_candidates_in_full(self):
+        reads = []
+        original = _XlsxReader.read
+
+        def tracking_read(reader, name, max_rows=control_plan_helper.XLSX_MAX_ROWS):
+            reads.append((name, max_rows))
+            return original(reader, name, max_rows=max_rows)
+
+        with patch.object(_XlsxReader, "read", tracking_read):
+            sheet, header = _best_xlsx_sheet(self.path)
+            reads_sequential = list(reads)
+            reads.clear()
+            parallel_sheet, parallel_header = _best_xlsx_sheet(self.path, workers=2)
+
+        self.assertEqual(sheet["name"], "CP 1A00-2231")
+        self.assertEqual(header["kind"], "aiag")
+        self.assertEqual(
+            reads_sequential,
+            [("Instructions", SHEET_PROBE_ROWS), ("CP 1A00-2231", SHEET_PROBE_ROWS),
+             ("CP 1A00-2231", control_plan_helper.XLSX_MAX_ROWS)],
+        )
+        self.assertEqual((parallel_sheet, parallel_header), (sheet, header))
+
+
+class PdfReaderTests(unittest.TestCase):
+    def test_parallel_pages_merge_in_page_order_like_serial(self):
+        from benchmarks.pdf_reader import build_pdf
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cp.pdf")
+            build_pdf(path, pages=3, rows_per_page=4)
+            serial = control_plan_helper._read_pdf(path, workers=1)
+            with patch.object(control_plan_helper, "PDF_PARALLEL_MIN_PAGES", 0):
+                parallel = control_plan_helper._read_pdf(path, workers=2)
+
+        self.assertEqual(parallel, serial)
+        self.assertEqual((serial[0]["page_count"], serial[0]["table_page_count"]), (3, 3))
+        self.assertEqual(len(serial[0]["matrix"]), 15)
+        self.assertEqual(serial[0]["matrix"][5][0], "Process No.")
+
+
+class ExtractionCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.path = os.path.join(self.temp_dir.name, "cp.pdf")
+        with open(self.path, "wb") as handle:
+            handle.write(b"%PDF-1.4 same bytes")
+        self.result = {
+            "parser_version": control_plan_helper.PARSER_VERSION,
+            "source_template": "pdf_aiag",
+            "ai_model": None,
+            "steps": [{"process_name": "Die casting", "characteristics": []}],
+        }
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def test_same_file_reuses_result_until_parser_version_changes(self):
+        with patch.object(
+            control_plan_helper, "extract_control_plan", return_value=self.result
+        ) as extract:
+            first = extract_control_plan_cached(self.path)
+            db.session.commit()
+            second = extract_control_plan_cached(self.path)
+            self.assertEqual(extract.call_count, 1)
+            self.assertEqual(second, first)
+            self.assertEqual(ControlPlanExtraction.query.one().hit_count, 1)
+
+            # force_ai 单独成键
+            extract_control_plan_cached(self.path, force_ai=True)
+            self.assertEqual(extract.call_count, 2)
+
+            with patch.object(control_plan_helper, "PARSER_VERSION", "cp-parser-next"):
+                extract_control_plan_cached(self.path)
+                db.session.commit()
+            self.assertEqual(extract.call_count, 3)
+        self.assertEqual(
+            {row.parser_version for row in ControlPlanExtraction.query}, {"cp-parser-next"}
+        )
+
+    def test_result_missing_wanted_ai_is_not_cached(self):
+        empty = dict(self.result, source_template="unknown", steps=[])
+        with patch.object(control_plan_helper, "extract_control_plan", return_value=empty) as extract:
+            extract_control_plan_cached(self.path)
+            extract_control_plan_cached(self.path)
+        self.assertEqual(extract.call_count, 2)
+        self.assertEqual(ControlPlanExtraction.query.count(), 0)
+
+    def test_unsupported_result_is_not_cached(self):
+        unsupported = dict(self.result, source_template="unsupported", steps=[])
+        with patch.object(control_plan_helper, "extract_control_plan", return_value=unsupported) as extract:
+            extract_control_plan_cached(self.path)
+            extract_control_plan_cached(self.path)
+        self.assertEqual(extract.call_count, 2)
+        self.assertEqual(ControlPlanExtraction.query.count(), 0)
+
+    def test_ai_result_is_reextracted_after_model_change(self):
+        with patch.object(control_plan_helper, "OLLAMA_MODEL", "model-a"):
+            ai_result = dict(self.result, ai_model="model-a")
+            with patch.object(control_plan_helper, "extract_control_plan", return_value=ai_result) as extract:
+                extract_control_plan_cached(self.path, force_ai=True)
+                db.session.commit()
+                extract_control_plan_cached(self.path, force_ai=True)
+            self.assertEqual(extract.call_count, 1)
+
+        with patch.object(control_plan_helper, "OLLAMA_MODEL", "model-b"):
+            ai_result = dict(self.result, ai_model="model-b")
+            with patch.object(control_plan_helper, "extract_control_plan", return_value=ai_result) as extract:
+                self.assertEqual(extract_control_plan_cached(self.path, force_ai=True)["ai_model"], "model-b")
+                db.session.commit()
+            self.assertEqual(extract.call_count, 1)
+        self.assertEqual([row.ai_model for row in ControlPlanExtraction.query], ["model-b"])
+
+
 if __name__ == "__main__":
     unittest.main()
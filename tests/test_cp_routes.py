@@ -0,0 +1,528 @@
+import io
+import json
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app import control_plan_helper, create_app
+from app.extensions import db
+from app.models import (
+    ControlCharacteristic, ControlPlan, ControlPlanDraftCharacteristic, ControlPlanDraftStep,
+    ControlPlanVersion, ControlPlanVersionDiff, Part, ProcessStep, Supplier,
+)
+
+
+def control_plan_workbook(rows=(("10", "Die casting", "Die temperature", "220±20°C"),)):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Control Plan"
+    sheet.append(["Process Number", "Process Name", "Machine", "Characteristic", "", "",
+                  "Specification / Tolerance", "Evaluation Measurement Technique",
+                  "Sample Size", "Frequency", "Control Method", "Reaction Plan"])
+    sheet.append(["", "", "", "No.", "Product", "Process", "", "", "", "", "", ""])
+    for code, process, characteristic, spec in rows:
+        sheet.append([code, process, "DC-800", "1", "", characteristic, spec,
+                      "Thermocouple", "1", "Continuous", "SPC", "Adjust"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class ControlPlanRouteTestCase(unittest.TestCase):
+    config = {}
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+                **self.config,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.supplier = Supplier(code="SUP01", name="ACME Casting")
+        db.session.add(self.supplier)
+        db.session.flush()
+        self.part = Part(supplier_id=self.supplier.id, pn="1A00-2231", description="Housing")
+        db.session.add(self.part)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def make_version(self, steps, cp=None, version_no=1, status="review"):
+        """直接写入一个已提取的版本（跳过文件上传和解析）"""
+        if cp is None:
+            cp = ControlPlan(
+                supplier_id=self.supplier.id, part_id=self.part.id,
+                cp_no=f"CP-{self.supplier.code}-{self.part.pn}", process_type="hpdc",
+            )
+            db.session.add(cp)
+            db.session.flush()
+        version = ControlPlanVersion(
+            cp_id=cp.id, version_no=version_no, revision=f"A{version_no}", status=status,
+            extract_status="review", original_name="cp.xlsx", stored_name="cp.xlsx",
+            rel_path="cp.xlsx",
+        )
+        db.session.add(version)
+        control_plan_helper.store_draft(version, {"steps": steps})
+        db.session.commit()
+        return cp, version
+
+    def upload(self, filename="cp.xlsx", workbook=None, process_type="hpdc"):
+        return self.client.post(
+            "/cp/upload",
+            data={
+                "supplier_id": self.supplier.id,
+                "part_id": self.part.id,
+                "process_type": process_type,
+                "revision": "A1",
+                "file": (workbook or control_plan_workbook(), filename),
+            },
+            content_type="multipart/form-data",
+        )
+
+
+class BackgroundExtractionTests(ControlPlanRouteTestCase):
+    def test_upload_returns_queued_and_worker_reports_stages(self):
+        with patch("app.blueprints.cp.routes.queue_extraction") as queued:
+            response = self.upload()
+
+        self.assertEqual(response.status_code, 302)
+        version = ControlPlanVersion.query.one()
+        self.assertEqual((version.extract_status, version.extract_stage), ("queued", "queued"))
+        queued.assert_called_once()
+        self.assertEqual(queued.call_args.args[1], version.id)
+
+        url = f"/cp/{version.cp_id}/versions/{version.id}/extraction"
+        status = self.client.get(url).get_json()
+        self.assertEqual((status["stage"], status["progress"], status["done"]), ("queued", 0, False))
+        detail = self.client.get(f"/cp/{version.cp_id}?tab=review")
+        self.assertIn(b"extractionProgress", detail.data)
+
+        stages = []
+        original_commit = db.session.commit
+
+        def record_stage():
+            stages.append(db.session.get(ControlPlanVersion, version.id).extract_stage)
+            original_commit()
+
+        with patch.object(db.session, "commit", side_effect=record_stage):
+            control_plan_helper.run_version_extraction(version.id)
+
+        self.assertEqual(
+            stages[:4], ["reading", "header_detection", "parsing", "quality_scoring"]
+        )
+        status = self.client.get(url).get_json()
+        self.assertEqual(status["extract_status"], "review")
+        self.assertEqual((status["progress"], status["done"]), (100, True))
+        self.assertEqual((status["step_count"], status["characteristic_count"]), (1, 1))
+        self.assertEqual(db.session.get(ControlPlan, version.cp_id).structure_status, "review")
+
+    def test_queued_extraction_uses_background_ai_lane(self):
+        with patch("app.blueprints.cp.routes.queue_extraction"):
+            self.upload()
+        version = ControlPlanVersion.query.one()
+
+        with patch.object(control_plan_helper, "extract_control_plan",
+                          wraps=control_plan_helper.extract_control_plan) as extract:
+            control_plan_helper.queue_extraction(self.app, version.id)
+            control_plan_helper._worker._queue.join()
+
+        self.assertEqual(extract.call_args.kwargs["priority"], "background")
+
+    def test_missing_file_marks_version_failed(self):
+        with patch("app.blueprints.cp.routes.queue_extraction"):
+            self.upload()
+        version = ControlPlanVersion.query.one()
+        version.rel_path = "control_plans/missing.xlsx"
+        db.session.commit()
+
+        control_plan_helper.run_version_extraction(version.id)
+
+        status = self.client.get(
+            f"/cp/{version.cp_id}/versions/{version.id}/extraction"
+        ).get_json()
+        self.assertEqual((status["extract_status"], status["done"]), ("failed", True))
+        self.assertTrue(status["error"])
+
+    def test_interrupted_extraction_is_requeued_and_can_be_reanalyzed(self):
+        with patch("app.blueprints.cp.routes.queue_extraction"):
+            self.upload()
+        version = ControlPlanVersion.query.one()
+        version.extract_status = "processing"
+        db.session.commit()
+
+        # 进程重启：内存队列里没有这个版本
+        url = f"/cp/{version.cp_id}/versions/{version.id}/extraction"
+        self.assertTrue(self.client.get(url).get_json()["stalled"])
+        with patch("app.blueprints.cp.routes.is_ollama_available", return_value=True), \
+                patch("app.blueprints.cp.routes.queue_extraction") as queued:
+            self.client.post(f"/cp/{version.cp_id}/versions/{version.id}/reanalyze")
+        queued.assert_called_once()
+
+        with patch.object(control_plan_helper._worker, "submit") as submit:
+            self.assertEqual(control_plan_helper.recover_extractions(self.app), [version.id])
+        submit.assert_called_once_with(self.app, version.id)
+
+
+def generated_steps(step_count, chars_per_step, prefix="Dim"):
+    return [
+        {
+            "seq": (i + 1) * 10,
+            "process_code": str((i + 1) * 10),
+            "process_name": f"Operation {i}",
+            "characteristics": [
+                {"char_name": f"{prefix} {i}-{j}", "spec_value": f"{j}±0.1",
+                 "is_key_char": j == 0, "source_row": j + 3}
+                for j in range(chars_per_step)
+            ],
+        }
+        for i in range(step_count)
+    ]
+
+
+class PublishTests(ControlPlanRouteTestCase):
+    def publish(self, cp, version):
+        return self.client.post(f"/cp/{cp.id}/versions/{version.id}/publish")
+
+    def test_publish_replaces_structure_with_bulk_inserts(self):
+        cp, first = self.make_version(generated_steps(50, 10))
+        started = time.perf_counter()
+        response = self.publish(cp, first)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(response.status_code, 302)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(ProcessStep.query.filter_by(cp_id=cp.id).count(), 50)
+        self.assertEqual(ControlCharacteristic.query.count(), 500)
+        step = ProcessStep.query.filter_by(cp_id=cp.id, seq=30).one()
+        self.assertEqual(
+            [c.char_name for c in step.characteristics][:2], ["Dim 2-0", "Dim 2-1"]
+        )
+        self.assertTrue(step.characteristics.first().is_key_char)
+
+        _, second = self.make_version(generated_steps(3, 2, prefix="Rev"), cp=cp, version_no=2)
+        self.publish(cp, second)
+
+        db.session.expire_all()
+        self.assertEqual(ProcessStep.query.filter_by(cp_id=cp.id).count(), 3)
+        self.assertEqual(
+            sorted(c.char_name for c in ControlCharacteristic.query)[:2], ["Rev 0-0", "Rev 0-1"]
+        )
+        self.assertEqual(ControlCharacteristic.query.count(), 6)
+        self.assertEqual(db.session.get(ControlPlanVersion, first.id).status, "superseded")
+        self.assertEqual(db.session.get(ControlPlan, cp.id).published_version_id, second.id)
+
+
+class CharacteristicSearchTests(ControlPlanRouteTestCase):
+    def setUp(self):
+        super().setUp()
+        other = Supplier(code="SUP02", name="Beta Foundry")
+        db.session.add(other)
+        db.session.flush()
+        other_part = Part(supplier_id=other.id, pn="2B00-1000")
+        db.session.add(other_part)
+        db.session.commit()
+
+        def published(supplier, part, characteristics, process_type="hpdc"):
+            cp = ControlPlan(supplier_id=supplier.id, part_id=part.id, process_type=process_type,
+                             cp_no=f"CP-{supplier.code}-{part.pn}")
+            db.session.add(cp)
+            db.session.flush()
+            _, version = self.make_version(
+                [{"seq": 10, "process_name": "Casting", "characteristics": characteristics}], cp=cp
+            )
+            self.client.post(f"/cp/{cp.id}/versions/{version.id}/publish")
+            return cp
+
+        self.acme = published(self.supplier, self.part, [
+            {"char_name": "Porosity", "measurement_method": "X-ray", "frequency": "every batch",
+             "special_class": "SC", "is_key_char": True},
+            {"char_name": "气孔检查", "measurement_method": "目视", "frequency": "每班"},
+        ])
+        self.beta = published(other, other_part, [
+            {"char_name": "Internal porosity", "measurement_method": "CT scan", "frequency": "1/shift"},
+            {"char_name": "Wall thickness", "measurement_method": "X-ray gauge", "special_class": "CC"},
+        ], process_type="casting")
+        db.session.commit()
+
+    def search(self, **params):
+        return self.client.get("/cp/api/characteristics", query_string=params).get_json()
+
+    def test_fulltext_terms_are_anded_across_columns(self):
+        result = self.search(q="porosity x-ray")
+        self.assertEqual(result["total"], 1)
+        self.assertEqual(
+            (result["items"][0]["supplier_code"], result["items"][0]["part_pn"]), ("SUP01", "1A00-2231")
+        )
+        self.assertEqual({i["char_name"] for i in self.search(q="porosity")["items"]},
+                         {"Porosity", "Internal porosity"})
+        # 中文子串和两字短词
+        self.assertEqual([i["char_name"] for i in self.search(q="气孔")["items"]], ["气孔检查"])
+        self.assertEqual(self.search(q="every batch")["total"], 1)
+        # 短词里的 LIKE 通配符按字面匹配
+        self.assertEqual(self.search(q="1/")["total"], 1)
+        self.assertEqual(self.search(q="_")["total"], 0)
+        self.assertEqual(self.search(q="%")["total"], 0)
+
+    def test_structured_filters_and_unpublished_plans(self):
+        self.assertEqual([i["char_name"] for i in self.search(key=1)["items"]], ["Porosity"])
+        self.assertEqual([i["char_name"] for i in self.search(special_class="cc")["items"]],
+                         ["Wall thickness"])
+        self.assertEqual(self.search(special_class="%")["total"], 0)
+        self.assertEqual(self.search(q="x-ray", process_type="casting")["total"], 1)
+
+        self.beta.status = "obsolete"
+        db.session.commit()
+        self.assertEqual(self.search(q="porosity")["total"], 1)
+
+    def test_index_filter_narrows_plans_and_lists_hits(self):
+        response = self.client.get("/cp/", query_string={"char_q": "CT scan"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"2B00-1000", response.data)
+        self.assertIn("匹配的控制特性 · 1 条".encode(), response.data)
+        self.assertNotIn(b"1A00-2231", response.data)
+
+
+class DraftStorageTests(ControlPlanRouteTestCase):
+    def test_upload_stores_draft_rows_not_json(self):
+        with patch("app.blueprints.cp.routes.queue_extraction"):
+            self.upload(workbook=control_plan_workbook(rows=(
+                ("10", "Die casting", "Die temperature", "220±20°C"),
+                ("20", "Trimming", "Burr height", "≤0.2"),
+            )))
+        version = ControlPlanVersion.query.one()
+        control_plan_helper.run_version_extraction(version.id)
+
+        self.assertIsNone(version.structured_json)
+        self.assertEqual(version.draft_revision, 1)
+        self.assertEqual(
+            [(s.position, s.process_name) for s in version.draft_steps],
+            [(0, "Die casting"), (1, "Trimming")],
+        )
+        exported = self.client.get(f"/cp/{version.cp_id}/export.json").get_json()
+        self.assertEqual(exported["steps"][1]["characteristics"][0]["spec_value"], "≤0.2")
+        self.assertEqual(exported["quality_score"], version.quality_score)
+
+    def test_review_save_patches_only_the_edited_step(self):
+        cp, version = self.make_version(generated_steps(3, 2))
+        untouched = {
+            c.id: c.spec_value for c in ControlPlanDraftCharacteristic.query.filter(
+                ControlPlanDraftCharacteristic.version_id == version.id
+            )
+        }
+        form = {"step_index": 1, "s1_process_code": "20", "s1_process_name": "Operation 1 rev"}
+        for ci in range(2):
+            form[f"s1c{ci}_char_name"] = f"Dim 1-{ci}"
+            form[f"s1c{ci}_spec_value"] = f"{ci}±0.05"
+            form[f"s1c{ci}_sample_size"] = "5"
+        response = self.client.post(f"/cp/{cp.id}/versions/{version.id}/save", data=form)
+
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        version = db.session.get(ControlPlanVersion, version.id)
+        self.assertEqual(version.draft_revision, 2)
+        steps = version.draft_steps.all()
+        self.assertEqual([s.process_name for s in steps], ["Operation 0", "Operation 1 rev", "Operation 2"])
+        for char in ControlPlanDraftCharacteristic.query:
+            if char.step.position == 1:
+                self.assertEqual(char.spec_value, f"{char.position}±0.05")
+            else:
+                self.assertEqual(char.spec_value, untouched[char.id])
+
+        page = self.client.get(f"/cp/{cp.id}?tab=review&version_id={version.id}&step=1")
+        self.assertIn(b"Operation 1 rev", page.data)
+        self.assertIn("0±0.05".encode(), page.data)
+
+
+class VersionDiffTests(ControlPlanRouteTestCase):
+    def test_diff_aligns_steps_and_characteristics(self):
+        base = {"steps": [
+            {"process_code": "10", "process_name": "Die casting", "characteristics": [
+                {"char_code": "1", "char_name": "Die temperature", "spec_value": "220±20°C"},
+                {"char_code": "2", "char_name": "Injection pressure", "spec_value": "80 MPa"},
+            ]},
+            {"process_code": "20", "process_name": "Trimming", "characteristics": [
+                {"char_name": "Burr height", "spec_value": "≤0.2"},
+            ]},
+            {"process_code": "30", "process_name": "Shot blasting", "characteristics": []},
+        ]}
+        target = {"steps": [
+            # 工序号变了，名称略有出入 → 相似度对齐
+            {"process_code": "100", "process_name": "Die-casting HPDC", "characteristics": [
+                {"char_code": "1", "char_name": "Die temperature", "spec_value": "230±20°C"},
+                {"char_code": "3", "char_name": "Injection pressure", "spec_value": "80 MPa"},
+                {"char_code": "4", "char_name": "Cycle time", "spec_value": "60 s"},
+            ]},
+            {"process_code": "20", "process_name": "Trimming", "characteristics": [
+                {"char_name": "Burr height", "spec_value": "≤0.2"},
+            ]},
+            {"process_code": "40", "process_name": "Leak test", "characteristics": [
+                {"char_name": "Leak rate", "spec_value": "<5 ccm"},
+            ]},
+        ]}
+        diff = control_plan_helper.diff_structures(base, target)
+
+        self.assertEqual(diff["summary"], {
+            "steps_added": 1, "steps_removed": 1, "steps_changed": 1,
+            "chars_added": 2, "chars_removed": 0, "chars_changed": 2,
+        })
+        casting = diff["steps"][0]
+        self.assertEqual((casting["status"], casting["base_index"], casting["target_index"]),
+                         ("changed", 0, 0))
+        self.assertEqual({c["field"] for c in casting["changes"]}, {"process_code", "process_name"})
+        self.assertEqual(
+            [(c["status"], c["char_name"], [x["field"] for x in c["changes"]])
+             for c in casting["characteristics"]],
+            [("changed", "Die temperature", ["spec_value"]),
+             ("changed", "Injection pressure", ["char_code"]),
+             ("added", "Cycle time", [])],
+        )
+        self.assertEqual([s["status"] for s in diff["steps"]], ["changed", "added", "removed"])
+
+    def test_publish_stores_diff_and_detail_and_csv_read_it(self):
+        steps = generated_steps(40, 10)
+        cp, first = self.make_version(steps)
+        self.client.post(f"/cp/{cp.id}/versions/{first.id}/publish")
+
+        revised = json.loads(json.dumps(steps))
+        revised[5]["characteristics"][3]["spec_value"] = "3±0.05"
+        revised[7]["characteristics"].pop()
+        revised.append({"seq": 999, "process_code": "999", "process_name": "Final audit",
+                        "characteristics": [{"char_name": "Appearance"}]})
+        _, second = self.make_version(revised, cp=cp, version_no=2)
+
+        url = f"/cp/{cp.id}/versions/{second.id}/diff"
+        summary = self.client.get(url).get_json()["summary"]
+        self.assertEqual(
+            (summary["chars_changed"], summary["chars_removed"], summary["steps_added"]), (1, 1, 1)
+        )
+        stored = ControlPlanVersionDiff.query.filter_by(
+            base_version_id=first.id, target_version_id=second.id
+        ).one()
+        computed_at = stored.created_at
+
+        with patch.object(control_plan_helper, "diff_structures") as recompute:
+            page = self.client.get(f"/cp/{cp.id}?tab=changes&version_id={second.id}")
+            export = self.client.get(f"/cp/{cp.id}/export.csv?version_id={second.id}&changes=1")
+        recompute.assert_not_called()
+        self.assertIn("V1 → V2 变更".encode(), page.data)
+        lines = export.get_data(as_text=True).splitlines()
+        self.assertTrue(lines[0].endswith("Change,Changed Fields"))
+        self.assertTrue(any("Dim 5-3" in line and line.endswith("changed,spec_value") for line in lines))
+        self.assertTrue(lines[-1].endswith("removed,"))
+        self.assertIn("Dim 7-9", lines[-1])
+
+        # 草稿再次修改后 draft_revision 变化，重新计算
+        step = ControlPlanDraftStep.query.filter_by(version_id=second.id, position=0).one()
+        step.process_name = "Operation zero"
+        second.draft_revision += 1
+        db.session.commit()
+        summary = self.client.get(url).get_json()["summary"]
+        self.assertEqual(summary["steps_changed"], 3)
+        self.assertEqual(ControlPlanVersionDiff.query.count(), 1)
+        self.assertGreaterEqual(ControlPlanVersionDiff.query.one().created_at, computed_at)
+        self.assertEqual(ControlPlanVersionDiff.query.one().target_revision, second.draft_revision)
+
+        self.client.post(f"/cp/{cp.id}/versions/{second.id}/publish")
+        page = self.client.get(f"/cp/{cp.id}?tab=changes")
+        self.assertIn("V1 → V2 变更".encode(), page.data)
+
+
+class ExportTests(ControlPlanRouteTestCase):
+    def setUp(self):
+        super().setUp()
+        other = Supplier(code="SUP02", name="Beta Foundry")
+        db.session.add(other)
+        db.session.flush()
+        other_part = Part(supplier_id=other.id, pn="2B00-1000")
+        db.session.add(other_part)
+        db.session.commit()
+        self.cp, version = self.make_version(generated_steps(3, 2))
+        self.client.post(f"/cp/{self.cp.id}/versions/{version.id}/publish")
+        self.other_cp = ControlPlan(supplier_id=other.id, part_id=other_part.id,
+                                    cp_no="CP-SUP02-2B00-1000", process_type="casting")
+        db.session.add(self.other_cp)
+        db.session.flush()
+        _, other_version = self.make_version(
+            [{"seq": 10, "process_name": "Pouring", "characteristics": []}], cp=self.other_cp
+        )
+        self.client.post(f"/cp/{self.other_cp.id}/versions/{other_version.id}/publish")
+
+    def test_plan_export_streams_csv_and_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(f"/cp/{self.cp.id}/export.csv")
+        self.assertTrue(response.is_streamed)
+        lines = response.get_data(as_text=True).lstrip("\ufeff").splitlines()
+        self.assertEqual(len(lines), 1 + 6)
+        self.assertTrue(lines[1].startswith("10,Operation 0,,,Dim 0-0,product,,0±0.1"))
+
+        # cp_no 由零件号拼成，可能带 "/"，Excel 工作表名里不允许
+        self.cp.cp_no = "CP-SUP01/1A00:0001"
+        db.session.commit()
+        response = self.client.get(f"/cp/{self.cp.id}/export.xlsx")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        workbook = load_workbook(io.BytesIO(response.get_data()), read_only=True)
+        self.assertEqual(workbook.sheetnames, ["CP-SUP011A000001"])
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:2], ("Process No.", "Process Name"))
+        self.assertEqual((rows[6][1], rows[6][4]), ("Operation 2", "Dim 2-1"))
+        self.assertEqual(self.client.get(f"/cp/{self.cp.id}/export.pdf").status_code, 404)
+
+    def test_xlsx_writer_streams_chunks_and_escapes_values(self):
+        from openpyxl import load_workbook
+
+        rows = [[index, f"<Op & {index}>\x07", None, "  spaced "] for index in range(25)]
+        chunks = list(control_plan_helper.iter_xlsx(["No.", "Name", "Empty", "Note"], rows,
+                                                    title="a/b", chunk_rows=10))
+        self.assertGreater(len(chunks), 3)
+        workbook = load_workbook(io.BytesIO(b"".join(chunks)), read_only=True)
+        values = list(workbook["ab"].iter_rows(values_only=True))
+        self.assertEqual(len(values), 26)
+        self.assertEqual(values[3], (2, "<Op & 2>", None, "  spaced "))
+
+    def test_bulk_export_covers_published_plans_with_filters(self):
+        def bulk(fmt="csv", **params):
+            response = self.client.get(f"/cp/export.{fmt}", query_string=params)
+            self.assertEqual(response.status_code, 200)
+            return response
+
+        lines = bulk().get_data(as_text=True).lstrip("\ufeff").splitlines()
+        self.assertEqual(lines[0].split(",")[:4],
+                         ["Supplier Code", "Supplier Name", "Part No.", "Control Plan No."])
+        # 3 道工序 x 2 个特性，另一份 CP 只有一道无特性的工序
+        self.assertEqual(len(lines), 1 + 6 + 1)
+        self.assertTrue(lines[-1].startswith("SUP02,Beta Foundry,2B00-1000,CP-SUP02-2B00-1000"))
+
+        only_casting = bulk(process_type="casting").get_data(as_text=True).splitlines()
+        self.assertEqual(len(only_casting), 2)
+        only_acme = bulk(supplier_id=self.supplier.id).get_data(as_text=True).splitlines()
+        self.assertEqual(len(only_acme), 7)
+        self.assertIn("SUP01", bulk(supplier_id=self.supplier.id).headers["Content-Disposition"])
+
+        self.other_cp.status = "obsolete"
+        db.session.commit()
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(io.BytesIO(bulk("xlsx").get_data()), read_only=True)
+        self.assertEqual(len(list(workbook.active.iter_rows(values_only=True))), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
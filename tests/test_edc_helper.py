@@ -0,0 +1,148 @@
+import tempfile
+import unittest
+
+from app import create_app, edc_helper, supplier_helper
+from app.extensions import db
+from app.models import EDCReport, Part, Supplier, SupplierMatchReview
+
+
+class EDCLinkTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        self.acme = Supplier(code="ITMD10814", name="Acme Precision Co., Ltd.")
+        self.beta = Supplier(code="ITMD20000", name="Beta Castings")
+        db.session.add_all([self.acme, self.beta])
+        db.session.commit()
+        self.bracket = Part(supplier_id=self.acme.id, pn="1A000123")
+        self.cover = Part(supplier_id=self.acme.id, pn="2B 000456")
+        self.shared_acme = Part(supplier_id=self.acme.id, pn="9Z000001")
+        self.shared_beta = Part(supplier_id=self.beta.id, pn="9Z000001")
+        db.session.add_all([self.bracket, self.cover, self.shared_acme, self.shared_beta])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def edc(self, no, code, name, drawing):
+        return {"report_no": no, "supplier_code": code, "supplier_name": name, "drawing": drawing,
+                "rejected_parts": 1, "received_parts": 100, "file_path": f"{no}.pdf"}
+
+    def ingest(self, *rows):
+        batch = list(rows)
+        edc_helper.link_edc_batch(batch)
+        db.session.bulk_insert_mappings(EDCReport, batch)
+        db.session.commit()
+
+    def links(self):
+        db.session.expire_all()
+        return {r.report_no: (r.supplier_id, r.part_id) for r in EDCReport.query}
+
+    def test_ingest_resolves_supplier_and_part_per_batch(self):
+        self.ingest(
+            self.edc("100000001", "ITMD10814", "ACME PRECISION", "1a000123"),
+            self.edc("100000002", "N/A", "Acme Precision S.p.A.", "2B000456"),
+            self.edc("100000003", "ITMD20000", "Beta Castings", "1A000123"),     # 别家的零件号不串
+            self.edc("100000004", "", "Officine Rossi S.r.l.", "9Z000001"),      # 两家都有 → 不猜
+            self.edc("100000005", "", "Officine Rossi S.r.l.", "2B000456"),      # 全局唯一 → 挂上
+        )
+        self.assertEqual(self.links(), {
+            "100000001": (self.acme.id, self.bracket.id),
+            "100000002": (self.acme.id, self.cover.id),
+            "100000003": (self.beta.id, None),
+            "100000004": (None, None),
+            "100000005": (None, self.cover.id),
+        })
+        self.assertEqual([r.report_no for r in self.bracket.edc_reports], ["100000001"])
+        self.assertEqual(self.acme.edc_reports.count(), 2)
+        review = SupplierMatchReview.query.one()
+        self.assertEqual((review.raw_name, review.occurrences, review.source),
+                         ("Officine Rossi S.r.l.", 2, "edc_reports"))
+
+    def test_part_and_supplier_writes_maintain_links(self):
+        self.ingest(
+            self.edc("100000001", "ITMD10814", "Acme", "3C000789"),
+            self.edc("100000002", "ITMD30000", "Gamma Forging", "4D000111"),
+        )
+        part = Part(supplier_id=self.acme.id, pn="3C000789")
+        db.session.add(part)
+        db.session.commit()
+        self.assertEqual(self.links()["100000001"], (self.acme.id, part.id))
+
+        part.pn = "3C000790"
+        db.session.commit()
+        self.assertEqual(self.links()["100000001"], (self.acme.id, None))
+
+        gamma = Supplier(code="ITMD30000", name="Gamma Forging")
+        db.session.add(gamma)
+        db.session.commit()
+        gamma_part = Part(supplier_id=gamma.id, pn="4D000111")
+        db.session.add(gamma_part)
+        db.session.commit()
+        self.assertEqual(self.links()["100000002"], (gamma.id, gamma_part.id))
+
+        db.session.delete(gamma)
+        db.session.commit()
+        self.assertEqual(self.links()["100000002"], (None, None))
+
+    def test_supplier_linked_later_resolves_part_against_its_parts(self):
+        self.ingest(
+            self.edc("100000001", "", "Officine Rossi S.r.l.", "9Z000001"),      # 两家都有 → 不猜
+            self.edc("100000002", "", "Officine Rossi S.r.l.", "2B000456"),      # 全局唯一 → 挂 Acme 的
+            self.edc("100000003", "", "Someone Else", "9Z000001"),
+        )
+        self.assertEqual(self.links()["100000001"], (None, None))
+
+        review = SupplierMatchReview.query.filter_by(name_key="officinerossi").one()
+        self.assertTrue(supplier_helper.resolve_review(review, self.beta))
+        db.session.commit()
+        links = self.links()
+        self.assertEqual(links["100000001"], (self.beta.id, self.shared_beta.id))
+        self.assertEqual(links["100000002"], (self.beta.id, None))          # Beta 没有这个零件
+        self.assertEqual(links["100000003"], (None, None))
+
+    def test_key_prefilter_keeps_spelling_variants(self):
+        table = EDCReport.__table__
+        db.session.bulk_insert_mappings(EDCReport, [
+            self.edc("100000001", "", "O.R. Officine-Rossi Srl", "1A000123"),
+            self.edc("100000002", "", "Rossi Officine", "1A000123"),
+        ])
+        stmt = db.select(table.c.report_no).where(
+            supplier_helper._key_prefilter([table.c.supplier_name], {"orofficinerossi"})
+        )
+        self.assertEqual(db.session.execute(stmt).scalars().all(), ["100000001"])
+
+    def test_relink_backfills_existing_rows(self):
+        db.session.bulk_insert_mappings(EDCReport, [
+            self.edc("100000001", "ITMD10814", "Acme", "1A000123"),
+            self.edc("100000002", "ITMD99999", "Nobody", "8X000000"),
+        ])
+        db.session.commit()
+        self.assertEqual(self.links()["100000001"], (None, None))
+
+        report = edc_helper.relink_edc_reports()
+        db.session.commit()
+        self.assertEqual(self.links()["100000001"], (self.acme.id, self.bracket.id))
+        self.assertEqual((report["suppliers"]["code"], report["parts"]["linked"]), (1, 1))
+        self.assertEqual(report["parts"]["unmatched"]["8X000000"], 1)
+
+        report = edc_helper.relink_edc_reports()
+        self.assertEqual((report["suppliers"]["total"], report["parts"]["total"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import tempfile
+import unittest
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import BusinessTrip, FileLibrary, KnowledgeItem, Supplier, TroubleReport
+from conftest import captured_context
+
+
+class DashboardTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+                "DASHBOARD_CACHE_TTL": 300,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        now = datetime.utcnow()
+        db.session.add(Supplier(code="ZSU001", name="Acme Precision"))
+        db.session.add_all([
+            TroubleReport(tr_no="1001", supplier_code="ZSU001", supplier_name="Acme Precision",
+                          status="open", issue_description="x" * 80, created_at=now - timedelta(minutes=5)),
+            TroubleReport(tr_no="1002", supplier_code="ZSU001", supplier_name="Acme Precision",
+                          status="Closed", issue_description="Burr", created_at=now - timedelta(days=40)),
+            BusinessTrip(trip_no="TRIP-1", engineer="Li", supplier_name="Acme Precision", purpose="Audit",
+                         start_date=date(2026, 3, 1), end_date=date(2026, 3, 2), status="ongoing",
+                         created_at=now - timedelta(days=1)),
+            KnowledgeItem(title="Porosity", content="Vacuum casting notes", process="casting",
+                          created_at=now - timedelta(hours=2)),
+            FileLibrary(title="Spec", category="standard", original_name="spec.pdf", stored_name="a.pdf",
+                        rel_path="a.pdf", created_at=now - timedelta(days=60)),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def render(self):
+        with captured_context(self.app) as recorded:
+            response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        return recorded[-1]
+
+    @contextmanager
+    def count_queries(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+    def test_counts_and_recent_activity(self):
+        with self.count_queries() as statements:
+            ctx = self.render()
+        self.assertLessEqual(len(statements), 3)
+
+        stats = ctx["stats"]
+        self.assertEqual((stats["suppliers"], stats["tr_total"], stats["tr_pending"]), (1, 2, 1))
+        self.assertEqual((stats["trip_total"], stats["trip_ongoing"], stats["knowledge"], stats["file"]), (1, 1, 1, 1))
+        self.assertEqual(stats["week_tr"], 1)
+        self.assertEqual(stats["week_file"], 0)
+
+        activities = ctx["recent_activities"]
+        self.assertEqual(
+            [a["title"] for a in activities], ["TR-1001", "Porosity", "TRIP-1", "TR-1002", "Spec"]
+        )
+        self.assertEqual(activities[0]["description"], "ZSU001 - " + "x" * 50 + "...")
+        self.assertEqual(activities[0]["time_ago"], "5分钟前")
+        self.assertEqual(activities[-1]["description"], "spec.pdf")
+
+    def test_cache_is_served_until_a_relevant_write(self):
+        self.render()
+        with self.count_queries() as statements:
+            ctx = self.render()
+        self.assertEqual(statements, [])
+        self.assertEqual(ctx["stats"]["tr_total"], 2)
+
+        db.session.add(KnowledgeItem(title="Draft", content="x", process="casting"))
+        db.session.rollback()
+        with self.count_queries() as statements:
+            self.render()
+        self.assertEqual(statements, [])
+
+        db.session.add(TroubleReport(tr_no="1003", supplier_code="ZSU001", supplier_name="Acme Precision",
+                                     issue_description="Dent"))
+        db.session.commit()
+        ctx = self.render()
+        self.assertEqual((ctx["stats"]["tr_total"], ctx["stats"]["week_tr"]), (3, 2))
+        self.assertEqual(ctx["recent_activities"][0]["title"], "TR-1003")
+
+    def test_cache_can_be_disabled(self):
+        self.app.config["DASHBOARD_CACHE_TTL"] = 0
+        self.render()
+        with self.count_queries() as statements:
+            self.render()
+        self.assertTrue(statements)
+
+
+if __name__ == "__main__":
+    unittest.main()
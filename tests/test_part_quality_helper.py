@@ -0,0 +1,154 @@
+import tempfile
+import unittest
+from datetime import date
+
+from app import create_app, edc_helper, part_quality_helper
+from app.extensions import db
+from app.models import EDCReport, Part, PartQualityRollup, Supplier, TroubleReport
+
+
+class PartQualityRollupTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        self.acme = Supplier(code="ITMD10814", name="Acme Precision")
+        db.session.add(self.acme)
+        db.session.commit()
+        self.bracket = Part(supplier_id=self.acme.id, pn="1A000123")
+        db.session.add(self.bracket)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def tr(self, no, part_number, **kwargs):
+        report = TroubleReport(
+            tr_no=no, supplier_code="ITMD10814", supplier_name="Acme Precision",
+            part_number=part_number, issue_description="Burr on flange", **kwargs,
+        )
+        db.session.add(report)
+        db.session.commit()
+        return report
+
+    def ingest(self, *rows):
+        batch = [
+            {"report_no": no, "supplier_code": "ITMD10814", "supplier_name": "Acme", "drawing": drawing,
+             "rejected_parts": rejected, "received_parts": received, "report_date": date(2026, 9, 1),
+             "file_path": f"{no}.pdf"}
+            for no, drawing, rejected, received in rows
+        ]
+        edc_helper.link_edc_batch(batch)
+        db.session.bulk_insert_mappings(EDCReport, batch)
+        db.session.commit()
+
+    def rollup(self, key):
+        db.session.expire_all()
+        return db.session.get(PartQualityRollup, key)
+
+    def test_tr_writes_refresh_rollup_incrementally(self):
+        first = self.tr("TR-1", "1a 000123", eight_d_status="NOT_RECEIVED")
+        self.tr("TR-2", "1A000123", status="Closed")
+        rollup = self.rollup("1A000123")
+        self.assertEqual((rollup.tr_count, rollup.open_trs, rollup.open_8d), (2, 1, 1))
+
+        first.status = "Closed"
+        first.eight_d_status = "RECEIVED_PASS"
+        db.session.commit()
+        rollup = self.rollup("1A000123")
+        self.assertEqual((rollup.tr_count, rollup.open_trs, rollup.open_8d), (2, 0, 0))
+
+        # 改零件号：新旧两个零件号都要重算
+        first.part_number = "2B000456"
+        db.session.commit()
+        self.assertEqual(self.rollup("1A000123").tr_count, 1)
+        self.assertEqual(self.rollup("2B000456").tr_count, 1)
+
+        db.session.delete(first)
+        db.session.commit()
+        self.assertIsNone(self.rollup("2B000456"))
+
+    def test_edc_batch_and_ppm(self):
+        self.ingest(("100000001", "1A000123", 5, 1000), ("100000002", "1a000123", 0, 1500),
+                    ("100000003", "7Q000777", 2, 0))
+        rollup = self.rollup("1A000123")
+        self.assertEqual((rollup.edc_count, rollup.rejected_parts, rollup.received_parts), (2, 5, 2500))
+        self.assertEqual(rollup.ppm, 2000)
+        self.assertEqual(rollup.last_edc_date, date(2026, 9, 1))
+        # 未登记的零件号也有汇总；没有来料数时不给 ppm
+        unregistered = self.rollup("7Q000777")
+        self.assertEqual((unregistered.edc_count, unregistered.ppm), (1, None))
+
+        db.session.rollback()
+        self.assertNotIn(part_quality_helper._DIRTY_KEY, db.session.info)
+
+    def test_rollup_for_falls_back_and_full_refresh(self):
+        self.tr("TR-1", "1A000123")
+        db.session.execute(PartQualityRollup.__table__.delete())
+        db.session.commit()
+
+        rollup = part_quality_helper.rollup_for(" 1a000123 ")
+        self.assertEqual(rollup.tr_count, 1)
+        self.assertIsNone(self.rollup("1A000123"))
+        self.assertIsNone(part_quality_helper.rollup_for("0X000000"))
+        self.assertEqual(part_quality_helper.rollups_for_parts([self.bracket]), {})
+
+        self.assertEqual(part_quality_helper.refresh_rollups(), 1)
+        db.session.commit()
+        self.assertEqual(part_quality_helper.rollups_for_parts([self.bracket])[self.bracket.id].tr_count, 1)
+
+    def test_history_page_and_api(self):
+        tr = self.tr("TR-1", "1A000123")
+        self.ingest(("100000001", "1A000123", 5, 1000))
+        client = self.app.test_client()
+
+        response = client.get("/edc/part/1a000123")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"100000001", response.data)
+        self.assertIn(f"/tr/{tr.id}/edit".encode(), response.data)
+        self.assertEqual(client.get("/edc/part/0X000000").status_code, 200)
+
+        payload = client.get("/edc/api/part/1A000123").get_json()
+        self.assertEqual(payload["rollup"]["ppm"], 5000)
+        self.assertEqual(payload["monthly"][0]["month"], "2026-09")
+        self.assertEqual(payload["by_supplier"][0]["supplier_id"], self.acme.id)
+        self.assertEqual([p["id"] for p in payload["parts"]], [self.bracket.id])
+        self.assertEqual(client.get("/edc/api/part/0X000000").status_code, 404)
+
+        redirect = client.get("/edc/part?pn=1A000123")
+        self.assertTrue(redirect.headers["Location"].endswith("/edc/part/1A000123"))
+
+    def test_history_covers_calendar_months_and_clamps_limit(self):
+        today = date.today()
+        first = today.year * 12 + today.month - 24
+        oldest = date(first // 12, first % 12 + 1, 1)
+        before = date((first - 1) // 12, (first - 1) % 12 + 1, 28)
+        self.ingest(("100000001", "1A000123", 1, 100), ("100000002", "1A000123", 1, 100))
+        db.session.execute(EDCReport.__table__.update().where(EDCReport.report_no == "100000001")
+                           .values(report_date=oldest))
+        db.session.execute(EDCReport.__table__.update().where(EDCReport.report_no == "100000002")
+                           .values(report_date=before))
+        db.session.commit()
+
+        history = part_quality_helper.part_history("1A000123")
+        self.assertEqual([m["month"] for m in history["monthly"]], [oldest.strftime("%Y-%m")])
+
+        payload = self.app.test_client().get("/edc/api/part/1A000123?limit=-1").get_json()
+        self.assertEqual(len(payload["edc_reports"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
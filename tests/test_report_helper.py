@@ -0,0 +1,136 @@
+import io
+import json
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from app import create_app, report_helper
+from app.extensions import db
+from app.models import Supplier, TroubleReport
+
+
+class BatchReportTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+                "REPORT_BATCH_WORKERS": 1,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.acme = Supplier(code="ZSU001", name="Acme Precision Co., Ltd.")
+        self.beta = Supplier(code="ZSU002", name="Beta Castings")
+        self.idle = Supplier(code="ZSU003", name="Gamma Forging")
+        db.session.add_all([self.acme, self.beta, self.idle])
+        db.session.commit()
+
+        now = datetime.utcnow()
+        rows = [
+            ("TR-A1", "Acme Precision Co., Ltd.", "Open", "NOT_RECEIVED", "PN-1", 100.0, 1),
+            ("TR-A2", "Acme Precision Co., Ltd.", "Closed", "RECEIVED_PASS", "PN-1", None, 2),
+            ("TR-A3", "Acme Precision Co., Ltd.", "Open", "NOT_REQUIRED", "", 20.0, 3),
+            ("TR-B1", "Beta Castings", "Open", "NOT_RECEIVED", "PN-7", 50.0, 1),
+            ("TR-B2", "Beta Castings", "Open", "NOT_REQUIRED", "PN-7", None, 900),
+        ]
+        for tr_no, name, status, eight_d, part, debit, age in rows:
+            db.session.add(TroubleReport(
+                tr_no=tr_no, supplier_code="N/A", supplier_name=name, status=status,
+                eight_d_status=eight_d, part_number=part, debit_amount=debit, debit_currency="EUR",
+                issue_description=f"Burr {tr_no}", created_at=now - timedelta(days=age),
+            ))
+        db.session.commit()
+        self.out = Path(self.temp_dir.name) / "bundle"
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def test_one_aggregation_serves_every_supplier(self):
+        ids = [self.acme.id, self.beta.id, self.idle.id]
+        together = report_helper.collect_report_data(ids)
+        for supplier_id in ids:
+            alone = report_helper.collect_report_data([supplier_id])[supplier_id]
+            self.assertEqual(
+                {k: v for k, v in together[supplier_id].items() if k != "trs"},
+                {k: v for k, v in alone.items() if k != "trs"},
+            )
+            self.assertEqual([t.tr_no for t in together[supplier_id]["trs"]], [t.tr_no for t in alone["trs"]])
+
+        acme = together[self.acme.id]
+        self.assertEqual((acme["total"], acme["closed"], acme["eight_d_pending"]), (3, 1, 1))
+        self.assertEqual(acme["debit"], {"EUR": 120.0})
+        self.assertEqual([p[:3] for p in acme["parts"]], [("PN-1", None, 2), (report_helper.NO_PART_LABEL, None, 1)])
+        self.assertEqual([t.tr_no for t in acme["trs"]], ["TR-A1", "TR-A3", "TR-A2"])
+        self.assertEqual(together[self.idle.id]["total"], 0)
+
+    def test_batch_renders_in_spawned_worker_processes(self):
+        calls = []
+        with patch.object(report_helper, "ProcessPoolExecutor", wraps=report_helper.ProcessPoolExecutor) as pool:
+            manifest = report_helper.run_batch_reports(
+                self.out, period="this_year", workers=2, progress=lambda *args: calls.append(args),
+            )
+        self.assertEqual(pool.call_args.kwargs["mp_context"].get_start_method(), "spawn")
+        self.assertEqual([r["code"] for r in manifest["reports"]], ["ZSU001", "ZSU002"])
+        self.assertEqual(manifest["skipped"], ["ZSU003"])
+        self.assertEqual(manifest["errors"], [])
+        self.assertEqual(sorted(done for done, _, _ in calls), [1, 2])
+        self.assertEqual({total for _, total, _ in calls}, {2})
+
+        beta = next(r for r in manifest["reports"] if r["code"] == "ZSU002")
+        self.assertEqual((beta["total"], beta["open"]), (1, 1))          # TR-B2 不在本年
+        html = (self.out / beta["html"]).read_text(encoding="utf-8")
+        self.assertIn("TR-B1", html)
+        self.assertNotIn("TR-B2", html)
+        self.assertIn('href="assets/tailwind.css"', html)
+        self.assertIn('href="index.html"', html)
+
+        self.assertIn(beta["html"], (self.out / "index.html").read_text(encoding="utf-8"))
+        self.assertEqual(json.loads((self.out / "manifest.json").read_text(encoding="utf-8"))["period"], "this_year")
+        with zipfile.ZipFile(manifest["zip"]) as bundle:
+            names = bundle.namelist()
+        self.assertIn(f"bundle/{beta['html']}", names)
+        self.assertIn("bundle/index.html", names)
+
+    def test_selected_suppliers_and_page_report_share_context(self):
+        manifest = report_helper.run_batch_reports(self.out, period="all", codes=["ZSU003"], include_empty=True)
+        self.assertEqual([r["code"] for r in manifest["reports"]], ["ZSU003"])
+
+        body = self.client.get("/suppliers/ZSU001/report?period=all").get_data(as_text=True)
+        self.assertIn("TR-A3", body)
+        self.assertIn("/static/css/tailwind.css", body)
+        self.assertIn("ACME", body)
+
+    def test_batch_job_endpoints(self):
+        response = self.client.post("/suppliers/reports/batch", data={"period": "bogus"})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post("/suppliers/reports/batch", data={"period": "all", "code": ["ZSU001"]})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["job_id"]
+        report_helper.get_batch_job(job_id)["thread"].join(timeout=30)
+
+        status = self.client.get(f"/suppliers/reports/batch/{job_id}").get_json()
+        self.assertEqual((status["status"], status["done"], status["total"]), ("done", 1, 1))
+        download = self.client.get(status["download_url"])
+        self.assertEqual(download.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(download.data)) as bundle:
+            self.assertTrue(any(name.endswith("manifest.json") for name in bundle.namelist()))
+        download.close()
+        self.assertEqual(self.client.get("/suppliers/reports/batch/missing").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
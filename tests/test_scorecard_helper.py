@@ -0,0 +1,178 @@
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from app import create_app, scorecard_helper
+from app.extensions import db
+from app.models import AuditReport, ControlPlan, Part, Supplier, SupplierScorecard, TroubleReport
+from conftest import captured_context
+
+
+class SupplierScorecardTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.acme = Supplier(code="ZSU001", name="Acme Precision")
+        self.beta = Supplier(code="ZSU002", name="Beta Castings")
+        self.quiet = Supplier(code="ZSU003", name="Gamma Forging")
+        db.session.add_all([self.acme, self.beta, self.quiet])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def tr(self, no, supplier_name, status="Open", eight_d="NOT_REQUIRED", debit=None, currency=None, age=1):
+        report = TroubleReport(
+            tr_no=no, supplier_code="N/A", supplier_name=supplier_name, status=status,
+            eight_d_status=eight_d, debit_amount=debit, debit_currency=currency,
+            issue_description="Burr", created_at=datetime.utcnow() - timedelta(days=age),
+        )
+        db.session.add(report)
+        db.session.commit()
+        return report
+
+    def card(self, supplier):
+        db.session.expire_all()
+        return db.session.get(SupplierScorecard, supplier.id)
+
+    def render(self, url):
+        with captured_context(self.app) as recorded:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return recorded[-1]
+
+    def test_new_supplier_gets_an_empty_scorecard(self):
+        card = self.card(self.quiet)
+        self.assertEqual((card.total_trs, card.open_trs, card.parts_count), (0, 0, 0))
+        self.assertIsNone(card.cp_coverage)
+        self.assertEqual(card.status_color, "green")
+
+    def test_tr_writes_refresh_only_affected_suppliers(self):
+        self.tr("TR-1", "Acme Precision", eight_d="NOT_RECEIVED", debit=100.0, currency="eur")
+        self.tr("TR-2", "Acme Precision", status="Closed", debit=50.0, currency="USD", age=3)
+        moved = self.tr("TR-3", "Acme Precision", debit=-20.0)
+
+        card = self.card(self.acme)
+        self.assertEqual((card.total_trs, card.open_trs, card.closed_trs, card.eight_d_pending), (3, 2, 1, 1))
+        self.assertEqual(card.debit_total, 150.0)
+        self.assertEqual(card.debit_by_currency, {"EUR": 80.0, "USD": 50.0})
+        self.assertEqual(card.status_color, "yellow")
+        beta_refreshed = self.card(self.beta).refreshed_at
+
+        moved.remark = "only the remark"
+        db.session.commit()
+        self.assertEqual(self.card(self.beta).refreshed_at, beta_refreshed)
+
+        moved.supplier_name = "Beta Castings"
+        db.session.commit()
+        self.assertEqual(self.card(self.acme).total_trs, 2)
+        self.assertEqual(self.card(self.beta).open_trs, 1)
+
+        db.session.delete(moved)
+        db.session.commit()
+        self.assertEqual(self.card(self.beta).total_trs, 0)
+
+    def test_audits_parts_and_cp_coverage(self):
+        audit = AuditReport(
+            audit_no="AUD-1", supplier_name="Acme Precision", audit_date=date(2026, 3, 1),
+            auditor="Li", open_findings=2,
+        )
+        part_a = Part(supplier_id=self.acme.id, pn="PN-1")
+        part_b = Part(supplier_id=self.acme.id, pn="PN-2")
+        db.session.add_all([audit, part_a, part_b])
+        db.session.commit()
+        db.session.add(ControlPlan(supplier_id=self.acme.id, part_id=part_a.id, cp_no="CP-1", process_type="casting"))
+        db.session.commit()
+
+        card = self.card(self.acme)
+        self.assertEqual((card.audit_count, card.open_findings), (1, 2))
+        self.assertEqual((card.parts_count, card.cp_parts, card.cp_coverage), (2, 1, 50.0))
+        self.assertEqual(card.last_activity, audit.created_at)
+
+        audit.open_findings = 0
+        db.session.commit()
+        self.assertEqual(self.card(self.acme).open_findings, 0)
+
+    def test_full_refresh_repairs_bulk_sql_and_drops_deleted_suppliers(self):
+        report = self.tr("TR-1", "Acme Precision")
+        db.session.execute(db.update(TroubleReport).values(supplier_id=self.beta.id))
+        db.session.commit()
+        self.assertEqual(self.card(self.acme).total_trs, 1)     # 批量 SQL 绕过了 mapper 事件
+
+        self.assertEqual(scorecard_helper.refresh_scorecards(), 3)
+        db.session.commit()
+        self.assertEqual((self.card(self.acme).total_trs, self.card(self.beta).total_trs), (0, 1))
+
+        db.session.delete(db.session.get(Supplier, self.beta.id))
+        db.session.commit()
+        self.assertIsNone(self.card(self.beta))
+        db.session.refresh(report)
+        self.assertIsNone(report.supplier_id)
+
+    def test_rollback_discards_pending_refresh(self):
+        db.session.add(TroubleReport(
+            tr_no="TR-X", supplier_code="N/A", supplier_name="Acme Precision", issue_description="Burr",
+        ))
+        db.session.flush()
+        db.session.rollback()
+        db.session.add(Part(supplier_id=self.beta.id, pn="PN-9"))
+        db.session.commit()
+        self.assertEqual(self.card(self.acme).total_trs, 0)
+        self.assertEqual(self.card(self.beta).parts_count, 1)
+
+    def test_supplier_list_filters_and_sorts_on_scorecard(self):
+        for i in range(4):
+            self.tr(f"TR-A{i}", "Acme Precision", age=30)
+        self.tr("TR-B1", "Beta Castings", age=1)
+        self.tr("TR-B2", "Beta Castings", status="done", age=2)
+
+        def codes(url):
+            return [item["supplier"].code for item in self.render(url)["suppliers"]]
+
+        self.assertEqual(codes("/suppliers/?sort=recent"), ["ZSU002", "ZSU001", "ZSU003"])
+        self.assertEqual(codes("/suppliers/?sort=issues"), ["ZSU001", "ZSU002", "ZSU003"])
+        self.assertEqual(codes("/suppliers/?filter=issues&sort=name"), ["ZSU001", "ZSU002"])
+        self.assertEqual(codes("/suppliers/?filter=quiet"), ["ZSU003"])
+        self.assertEqual(codes("/suppliers/?filter=recent&q=beta"), ["ZSU002"])
+
+        ctx = self.render("/suppliers/?sort=name")
+        acme = ctx["suppliers"][0]
+        self.assertEqual((acme["open_trs"], acme["total_trs"], acme["status_color"]), (4, 4, "red"))
+        self.assertEqual(ctx["stats"], {"total": 3, "issues": 2, "quiet": 1, "recent": 1})
+
+    def test_workspace_header_and_dashboard_read_scorecard(self):
+        self.tr("TR-1", "Acme Precision", eight_d="NOT_RECEIVED")
+        body = self.client.get("/suppliers/ZSU001/quality").get_data(as_text=True)
+        self.assertIn("1 open TR", body)
+
+        ctx = self.render("/")
+        self.assertEqual(
+            (ctx["stats"]["suppliers"], ctx["stats"]["suppliers_with_issues"], ctx["stats"]["eight_d_pending"]),
+            (3, 1, 1),
+        )
+
+        # 还没有计分卡行时概览现算，不写库
+        db.session.execute(db.delete(SupplierScorecard))
+        db.session.commit()
+        ctx = self.render("/suppliers/ZSU001/")
+        self.assertEqual((ctx["total_trs"], ctx["eight_d_pending"]), (1, 1))
+        self.assertEqual(SupplierScorecard.query.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import create_app, similar_helper
+from app.extensions import db
+from app.models import IssueEmbedding, KnowledgeItem, TroubleReport
+
+VOCAB = ("porosity", "casting", "scratch", "paint", "crack", "weld")
+
+
+def fake_embed(texts, **kwargs):
+    """词袋向量：同主题的文本余弦相似度高"""
+    return [
+        [float(text.lower().count(word)) + 0.01 for word in VOCAB]
+        for text in texts
+    ]
+
+
+class SimilarIssueTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        similar_helper._index.reset()
+
+        def tr(no, description, root_cause=None):
+            report = TroubleReport(
+                tr_no=no, supplier_code="N/A", supplier_name="ACME",
+                issue_description=description, eight_d_root_cause_en=root_cause,
+            )
+            db.session.add(report)
+            return report
+
+        self.porosity = tr("TR-1", "Porosity found in casting housing", "casting porosity from gas")
+        self.porosity_again = tr("TR-2", "Casting porosity on flange")
+        self.scratch = tr("TR-3", "Paint scratch on cover")
+        self.knowledge = KnowledgeItem(
+            title="Casting porosity checklist", content="Vent design against porosity", process="casting"
+        )
+        db.session.add(self.knowledge)
+        db.session.commit()
+
+        self.embed = patch.object(similar_helper, "embed_texts", side_effect=fake_embed)
+        self.embed_mock = self.embed.start()
+
+    def tearDown(self):
+        self.embed.stop()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def test_backfill_then_similar_ranks_same_topic_first(self):
+        done, pending = similar_helper.index_missing()
+        self.assertEqual((done, pending), (4, 4))
+
+        hits = similar_helper.similar_issues("tr", self.porosity.id)
+        keys = [(hit["type"], hit["obj"].id) for hit in hits]
+        self.assertEqual(
+            set(keys[:2]), {("tr", self.porosity_again.id), ("knowledge", self.knowledge.id)}
+        )
+        self.assertNotIn(("tr", self.scratch.id), keys)
+
+        # 文本没变：第二次回填不再调用 embedding
+        self.embed_mock.reset_mock()
+        self.assertEqual(similar_helper.index_missing(), (0, 0))
+        self.embed_mock.assert_not_called()
+
+    def test_write_updates_and_removes_single_rows_in_loaded_index(self):
+        similar_helper.index_missing()
+        similar_helper.similar_issues("tr", self.porosity.id)   # 加载矩阵
+
+        self.scratch.issue_description = "Casting porosity near boss"
+        db.session.commit()
+        self.assertTrue(similar_helper.index_source("tr", self.scratch.id))
+        self.assertEqual(self.embed_mock.call_count, 2)
+        hits = similar_helper.similar_issues("tr", self.porosity.id, k=3)
+        self.assertIn(self.scratch.id, [hit["obj"].id for hit in hits if hit["type"] == "tr"])
+
+        similar_helper.remove_source("tr", self.scratch.id)
+        self.assertEqual(similar_helper._index.size, 3)
+        self.assertEqual(IssueEmbedding.query.count(), 3)
+        hits = similar_helper.similar_issues("tr", self.porosity.id, k=3)
+        self.assertNotIn(self.scratch.id, [hit["obj"].id for hit in hits if hit["type"] == "tr"])
+
+    def test_page_views_check_database_at_most_once_per_interval(self):
+        similar_helper.index_missing()
+        similar_helper.similar_issues("tr", self.porosity.id)   # 加载矩阵
+
+        # 其他进程写入：读路径在核对间隔内不查库，间隔到了才发现并重载
+        db.session.add(IssueEmbedding(
+            source_type="knowledge", source_id=999, model=similar_helper.OLLAMA_EMBED_MODEL, text_hash="x",
+            dim=len(VOCAB), vector=similar_helper._normalize([1.0] * len(VOCAB)).tobytes(),
+        ))
+        db.session.commit()
+        with patch.object(similar_helper._VectorIndex, "_db_signature",
+                          wraps=similar_helper._VectorIndex._db_signature) as signature:
+            similar_helper.similar_issues("tr", self.porosity.id)
+            similar_helper.similar_issues("tr", self.porosity.id)
+            signature.assert_not_called()
+            self.assertEqual(similar_helper._index.size, 4)
+
+            with patch.object(similar_helper, "INDEX_CHECK_SECONDS", 0):
+                similar_helper._index._check_after = 0.0
+                similar_helper.similar_issues("tr", self.porosity.id)
+            self.assertEqual(signature.call_count, 1)
+            self.assertEqual(similar_helper._index.size, 5)
+
+    def test_knowledge_page_shows_similar_panel_without_calling_ollama(self):
+        similar_helper.index_missing()
+        self.embed_mock.reset_mock()
+
+        response = self.app.test_client().get(f"/knowledge/item/{self.knowledge.id}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Similar Past Issues", response.data)
+        self.assertIn(b"TR-1", response.data)
+        self.embed_mock.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+import tempfile
+import unittest
+from datetime import date
+
+from app import create_app, supplier_helper
+from app.extensions import db
+from app.models import (
+    AuditReport, BusinessTrip, Supplier, SupplierAlias, SupplierMatchReview, SupplierScorecard, TroubleReport,
+)
+
+
+class SupplierLinkTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.acme = Supplier(code="ZSU001", name="Acme Precision Co., Ltd.", chinese_name="爱克美精密有限公司")
+        db.session.add(self.acme)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def tr(self, no, supplier_name, supplier_code="N/A"):
+        report = TroubleReport(
+            tr_no=no, supplier_code=supplier_code, supplier_name=supplier_name,
+            issue_description="Burr on flange",
+        )
+        db.session.add(report)
+        db.session.commit()
+        return report
+
+    def test_supplier_key_ignores_case_punctuation_and_legal_suffix(self):
+        key = supplier_helper.supplier_key("Acme Precision Co., Ltd.")
+        self.assertEqual(key, supplier_helper.supplier_key("ACME  precision co ltd"))
+        self.assertEqual(key, supplier_helper.supplier_key("Acme-Precision"))
+        self.assertEqual(supplier_helper.supplier_key("爱克美精密有限公司"), "爱克美精密")
+        self.assertEqual(supplier_helper.supplier_key("Ltd"), "ltd")
+        self.assertEqual(supplier_helper.supplier_key("Officine Rossi S.r.l."), "officinerossi")
+
+    def test_supplier_key_strips_only_whole_legal_form_words(self):
+        key = supplier_helper.supplier_key
+        self.assertNotEqual(key("Metalco"), key("Metal"))
+        self.assertEqual(key("Marco Spa"), "marco")
+        self.assertEqual(key("Tesco"), "tesco")
+        self.assertNotEqual(key("Franco Zinc"), key("Franco Z"))
+        self.assertEqual(key("Franco Zinc Inc."), "francozinc")
+
+        metalco = Supplier(code="ZSU010", name="Metalco")
+        metal = Supplier(code="ZSU011", name="Metal S.r.l.")
+        db.session.add_all([metalco, metal])
+        db.session.commit()
+        self.assertEqual(self.tr("TR-1", "METAL SRL").supplier_id, metal.id)
+        self.assertEqual(self.tr("TR-2", "Metalco").supplier_id, metalco.id)
+
+    def test_supplier_aliases_registered_on_insert(self):
+        sources = {a.alias_key: a.source for a in SupplierAlias.query.filter_by(supplier_id=self.acme.id)}
+        self.assertEqual(sources, {"zsu001": "code", "acmeprecision": "name", "爱克美精密": "name"})
+
+    def test_resolved_at_write_time_by_code_then_name(self):
+        self.assertEqual(self.tr("TR-1", "ACME PRECISION CO LTD").supplier_id, self.acme.id)
+        self.assertEqual(self.tr("TR-2", "爱克美精密").supplier_id, self.acme.id)
+        self.assertEqual(self.tr("TR-3", "Unknown", supplier_code="zsu001").supplier_id, self.acme.id)
+        self.assertIsNone(self.tr("TR-4", "Someone Else").supplier_id)
+
+        trip = BusinessTrip(
+            trip_no="TRIP-1", engineer="Li", supplier_name="acme precision", purpose="Audit",
+            start_date=date(2026, 3, 1), end_date=date(2026, 3, 2),
+        )
+        audit = AuditReport(audit_no="AUD-1", supplier_name="Acme Precision", audit_date=date(2026, 3, 1), auditor="Li")
+        db.session.add_all([trip, audit])
+        db.session.commit()
+        self.assertEqual((trip.supplier_id, audit.supplier_id), (self.acme.id, self.acme.id))
+
+    def test_update_reresolves_unless_supplier_id_is_explicit(self):
+        other = Supplier(code="ZSU002", name="Beta Castings")
+        db.session.add(other)
+        db.session.commit()
+        report = self.tr("TR-1", "Acme Precision")
+        report.supplier_name = "Beta Castings"
+        db.session.commit()
+        self.assertEqual(report.supplier_id, other.id)
+
+        report.supplier_name = "Acme Precisoin"
+        report.supplier_id = self.acme.id
+        db.session.commit()
+        self.assertEqual(report.supplier_id, self.acme.id)
+
+    def test_new_supplier_links_previously_unmatched_records(self):
+        report = self.tr("TR-1", "Gamma Forging S.p.A.")
+        self.assertIsNone(report.supplier_id)
+        gamma = Supplier(code="ITV009", name="Gamma Forging")
+        db.session.add(gamma)
+        db.session.commit()
+        db.session.refresh(report)
+        self.assertEqual(report.supplier_id, gamma.id)
+        review = SupplierMatchReview.query.one()
+        self.assertEqual((review.status, review.resolved_supplier_id), ("resolved", gamma.id))
+
+    def test_rename_keeps_old_alias_and_delete_unlinks(self):
+        report = self.tr("TR-1", "Acme Precision")
+        self.acme.name = "Acme Group"
+        db.session.commit()
+        self.assertEqual(self.tr("TR-2", "Acme Precision").supplier_id, self.acme.id)
+        self.assertEqual(self.tr("TR-3", "ACME GROUP").supplier_id, self.acme.id)
+
+        db.session.delete(self.acme)
+        db.session.commit()
+        db.session.refresh(report)
+        self.assertIsNone(report.supplier_id)
+        self.assertEqual(SupplierAlias.query.count(), 0)
+
+    def test_manual_alias_and_backfill_report(self):
+        unmatched = self.tr("TR-1", "A.P. Precision")
+        db.session.execute(db.update(TroubleReport).values(supplier_id=None))
+        db.session.commit()
+
+        report = supplier_helper.link_records()
+        stats = report["trouble_reports"]
+        self.assertEqual((stats["total"], stats["name"]), (1, 0))
+        self.assertEqual(stats["unmatched"]["A.P. Precision"], 1)
+
+        self.assertTrue(supplier_helper.add_supplier_alias(self.acme, "A P Precision"))
+        self.assertFalse(supplier_helper.add_supplier_alias(Supplier(id=999), "ap precision"))
+        stats = supplier_helper.link_records()["trouble_reports"]
+        db.session.commit()
+        self.assertEqual((stats["name"], sum(stats["unmatched"].values())), (1, 0))
+        db.session.refresh(unmatched)
+        self.assertEqual(unmatched.supplier_id, self.acme.id)
+
+    def test_fuzzy_match_links_close_variants_and_queues_the_rest(self):
+        beta = Supplier(code="ZSU002", name="Beta Castings")
+        db.session.add(beta)
+        db.session.commit()
+        self.assertEqual(self.tr("TR-1", "Acme Precisions Srl").supplier_id, self.acme.id)
+        self.assertEqual(self.tr("TR-2", "Beta Casting").supplier_id, beta.id)
+        self.assertIsNone(self.tr("TR-3", "Beta Cast").supplier_id)
+        self.assertIsNone(self.tr("TR-4", "BETA CAST.").supplier_id)
+        self.assertIsNone(self.tr("TR-5", "Someone Else").supplier_id)
+
+        queued = {r.name_key: r for r in SupplierMatchReview.query}
+        self.assertEqual(set(queued), {"betacast", "someoneelse"})
+        review = queued["betacast"]
+        self.assertEqual((review.raw_name, review.occurrences, review.source), ("Beta Cast", 2, "trouble_reports"))
+        self.assertEqual(review.suggested_supplier_id, beta.id)
+        self.assertIsNone(queued["someoneelse"].suggested_supplier_id)
+
+    def test_resolving_a_review_registers_alias_and_links_history(self):
+        report = self.tr("TR-1", "A.P. Precision")
+        noise = self.tr("TR-2", "Someone Else")
+        self.assertIsNone(report.supplier_id)
+        review = SupplierMatchReview.query.filter_by(name_key="apprecision").one()
+        client = self.app.test_client()
+
+        response = client.post(f"/suppliers/aliases/review/{review.id}/resolve", data={"supplier_id": self.acme.id})
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        self.assertEqual(report.supplier_id, self.acme.id)
+        self.assertEqual((review.status, review.resolved_supplier_id), ("resolved", self.acme.id))
+        self.assertEqual(SupplierAlias.query.filter_by(alias_key="apprecision").one().source, "review")
+        self.assertEqual(db.session.get(SupplierScorecard, self.acme.id).total_trs, 1)
+        self.assertEqual(self.tr("TR-3", "A P Precision").supplier_id, self.acme.id)
+
+        other = SupplierMatchReview.query.filter_by(name_key="someoneelse").one()
+        client.post(f"/suppliers/aliases/review/{other.id}/ignore")
+        self.tr("TR-4", "someone else")
+        db.session.refresh(other)
+        self.assertEqual((other.status, other.occurrences), ("ignored", 2))
+        body = client.get("/suppliers/aliases/review?status=ignored").get_data(as_text=True)
+        self.assertIn("Someone Else", body)
+        self.assertIsNone(noise.supplier_id)
+
+    def test_matcher_snapshot_is_rebuilt_only_after_alias_changes(self):
+        matcher = supplier_helper.supplier_matcher()
+        self.assertIs(supplier_helper.supplier_matcher(), matcher)
+        self.tr("TR-1", "Acme Precision")
+        self.assertIs(supplier_helper.supplier_matcher(), matcher)
+
+        supplier_helper.add_supplier_alias(self.acme, "AP Prec")
+        db.session.rollback()
+        self.assertNotIn("apprec", supplier_helper.supplier_matcher().exact)
+
+        db.session.add(Supplier(code="ZSU002", name="Beta Castings"))
+        db.session.commit()
+        self.assertIn("betacastings", supplier_helper.supplier_matcher().exact)
+
+        # 其他进程登记的别名：快照未命中时回落到别名表
+        db.session.execute(SupplierAlias.__table__.insert().values(
+            supplier_id=self.acme.id, alias="Acme SZ", alias_key="acmesz", source="manual",
+        ))
+        db.session.commit()
+        self.assertEqual(self.tr("TR-2", "ACME SZ").supplier_id, self.acme.id)
+
+    def test_workspace_lists_trs_by_supplier_id(self):
+        self.tr("TR-LINKED-1", "ACME precision co., ltd")
+        self.tr("TR-OTHER-1", "Someone Else")
+        client = self.app.test_client()
+        body = client.get("/suppliers/ZSU001/quality").get_data(as_text=True)
+        self.assertIn("TR-LINKED-1", body)
+        self.assertNotIn("TR-OTHER-1", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+import json
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import AuditReport, Supplier, TroubleReport
+from conftest import captured_context
+
+
+class SupplierWorkspaceTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite://",
+                "DB_DIR": self.temp_dir.name,
+                "UPLOAD_DIR": self.temp_dir.name,
+            }
+        )
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.supplier = Supplier(code="ZSU001", name="Acme Precision")
+        other = Supplier(code="ZSU002", name="Beta Castings")
+        db.session.add_all([self.supplier, other])
+        db.session.commit()
+
+        now = datetime.utcnow()
+        self.now = now
+        rows = [
+            # (tr_no, supplier, status, 8D, part, debit, currency, age_days)
+            ("TR-1", "Acme Precision", "Open", "NOT_RECEIVED", "PN-1", 100.0, "EUR", 1),
+            ("TR-2", "Acme Precision", "Closed", "RECEIVED_PASS", "PN-1", 50.0, "usd", 2),
+            ("TR-3", "Acme Precision", "done", "NOT_REQUIRED", "PN-2", None, None, 40),
+            ("TR-4", "Acme Precision", "Open", "NOT_RECEIVED", "", 0.0, "EUR", 3),
+            ("TR-5", "Acme Precision", "Open", "NOT_REQUIRED", None, 30.0, None, 800),
+            ("TR-9", "Beta Castings", "Open", "NOT_RECEIVED", "PN-1", 999.0, "EUR", 1),
+        ]
+        for tr_no, name, status, eight_d, part, debit, currency, age in rows:
+            created = now - timedelta(days=age)
+            db.session.add(TroubleReport(
+                tr_no=tr_no, supplier_code="N/A", supplier_name=name, status=status,
+                eight_d_status=eight_d, part_number=part, debit_amount=debit,
+                debit_currency=currency, issue_description="Burr", created_at=created,
+                remark=f"note | {created.strftime('%d.%m.%Y')}",
+            ))
+        db.session.add(AuditReport(
+            audit_no="AUD-1", supplier_name="Acme Precision", audit_date=date(2026, 1, 5),
+            auditor="Li", open_findings=3,
+        ))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        self.temp_dir.cleanup()
+
+    def render(self, url):
+        with captured_context(self.app) as recorded:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return recorded[-1]
+
+    def tr_row(self, tr_no):
+        db.session.add(TroubleReport(
+            tr_no=tr_no, supplier_code="N/A", supplier_name="Acme Precision",
+            issue_description="Scratch", created_at=self.now - timedelta(days=900),
+        ))
+        db.session.commit()
+
+    def test_overview_kpis_and_charts_from_aggregates(self):
+        ctx = self.render("/suppliers/ZSU001/")
+        self.assertEqual(
+            (ctx["total_trs"], ctx["open_trs"], ctx["closed_trs"], ctx["eight_d_pending"]), (5, 3, 2, 2)
+        )
+        this_year = [age for age in (1, 2, 800) if (self.now - timedelta(days=age)).year == self.now.year]
+        self.assertEqual(ctx["debit_count"], len(this_year))
+        self.assertEqual(ctx["open_findings"], 3)
+        self.assertEqual(ctx["last_audit"].audit_no, "AUD-1")
+
+        chart = json.loads(ctx["chart_data"])
+        self.assertEqual(sum(chart["open"]), 2)             # TR-5 落在 12 个月之外
+        self.assertEqual(sum(chart["closed"]), 2)
+        self.assertEqual(sum(chart["debit"]), 150.0)
+        self.assertEqual(chart["eight_d"], {
+            "NOT_REQUIRED": 2, "NOT_RECEIVED": 2, "RECEIVED_REJECT": 0, "RECEIVED_PASS": 1,
+        })
+        self.assertEqual(chart["top_parts_labels"], ["PN-1", "PN-2"])
+        self.assertEqual(chart["top_parts_values"], [2, 1])
+        self.assertIn("TR TR-1", [a["title"] for a in ctx["activities"]])
+
+    def test_debit_tab(self):
+        ctx = self.render("/suppliers/ZSU001/debit")
+        self.assertEqual([t.tr_no for t in ctx["debit_trs"]], ["TR-1", "TR-2", "TR-5"])
+        self.assertEqual(ctx["total_debit"], 180.0)
+
+    def test_report_all_time_and_period(self):
+        ctx = self.render("/suppliers/ZSU001/report?period=all")
+        self.assertEqual((ctx["total"], ctx["open_cnt"], ctx["closed"], ctx["pending_8d"]), (5, 3, 2, 2))
+        self.assertEqual(
+            {d["currency"]: d["amount"] for d in ctx["debit_totals"]}, {"EUR": 130.0, "USD": 50.0}
+        )
+        self.assertEqual(
+            [(p["pn"], p["count"]) for p in ctx["top_parts"]],
+            [("PN-1", 2), ("No Part No. / 未填零件号", 2), ("PN-2", 1)],
+        )
+        self.assertEqual({d["key"]: d["count"] for d in ctx["eight_d"]}["NOT_RECEIVED"], 2)
+        self.assertEqual(len(ctx["trs"]), 5)
+        self.assertEqual(sum(m["count"] for m in ctx["monthly"]), 5)
+
+        start = (self.now - timedelta(days=10)).strftime("%Y-%m-%d")
+        end = self.now.strftime("%Y-%m-%d")
+        ctx = self.render(f"/suppliers/ZSU001/report?period=custom&start={start}&end={end}")
+        self.assertEqual([t.tr_no for t in ctx["trs"]], ["TR-1", "TR-4", "TR-2"])
+        self.assertEqual((ctx["total"], ctx["open_cnt"]), (3, 2))
+        self.assertEqual(sum(m["count"] for m in ctx["monthly"]), 3)
+
+    def test_quality_filters_search_and_pagination_in_sql(self):
+        tr3 = TroubleReport.query.filter_by(tr_no="TR-3").one()
+        tr3.issue_summary = "No specific defect described in the notice"
+        tr1 = TroubleReport.query.filter_by(tr_no="TR-1").one()
+        tr1.issue_summary = "No specific defect described"
+        tr1.investigation_note = "Checked on site"
+        tr4 = TroubleReport.query.filter_by(tr_no="TR-4").one()
+        tr4.issue_description = "毛刺超差 on cover, 5% of lot"
+        db.session.commit()
+
+        def tr_nos(url):
+            return [t.tr_no for t in self.render(url)["trs"]]
+
+        base = "/suppliers/ZSU001/quality"
+        self.assertEqual(tr_nos(base), ["TR-1", "TR-2", "TR-4", "TR-3", "TR-5"])
+        self.assertEqual(tr_nos(f"{base}?filter=open"), ["TR-1", "TR-4", "TR-5"])
+        self.assertEqual(tr_nos(f"{base}?filter=closed"), ["TR-2", "TR-3"])
+        self.assertEqual(tr_nos(f"{base}?filter=investigation"), ["TR-3"])
+
+        self.assertEqual(tr_nos(f"{base}?q=毛刺"), ["TR-4"])            # 短词：LIKE
+        self.assertEqual(tr_nos(f"{base}?q=刺超差"), ["TR-4"])           # trigram 全文索引
+        self.assertEqual(tr_nos(f"{base}?q=COVER"), ["TR-4"])
+        self.assertEqual(tr_nos(f"{base}?q=tr-5"), ["TR-5"])
+        self.assertEqual(tr_nos(f"{base}?q=burr&filter=closed"), ["TR-2", "TR-3"])
+        self.assertEqual(tr_nos(f"{base}?q=nothing-like-this"), [])
+        self.assertEqual(tr_nos(f"{base}?q=5%25"), ["TR-4"])              # % / _ 按字面匹配
+        self.assertEqual(tr_nos(f"{base}?q=_"), [])
+
+        ctx = self.render(f"{base}?per_page=5&page=9")
+        self.assertEqual((ctx["pagination"].page, ctx["pagination"].total), (1, 5))
+        self.assertEqual(ctx["total_quality"], 5)
+
+        for i in range(7):
+            self.tr_row(f"TR-P{i}")
+        ctx = self.render(f"{base}?per_page=5&page=3")
+        self.assertEqual((ctx["pagination"].page, ctx["pagination"].pages), (3, 3))
+        self.assertEqual(len(ctx["trs"]), 2)
+
+    def test_issue_date_maintained_on_write(self):
+        tr = TroubleReport.query.filter_by(tr_no="TR-3").one()
+        self.assertEqual(tr.issue_date, (self.now - timedelta(days=40)).date())
+        tr.remark = "EDC 42 | 2025-02-03"
+        db.session.commit()
+        self.assertEqual(tr.issue_date, date(2025, 2, 3))
+        tr.remark = "no date any more"
+        db.session.commit()
+        self.assertEqual(tr.issue_date, tr.created_at.date())
+
+        fresh = TroubleReport(tr_no="TR-NEW", supplier_code="N/A", supplier_name="Acme Precision",
+                              issue_description="Dent", remark="Issue Date | 01/12/2024")
+        db.session.add(fresh)
+        db.session.commit()
+        self.assertEqual(fresh.issue_date, date(2024, 12, 1))
+
+    def test_report_period_uses_issue_date_range(self):
+        tr5 = TroubleReport.query.filter_by(tr_no="TR-5").one()
+        tr5.remark = f"moved | {self.now:%d.%m.%Y}"      # 通知日期改到今天，created_at 仍是 800 天前
+        db.session.commit()
+        start = (self.now - timedelta(days=10)).strftime("%Y-%m-%d")
+        end = self.now.strftime("%Y-%m-%d")
+        ctx = self.render(f"/suppliers/ZSU001/report?period=custom&start={start}&end={end}")
+        self.assertEqual([t.tr_no for t in ctx["trs"]], ["TR-5", "TR-1", "TR-4", "TR-2"])
+
+        ctx = self.render("/suppliers/ZSU001/report?period=this_month")
+        in_month = [
+            tr.tr_no for tr in TroubleReport.query.filter_by(supplier_id=self.supplier.id)
+            if tr.issue_date >= self.now.date().replace(day=1)
+        ]
+        self.assertEqual(ctx["total"], len(in_month))
+        self.assertIsNotNone(ctx["prev_total"])
+
+
+if __name__ == "__main__":
+    unittest.main()